@@ -1,21 +1,219 @@
+import asyncio
+import json
+import logging
 import os
+import re
+import secrets
 import shutil
-from fastapi import FastAPI, HTTPException
+import time
+from contextlib import asynccontextmanager
+from functools import partial
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, StreamingResponse
 import docker
-from pydantic import BaseModel
-from typing import Optional, List
+import requests
+from pydantic import BaseModel, ValidationError
+from typing import Any, Optional, List, Dict
+from jobs import Job, JobManager
+from inventory import ServerInventory, server_labels
+from nodes import (
+    CPUS_LABEL, DEFAULT_CPUS, MEMORY_LABEL, NODE_LABEL, PIDS_LIMIT, NoCapacity, NodeRegistry, UnknownNode,
+    container_memory, resource_limits, server_memory,
+)
+from warm_pool import WarmPool
+from artifacts import ArtifactStore, artifact_key
+from batch import BATCH_PARALLELISM, BATCH_READY_TIMEOUT, Batch, max_in_flight
+from trash import Trash
+from ports import RCON_BIND, PortAllocator, PortConflict, PortsExhausted, port_bindings, port_labels
+from stats import StatsCollector, parse_memory, prometheus_metric
+from rcon import RconError, RconManager
+from probe import GameProber
+from logs import FollowersExhausted, LogFilter, LogHub, parse_timestamp, read_history
+from console import ConsoleHub, can_write
+from hibernation import HIBERNATE_LABEL, Hibernator
+from store import STATE_DB, StateStore
+from reconciler import DESIRED_STATUSES, RUNNING, STOPPED, Reconciler
+from backups import BACKUP_DIR, BackupRepository, BackupScheduler, SnapshotNotFound
+from pregen import CHUNKY_PROJECT, PREGEN_CPUS, PREGEN_TYPES, PregenUnavailable, Pregenerator
+from templates import INSTANCE_FIELDS, TEMPLATE_NAME, TemplateRepository
+from profiles import MODDED_TYPES, PROFILES, ZGC_HEAP, UnknownProfile, resolve_profile
 
-app = FastAPI()
-client = docker.from_env()
+logger = logging.getLogger(__name__)
 
 # Chemin du dossier ServerData
 SERVER_DATA_DIR = os.path.join(os.getcwd(), "ServerData")
+# Noms de conteneurs acceptés par Docker : un nom de serveur ne sort jamais de ServerData
+SERVER_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+# File des opérations longues (création, arrêt, redémarrage, suppression)
+jobs = JobManager()
+# Définitions des serveurs (configuration, ports, nœud) et historique, en SQLite
+store = StateStore()
+# Vue en mémoire des serveurs gérés, tenue à jour par le flux d'événements Docker de chaque nœud
+inventory = ServerInventory(on_transition=lambda server_name, status, at: store.record(server_name, "status", status, at))
+# Démons Docker gérés (MCDEPLOYER_NODES) et placement des serveurs selon leur mémoire libre
+nodes = NodeRegistry.from_env(inventory)
+client = nodes.default.client
+# Les appels docker-py sont bloquants : ils passent par un pool de threads borné (un par nœud)
+docker_exec = nodes.default.docker_exec
+# Cache des images itzg/minecraft-server (pré-téléchargement, pulls dédupliqués, éviction LRU)
+images = nodes.default.images
+# Pool optionnel de dossiers de serveurs préchauffés (jar téléchargé, monde généré)
+warm_pool = WarmPool(client, docker_exec, images, SERVER_DATA_DIR)
+# Jars, mods et plugins partagés entre serveurs par liens physiques
+artifacts = ArtifactStore(SERVER_DATA_DIR)
+# Corbeille des dossiers supprimés, vidée en arrière-plan à débit limité
+trash = Trash(SERVER_DATA_DIR, on_removed=partial(docker_exec.run, "io", artifacts.collect))
+# Sauvegardes incrémentales et dédupliquées des mondes
+backups = BackupRepository(BACKUP_DIR or os.path.join(SERVER_DATA_DIR, ".backups"))
+# Données de référence des modèles de serveurs, copiées en copy-on-write dans les nouveaux serveurs
+templates = TemplateRepository(SERVER_DATA_DIR)
+# Index des ports libres de la plage attribuée aux serveurs
+ports = PortAllocator()
+# Relevés CPU, mémoire, réseau et disque de tous les serveurs, servis depuis la mémoire
+stats_collector = StatsCollector(client, docker_exec, inventory, nodes=nodes)
+
+
+async def _rcon_address(server_name: str):
+    """
+    Find the host, port and password of the RCON session of a server.
+
+    The port comes from the port index; the password is read from the container environment.
+
+    Args:
+        server_name (str): The name of the server.
+
+    Returns:
+        tuple: The host, the port and the password.
+
+    Raises:
+        RconError: If RCON is not enabled on the server.
+    """
+    container = await _get_container(server_name)
+    env = dict(entry.partition("=")[::2] for entry in container.attrs["Config"]["Env"] or [])
+    if env.get("ENABLE_RCON", "TRUE").upper() != "TRUE" or not env.get("RCON_PASSWORD"):
+        raise RconError(f"RCON is not enabled on server {server_name}")
+    server_ports = ports.get(server_name)
+    if server_ports and "rcon_port" in server_ports:
+        port = server_ports["rcon_port"]
+    else:
+        # Serveur créé avant l'attribution automatique des ports
+        bindings = container.attrs["HostConfig"]["PortBindings"].get("25575/tcp")
+        if not bindings:
+            raise RconError(f"The RCON port of server {server_name} is not published")
+        port = int(bindings[0]["HostPort"])
+    node = nodes.node_of(server_name)
+    if node is not nodes.default:
+        host = node.host
+    else:
+        host = RCON_BIND if RCON_BIND not in ("", "0.0.0.0") else "127.0.0.1"
+    return host, port, env["RCON_PASSWORD"]
+
+# Sessions RCON persistantes, par serveur
+rcon = RconManager(_rcon_address)
+# Prégénération des mondes par Chunky, piloté en RCON
+pregenerator = Pregenerator(rcon.command)
+# Sondage Server List Ping : le serveur accepte-t-il des joueurs ? (jamais pendant sa prégénération)
+prober = GameProber(
+    inventory, lambda server_name: (ports.get(server_name) or {}).get("query_port"),
+    hosts={name: node.host for name, node in nodes.nodes.items() if node is not nodes.default},
+    is_held=lambda server_name: server_name in pregenerator.running,
+    on_ready=lambda server_name: _ingest_when_ready(server_name),
+)
+# Un seul suivi des logs par serveur, partagé par tous les clients
+log_hub = LogHub()
+# Un seul attachement à la console par serveur, partagé par tous les clients WebSocket
+consoles = ConsoleHub(client, docker_exec)
+# Mise en veille des serveurs sans joueur, réveillés à la première connexion
+hibernator = Hibernator(
+    inventory, docker_exec, SERVER_DATA_DIR,
+    on_sleep=lambda server_name: _run_and_wait("hibernate", server_name, _hibernate_server),
+    on_wake=lambda server_name: _run_and_wait("wake", server_name, _wake_server),
+    node=nodes.default.name,
+)
+# Ramène chaque serveur à son état voulu (démarré, arrêté, spec), par vagues
+reconciler = Reconciler(
+    store, inventory, nodes,
+    apply=lambda action, server_name: _run_and_wait(action, server_name, RECONCILE_OPERATIONS[action]),
+    is_hibernated=hibernator.is_hibernated,
+    is_busy=jobs.busy,
+)
+# Sauvegardes planifiées (intervalle et rétention enregistrés dans le store)
+backup_scheduler = BackupScheduler(
+    store, on_backup=lambda server_name: _run_and_wait("backup", server_name, _backup_server),
+)
+
+
+def _reconcile_store(node_name: str):
+    # Conteneurs disparus ou créés hors de l'API pendant son arrêt, ou pendant que le nœud était injoignable :
+    # seul un nœud dont tous les conteneurs viennent d'être listés est comparé au store
+    changes = store.reconcile(inventory.list(), nodes={node_name})
+    if any(changes.values()):
+        logger.info("State store reconciled with node %s: %s", node_name, {key: len(names) for key, names in changes.items()})
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.started_at = None
+    store.open(STATE_DB or os.path.join(SERVER_DATA_DIR, ".mcdeployer.db"))
+    for node in nodes.nodes.values():
+        node.events.on_sync = _reconcile_store
+    await nodes.start()
+    # Les ports enregistrés d'abord : un nœud injoignable ne fait pas perdre ceux de ses serveurs
+    records = store.list_servers()
+    ports.rebuild([], records)
+    try:
+        # Tous les conteneurs de tous les nœuds : leurs ports publiés ne sont jamais attribués
+        listings = await nodes.containers()
+        ports.rebuild([summary for summaries in listings.values() for summary in summaries], records)
+        for node_name, summaries in listings.items():
+            nodes.rebuild(node_name, summaries)
+        await hibernator.rebuild(listings[nodes.default.name])
+    except Exception as e:
+        logger.warning("Could not rebuild the port index from the Docker daemons: %s", e)
+    await warm_pool.start()
+    trash.start(docker_exec)
+    stats_collector.start()
+    rcon.start()
+    prober.start()
+    hibernator.start()
+    reconciler.start()
+    backup_scheduler.start()
+    app.state.started_at = time.time()
+    yield
+    await backup_scheduler.stop()
+    await pregenerator.stop()
+    await reconciler.stop()
+    await hibernator.stop()
+    consoles.stop()
+    log_hub.stop()
+    await prober.stop()
+    await rcon.stop()
+    await stats_collector.stop()
+    await trash.stop()
+    await warm_pool.stop()
+    await nodes.stop()
+    await jobs.stop()
+    nodes.shutdown()
+    store.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Modèle Pydantic pour les variables d'environnement
 class MinecraftServerConfig(BaseModel):
     server_name: str
+    labels: Optional[Dict[str, str]] = None
     version: Optional[str] = "latest"
-    port: Optional[int] = 25565
+    port: Optional[int] = None
+    node: Optional[str] = None
+    hibernate_after: Optional[int] = None
+    memory_limit: Optional[str] = None
+    cpus: Optional[float] = None
+    pids_limit: Optional[int] = None
+    performance_profile: Optional[str] = None
+    pregenerate_radius: Optional[int] = None
+    template: Optional[str] = None
     eula: str = "true"
     difficulty: Optional[str] = None
     type: Optional[str] = None
@@ -92,156 +290,2062 @@ class MinecraftServerConfig(BaseModel):
     op_permission_level: Optional[int] = None
     allow_nether: Optional[bool] = None
 
-@app.post("/create-server/", summary="Create a Minecraft Server", description="Create a new Minecraft server with specified configurations.")
-async def create_server(config: MinecraftServerConfig):
+# Modèles Pydantic pour les opérations groupées
+class BatchRequest(BaseModel):
+    names: Optional[List[str]] = None
+    selector: Optional[str] = None
+    parallelism: int = BATCH_PARALLELISM
+    max_unavailable: Optional[float] = None
+    ready_timeout: float = BATCH_READY_TIMEOUT
+
+class BatchCreateRequest(BaseModel):
+    servers: List[MinecraftServerConfig]
+    parallelism: int = BATCH_PARALLELISM
+    ready_timeout: float = BATCH_READY_TIMEOUT
+
+# Modèles Pydantic pour les commandes RCON
+class CommandRequest(BaseModel):
+    command: str
+
+class BatchCommandRequest(BaseModel):
+    command: str
+    names: Optional[List[str]] = None
+    selector: Optional[str] = None
+    parallelism: int = BATCH_PARALLELISM
+
+# Modèle Pydantic pour un profil du pool de serveurs préchauffés
+class WarmPoolProfile(BaseModel):
+    version: str = "latest"
+    type: Optional[str] = None
+    memory: Optional[str] = None
+    target: int
+    refill_delay: float = 0.0
+
+# Modèles Pydantic pour les modèles de serveurs et les clones
+class TemplateRequest(BaseModel):
+    name: str
+    server_name: Optional[str] = None
+    config: Optional[Dict[str, Any]] = None
+
+class CloneRequest(BaseModel):
+    count: int = 1
+    names: Optional[List[str]] = None
+    config: Optional[Dict[str, Any]] = None
+    parallelism: int = BATCH_PARALLELISM
+    ready_timeout: float = BATCH_READY_TIMEOUT
+
+# Modèle Pydantic pour la prégénération d'un monde
+class PregenerateRequest(BaseModel):
+    radius: Optional[int] = None
+
+# Modèle Pydantic pour la planification des sauvegardes
+class BackupSchedule(BaseModel):
+    interval: float
+    keep: Optional[int] = None
+
+# Modèle Pydantic pour le pré-téléchargement d'images
+class ImagePrefetchRequest(BaseModel):
+    tags: List[str]
+    refresh: bool = False
+    node: Optional[str] = None
+
+# Modèle Pydantic pour l'état voulu d'un serveur
+class DesiredState(BaseModel):
+    status: Optional[str] = None
+    config: Optional[MinecraftServerConfig] = None
+
+async def _create_server(config: MinecraftServerConfig, job: Job, seed_dir: Optional[str] = None):
     """
-    Create a new Minecraft server with specified configurations.
+    Create the data directory and the container of a Minecraft server.
+
+    With a template, its configuration is used for the fields the config does not set, and
+    a new data directory starts as a copy-on-write copy of the template data.
 
     Args:
         config (MinecraftServerConfig): The configuration for the Minecraft server.
+        job (Job): The job running this operation, used to report progress.
+        seed_dir (str): A staged snapshot to copy the new data directory from (clones).
 
     Returns:
         dict: A message indicating the server was created successfully and the container ID.
 
     Raises:
-        HTTPException: If the server image is not found or if there is an API error.
+        HTTPException: If the server name is invalid, the server image is not found or if
+            there is an API error.
     """
+    started_at = time.time()
+    data_dir = _data_dir(config.server_name)
+    # Un dossier existant (recréation, restauration) n'est jamais supprimé en cas d'échec
+    new_data_dir = not os.path.exists(data_dir)
+    if config.template:
+        template = store.get_template(config.template)
+        if template is not None:
+            config = MinecraftServerConfig(**dict(template["config"], **config.model_dump(exclude_unset=True)))
+            if seed_dir is None and templates.has_data(config.template):
+                seed_dir = templates.path(config.template)
+        elif new_data_dir:
+            # Une recréation se passe du modèle : sa configuration est déjà dans la spec
+            raise HTTPException(status_code=404, detail=f"Template {config.template} not found")
+    # La spec enregistrée est celle demandée : le profil est résolu à nouveau à chaque recréation
+    spec = config.model_dump(exclude_none=True)
+    tuning = None
+    if config.performance_profile:
+        try:
+            tuning = resolve_profile(spec)
+        except UnknownProfile as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        config = config.model_copy(update=tuning["values"])
+        await job.progress(f"Tuned with the {tuning['profile']} profile")
+    # Limite du conteneur : le tas de la JVM plus sa mémoire hors tas
+    heap = server_memory(config.memory, config.max_memory)
+    if config.memory_limit:
+        memory = parse_memory(config.memory_limit)
+    else:
+        memory = container_memory(heap) if heap else None
+    if not heap or memory is None or memory < heap:
+        raise HTTPException(status_code=400, detail="memory, max_memory and memory_limit must be sizes, memory_limit at least as large as the heap")
+    cpus = config.cpus if config.cpus is not None else DEFAULT_CPUS
+    seed_dir = seed_dir if new_data_dir else None
+    if config.pregenerate_radius is not None:
+        if config.pregenerate_radius <= 0:
+            raise HTTPException(status_code=400, detail="pregenerate_radius must be positive")
+        if (config.type or "").upper() not in PREGEN_TYPES or config.enable_rcon is False:
+            raise HTTPException(status_code=400, detail=f"Pre-generation needs RCON and a server type loading Chunky: {', '.join(PREGEN_TYPES)}")
     try:
-        os.makedirs(SERVER_DATA_DIR, exist_ok=True)
-        data_dir = os.path.join(SERVER_DATA_DIR, config.server_name)
-        os.makedirs(data_dir, exist_ok=True)
+        # Attribution synchrone sur la boucle : les trois ports sont pris d'un coup
+        server_ports = ports.allocate(
+            config.server_name,
+            {"port": config.port, "rcon_port": config.rcon_port, "query_port": config.query_port},
+        )
+    except PortConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except PortsExhausted as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    await job.progress(f"Allocated ports {server_ports}")
+    try:
+        node = await nodes.acquire(config.server_name, memory, config.version, config.node, cpus, on_wait=job.progress)
+    except UnknownNode as e:
+        ports.release(config.server_name)
+        raise HTTPException(status_code=404, detail=str(e))
+    except NoCapacity as e:
+        ports.release(config.server_name)
+        raise HTTPException(status_code=503, detail=str(e))
+    await job.progress(f"Placed on node {node.name}")
+    container = None
+    # Une recréation garde sa définition si elle échoue, une création n'en laisse aucune
+    recorded = store.get_server(config.server_name) is not None
+    try:
+        # Les dossiers préchauffés sont créés par le nœud par défaut
+        warm_dir = None if not new_data_dir or seed_dir or node is not nodes.default else warm_pool.claim(config)
+        if seed_dir:
+            copied = await docker_exec.run("io", templates.seed, seed_dir, data_dir)
+            await job.progress(
+                f"Seeded {data_dir}: {copied['reflinked']} files reflinked, {copied['linked']} hard-linked, "
+                f"{copied['copied']} copied ({copied['bytes_copied']} bytes)"
+            )
+        elif warm_dir:
+            await job.progress("Using a pre-warmed server from the pool")
+            await docker_exec.run("delete", warm_pool.adopt, warm_dir, data_dir)
+        else:
+            os.makedirs(data_dir, exist_ok=True)
+        key = artifact_key(config)
+        linked = await docker_exec.run("io", artifacts.seed, data_dir, key)
+        if linked:
+            await job.progress(f"Linked {linked} shared artifacts into {data_dir}")
         mods_str = "\n".join(config.mods) if config.mods else None
         environment = {
             key.upper(): str(value)
-            for key, value in config.model_dump(exclude={"server_name", "port"}).items()
+            for key, value in config.model_dump(exclude={"server_name", "port", "rcon_port", "query_port", "labels", "hibernate_after", "node", "memory_limit", "cpus", "pids_limit", "performance_profile", "pregenerate_radius", "template"}).items()
             if value is not None
         }
         if mods_str:
             environment['MODS'] = mods_str
-        container = client.containers.run(
-            image=f"itzg/minecraft-server:{config.version}",
+        if config.pregenerate_radius:
+            environment['MODRINTH_PROJECTS'] = CHUNKY_PROJECT
+        if config.enable_rcon is not False:
+            # Mot de passe généré pour que l'API puisse ouvrir ses propres sessions RCON
+            environment['ENABLE_RCON'] = "TRUE"
+            environment.setdefault('RCON_PASSWORD', secrets.token_urlsafe(24))
+        labels = dict(server_labels(config.server_name, server_ports["port"], config.labels), **port_labels(server_ports))
+        labels.update({NODE_LABEL: node.name, MEMORY_LABEL: str(memory)})
+        if cpus:
+            labels[CPUS_LABEL] = str(cpus)
+        if config.hibernate_after is not None:
+            labels[HIBERNATE_LABEL] = str(config.hibernate_after)
+        image = await node.images.ensure(config.version, on_progress=job.progress)
+        await job.progress(f"Starting container from {image}")
+        # Création puis démarrage séparés : un conteneur créé mais qui ne démarre pas (port pris, ...) est connu
+        container = await node.docker_exec.run(
+            "create",
+            lambda **kwargs: node.client.containers.create(**kwargs),
+            image=image,
             name=config.server_name,
-            ports={'25565/tcp': config.port},
+            # Sur un autre hôte, RCON doit être joignable depuis l'API
+            ports=port_bindings(server_ports, RCON_BIND if node is nodes.default else ""),
             environment=environment,
             volumes={data_dir: {'bind': '/data', 'mode': 'rw'}},
-            detach=True,
+            labels=labels,
             stdin_open=True,
             tty=True,
-            restart_policy={"Name": "always"}
+            # Avec le réconciliateur, c'est lui qui redémarre les serveurs, par vagues
+            restart_policy={"Name": "no" if reconciler.enabled else "always"},
+            **resource_limits(memory, cpus, config.pids_limit or PIDS_LIMIT),
+        )
+        await node.docker_exec.run("create", container.start)
+        inventory.upsert(
+            config.server_name, id=container.id, node=node.name, status="running", port=server_ports["port"],
+            labels=config.labels or {},
         )
-        return {"message": f"Server {config.server_name} created successfully", "container_id": container.id}
+        hibernator.configure(config.server_name, config.hibernate_after)
+        store.put_server(
+            config.server_name, spec=spec, ports=server_ports,
+            node=node.name, container_id=container.id, desired_status=RUNNING,
+        )
+        store.record(config.server_name, "created", container.id)
+        # Un monde existant (recréation, restauration) n'est pas prégénéré à nouveau
+        pregenerate = bool(config.pregenerate_radius and new_data_dir)
+        if pregenerate:
+            pregenerator.submit(
+                config.server_name, config.pregenerate_radius,
+                partial(_pregenerate_server, config.server_name, config.pregenerate_radius),
+            )
+        warm_pool.measure(container, started_at, warm=bool(warm_dir), docker_exec=node.docker_exec)
+        return {
+            "message": f"Server {config.server_name} created successfully",
+            "container_id": container.id,
+            "warm": bool(warm_dir),
+            "ports": server_ports,
+            "node": node.name,
+            "tuning": tuning,
+            "pregenerating": pregenerate,
+        }
     except docker.errors.ImageNotFound:
+        await _abort_create(config.server_name, node, container, recorded, data_dir, new_data_dir)
         raise HTTPException(status_code=404, detail=f"Minecraft server image for version {config.version} not found")
     except docker.errors.APIError as e:
+        await _abort_create(config.server_name, node, container, recorded, data_dir, new_data_dir)
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
+        await _abort_create(config.server_name, node, container, recorded, data_dir, new_data_dir)
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _abort_create(server_name: str, node, container, recorded: bool, data_dir: str, new_data_dir: bool):
+    # Rien ne doit rester d'une création échouée, sauf un dossier ou une définition qui existaient déjà
+    if container is not None:
+        # Sinon le conteneur orphelin garde le nom : chaque nouvel essai échouerait en 409
+        await pregenerator.cancel(server_name)
+        try:
+            await node.docker_exec.run("delete", container.remove, force=True, v=True)
+        except docker.errors.APIError as e:
+            logger.warning("Could not remove the container of failed create %s: %s", server_name, e)
+        inventory.remove(server_name)
+        hibernator.forget(server_name)
+        if not recorded:
+            store.delete_server(server_name)
+        elif (store.get_server(server_name) or {}).get("container_id") == container.id:
+            store.update_server(server_name, container_id=None)
+    ports.release(server_name)
+    nodes.release(server_name)
+    if new_data_dir and os.path.exists(data_dir):
+        await docker_exec.run("delete", shutil.rmtree, data_dir)
+
+async def _get_container(server_name: str):
+    """
+    Fetch the container of a server from its node.
+
+    Args:
+        server_name (str): The name of the server.
+
+    Returns:
+        Container: The docker-py container.
+
+    Raises:
+        HTTPException: If the server is not found or if there is an API error.
+    """
+    try:
+        node = nodes.node_of(server_name)
+        return await node.docker_exec.run("read", lambda: node.client.containers.get(server_name))
+    except docker.errors.NotFound:
+        raise HTTPException(status_code=404, detail=f"Server {server_name} not found")
+    except docker.errors.APIError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _stop_server(server_name: str, job: Job):
+    container = await _get_container(server_name)
+    await _cancel_pregeneration(server_name, job)
+    node_exec = nodes.node_of(server_name).docker_exec
+    await job.progress(f"Stopping container {container.short_id}")
+    rcon.close(server_name)
+    # Un arrêt explicite n'est pas une mise en veille : plus de réveil à la connexion
+    await hibernator.release(server_name)
+    try:
+        await node_exec.run("stop", container.stop)
+    except docker.errors.APIError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    inventory.upsert(server_name, status="exited")
+    store.update_server(server_name, desired_status=STOPPED)
+    return {"message": f"Server {server_name} stopped successfully"}
+
+async def _restart_server(server_name: str, job: Job):
+    container = await _get_container(server_name)
+    await _cancel_pregeneration(server_name, job)
+    node_exec = nodes.node_of(server_name).docker_exec
+    await job.progress(f"Restarting container {container.short_id}")
+    # Le port de jeu doit être libéré avant que Docker le publie de nouveau
+    await hibernator.release(server_name)
+    try:
+        await node_exec.run("restart", container.restart)
+    except docker.errors.APIError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    inventory.upsert(server_name, status="running")
+    store.update_server(server_name, desired_status=RUNNING)
+    return {"message": f"Server {server_name} restarted successfully"}
+
+async def _delete_server(server_name: str, job: Job):
+    container = await _get_container(server_name)
+    await _cancel_pregeneration(server_name, job)
+    node_exec = nodes.node_of(server_name).docker_exec
+    rcon.close(server_name)
+    log_hub.close(server_name)
+    warm_pool.cancel_measure(server_name)
+    await hibernator.release(server_name)
+    try:
+        await job.progress(f"Stopping container {container.short_id}")
+        await node_exec.run("stop", container.stop)
+        await job.progress(f"Removing container {container.short_id}")
+        await node_exec.run("delete", container.remove, v=True)
+        inventory.remove(server_name)
+        ports.release(server_name)
+        nodes.release(server_name)
+        hibernator.forget(server_name)
+        pregenerator.forget(server_name)
+        store.delete_server(server_name)
+        store.delete_backup_schedule(server_name)
+        store.record(server_name, "deleted", container.id)
+        data_dir = os.path.join(SERVER_DATA_DIR, server_name)
         if os.path.exists(data_dir):
-            shutil.rmtree(data_dir)
+            # Simple renommage : le contenu est supprimé (ou archivé) en arrière-plan
+            entry_id = await docker_exec.run("delete", trash.put, data_dir, server_name)
+            trash.wake()
+            await job.progress(f"Moved data directory to trash entry {entry_id}")
+    except docker.errors.NotFound:
+        raise HTTPException(status_code=404, detail=f"Server {server_name} not found")
+    except docker.errors.APIError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"message": f"Server {server_name} deleted successfully"}
+
+async def _hibernate_server(server_name: str, job: Job):
+    if nodes.node_of(server_name) is not nodes.default:
+        # L'écoute pendant la veille se fait dans le processus de l'API, sur son propre hôte
+        raise HTTPException(status_code=409, detail=f"Only servers of node {nodes.default.name} can hibernate")
+    container = await _get_container(server_name)
+    await _cancel_pregeneration(server_name, job)
+    node_exec = nodes.node_of(server_name).docker_exec
+    if container.status != "running":
+        raise HTTPException(status_code=409, detail=f"Server {server_name} is not running")
+    port = (ports.get(server_name) or {}).get("port") or inventory.get(server_name)["port"]
+    await job.progress(f"Stopping idle container {container.short_id}")
+    rcon.close(server_name)
+    consoles.close(server_name)
+    try:
+        await node_exec.run("stop", container.stop)
+    except docker.errors.APIError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    inventory.upsert(server_name, status="exited")
+    try:
+        await hibernator.sleep(server_name, port)
+    except OSError as e:
+        # Sans écoute sur son port, le serveur serait injoignable : il est redémarré
+        await node_exec.run("restart", container.start)
+        inventory.upsert(server_name, status="running")
+        raise HTTPException(status_code=500, detail=f"Could not listen on port {port}: {e}")
+    store.record(server_name, "hibernated", str(port))
+    await job.progress(f"Listening on port {port} until a player connects")
+    return {"message": f"Server {server_name} hibernated successfully", "port": port}
+
+async def _wake_server(server_name: str, job: Job):
+    container = await _get_container(server_name)
+    node_exec = nodes.node_of(server_name).docker_exec
+    port = hibernator.port(server_name)
+    await hibernator.release(server_name)
+    await job.progress(f"Starting container {container.short_id}")
+    try:
+        await node_exec.run("restart", container.start)
+    except docker.errors.APIError as e:
+        if port is not None:
+            # Le serveur reste en veille plutôt que de laisser son port sans écoute
+            await hibernator.sleep(server_name, port)
+        raise HTTPException(status_code=500, detail=str(e))
+    inventory.upsert(server_name, status="running")
+    store.record(server_name, "woken")
+    return {"message": f"Server {server_name} woken up successfully"}
+
+async def _start_server(server_name: str, job: Job):
+    container = await _get_container(server_name)
+    node_exec = nodes.node_of(server_name).docker_exec
+    await hibernator.release(server_name)
+    await job.progress(f"Starting container {container.short_id}")
+    try:
+        await node_exec.run("restart", container.start)
+    except docker.errors.APIError as e:
         raise HTTPException(status_code=500, detail=str(e))
+    inventory.upsert(server_name, status="running")
+    store.update_server(server_name, desired_status=RUNNING)
+    return {"message": f"Server {server_name} started successfully"}
+
+async def _recreate_server(server_name: str, job: Job):
+    """
+    Create the container of a server again from its recorded spec, keeping its data directory.
+
+    Args:
+        server_name (str): The name of the server.
+        job (Job): The job running this operation, used to report progress.
+
+    Returns:
+        dict: The result of the creation.
+
+    Raises:
+        HTTPException: If the server has no recorded spec or if there is an API error.
+    """
+    server = store.get_server(server_name)
+    if server is None or server["spec"] is None:
+        raise HTTPException(status_code=404, detail=f"No spec recorded for server {server_name}")
+    spec = dict(server["spec"])
+    # Les ports attribués automatiquement sont conservés
+    for kind, port in (server["ports"] or {}).items():
+        if spec.get(kind) is None:
+            spec[kind] = port
+    config = MinecraftServerConfig(**spec)
+    if inventory.get(server_name) is not None:
+        container = await _get_container(server_name)
+        node_exec = nodes.node_of(server_name).docker_exec
+        rcon.close(server_name)
+        log_hub.close(server_name)
+        consoles.close(server_name)
+        await hibernator.release(server_name)
+        await job.progress(f"Removing container {container.short_id}")
+        try:
+            await node_exec.run("stop", container.stop)
+            await node_exec.run("delete", container.remove, v=True)
+        except docker.errors.APIError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        inventory.remove(server_name)
+    ports.release(server_name)
+    nodes.release(server_name)
+    store.record(server_name, "recreating", server["container_id"])
+    return await _create_server(config, job)
+
+# Opérations appliquées par le réconciliateur
+RECONCILE_OPERATIONS = {
+    "start": _start_server,
+    "stop": _stop_server,
+    "create": _recreate_server,
+    "recreate": _recreate_server,
+}
+
+async def _run_and_wait(kind: str, server_name: str, operation):
+    job = jobs.submit(kind, server_name, partial(operation, server_name))
+    await job.wait()
+    if job.error:
+        raise RuntimeError(job.error["detail"])
+
+def _require_server(server_name: str):
+    """
+    Check from the inventory that a server exists, without calling the daemon.
+
+    Args:
+        server_name (str): The name of the server.
+
+    Raises:
+        HTTPException: If the server is not found.
+    """
+    if inventory.get(server_name) is None:
+        raise HTTPException(status_code=404, detail=f"Server {server_name} not found")
+
+def _data_dir(server_name: str):
+    """
+    Get the data directory of a server, rejecting names that would point outside ServerData.
+
+    Args:
+        server_name (str): The name of the server.
+
+    Returns:
+        str: The path of its data directory, ServerData/<server_name>.
+
+    Raises:
+        HTTPException: If the name is not a valid container name.
+    """
+    if not SERVER_NAME.match(server_name):
+        raise HTTPException(status_code=422, detail="Server names start with a letter or a digit, followed by letters, digits, '_', '.' and '-'")
+    data_dir = os.path.join(SERVER_DATA_DIR, server_name)
+    root = os.path.realpath(SERVER_DATA_DIR)
+    if os.path.dirname(os.path.realpath(data_dir)) != root:
+        raise HTTPException(status_code=422, detail=f"The data directory of server {server_name} is outside {SERVER_DATA_DIR}")
+    return data_dir
+
+def _node(node_name: str):
+    try:
+        return nodes.get(node_name)
+    except UnknownNode as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+def _accepted(job: Job):
+    return {"job_id": job.id, "status": job.status, "message": f"Server {job.server_name} {job.kind} queued"}
+
+@app.post("/create-server/", status_code=202, summary="Create a Minecraft Server", description="Queue the creation of a new Minecraft server with specified configurations.")
+async def create_server(config: MinecraftServerConfig):
+    """
+    Queue the creation of a new Minecraft server with specified configurations.
+
+    Args:
+        config (MinecraftServerConfig): The configuration for the Minecraft server.
+
+    Returns:
+        dict: The id of the job creating the server. Its result holds the container ID.
+
+    Raises:
+        HTTPException: If the server name is invalid.
+    """
+    _data_dir(config.server_name)
+    job = jobs.submit("create", config.server_name, partial(_create_server, config))
+    return _accepted(job)
 
 @app.get("/list-servers/", summary="List All Servers", description="List all Minecraft servers, including their status and port.")
 async def list_servers():
     """
     List all Minecraft servers, including their status and port.
 
+    Each entry also carries the health, last exit code, restart count and time of the last
+    status change maintained by the events watcher. The list is served from the in-memory inventory of the containers labelled by MCDeployer;
+    it never calls the Docker daemon.
+
     Returns:
         dict: A list of servers with their names, IDs, status, and ports.
+    """
+    return {"servers": [dict(server, hibernated=hibernator.is_hibernated(server["name"])) for server in inventory.list()]}
+
+@app.get("/servers/{server_name}", summary="Get a Server", description="Get the current state of a Minecraft server.")
+async def get_server(server_name: str):
+    """
+    Get the current state of a Minecraft server.
+
+    The state is maintained from the Docker events stream and never calls the daemon.
+
+    Args:
+        server_name (str): The name of the server.
+
+    Returns:
+        dict: The server name, ID, port, status, health, last exit code, restart count,
+            time of the last status change, game-level readiness (ready, players_online,
+            max_players, latency_ms), the game, RCON and query host ports, whether the
+            server is hibernated and the progress of its world pre-generation.
+
+    Raises:
+        HTTPException: If the server is not found.
+    """
+    server = inventory.get(server_name)
+    if server is None:
+        raise HTTPException(status_code=404, detail=f"Server {server_name} not found")
+    return dict(
+        server, ports=ports.get(server_name), hibernated=hibernator.is_hibernated(server_name),
+        pregeneration=pregenerator.running.get(server_name),
+    )
+
+@app.get("/servers/{server_name}/spec", summary="Get a Server Spec", description="Get the configuration a Minecraft server was created with, its ports and its node.")
+async def get_server_spec(server_name: str):
+    """
+    Get the configuration a Minecraft server was created with, its ports and its node.
+
+    The definition is read from the local state store, without calling the daemon.
+    Servers adopted from existing containers have no spec.
+
+    Args:
+        server_name (str): The name of the server.
+
+    Returns:
+        dict: The server name, its spec, ports, node, container ID, desired status and timestamps.
+
+    Raises:
+        HTTPException: If the server is not recorded.
+    """
+    server = store.get_server(server_name)
+    if server is None:
+        raise HTTPException(status_code=404, detail=f"Server {server_name} not found")
+    return server
+
+@app.get("/servers/{server_name}/history", summary="Get Server History", description="Get the recent lifecycle events of a Minecraft server.")
+async def get_server_history(server_name: str, limit: int = 100):
+    """
+    Get the recent lifecycle events of a Minecraft server.
+
+    The history outlives the server: it can still be read after a deletion.
+
+    Args:
+        server_name (str): The name of the server.
+        limit (int): How many events to return.
+
+    Returns:
+        dict: The events (creation, status changes, hibernation, deletion), oldest first.
+
+    Raises:
+        HTTPException: If the server has no history.
+    """
+    events = store.history(server_name, limit)
+    if not events:
+        raise HTTPException(status_code=404, detail=f"Server {server_name} not found")
+    return {"server_name": server_name, "events": events}
+
+@app.get("/servers/{server_name}/metrics", summary="Get Server Metrics", description="Get the recent CPU, memory, network and block I/O samples of a Minecraft server.")
+async def get_server_metrics(server_name: str):
+    """
+    Get the recent CPU, memory, network and block I/O samples of a Minecraft server.
+
+    The samples are taken in the background by the stats collector and served from memory.
+
+    Args:
+        server_name (str): The name of the server.
+
+    Returns:
+        dict: The sampling interval, the latest sample and the samples kept, oldest first.
+
+    Raises:
+        HTTPException: If the server is not found.
+    """
+    _require_server(server_name)
+    samples = stats_collector.series(server_name)
+    return {
+        "server_name": server_name,
+        "interval_seconds": stats_collector.interval,
+        "latest": samples[-1] if samples else None,
+        "samples": samples,
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse, summary="Prometheus Metrics", description="Expose the server metrics in the Prometheus text format.")
+async def prometheus_metrics():
+    """
+    Expose the server metrics in the Prometheus text format.
+
+    Returns:
+        PlainTextResponse: The latest sample of every server and the collector metrics.
+    """
+    servers = inventory.list()
+    lines = prometheus_metric(
+        "mcdeployer_server_up", "Whether the server container is running.", "gauge",
+        [({"server": server["name"]}, int(server["status"] == "running")) for server in servers],
+    )
+    lines += prometheus_metric(
+        "mcdeployer_server_ready", "Whether the server answers the Server List Ping.", "gauge",
+        [({"server": server["name"]}, int(bool(server["ready"]))) for server in servers],
+    )
+    for key, help in (
+        ("players_online", "Players connected to the server."),
+        ("max_players", "Player slots of the server."),
+        ("latency_ms", "Round-trip time of the last Server List Ping, in milliseconds."),
+    ):
+        lines += prometheus_metric(
+            f"mcdeployer_server_{key}", help, "gauge",
+            [({"server": server["name"]}, server[key]) for server in servers],
+        )
+    lines += stats_collector.prometheus()
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+async def _run_command(server_name: str, command: str):
+    """
+    Run a console command on a running server through its pooled RCON sessions.
+
+    Args:
+        server_name (str): The name of the server.
+        command (str): The command, without leading slash.
+
+    Returns:
+        dict: The server name, the command and the response of the server.
 
     Raises:
-        HTTPException: If there is an API error.
+        HTTPException: If the server is not found or not running, if the command is too long,
+            or if the RCON session fails.
     """
+    server = inventory.get(server_name)
+    if server is None:
+        raise HTTPException(status_code=404, detail=f"Server {server_name} not found")
+    if server["status"] != "running":
+        raise HTTPException(status_code=409, detail=f"Server {server_name} is not running")
     try:
-        containers = client.containers.list(all=True)
-        servers = []
-        for c in containers:
-            ports = c.attrs["HostConfig"]["PortBindings"]
-            server_port = None
-            if ports and "25565/tcp" in ports:
-                server_port = int(ports["25565/tcp"][0]["HostPort"])
-            servers.append({
-                "name": c.name,
-                "id": c.id,
-                "status": c.status,
-                "port": server_port
-            })
-        return {"servers": servers}
+        response = await rcon.command(server_name, command.lstrip("/"))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except RconError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    return {"server_name": server_name, "command": command, "response": response}
+
+@app.post("/servers/{server_name}/command", summary="Run a Server Command", description="Run a console command on a running Minecraft server through RCON and return its output.")
+async def run_command(server_name: str, request: CommandRequest):
+    """
+    Run a console command on a running Minecraft server through RCON and return its output.
+
+    The command goes through a pool of persistent, authenticated RCON sessions, so no
+    process is spawned and no handshake is paid per command.
+
+    Args:
+        server_name (str): The name of the server.
+        request (CommandRequest): The command, e.g. "say hello" or "whitelist add Steve".
+
+    Returns:
+        dict: The server name, the command and the response of the server.
+
+    Raises:
+        HTTPException: If the server is not found or not running, or if RCON fails.
+    """
+    return await _run_command(server_name, request.command)
+
+def _log_event(timestamp: str, line: str):
+    return f"event: log\ndata: {json.dumps({'timestamp': timestamp, 'line': line})}\n\n"
+
+@app.get("/servers/{server_name}/logs", summary="Stream Server Logs", description="Stream the logs of a Minecraft server as Server-Sent Events, with server-side filtering.")
+async def stream_logs(server_name: str, follow: bool = True, tail: Optional[int] = 100, since: Optional[float] = None,
+                      grep: Optional[str] = None, level: Optional[str] = None):
+    """
+    Stream the logs of a Minecraft server as Server-Sent Events, with server-side filtering.
+
+    Past lines are sent first, then, with `follow`, new lines as the server writes them.
+    All the viewers of a server share one follow of the container log stream; each viewer
+    has a bounded buffer, and when it reads too slowly the oldest lines are dropped and a
+    `dropped` event tells how many.
+
+    Args:
+        server_name (str): The name of the server.
+        follow (bool): Keep the stream open and send new lines.
+        tail (int): How many past lines to send; all of them if not set.
+        since (float): Only send lines written after this POSIX time.
+        grep (str): Only send lines matching this regular expression.
+        level (str): Only send lines of this level or above (DEBUG, INFO, WARN, ERROR).
+
+    Returns:
+        StreamingResponse: A text/event-stream of `log` events, then an `end` event.
+
+    Raises:
+        HTTPException: If the server is not found, if a filter is invalid, or if too many
+            servers already have their logs followed.
+    """
+    _require_server(server_name)
+    try:
+        log_filter = LogFilter(grep, level)
+    except (re.error, ValueError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid filter: {e}")
+    container = await _get_container(server_name)
+    subscription = None
+    if follow:
+        try:
+            # Abonnement avant la lecture de l'historique : aucune ligne n'est perdue entre les deux
+            subscription = log_hub.subscribe(server_name, container)
+        except FollowersExhausted as e:
+            raise HTTPException(status_code=503, detail=str(e))
+    try:
+        history = await docker_exec.run("logs", read_history, container, tail, since)
     except docker.errors.APIError as e:
+        if subscription is not None:
+            log_hub.unsubscribe(server_name, subscription)
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/stop-server/{server_name}", summary="Stop a Minecraft Server", description="Stop a specified Minecraft server.")
+    async def stream():
+        try:
+            for timestamp, line in history:
+                if log_filter(line):
+                    yield _log_event(timestamp, line)
+            if subscription is None:
+                yield "event: end\ndata: {}\n\n"
+                return
+            # Lignes déjà envoyées avec l'historique
+            seen_until = parse_timestamp(history[-1][0]) if history else None
+            dropped = 0
+            while True:
+                item = await subscription.queue.get()
+                if subscription.dropped != dropped:
+                    yield f"event: dropped\ndata: {json.dumps({'dropped': subscription.dropped - dropped})}\n\n"
+                    dropped = subscription.dropped
+                if item is None:
+                    yield "event: end\ndata: {}\n\n"
+                    return
+                timestamp, line = item
+                if seen_until is not None:
+                    if parse_timestamp(timestamp) <= seen_until:
+                        continue
+                    seen_until = None
+                if log_filter(line):
+                    yield _log_event(timestamp, line)
+        finally:
+            if subscription is not None:
+                log_hub.unsubscribe(server_name, subscription)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+@app.websocket("/servers/{server_name}/console")
+async def attach_console(websocket: WebSocket, server_name: str, token: Optional[str] = None):
+    """
+    Attach to the console of a running Minecraft server over a WebSocket.
+
+    The recent console output is replayed, then new output is sent as text messages. All
+    the viewers of a server share one attachment to the container. Clients presenting the
+    console token (MCDEPLOYER_CONSOLE_TOKEN) may send input as text messages, e.g.
+    "say hello\n"; input from read-only clients closes the connection with code 4403.
+
+    Args:
+        websocket (WebSocket): The client connection.
+        server_name (str): The name of the server.
+        token (str): The console token, required to send input.
+    """
+    # Acceptée avant les vérifications pour que le client reçoive le code de fermeture
+    await websocket.accept()
+    server = inventory.get(server_name)
+    if server is None:
+        await websocket.close(code=4404, reason=f"Server {server_name} not found")
+        return
+    if server["status"] != "running":
+        await websocket.close(code=4409, reason=f"Server {server_name} is not running")
+        return
+    writer = can_write(token)
+    try:
+        subscription = await consoles.attach(server_name, server["id"], nodes.node_of(server_name))
+    except (docker.errors.DockerException, requests.exceptions.RequestException, OSError) as e:
+        # Démon injoignable ou socket refusé : le client reçoit la raison plutôt qu'une coupure
+        await websocket.close(code=1011, reason=f"Could not attach to the console: {e}"[:120])
+        return
+
+    async def send_output():
+        while True:
+            text = await subscription.queue.get()
+            if text is None:
+                return
+            await websocket.send_text(text)
+
+    async def receive_input():
+        while True:
+            data = await websocket.receive_text()
+            if not writer:
+                return 4403
+            await consoles.write(server_name, data)
+
+    tasks = [asyncio.create_task(send_output()), asyncio.create_task(receive_input())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        task = done.pop()
+        if task.exception() is None:
+            if task.result() == 4403:
+                await websocket.close(code=4403, reason="Read-only console")
+            else:
+                await websocket.close(code=1000, reason="Console detached")
+        elif not isinstance(task.exception(), (WebSocketDisconnect, ConnectionError)):
+            raise task.exception()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        consoles.detach(server_name, subscription)
+
+@app.post("/stop-server/{server_name}", status_code=202, summary="Stop a Minecraft Server", description="Queue the stop of a specified Minecraft server.")
 async def stop_server(server_name: str):
     """
-    Stop a specified Minecraft server.
+    Queue the stop of a specified Minecraft server.
 
     Args:
         server_name (str): The name of the server to stop.
 
     Returns:
-        dict: A message indicating the server was stopped successfully.
+        dict: The id of the job stopping the server.
 
     Raises:
         HTTPException: If the server is not found or if there is an API error.
     """
-    try:
-        container = client.containers.get(server_name)
-        container.stop()
-        return {"message": f"Server {server_name} stopped successfully"}
-    except docker.errors.NotFound:
-        raise HTTPException(status_code=404, detail=f"Server {server_name} not found")
-    except docker.errors.APIError as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    _require_server(server_name)
+    job = jobs.submit("stop", server_name, partial(_stop_server, server_name))
+    return _accepted(job)
 
-@app.post("/restart-server/{server_name}", summary="Restart a Minecraft Server", description="Restart a specified Minecraft server.")
+@app.post("/restart-server/{server_name}", status_code=202, summary="Restart a Minecraft Server", description="Queue the restart of a specified Minecraft server.")
 async def restart_server(server_name: str):
     """
-    Restart a specified Minecraft server.
+    Queue the restart of a specified Minecraft server.
 
     Args:
         server_name (str): The name of the server to restart.
 
     Returns:
-        dict: A message indicating the server was restarted successfully.
+        dict: The id of the job restarting the server.
 
     Raises:
         HTTPException: If the server is not found or if there is an API error.
     """
-    try:
-        container = client.containers.get(server_name)
-        container.restart()
-        return {"message": f"Server {server_name} restarted successfully"}
-    except docker.errors.NotFound:
-        raise HTTPException(status_code=404, detail=f"Server {server_name} not found")
-    except docker.errors.APIError as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    _require_server(server_name)
+    job = jobs.submit("restart", server_name, partial(_restart_server, server_name))
+    return _accepted(job)
 
-@app.post("/delete-server/{server_name}", summary="Delete a Minecraft Server", description="Delete a specified Minecraft server and its associated data.")
+@app.post("/delete-server/{server_name}", status_code=202, summary="Delete a Minecraft Server", description="Queue the deletion of a specified Minecraft server and its associated data.")
 async def delete_server(server_name: str):
     """
-    Delete a specified Minecraft server and its associated data.
+    Queue the deletion of a specified Minecraft server and its associated data.
 
     Args:
         server_name (str): The name of the server to delete.
 
     Returns:
-        dict: A message indicating the server was deleted successfully.
+        dict: The id of the job deleting the server.
 
     Raises:
         HTTPException: If the server is not found or if there is an API error.
     """
-    try:
-        container = client.containers.get(server_name)
-        container.stop()
-        container.remove(v=True)
-        data_dir = os.path.join(SERVER_DATA_DIR, server_name)
-        if os.path.exists(data_dir):
-            shutil.rmtree(data_dir)
-        return {"message": f"Server {server_name} deleted successfully"}
-    except docker.errors.NotFound:
-        raise HTTPException(status_code=404, detail=f"Server {server_name} not found")
-    except docker.errors.APIError as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    _require_server(server_name)
+    job = jobs.submit("delete", server_name, partial(_delete_server, server_name))
+    return _accepted(job)
+
+@app.post("/servers/{server_name}/hibernate", status_code=202, summary="Hibernate a Minecraft Server", description="Queue the hibernation of a running server: it is stopped and woken up by the next player login.")
+async def hibernate_server(server_name: str):
+    """
+    Queue the hibernation of a running server: it is stopped and woken up by the next player login.
+
+    While the server sleeps, a lightweight listener on its game port answers server list
+    pings with a "sleeping" MOTD and starts the container when a player tries to join.
+
+    Args:
+        server_name (str): The name of the server to hibernate.
+
+    Returns:
+        dict: The id of the job hibernating the server.
+
+    Raises:
+        HTTPException: If the server is not found or already hibernated.
+    """
+    _require_server(server_name)
+    if hibernator.is_hibernated(server_name):
+        raise HTTPException(status_code=409, detail=f"Server {server_name} is already hibernated")
+    job = jobs.submit("hibernate", server_name, partial(_hibernate_server, server_name))
+    return _accepted(job)
+
+@app.post("/servers/{server_name}/wake", status_code=202, summary="Wake a Minecraft Server", description="Queue the start of a hibernated server without waiting for a player.")
+async def wake_server(server_name: str):
+    """
+    Queue the start of a hibernated server without waiting for a player.
+
+    Args:
+        server_name (str): The name of the server to wake up.
+
+    Returns:
+        dict: The id of the job starting the server.
+
+    Raises:
+        HTTPException: If the server is not found or not hibernated.
+    """
+    _require_server(server_name)
+    if not hibernator.is_hibernated(server_name):
+        raise HTTPException(status_code=409, detail=f"Server {server_name} is not hibernated")
+    job = jobs.submit("wake", server_name, partial(_wake_server, server_name))
+    return _accepted(job)
+
+@app.get("/hibernation/", summary="Get Hibernation State", description="Get the hibernated servers, the idle ones and the hibernation counters.")
+async def get_hibernation():
+    """
+    Get the hibernated servers, the idle ones and the hibernation counters.
+
+    Returns:
+        dict: The default idle time, the hibernated servers with their port and since when,
+            the seconds each running server has been without players, and the counters.
+    """
+    return hibernator.status()
+
+@app.put("/servers/{server_name}/desired", summary="Set the Desired State", description="Declare whether a server should run and the spec of its container; the reconciler converges to it in the background.")
+async def set_desired_state(server_name: str, desired: DesiredState):
+    """
+    Declare whether a server should run and the spec of its container.
+
+    Nothing is done synchronously: the reconciler starts, stops or recreates the container
+    (keeping its data directory) on its next pass, which this call triggers.
+
+    Args:
+        server_name (str): The name of the server.
+        desired (DesiredState): "running" or "stopped", and/or the new configuration.
+
+    Returns:
+        dict: The recorded desired status and spec, and whether the reconciler is enabled.
+
+    Raises:
+        HTTPException: If the server is not recorded or the request is invalid.
+    """
+    server = store.get_server(server_name)
+    if server is None:
+        raise HTTPException(status_code=404, detail=f"Server {server_name} not found")
+    if desired.status is not None and desired.status not in DESIRED_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Invalid status {desired.status}, expected one of {', '.join(DESIRED_STATUSES)}")
+    fields = {}
+    if desired.status is not None:
+        fields["desired_status"] = desired.status
+    if desired.config is not None:
+        if desired.config.server_name != server_name:
+            raise HTTPException(status_code=400, detail="The server name cannot be changed")
+        fields["spec"] = desired.config.model_dump(exclude_none=True)
+        if server["desired_status"] is None and desired.status is None:
+            fields["desired_status"] = RUNNING
+    if fields:
+        store.update_server(server_name, **fields)
+        store.record(server_name, "desired", fields.get("desired_status", server["desired_status"]))
+        reconciler.wake(server_name)
+    server = store.get_server(server_name)
+    return {
+        "server_name": server_name,
+        "desired_status": server["desired_status"],
+        "spec": server["spec"],
+        "reconciler": reconciler.enabled,
+    }
+
+@app.get("/reconciler/", summary="Get the Reconciler", description="Get the reconciliation settings, counters, last pass and the servers backing off.")
+async def get_reconciler():
+    """
+    Get the reconciliation settings, counters, last pass and the servers backing off.
+
+    Returns:
+        dict: Whether it is enabled, its interval, wave size and delay, the actions applied
+            by kind, the last pass and the servers waiting before their next action.
+    """
+    return reconciler.status()
+
+# Opérations unitaires réutilisées par les opérations groupées
+BATCH_OPERATIONS = {
+    "stop": _stop_server,
+    "restart": _restart_server,
+    "delete": _delete_server,
+}
+# Tâches des opérations groupées en cours, qui continuent si le client se déconnecte
+batches = set()
+
+async def _then(task: asyncio.Task, cleanup):
+    try:
+        await task
+    finally:
+        await cleanup()
+
+def _until_up(timeout: float):
+    """
+    Build the settle step of a batch keeping each server in the window until it answers.
+
+    Args:
+        timeout (float): How long to wait for a server, in seconds.
+
+    Returns:
+        callable: An async callable taking a server name and returning None, or the error
+            of a server that did not answer in time.
+    """
+    async def settle(server_name):
+        if await prober.wait_up(server_name, timeout):
+            return None
+        return {"status_code": 504, "detail": f"Server {server_name} did not accept connections within {timeout:g} s"}
+    return settle
+
+def _start_batch(batch: Batch, failures=(), cleanup=None):
+    task = batch.start(failures)
+    if cleanup is not None:
+        # Nettoyage une fois tous les serveurs traités (instantané d'un serveur cloné, ...)
+        task = asyncio.create_task(_then(task, cleanup))
+    batches.add(task)
+    task.add_done_callback(batches.discard)
+    return StreamingResponse(batch.stream(), media_type="application/x-ndjson")
+
+@app.post("/servers/batch/create", summary="Create Servers in Batch", description="Create many Minecraft servers with bounded parallelism, streaming one result line per server.")
+async def batch_create_servers(request: BatchCreateRequest):
+    """
+    Create many Minecraft servers with bounded parallelism, streaming one result line per server.
+
+    A created server keeps its place in the window until it accepts connections, and fails
+    if it does not within `ready_timeout` seconds.
+
+    Args:
+        request (BatchCreateRequest): The server configurations, the parallelism and how long
+            to wait for each server to accept connections.
+
+    Returns:
+        StreamingResponse: Newline-delimited JSON, one line per server as it finishes, then
+            a summary line.
+
+    Raises:
+        HTTPException: If the parallelism is not positive.
+    """
+    if request.parallelism < 1:
+        raise HTTPException(status_code=422, detail="parallelism must be at least 1")
+    configs, failures = {}, []
+    for config in request.servers:
+        if config.server_name in configs:
+            # Le premier serveur de ce nom est créé, les suivants sont rejetés
+            failures.append({
+                "server_name": config.server_name, "job_id": None, "status": "failed", "result": None,
+                "error": {"status_code": 409, "detail": f"Server {config.server_name} is listed more than once in the batch"},
+            })
+            continue
+        configs[config.server_name] = config
+    batch = Batch(
+        "create",
+        list(configs),
+        lambda name: jobs.submit("create", name, partial(_create_server, configs[name])),
+        max_in_flight(len(configs), request.parallelism),
+        settle=_until_up(request.ready_timeout),
+    )
+    return _start_batch(batch, failures)
+
+def _instance_config(config: Optional[Dict[str, Any]]):
+    """
+    Check a partial server configuration shared by several servers (template, clone overrides).
+
+    Args:
+        config (dict): The fields of MinecraftServerConfig to set.
+
+    Returns:
+        dict: The configuration.
+
+    Raises:
+        HTTPException: If it sets unknown fields or fields proper to one server.
+    """
+    config = config or {}
+    unknown = sorted(set(config) - set(MinecraftServerConfig.model_fields))
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown configuration fields: {', '.join(unknown)}")
+    proper = sorted(set(config) & set(INSTANCE_FIELDS))
+    if proper:
+        raise HTTPException(status_code=422, detail=f"Fields proper to one server cannot be shared: {', '.join(proper)}")
+    return config
+
+def _start_clones(source: str, request: CloneRequest, base: dict, seed_dir: Optional[str] = None, cleanup=None):
+    """
+    Create servers from a shared configuration, as a batch streaming one result line per server.
+
+    Args:
+        source (str): The template or server cloned, used to name the clones.
+        request (CloneRequest): The names or count of clones, their overrides and the parallelism.
+        base (dict): The configuration shared by the clones.
+        seed_dir (str): The staged snapshot their data directories are copied from, if any.
+        cleanup (callable): An async callable run once every clone is processed.
+
+    Returns:
+        StreamingResponse: Newline-delimited JSON, one line per clone as it finishes, then
+            a summary line.
+    """
+    names = list(dict.fromkeys(request.names or []))
+    index = 0
+    while len(names) < request.count and request.names is None:
+        index += 1
+        name = f"{source}-{index}"
+        if inventory.get(name) is None and store.get_server(name) is None:
+            names.append(name)
+    taken = {
+        name for name in names
+        if inventory.get(name) is not None or store.get_server(name) is not None
+        or os.path.exists(os.path.join(SERVER_DATA_DIR, name))
+    }
+    failures = [
+        {"server_name": name, "job_id": None, "status": "failed", "result": None,
+         "error": {"status_code": 409, "detail": f"Server {name} already exists"}}
+        for name in names if name in taken
+    ]
+    configs = {
+        name: MinecraftServerConfig(**dict(base, **_instance_config(request.config), server_name=name))
+        for name in names if name not in taken
+    }
+    batch = Batch(
+        "clone",
+        list(configs),
+        lambda name: jobs.submit("create", name, partial(_create_server, configs[name], seed_dir=seed_dir)),
+        max_in_flight(len(configs), request.parallelism),
+        settle=_until_up(request.ready_timeout),
+    )
+    return _start_batch(batch, failures, cleanup)
+
+@app.post("/servers/{server_name}/clone", summary="Clone a Server", description="Create new Minecraft servers from the configuration and a copy-on-write snapshot of an existing one.")
+async def clone_server(server_name: str, request: CloneRequest):
+    """
+    Create new Minecraft servers from the configuration and a copy-on-write snapshot of an existing one.
+
+    The world of a running server is flushed and its saving paused while it is snapshotted.
+    The snapshot and the data directory of every clone are reflinked where the filesystem
+    supports it (btrfs, XFS, ...), so a large world is cloned in seconds; jars, mods and
+    plugins are hard-linked. Each clone gets its own ports and RCON password.
+
+    Args:
+        server_name (str): The name of the server to clone.
+        request (CloneRequest): The names of the clones, or how many to name
+            <server_name>-<n>, configuration overrides and the parallelism.
+
+    Returns:
+        StreamingResponse: Newline-delimited JSON, one line per clone as it finishes, then
+            a summary line.
+
+    Raises:
+        HTTPException: If the server is not found or has no recorded spec, if the request
+            or the overrides are invalid, or if the snapshot fails.
+    """
+    if request.parallelism < 1 or (request.names is None and request.count < 1):
+        raise HTTPException(status_code=422, detail="parallelism and count must be at least 1")
+    data_dir = _data_dir(server_name)
+    record = store.get_server(server_name)
+    if record is None or not os.path.isdir(data_dir):
+        raise HTTPException(status_code=404, detail=f"Server {server_name} not found")
+    if record["spec"] is None:
+        raise HTTPException(status_code=409, detail=f"Server {server_name} was adopted without a spec and cannot be cloned")
+    base = {key: value for key, value in record["spec"].items() if key not in INSTANCE_FIELDS}
+    try:
+        # Les surcharges sont vérifiées avant l'instantané, qui ne servirait à rien
+        MinecraftServerConfig(**dict(base, **_instance_config(request.config), server_name=server_name))
+    except ValidationError as e:
+        detail = "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+        raise HTTPException(status_code=422, detail=f"Invalid clone configuration: {detail}")
+    # Sous le nom de la source : ni arrêt ni suppression de celle-ci pendant l'instantané
+    job = jobs.submit("clone", server_name, partial(_stage_clone, data_dir))
+    try:
+        await job.wait()
+        if job.error:
+            raise HTTPException(status_code=job.error["status_code"], detail=job.error["detail"])
+        staging = job.result["staging"]
+        return _start_clones(
+            server_name, request, base, seed_dir=staging,
+            cleanup=partial(docker_exec.run, "delete", templates.discard, staging),
+        )
+    except BaseException:
+        # Échec ou requête annulée : l'instantané est supprimé, une fois terminé s'il est en cours
+        task = asyncio.create_task(_discard_staging(job))
+        batches.add(task)
+        task.add_done_callback(batches.discard)
+        raise
+
+async def _stage_clone(data_dir: str, job: Job):
+    """
+    Snapshot the data directory of a server to seed its clones from.
+
+    Args:
+        data_dir (str): The data directory of the server.
+        job (Job): The job running this operation, used to report progress.
+
+    Returns:
+        dict: The path of the snapshot and the copy statistics.
+    """
+    async with _saves_paused(job.server_name, job):
+        staging, copied = await docker_exec.run("io", templates.stage, data_dir)
+    await job.progress(f"Staged {data_dir}: {copied['reflinked']} files reflinked, {copied['copied']} copied")
+    return {"staging": staging, "copied": copied}
+
+async def _discard_staging(job: Job):
+    await job.wait()
+    if job.result is not None:
+        await docker_exec.run("delete", templates.discard, job.result["staging"])
+
+async def _create_template(request: TemplateRequest, config: dict, job: Job):
+    """
+    Record a template, capturing the data directory of a server as its baseline if one is given.
+
+    Args:
+        request (TemplateRequest): The name of the template and the server to capture.
+        config (dict): The configuration of the template.
+        job (Job): The job running this operation, used to report progress.
+
+    Returns:
+        dict: The template and the copy statistics of its data.
+    """
+    copied = None
+    if request.server_name:
+        data_dir = _data_dir(request.server_name)
+        async with _saves_paused(request.server_name, job):
+            copied = await docker_exec.run("io", templates.capture, request.name, data_dir)
+        await job.progress(f"Captured {data_dir}: {copied['reflinked']} files reflinked, {copied['copied']} copied")
+    elif templates.has_data(request.name):
+        # Modèle redéfini sans données : les anciennes ne doivent plus être copiées
+        await docker_exec.run("delete", templates.delete, request.name)
+    store.put_template(request.name, config, request.server_name)
+    return {"template": store.get_template(request.name), "has_data": templates.has_data(request.name), "copied": copied}
+
+@app.post("/templates/", status_code=202, summary="Create a Server Template", description="Record a reusable server configuration, with the data of an existing server as its baseline world, mods and plugins.")
+async def create_template(request: TemplateRequest):
+    """
+    Record a reusable server configuration, with the data of an existing server as its baseline.
+
+    With server_name, the configuration of that server (without its name, ports and RCON
+    password) is taken, overridden by config, and its data directory is snapshotted to
+    ServerData/.templates/<name>. Servers created with "template": "<name>" start from both.
+
+    Args:
+        request (TemplateRequest): The name of the template, the server to capture and the
+            configuration fields to set.
+
+    Returns:
+        dict: The id of the job recording the template.
+
+    Raises:
+        HTTPException: If the name is invalid, the server is not found or the configuration
+            is invalid.
+    """
+    if not TEMPLATE_NAME.match(request.name):
+        raise HTTPException(status_code=422, detail="Template names are made of letters, digits, '_', '.' and '-'")
+    config = {}
+    if request.server_name:
+        record = store.get_server(request.server_name)
+        if record is None or not os.path.isdir(_data_dir(request.server_name)):
+            raise HTTPException(status_code=404, detail=f"Server {request.server_name} not found")
+        config = {key: value for key, value in (record["spec"] or {}).items() if key not in INSTANCE_FIELDS}
+    config.update(_instance_config(request.config))
+    job = jobs.submit("template", request.name, partial(_create_template, request, config))
+    return {"job_id": job.id, "status": job.status, "message": f"Template {request.name} queued"}
+
+@app.get("/templates/", summary="List Server Templates", description="List the server templates with their configuration.")
+async def list_templates():
+    """
+    List the server templates with their configuration.
+
+    Returns:
+        dict: The templates, with their configuration, source server and whether they have data.
+    """
+    return {"templates": [dict(template, has_data=templates.has_data(template["name"])) for template in store.list_templates()]}
+
+@app.get("/templates/{name}", summary="Get a Server Template", description="Get the configuration of a server template.")
+async def get_template(name: str):
+    """
+    Get the configuration of a server template.
+
+    Args:
+        name (str): The name of the template.
+
+    Returns:
+        dict: The template, with its configuration, source server and whether it has data.
+
+    Raises:
+        HTTPException: If the template is not found.
+    """
+    template = store.get_template(name)
+    if template is None:
+        raise HTTPException(status_code=404, detail=f"Template {name} not found")
+    return dict(template, has_data=templates.has_data(name))
+
+@app.delete("/templates/{name}", summary="Delete a Server Template", description="Delete a server template and its data. Servers created from it are not affected.")
+async def delete_template(name: str):
+    """
+    Delete a server template and its data. Servers created from it are not affected.
+
+    Args:
+        name (str): The name of the template.
+
+    Returns:
+        dict: A message confirming the deletion.
+
+    Raises:
+        HTTPException: If the template is not found.
+    """
+    if not store.delete_template(name):
+        raise HTTPException(status_code=404, detail=f"Template {name} not found")
+    await docker_exec.run("delete", templates.delete, name)
+    return {"message": f"Template {name} deleted"}
+
+@app.post("/templates/{name}/clone", summary="Create Servers from a Template", description="Create new Minecraft servers from a template, their data copied on write from its baseline.")
+async def clone_template(name: str, request: CloneRequest):
+    """
+    Create new Minecraft servers from a template, their data copied on write from its baseline.
+
+    Args:
+        name (str): The name of the template.
+        request (CloneRequest): The names of the servers, or how many to name <name>-<n>,
+            configuration overrides and the parallelism.
+
+    Returns:
+        StreamingResponse: Newline-delimited JSON, one line per server as it finishes, then
+            a summary line.
+
+    Raises:
+        HTTPException: If the template is not found or the request is invalid.
+    """
+    if request.parallelism < 1 or (request.names is None and request.count < 1):
+        raise HTTPException(status_code=422, detail="parallelism and count must be at least 1")
+    if store.get_template(name) is None:
+        raise HTTPException(status_code=404, detail=f"Template {name} not found")
+    _instance_config(request.config)
+    return _start_clones(name, request, {"template": name})
+
+@app.post("/servers/batch/command", summary="Broadcast a Server Command", description="Run one console command on many Minecraft servers concurrently through RCON.")
+async def batch_command(request: BatchCommandRequest):
+    """
+    Run one console command on many Minecraft servers concurrently through RCON.
+
+    Args:
+        request (BatchCommandRequest): The command, the server names or label selector, and
+            the number of servers contacted at once.
+
+    Returns:
+        dict: The result of each server (its response or its error) and a summary.
+
+    Raises:
+        HTTPException: If neither names nor a selector is given, or if the parallelism is
+            not positive.
+    """
+    if request.parallelism < 1:
+        raise HTTPException(status_code=422, detail="parallelism must be at least 1")
+    if request.names is None and request.selector is None:
+        raise HTTPException(status_code=422, detail="names or selector is required")
+    names = list(dict.fromkeys(request.names or []))
+    if request.selector is not None:
+        names += [name for name in inventory.select(request.selector) if name not in names]
+    window = asyncio.Semaphore(request.parallelism)
+
+    async def one(name):
+        async with window:
+            try:
+                result = await _run_command(name, request.command)
+                return {"server_name": name, "status": "succeeded", "response": result["response"], "error": None}
+            except HTTPException as e:
+                return {"server_name": name, "status": "failed", "response": None,
+                        "error": {"status_code": e.status_code, "detail": e.detail}}
+
+    started_at = time.time()
+    results = await asyncio.gather(*(one(name) for name in names))
+    succeeded = sum(1 for result in results if result["status"] == "succeeded")
+    return {
+        "results": results,
+        "summary": {
+            "total": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "elapsed_seconds": time.time() - started_at,
+        },
+    }
+
+@app.post("/servers/batch/{operation}", summary="Stop, Restart or Delete Servers in Batch", description="Run stop, restart or delete on a list of servers or a label selector, as a rolling window, streaming one result line per server.")
+async def batch_servers(operation: str, request: BatchRequest):
+    """
+    Run stop, restart or delete on a list of servers or a label selector, as a rolling window.
+
+    At most `parallelism` servers are processed at once, and with `max_unavailable` at most
+    that percentage of the batch, so a fleet restart never takes more than e.g. 10% down: a
+    restarted server keeps its place in the window until it accepts connections again, and
+    fails if it does not within `ready_timeout` seconds.
+
+    Args:
+        operation (str): "stop", "restart" or "delete".
+        request (BatchRequest): The server names or label selector, the parallelism, the
+            maximum percentage of servers down at once and how long to wait for a restarted
+            server to accept connections.
+
+    Returns:
+        StreamingResponse: Newline-delimited JSON, one line per server as it finishes, then
+            a summary line.
+
+    Raises:
+        HTTPException: If the operation is unknown, or if neither names nor a selector is given.
+    """
+    if operation not in BATCH_OPERATIONS:
+        raise HTTPException(status_code=404, detail=f"Unknown batch operation {operation}")
+    if request.parallelism < 1:
+        raise HTTPException(status_code=422, detail="parallelism must be at least 1")
+    if request.names is None and request.selector is None:
+        raise HTTPException(status_code=422, detail="names or selector is required")
+    names = list(dict.fromkeys(request.names or []))
+    if request.selector is not None:
+        names += [name for name in inventory.select(request.selector) if name not in names]
+    failures = [
+        {"server_name": name, "job_id": None, "status": "failed", "result": None,
+         "error": {"status_code": 404, "detail": f"Server {name} not found"}}
+        for name in names if inventory.get(name) is None
+    ]
+    names = [name for name in names if inventory.get(name) is not None]
+    batch = Batch(
+        operation,
+        names,
+        lambda name: jobs.submit(operation, name, partial(BATCH_OPERATIONS[operation], name)),
+        max_in_flight(len(names), request.parallelism, request.max_unavailable),
+        # Un serveur redémarré reste indisponible jusqu'à ce qu'il accepte de nouveau les joueurs
+        settle=_until_up(request.ready_timeout) if operation == "restart" else None,
+    )
+    return _start_batch(batch, failures)
+
+@app.post("/images/prefetch", status_code=202, summary="Prefetch Server Images", description="Pull itzg/minecraft-server tags in the background so later creates do not wait for them.")
+async def prefetch_images(request: ImagePrefetchRequest):
+    """
+    Pull itzg/minecraft-server tags in the background so later creates do not wait for them.
+
+    Without a node, the tags are pulled on every node.
+
+    Args:
+        request (ImagePrefetchRequest): The tags to pull, whether to pull cached tags again,
+            and the node to pull them on.
+
+    Returns:
+        dict: The state of each tag on the requested (or default) node: "cached", "pulling"
+            or "queued", and the states on every node pulling them.
+
+    Raises:
+        HTTPException: If the node is not found.
+    """
+    targets = [_node(request.node)] if request.node else list(nodes.nodes.values())
+    states = {node.name: node.images.prefetch(request.tags, refresh=request.refresh) for node in targets}
+    return {"tags": states[request.node or nodes.default.name], "nodes": states}
+
+@app.get("/images/", summary="List Cached Images", description="List the cached server images of a node, the pulls in progress and the cache metrics.")
+async def list_images(node: Optional[str] = None):
+    """
+    List the cached server images of a node, the pulls in progress and the cache metrics.
+
+    Args:
+        node (str): The node; the default node if not set.
+
+    Returns:
+        dict: The cached tags with their size and last use, the pull progress and the
+            hit/miss/eviction counters.
+
+    Raises:
+        HTTPException: If the node is not found.
+    """
+    return _node(node).images.status() if node else images.status()
+
+@app.get("/nodes/", summary="List Nodes", description="List the Docker nodes with their free memory, server count and cached images.")
+async def list_nodes():
+    """
+    List the Docker nodes with their free memory, server count and cached images.
+
+    Returns:
+        dict: The overcommit ratio, the default node, the placement counters, and for each
+            node its endpoint, connection state, memory and servers.
+    """
+    return nodes.status()
+
+@app.get("/capacity/", summary="Get the Capacity Ledger", description="Get the memory and CPUs reserved by the servers on every node against the overcommit ratios.")
+async def get_capacity():
+    """
+    Get the memory and CPUs reserved by the servers on every node against the overcommit ratios.
+
+    Each server reserves the memory limit of its container (heap plus JVM overhead, or
+    memory_limit) and its CPU limit, from its placement until its deletion.
+
+    Returns:
+        dict: The overcommit ratios, the placement counters and, per node, the allocatable,
+            reserved and free memory and CPUs and the reservation of each server.
+    """
+    return nodes.ledger()
+
+@app.get("/profiles/", summary="List Performance Profiles", description="List the performance profiles a server can be created with.")
+async def list_profiles():
+    """
+    List the performance profiles a server can be created with.
+
+    Returns:
+        dict: The settings of each profile, the heap from which ZGC replaces G1 and the
+            server types the "auto" profile tunes as modded.
+    """
+    return {"profiles": PROFILES, "zgc_heap": ZGC_HEAP, "modded_types": MODDED_TYPES}
+
+@app.post("/profiles/resolve", summary="Resolve a Performance Profile", description="Get the JVM and server settings a configuration would be created with.")
+async def resolve_performance_profile(config: MinecraftServerConfig):
+    """
+    Get the JVM and server settings a configuration would be created with, without creating it.
+
+    Args:
+        config (MinecraftServerConfig): The configuration, with its performance_profile.
+
+    Returns:
+        dict: The resolved profile, the effective value of each tuned field and the fields
+            the configuration overrides.
+
+    Raises:
+        HTTPException: If no profile is given or if it does not exist.
+    """
+    if not config.performance_profile:
+        raise HTTPException(status_code=400, detail="performance_profile is required")
+    try:
+        return resolve_profile(config.model_dump(exclude_none=True))
+    except UnknownProfile as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/warm-pool/", summary="Get the Warm Pool", description="Get the warm pool profiles and the cold vs. warm provisioning metrics.")
+async def get_warm_pool():
+    """
+    Get the warm pool profiles and the cold vs. warm provisioning metrics.
+
+    Returns:
+        dict: For each profile its target, ready and warming counts, the claim counters and
+            the time-to-joinable of cold and warm creates.
+    """
+    return warm_pool.status()
+
+@app.post("/warm-pool/profiles", summary="Configure a Warm Pool Profile", description="Set how many pre-warmed servers to keep for a (version, type, memory) profile.")
+async def set_warm_pool_profile(profile: WarmPoolProfile):
+    """
+    Set how many pre-warmed servers to keep for a (version, type, memory) profile.
+
+    A create whose version, type and memory match a profile, and which sets no world
+    generation option, starts from a warmed data directory instead of a cold one.
+
+    Args:
+        profile (WarmPoolProfile): The profile, its target size and refill delay.
+
+    Returns:
+        dict: The profile key and the updated pool state.
+
+    Raises:
+        HTTPException: If the target size is negative.
+    """
+    if profile.target < 0:
+        raise HTTPException(status_code=422, detail="target must be positive or zero")
+    key = warm_pool.set_profile(profile.version, profile.type, profile.memory, profile.target, profile.refill_delay)
+    return {"profile": key, "pool": warm_pool.status()}
+
+# Serveurs dont les artefacts sont en cours d'ingestion
+ingesting = set()
+
+def _ingest_when_ready(server_name: str):
+    # Appelé par le sondeur à chaque passage à l'état prêt : le premier démarrage a fini ses téléchargements
+    if server_name in ingesting:
+        return
+    ingesting.add(server_name)
+    task = asyncio.create_task(_ingest_artifacts(server_name))
+    task.add_done_callback(lambda _: ingesting.discard(server_name))
+
+async def _ingest_artifacts(server_name: str):
+    """
+    Move the jars, mods and plugins of a server into the shared artifact store, once per configuration.
+
+    Args:
+        server_name (str): The name of the server, ready so its downloads are complete.
+    """
+    spec = (store.get_server(server_name) or {}).get("spec")
+    if spec is None:
+        # Serveur adopté : sa configuration, donc sa clé d'artefacts, est inconnue
+        return
+    data_dir = os.path.join(SERVER_DATA_DIR, server_name)
+    key = artifact_key(MinecraftServerConfig(**spec))
+    try:
+        if await docker_exec.run("io", artifacts.ingested, data_dir, key):
+            return
+        result = await docker_exec.run("io", artifacts.ingest, data_dir, key)
+        logger.info("Ingested the artifacts of %s: %s", server_name, result)
+    except Exception as e:
+        logger.warning("Could not ingest the artifacts of %s: %s", server_name, e)
+
+@app.get("/artifacts/", summary="Get the Artifact Store", description="Get the size of the shared artifact store and the disk space it saves.")
+async def get_artifacts():
+    """
+    Get the size of the shared artifact store and the disk space it saves.
+
+    Returns:
+        dict: The number of stored objects, their size, the links held by servers and the
+            bytes that would be duplicated without the store.
+    """
+    return await docker_exec.run("io", artifacts.stats)
+
+@app.get("/ports/", summary="Get Port Usage", description="Get the host port ranges handed to the servers and how many ports are free.")
+async def get_ports():
+    """
+    Get the host port ranges handed to the servers and how many ports are free.
+
+    Returns:
+        dict: The game and RCON/query ranges with their used and free port counts.
+    """
+    return ports.status()
+
+@app.get("/trash/", summary="List Deleted Server Data", description="List the data directories of deleted servers that are still trashed or archived.")
+async def list_trash():
+    """
+    List the data directories of deleted servers that are still trashed or archived.
+
+    Returns:
+        dict: The trash mode and rate limits, the reaper metrics, and the entries that can
+            still be restored.
+    """
+    entries = await docker_exec.run("io", trash.entries)
+    return dict(trash.status(), entries=entries)
+
+async def _restore_server_data(entry_id: str, data_dir: str, job: Job):
+    await job.progress(f"Restoring trash entry {entry_id} to {data_dir}")
+    try:
+        source = await docker_exec.run("io", trash.restore, entry_id, data_dir)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Trash entry {entry_id} not found")
+    except FileExistsError:
+        raise HTTPException(status_code=409, detail=f"Data directory {data_dir} already exists")
+    except BlockingIOError:
+        raise HTTPException(status_code=409, detail=f"Trash entry {entry_id} is being cleaned up, retry later")
+    return {"message": f"Data of trash entry {entry_id} restored from {source} state", "data_dir": data_dir}
+
+@app.post("/trash/{entry_id}/restore", status_code=202, summary="Restore Deleted Server Data", description="Restore the data directory of a deleted server, so it can be created again with its world.")
+async def restore_trash_entry(entry_id: str):
+    """
+    Restore the data directory of a deleted server, so it can be created again with its world.
+
+    The directory is put back in ServerData/<server_name>; creating a server with the same
+    name then starts on it.
+
+    Args:
+        entry_id (str): The id of the trash entry, as listed by GET /trash/.
+
+    Returns:
+        dict: The id of the job restoring the data.
+    """
+    server_name = entry_id.rsplit("-", 1)[0]
+    if not server_name or entry_id.startswith("."):
+        raise HTTPException(status_code=404, detail=f"Trash entry {entry_id} not found")
+    data_dir = _data_dir(server_name)
+    job = jobs.submit("restore", server_name, partial(_restore_server_data, entry_id, data_dir))
+    return _accepted(job)
+
+@asynccontextmanager
+async def _saves_paused(server_name: str, job: Optional[Job] = None):
+    """
+    Flush the world of a running server to disk and pause its automatic saving meanwhile.
+
+    Region files then stay unchanged while they are copied. Servers that are stopped or
+    without RCON are copied as they are.
+
+    Args:
+        server_name (str): The name of the server.
+        job (Job): The job to report progress to, if any.
+    """
+    server = inventory.get(server_name)
+    flushed = False
+    if server is not None and server["status"] == "running":
+        # Sauvegarde automatique suspendue : les fichiers de région ne bougent plus pendant la copie
+        try:
+            await rcon.command(server_name, "save-off")
+            flushed = True
+            await rcon.command(server_name, "save-all flush")
+            if job is not None:
+                await job.progress("World saved to disk, automatic saving paused")
+        except RconError as e:
+            if job is not None:
+                await job.progress(f"Could not flush the world, copying the files as they are: {e}")
+    try:
+        yield
+    finally:
+        if flushed:
+            try:
+                await rcon.command(server_name, "save-on")
+            except RconError as e:
+                logger.warning("Could not resume automatic saving on %s: %s", server_name, e)
+
+async def _backup_server(server_name: str, job: Job):
+    """
+    Flush the world of a server and back up its data directory.
+
+    Args:
+        server_name (str): The name of the server.
+        job (Job): The job running this operation, used to report progress.
+
+    Returns:
+        dict: The summary of the new snapshot.
+
+    Raises:
+        HTTPException: If the server has no data directory.
+    """
+    data_dir = _data_dir(server_name)
+    if not os.path.isdir(data_dir):
+        raise HTTPException(status_code=404, detail=f"Server {server_name} not found")
+    async with _saves_paused(server_name, job):
+        snapshot = await docker_exec.run("backup", backups.create, server_name, data_dir)
+    await job.progress(
+        f"Snapshot {snapshot['id']}: {snapshot['files_read']} of {snapshot['files']} files read, "
+        f"{snapshot['bytes_written']} bytes written"
+    )
+    store.record(server_name, "backup", snapshot["id"])
+    schedule = store.get_backup_schedule(server_name)
+    if schedule is not None and schedule["keep"]:
+        pruned = await docker_exec.run("backup", backups.prune, server_name, schedule["keep"])
+        if pruned:
+            await job.progress(f"Removed {pruned} old snapshots")
+    return snapshot
+
+async def _restore_backup(server_name: str, snapshot_id: str, job: Job):
+    server = inventory.get(server_name)
+    if server is not None and server["status"] == "running":
+        raise HTTPException(status_code=409, detail=f"Server {server_name} is running, stop it first")
+    data_dir = _data_dir(server_name)
+    await job.progress(f"Restoring snapshot {snapshot_id} to {data_dir}")
+    try:
+        result = await docker_exec.run("backup", backups.restore, server_name, snapshot_id, data_dir)
+    except SnapshotNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    store.record(server_name, "restored", snapshot_id)
+    return dict(result, message=f"Server {server_name} restored from snapshot {snapshot_id}")
+
+@app.post("/servers/{server_name}/backups", status_code=202, summary="Back Up a Server", description="Queue an incremental backup of the world and data directory of a Minecraft server.")
+async def backup_server(server_name: str):
+    """
+    Queue an incremental backup of the world and data directory of a Minecraft server.
+
+    A running server with RCON enabled saves its world and pauses automatic saving during
+    the backup. Only the region chunks and file blocks not already in the repository are
+    written.
+
+    Args:
+        server_name (str): The name of the server.
+
+    Returns:
+        dict: The id of the job. Its result is the summary of the snapshot.
+
+    Raises:
+        HTTPException: If the server name is invalid or the server is not found.
+    """
+    _data_dir(server_name)
+    if store.get_server(server_name) is None and inventory.get(server_name) is None:
+        raise HTTPException(status_code=404, detail=f"Server {server_name} not found")
+    job = jobs.submit("backup", server_name, partial(_backup_server, server_name))
+    return _accepted(job)
+
+@app.get("/servers/{server_name}/backups", summary="List Server Backups", description="List the backup snapshots of a Minecraft server and its backup schedule.")
+async def list_backups(server_name: str):
+    """
+    List the backup snapshots of a Minecraft server and its backup schedule.
+
+    Snapshots outlive the server: they can still be restored after a deletion.
+
+    Args:
+        server_name (str): The name of the server.
+
+    Returns:
+        dict: The snapshots, oldest first, with their size and bytes read and written,
+            and the schedule (None if backups are not scheduled).
+
+    Raises:
+        HTTPException: If the server name is invalid.
+    """
+    # Le nom sert de chemin dans le dépôt des sauvegardes
+    _data_dir(server_name)
+    snapshots = await docker_exec.run("io", backups.list, server_name)
+    return {"server_name": server_name, "snapshots": snapshots, "schedule": store.get_backup_schedule(server_name)}
+
+@app.post("/servers/{server_name}/backups/{snapshot_id}/restore", status_code=202, summary="Restore a Server Backup", description="Queue the restoration of the data directory of a stopped Minecraft server from a snapshot.")
+async def restore_backup(server_name: str, snapshot_id: str):
+    """
+    Queue the restoration of the data directory of a stopped Minecraft server from a snapshot.
+
+    Files that did not change since the snapshot are left as they are. A deleted server
+    gets its data directory back and can be created again on it.
+
+    Args:
+        server_name (str): The name of the server.
+        snapshot_id (str): The id of the snapshot, as listed by GET /servers/{server_name}/backups.
+
+    Returns:
+        dict: The id of the restoring job.
+
+    Raises:
+        HTTPException: If the server name is invalid or the snapshot is not found.
+    """
+    _data_dir(server_name)
+    # Les instantanés survivent au serveur : ils suffisent à le connaître
+    if not await docker_exec.run("io", backups.has_snapshot, server_name, snapshot_id):
+        raise HTTPException(status_code=404, detail=f"Snapshot {snapshot_id} of server {server_name} not found")
+    job = jobs.submit("restore", server_name, partial(_restore_backup, server_name, snapshot_id))
+    return _accepted(job)
+
+@app.put("/servers/{server_name}/backups/schedule", summary="Schedule Server Backups", description="Back up a Minecraft server every interval seconds, keeping its last snapshots.")
+async def schedule_backups(server_name: str, schedule: BackupSchedule):
+    """
+    Back up a Minecraft server every interval seconds, keeping its last snapshots.
+
+    Args:
+        server_name (str): The name of the server.
+        schedule (BackupSchedule): The interval in seconds (0 removes the schedule) and how
+            many snapshots to keep (all if not set).
+
+    Returns:
+        dict: The recorded schedule.
+
+    Raises:
+        HTTPException: If the server is not found or the schedule is invalid.
+    """
+    _data_dir(server_name)
+    if store.get_server(server_name) is None and inventory.get(server_name) is None:
+        raise HTTPException(status_code=404, detail=f"Server {server_name} not found")
+    if schedule.interval < 0 or (schedule.keep is not None and schedule.keep < 1):
+        raise HTTPException(status_code=400, detail="The interval must be positive and keep at least 1")
+    if schedule.interval == 0:
+        store.delete_backup_schedule(server_name)
+    else:
+        store.set_backup_schedule(server_name, schedule.interval, schedule.keep)
+    return {"server_name": server_name, "schedule": store.get_backup_schedule(server_name)}
+
+@app.get("/backups/", summary="Get the Backup Repository", description="Get the size of the backup repository, the servers with snapshots and the backup counters.")
+async def get_backups():
+    """
+    Get the size of the backup repository, the servers with snapshots and the backup counters.
+
+    Returns:
+        dict: The repository path, object count and size, servers, counters and schedules.
+    """
+    status = await docker_exec.run("io", backups.status)
+    return dict(status, schedules=store.backup_schedules(), scheduler=dict(backup_scheduler.metrics))
+
+async def _pregenerate_server(server_name: str, radius: int):
+    """
+    Generate the chunks of a server's world around 0, 0, with its CPU capped meanwhile.
+
+    Run by the pre-generator once one of its slots is free, outside the job queue: a
+    generation takes hours and must not hold the jobs of the server meanwhile. The CPU cap
+    is lifted however it ends, including when stop or delete cancel it.
+
+    Args:
+        server_name (str): The name of the server.
+        radius (int): The radius to generate, in blocks.
+
+    Returns:
+        dict: The radius generated, the last progress and the duration.
+    """
+    spec = (store.get_server(server_name) or {}).get("spec") or {}
+    container = await _get_container(server_name)
+    node_exec = nodes.node_of(server_name).docker_exec
+    # Docker refuse un quota CFS sur un conteneur limité par nano_cpus : il garde sa limite
+    capped = PREGEN_CPUS > 0 and CPUS_LABEL not in container.labels
+    try:
+        if capped:
+            await node_exec.run("restart", container.update, cpu_period=100000, cpu_quota=int(PREGEN_CPUS * 100000))
+        result = await pregenerator.run(server_name, radius, spec.get("level") or "world", spec.get("max_world_size"))
+    except (PregenUnavailable, RconError, docker.errors.APIError) as e:
+        logger.warning("Pre-generation of %s failed: %s", server_name, e)
+        raise
+    finally:
+        if capped:
+            try:
+                await node_exec.run("restart", container.update, cpu_quota=-1)
+            except docker.errors.APIError as e:
+                logger.warning("Could not lift the CPU cap of %s: %s", server_name, e)
+    store.record(server_name, "pregenerated", str(result["radius"]))
+    return result
+
+async def _cancel_pregeneration(server_name: str, job: Job):
+    # Le conteneur arrêté, Chunky ne répondrait plus : la prégénération serait prise pour terminée
+    if await pregenerator.cancel(server_name):
+        await job.progress(f"Cancelled the pre-generation of server {server_name}")
+
+@app.post("/servers/{server_name}/pregenerate", status_code=202, summary="Pre-generate a World", description="Generate the chunks of a Minecraft server's world within a radius, before players explore it.")
+async def pregenerate_server(server_name: str, request: PregenerateRequest):
+    """
+    Generate the chunks of a Minecraft server's world within a radius, before players explore it.
+
+    The server needs Chunky (installed at creation with pregenerate_radius, or as a mod or
+    plugin). It is reported not ready until the generation ends, its CPU is capped to
+    MCDEPLOYER_PREGEN_CPUS meanwhile, and max_world_size, if set, becomes the world border
+    and caps the radius.
+
+    Args:
+        server_name (str): The name of the server.
+        request (PregenerateRequest): The radius in blocks; max_world_size if not set.
+
+    Returns:
+        dict: A message and the radius. GET /pregeneration/ reports the generated chunks.
+
+    Raises:
+        HTTPException: If the server is not found, not running, already being pre-generated
+            or if no radius is given.
+    """
+    server = inventory.get(server_name)
+    if server is None:
+        raise HTTPException(status_code=404, detail=f"Server {server_name} not found")
+    if server["status"] != "running":
+        raise HTTPException(status_code=409, detail=f"Server {server_name} is not running")
+    if server_name in pregenerator.running:
+        raise HTTPException(status_code=409, detail=f"Server {server_name} is already being pre-generated")
+    radius = request.radius or ((store.get_server(server_name) or {}).get("spec") or {}).get("max_world_size")
+    if not radius or radius <= 0:
+        raise HTTPException(status_code=400, detail="A positive radius is required when the server has no max_world_size")
+    pregenerator.submit(server_name, radius, partial(_pregenerate_server, server_name, radius))
+    return {"message": f"Pre-generation of server {server_name} started", "radius": radius}
+
+@app.delete("/servers/{server_name}/pregenerate", summary="Cancel a World Pre-generation", description="Cancel the running or queued pre-generation of a Minecraft server's world.")
+async def cancel_pregeneration(server_name: str):
+    """
+    Cancel the running or queued pre-generation of a Minecraft server's world.
+
+    The Chunky task is paused, so a later pre-generation resumes it, and the CPU cap of the
+    server is lifted.
+
+    Args:
+        server_name (str): The name of the server.
+
+    Returns:
+        dict: A message confirming the cancellation.
+
+    Raises:
+        HTTPException: If the server is not being pre-generated.
+    """
+    state = (pregenerator.running.get(server_name) or {}).get("state")
+    if not await pregenerator.cancel(server_name):
+        raise HTTPException(status_code=404, detail=f"Server {server_name} is not being pre-generated")
+    if state == "generating":
+        try:
+            await rcon.command(server_name, "chunky pause")
+        except RconError as e:
+            logger.warning("Could not pause the Chunky task of %s: %s", server_name, e)
+    return {"message": f"Pre-generation of server {server_name} cancelled"}
+
+@app.get("/pregeneration/", summary="Get the World Pre-generations", description="Get the running world pre-generations and their counters.")
+async def get_pregeneration():
+    """
+    Get the running world pre-generations and their counters.
+
+    Returns:
+        dict: The counters; per server being pre-generated, its radius, state and progress;
+            per server, the outcome of its last pre-generation.
+    """
+    return pregenerator.status()
+
+@app.get("/healthz", summary="Health Check", description="Tell whether the API process is up and started, without calling the Docker daemons.")
+async def healthz():
+    """
+    Tell whether the API process is up and started, without calling the Docker daemons.
+
+    Cheap enough for liveness probes and load balancers: it only reads in-memory state.
+
+    Returns:
+        dict: "ok" once the startup is complete ("starting" before), the uptime, and per
+            node whether its Docker client is created and its events stream connected.
+    """
+    started_at = getattr(app.state, "started_at", None)
+    return {
+        "status": "ok" if started_at else "starting",
+        "uptime_seconds": time.time() - started_at if started_at else None,
+        "nodes": {
+            name: {"client": getattr(node.client, "initialized", True), "connected": node.connected}
+            for name, node in nodes.nodes.items()
+        },
+    }
+
+@app.get("/jobs/{job_id}", summary="Get a Job", description="Get the status, progress and result of a server operation.")
+async def get_job(job_id: str):
+    """
+    Get the status, progress and result of a server operation.
+
+    Args:
+        job_id (str): The id returned when the operation was queued.
+
+    Returns:
+        dict: The job status, its events, and its result or error once finished.
+
+    Raises:
+        HTTPException: If the job is unknown.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/events", summary="Follow a Job", description="Stream the progress events of a server operation as Server-Sent Events.")
+async def follow_job(job_id: str):
+    """
+    Stream the progress events of a server operation as Server-Sent Events.
+
+    The stream replays the past events and closes once the job is finished.
+
+    Args:
+        job_id (str): The id returned when the operation was queued.
+
+    Returns:
+        StreamingResponse: A text/event-stream of job events.
+
+    Raises:
+        HTTPException: If the job is unknown.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+    async def stream():
+        async for event in job.follow():
+            yield f"event: {event['status']}\ndata: {json.dumps(event)}\n\n"
+        yield f"event: end\ndata: {json.dumps(job.to_dict())}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
 
 if __name__ == "__main__":
     import uvicorn
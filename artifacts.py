@@ -0,0 +1,292 @@
+import errno
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import stat
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Fichiers téléchargés par l'image itzg, identiques d'un serveur à l'autre et jamais modifiés sur place.
+# "*" ne traverse pas les dossiers, "**/" en traverse zéro ou plusieurs : les fichiers de configuration
+# et de données que des mods rangent dans des sous-dossiers de mods/ restent propres à chaque serveur.
+SHARED_PATTERNS = (
+    "*.jar",
+    "libraries/**/*.jar",
+    "versions/**/*.jar",
+    "cache/*.jar",
+    "mods/*.jar",
+    "plugins/*.jar",
+)
+HASH_CHUNK = 1024 * 1024
+# Clé du dernier ingest, dans le dossier du serveur : un serveur n'est ingéré qu'une fois par configuration
+INGESTED_FILE = ".mcdeployer-artifacts"
+
+
+def artifact_key(config):
+    """
+    Identify the set of artifacts a server configuration downloads.
+
+    Args:
+        config (MinecraftServerConfig): The configuration of the server.
+
+    Returns:
+        str: A stable key for the version, type, mods and plugins of the server.
+    """
+    source = {
+        "version": config.version,
+        "type": config.type,
+        "mods": sorted(config.mods or []),
+        "mods_files": config.mods_files,
+        "spiget_resources": config.spiget_resources,
+    }
+    return hashlib.sha256(json.dumps(source, sort_keys=True).encode()).hexdigest()[:32]
+
+
+def _compile(pattern):
+    expression = ""
+    for part in re.split(r"(\*\*/|\*|\?)", pattern):
+        if part == "**/":
+            expression += "(?:[^/]+/)*"
+        elif part == "*":
+            expression += "[^/]*"
+        elif part == "?":
+            expression += "[^/]"
+        else:
+            expression += re.escape(part)
+    return re.compile(expression + r"\Z")
+
+
+_SHARED = [_compile(pattern) for pattern in SHARED_PATTERNS]
+
+
+def is_shared(relative_path):
+    """
+    Tell whether a file of a server data directory is an immutable artifact shared between servers.
+
+    Args:
+        relative_path (str): The path of the file, relative to the data directory.
+
+    Returns:
+        bool: Whether the path matches SHARED_PATTERNS.
+    """
+    return any(pattern.match(relative_path) for pattern in _SHARED)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """
+    Host-level content-addressed store of server jars, libraries, mods and plugins.
+
+    Objects live under ServerData/.artifacts/objects/<sha256> and are hard-linked into the
+    data directory of every server that uses them, so each file is stored once. The link
+    count of an object is its reference count: once the last server holding a link is
+    deleted, the object only has its store link left and collect() removes it. Objects are
+    read-only, so a server cannot modify a file shared with others in place.
+
+    A manifest per artifact key (see artifact_key) records which files a configuration
+    downloaded; a new server with the same key is seeded with links before its first boot.
+    """
+
+    def __init__(self, data_root):
+        self.root = os.path.join(data_root, ".artifacts")
+        self.objects = os.path.join(self.root, "objects")
+        self.manifests = os.path.join(self.root, "manifests")
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects, digest[:2], digest)
+
+    def _manifest_path(self, key):
+        return os.path.join(self.manifests, f"{key}.json")
+
+    def _link(self, source, target):
+        # Remplacement atomique : le fichier cible n'est jamais absent
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(target), prefix=".mcdeployer-link-")
+        os.close(fd)
+        os.unlink(temporary)
+        os.link(source, temporary)
+        os.replace(temporary, target)
+
+    def _unshare(self, path, info):
+        # Fichier stocké par une version aux motifs plus larges : le serveur reprend sa propre copie
+        stored = self._object_path(_sha256(path))
+        try:
+            if os.stat(stored).st_ino != info.st_ino:
+                return 0
+        except FileNotFoundError:
+            return 0
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".mcdeployer-link-")
+        os.close(fd)
+        shutil.copyfile(path, temporary)
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+        return 1
+
+    def seed(self, data_dir, key):
+        """
+        Hard-link the artifacts recorded for a key into a new data directory. Blocking.
+
+        Files already present in the data directory are left untouched.
+
+        Args:
+            data_dir (str): The data directory of the server.
+            key (str): The artifact key of the server configuration.
+
+        Returns:
+            int: The number of files linked.
+        """
+        try:
+            with open(self._manifest_path(key)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        linked = 0
+        for relative_path, digest in manifest.items():
+            if not is_shared(relative_path):
+                # Manifeste écrit avec des motifs plus larges : ce fichier n'est plus partagé
+                continue
+            source = self._object_path(digest)
+            target = os.path.join(data_dir, relative_path)
+            if os.path.exists(target) or not os.path.exists(source):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                os.link(source, target)
+            except FileNotFoundError:
+                # Objet libéré par collect() entre-temps : le serveur le téléchargera
+                continue
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                logger.warning("Artifact store and %s are on different filesystems", data_dir)
+                return linked
+            linked += 1
+        return linked
+
+    def ingest(self, data_dir, key):
+        """
+        Move the shared files of a server into the store and link them back. Blocking.
+
+        Files whose content is already stored are replaced by a link to the stored object;
+        new content becomes a new object. The manifest of the key is updated. Files linked to
+        an object that no longer match SHARED_PATTERNS get a private, writable copy back.
+
+        Args:
+            data_dir (str): The data directory of the server.
+            key (str): The artifact key of the server configuration.
+
+        Returns:
+            dict: The number of files ingested, deduplicated, unshared, and the bytes saved.
+        """
+        manifest = {}
+        result = {"ingested": 0, "deduplicated": 0, "bytes_saved": 0, "unshared": 0}
+        for directory, _, files in os.walk(data_dir):
+            for name in files:
+                path = os.path.join(directory, name)
+                relative_path = os.path.relpath(path, data_dir)
+                info = os.lstat(path)
+                if not stat.S_ISREG(info.st_mode):
+                    continue
+                if not is_shared(relative_path):
+                    if info.st_nlink > 1:
+                        result["unshared"] += self._unshare(path, info)
+                    continue
+                digest = _sha256(path)
+                manifest[relative_path] = digest
+                stored = self._object_path(digest)
+                if os.path.exists(stored):
+                    if os.stat(stored).st_ino != info.st_ino:
+                        self._link(stored, path)
+                        result["deduplicated"] += 1
+                        result["bytes_saved"] += info.st_size
+                    continue
+                os.makedirs(os.path.dirname(stored), exist_ok=True)
+                try:
+                    os.link(path, stored)
+                except FileExistsError:
+                    # Même contenu stocké entre-temps par un autre serveur
+                    self._link(stored, path)
+                    continue
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        raise
+                    logger.warning("Artifact store and %s are on different filesystems", data_dir)
+                    return result
+                os.chmod(stored, 0o444)
+                result["ingested"] += 1
+        if manifest:
+            os.makedirs(self.manifests, exist_ok=True)
+            fd, temporary = tempfile.mkstemp(dir=self.manifests)
+            with os.fdopen(fd, "w") as f:
+                json.dump(manifest, f)
+            os.replace(temporary, self._manifest_path(key))
+        with open(os.path.join(data_dir, INGESTED_FILE), "w") as f:
+            f.write(key)
+        return result
+
+    def ingested(self, data_dir, key):
+        """
+        Tell whether a data directory was already ingested with a key. Blocking.
+
+        Args:
+            data_dir (str): The data directory of the server.
+            key (str): The artifact key of the server configuration.
+
+        Returns:
+            bool: Whether ingest() already ran on it for that key.
+        """
+        try:
+            with open(os.path.join(data_dir, INGESTED_FILE)) as f:
+                return f.read() == key
+        except OSError:
+            return False
+
+    def _objects(self):
+        if not os.path.isdir(self.objects):
+            return
+        for directory, _, files in os.walk(self.objects):
+            for name in files:
+                path = os.path.join(directory, name)
+                yield path, os.stat(path)
+
+    def collect(self):
+        """
+        Remove the objects no server links to anymore. Blocking.
+
+        Returns:
+            dict: The number of objects removed and the bytes freed.
+        """
+        result = {"removed": 0, "bytes_freed": 0}
+        for path, info in list(self._objects()):
+            if info.st_nlink <= 1:
+                os.unlink(path)
+                result["removed"] += 1
+                result["bytes_freed"] += info.st_size
+        return result
+
+    def stats(self):
+        """
+        Describe the store. Blocking.
+
+        Returns:
+            dict: The number of objects, the bytes stored, the number of links held by servers
+                and the bytes that would be duplicated without the store.
+        """
+        result = {"objects": 0, "stored_bytes": 0, "links": 0, "bytes_saved": 0}
+        for _, info in self._objects():
+            users = info.st_nlink - 1
+            result["objects"] += 1
+            result["stored_bytes"] += info.st_size
+            result["links"] += users
+            result["bytes_saved"] += max(0, users - 1) * info.st_size
+        return result
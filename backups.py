@@ -0,0 +1,424 @@
+import asyncio
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+import zstandard
+
+from trash import Throttle
+
+logger = logging.getLogger(__name__)
+
+# Dépôt des sauvegardes ; par défaut ServerData/.backups
+BACKUP_DIR = os.environ.get("MCDEPLOYER_BACKUP_DIR", "")
+# Débit disque maximal des sauvegardes et restaurations de l'hôte (octets lus et écrits par seconde)
+BACKUP_BANDWIDTH = float(os.environ.get("MCDEPLOYER_BACKUP_BANDWIDTH", str(50 * 1024 * 1024)))
+# Niveau de compression zstd des blocs
+BACKUP_LEVEL = int(os.environ.get("MCDEPLOYER_BACKUP_LEVEL", "3"))
+# Intervalle entre deux recherches de sauvegardes planifiées à lancer
+BACKUP_SCHEDULE_INTERVAL = float(os.environ.get("MCDEPLOYER_BACKUP_SCHEDULE_INTERVAL", "60"))
+
+# Fichiers sans valeur après une restauration. Les jars, mods et plugins sont sauvegardés : ajoutés à la
+# main, l'image ne les retéléchargerait pas, et leur contenu n'est stocké qu'une fois pour tous les serveurs.
+EXCLUDED_PATTERNS = ("logs/*", "crash-reports/*", ".mcdeployer-*")
+# Fichiers de région Anvil : 1024 chunks compressés, découpés un par un
+REGION_PATTERNS = ("*.mca", "*.mcr")
+SECTOR = 4096
+# Identifiants des instantanés (horodatage-aléa) : ils servent de noms de fichiers dans le dépôt
+SNAPSHOT_ID = re.compile(r"^[0-9]+-[0-9a-f]{6}$")
+# Blocs des autres fichiers
+FILE_CHUNK = 1024 * 1024
+
+
+class SnapshotNotFound(Exception):
+    """
+    The requested snapshot does not exist.
+    """
+
+
+def _excluded(relative_path):
+    return any(fnmatch.fnmatch(relative_path, pattern) for pattern in EXCLUDED_PATTERNS)
+
+
+def _is_region(path):
+    return any(fnmatch.fnmatch(os.path.basename(path), pattern) for pattern in REGION_PATTERNS)
+
+
+def region_pieces(data):
+    """
+    Split an Anvil region file into its header and one piece per chunk.
+
+    Args:
+        data (bytes): The content of the region file.
+
+    Returns:
+        list: The (offset, length) of the pieces, or None if the file is not a valid
+            region file (the caller then splits it in fixed-size blocks).
+    """
+    if len(data) < 2 * SECTOR:
+        return None
+    # Table des emplacements et table des horodatages, modifiées à chaque sauvegarde de chunk
+    pieces = [(0, 2 * SECTOR)]
+    for index in range(1024):
+        location = data[index * 4:index * 4 + 4]
+        sector, count = int.from_bytes(location[:3], "big"), location[3]
+        if sector == 0 or count == 0:
+            continue
+        start = sector * SECTOR
+        length = int.from_bytes(data[start:start + 4], "big") + 4
+        if start < 2 * SECTOR or length > count * SECTOR or start + length > len(data):
+            return None
+        pieces.append((start, length))
+    pieces.sort()
+    for (start, length), (next_start, _) in zip(pieces, pieces[1:]):
+        if start + length > next_start:
+            return None
+    return pieces
+
+
+def block_pieces(size):
+    return [(offset, min(FILE_CHUNK, size - offset)) for offset in range(0, size, FILE_CHUNK)]
+
+
+class BackupRepository:
+    """
+    Incremental, deduplicated backups of the server data directories.
+
+    The repository is a content-addressed store: every piece of a file is compressed with
+    zstd and written once under objects/<sha256>, and a snapshot is a JSON manifest listing,
+    for each file, its size, modification time and pieces. Region files are split along
+    their chunks, so a world where a few chunks changed only adds those chunks; other files
+    are split in 1 MiB blocks. A file whose size and modification time match the previous
+    snapshot is not even read. Reads and writes of all backups and restores of the host
+    share one bandwidth cap, and run one at a time. Objects no snapshot refers to anymore
+    are removed by collect() once old snapshots are pruned.
+    """
+
+    def __init__(self, root, bandwidth=BACKUP_BANDWIDTH, level=BACKUP_LEVEL):
+        self.root = root
+        self.objects = os.path.join(root, "objects")
+        self.snapshots = os.path.join(root, "snapshots")
+        self.level = level
+        self.throttle = Throttle(bandwidth, burst=FILE_CHUNK * 4)
+        self.metrics = {"backups": 0, "restores": 0, "bytes_read": 0, "bytes_written": 0,
+                        "objects_written": 0, "objects_removed": 0}
+        self._lock = threading.Lock()
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects, digest[:2], digest)
+
+    def _snapshot_path(self, server_name, snapshot_id):
+        return os.path.join(self.snapshots, server_name, f"{snapshot_id}.json")
+
+    def _read(self, f, length):
+        data = f.read(length)
+        self.throttle.consume(len(data))
+        self.metrics["bytes_read"] += len(data)
+        return data
+
+    def _put(self, data, compressor):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            return digest, 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = compressor.compress(data)
+        self.throttle.consume(len(compressed))
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(compressed)
+        os.replace(tmp_path, path)
+        self.metrics["objects_written"] += 1
+        return digest, len(compressed)
+
+    def _backup_file(self, path, compressor, stats):
+        with open(path, "rb") as f:
+            if _is_region(path):
+                data = self._read(f, -1)
+                pieces = region_pieces(data) or block_pieces(len(data))
+                chunks = ((offset, data[offset:offset + length]) for offset, length in pieces)
+            else:
+                size = os.fstat(f.fileno()).st_size
+                chunks = ((offset, self._read(f, length)) for offset, length in block_pieces(size))
+            entries = []
+            for offset, chunk in chunks:
+                digest, written = self._put(chunk, compressor)
+                stats["bytes_written"] += written
+                stats["pieces_written"] += 1 if written else 0
+                entries.append([offset, len(chunk), digest])
+            return entries
+
+    def latest(self, server_name):
+        snapshots = self.list(server_name)
+        return self.load(server_name, snapshots[-1]["id"]) if snapshots else None
+
+    def create(self, server_name, data_dir):
+        """
+        Back up a data directory. Blocking: run it on an executor.
+
+        Args:
+            server_name (str): The name of the server.
+            data_dir (str): Its data directory.
+
+        Returns:
+            dict: The summary of the new snapshot (id, files, size, bytes read and written).
+        """
+        with self._lock:
+            started_at = time.time()
+            previous = self.latest(server_name)
+            previous_files = previous["files"] if previous else {}
+            compressor = zstandard.ZstdCompressor(level=self.level)
+            read_before = self.metrics["bytes_read"]
+            stats = {"files": 0, "size": 0, "files_read": 0, "pieces_written": 0, "bytes_written": 0}
+            files = {}
+            for directory, subdirectories, names in os.walk(data_dir):
+                subdirectories.sort()
+                for name in sorted(names):
+                    path = os.path.join(directory, name)
+                    relative_path = os.path.relpath(path, data_dir).replace(os.sep, "/")
+                    if _excluded(relative_path) or not os.path.isfile(path) or os.path.islink(path):
+                        continue
+                    st = os.stat(path)
+                    known = previous_files.get(relative_path)
+                    if known and known["size"] == st.st_size and known["mtime_ns"] == st.st_mtime_ns:
+                        files[relative_path] = known
+                    else:
+                        files[relative_path] = {
+                            "size": st.st_size,
+                            "mtime_ns": st.st_mtime_ns,
+                            "mode": st.st_mode & 0o7777,
+                            "pieces": self._backup_file(path, compressor, stats),
+                        }
+                        stats["files_read"] += 1
+                    stats["files"] += 1
+                    stats["size"] += st.st_size
+            snapshot_id = f"{int(started_at)}-{uuid.uuid4().hex[:6]}"
+            stats.update(bytes_read=self.metrics["bytes_read"] - read_before, duration=time.time() - started_at)
+            manifest = {"id": snapshot_id, "server_name": server_name, "created_at": started_at,
+                        "stats": stats, "files": files}
+            path = self._snapshot_path(server_name, snapshot_id)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(manifest, f, separators=(",", ":"))
+            os.replace(f"{path}.tmp", path)
+            self.metrics["backups"] += 1
+            self.metrics["bytes_written"] += stats["bytes_written"]
+            return {"id": snapshot_id, "created_at": started_at, **stats}
+
+    def has_snapshot(self, server_name, snapshot_id):
+        return bool(SNAPSHOT_ID.match(snapshot_id)) and os.path.isfile(self._snapshot_path(server_name, snapshot_id))
+
+    def load(self, server_name, snapshot_id):
+        if not SNAPSHOT_ID.match(snapshot_id):
+            raise SnapshotNotFound(f"Snapshot {snapshot_id} of server {server_name} not found")
+        try:
+            with open(self._snapshot_path(server_name, snapshot_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise SnapshotNotFound(f"Snapshot {snapshot_id} of server {server_name} not found")
+
+    def list(self, server_name):
+        """
+        List the snapshots of a server.
+
+        Args:
+            server_name (str): The name of the server.
+
+        Returns:
+            list: The snapshot summaries, oldest first.
+        """
+        directory = os.path.join(self.snapshots, server_name)
+        if not os.path.isdir(directory):
+            return []
+        summaries = []
+        for name in os.listdir(directory):
+            if name.endswith(".json"):
+                manifest = self.load(server_name, name[:-len(".json")])
+                summaries.append({"id": manifest["id"], "created_at": manifest["created_at"], **manifest["stats"]})
+        return sorted(summaries, key=lambda summary: summary["created_at"])
+
+    def restore(self, server_name, snapshot_id, data_dir):
+        """
+        Bring a data directory back to a snapshot. Blocking: run it on an executor.
+
+        Files that match the snapshot (same size and modification time) are left as they
+        are; files the snapshot does not have are removed, except the excluded ones.
+
+        Args:
+            server_name (str): The name of the server.
+            snapshot_id (str): The snapshot to restore.
+            data_dir (str): The data directory, created if needed.
+
+        Returns:
+            dict: The number of files written and removed.
+
+        Raises:
+            SnapshotNotFound: If the snapshot does not exist.
+        """
+        with self._lock:
+            manifest = self.load(server_name, snapshot_id)
+            decompressor = zstandard.ZstdDecompressor()
+            written = removed = 0
+            for relative_path, entry in manifest["files"].items():
+                path = os.path.join(data_dir, *relative_path.split("/"))
+                if os.path.isfile(path):
+                    st = os.stat(path)
+                    if st.st_size == entry["size"] and st.st_mtime_ns == entry["mtime_ns"]:
+                        continue
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(f"{path}.restore", "wb") as f:
+                    f.truncate(entry["size"])
+                    for offset, _, digest in entry["pieces"]:
+                        with open(self._object_path(digest), "rb") as source:
+                            compressed = self._read(source, -1)
+                        data = decompressor.decompress(compressed)
+                        self.throttle.consume(len(data))
+                        f.seek(offset)
+                        f.write(data)
+                os.chmod(f"{path}.restore", entry["mode"])
+                os.utime(f"{path}.restore", ns=(entry["mtime_ns"], entry["mtime_ns"]))
+                os.replace(f"{path}.restore", path)
+                written += 1
+            for directory, _, names in os.walk(data_dir):
+                for name in names:
+                    path = os.path.join(directory, name)
+                    relative_path = os.path.relpath(path, data_dir).replace(os.sep, "/")
+                    if relative_path not in manifest["files"] and not _excluded(relative_path):
+                        os.remove(path)
+                        removed += 1
+            self.metrics["restores"] += 1
+            return {"files_written": written, "files_removed": removed}
+
+    def prune(self, server_name, keep):
+        """
+        Remove the oldest snapshots of a server beyond `keep`, then the unused objects.
+
+        Args:
+            server_name (str): The name of the server.
+            keep (int): How many snapshots to keep.
+
+        Returns:
+            int: The number of snapshots removed.
+        """
+        snapshots = self.list(server_name)
+        expired = snapshots[:max(0, len(snapshots) - keep)]
+        for snapshot in expired:
+            os.remove(self._snapshot_path(server_name, snapshot["id"]))
+        if expired:
+            self.collect()
+        return len(expired)
+
+    def collect(self):
+        """
+        Remove the objects no snapshot refers to. Blocking.
+
+        Returns:
+            int: The number of objects removed.
+        """
+        with self._lock:
+            used = set()
+            for server_name in os.listdir(self.snapshots) if os.path.isdir(self.snapshots) else []:
+                for name in os.listdir(os.path.join(self.snapshots, server_name)):
+                    if name.endswith(".json"):
+                        manifest = self.load(server_name, name[:-len(".json")])
+                        for entry in manifest["files"].values():
+                            used.update(digest for _, _, digest in entry["pieces"])
+            removed = 0
+            for prefix in os.listdir(self.objects) if os.path.isdir(self.objects) else []:
+                for digest in os.listdir(os.path.join(self.objects, prefix)):
+                    if digest not in used:
+                        os.remove(os.path.join(self.objects, prefix, digest))
+                        removed += 1
+            self.metrics["objects_removed"] += removed
+            return removed
+
+    def status(self):
+        """
+        Describe the repository. Blocking: walks the objects.
+
+        Returns:
+            dict: Its path, object count and size, the servers with snapshots and the counters.
+        """
+        objects = size = 0
+        for directory, _, names in os.walk(self.objects):
+            for name in names:
+                objects += 1
+                size += os.path.getsize(os.path.join(directory, name))
+        servers = sorted(os.listdir(self.snapshots)) if os.path.isdir(self.snapshots) else []
+        return {"path": self.root, "objects": objects, "size": size, "servers": servers, "metrics": dict(self.metrics)}
+
+
+class BackupScheduler:
+    """
+    Start the scheduled backups of the servers when they are due.
+
+    The schedules (interval and number of snapshots to keep) live in the state store;
+    `on_backup(server_name)` runs the backup, through the job queue, and returns once it is done.
+    """
+
+    def __init__(self, store, on_backup, interval=BACKUP_SCHEDULE_INTERVAL):
+        self.store = store
+        self.on_backup = on_backup
+        self.interval = interval
+        self.metrics = {"scheduled": 0, "failures": 0}
+        self._running = set()
+        self._tasks = set()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _loop(self):
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                logger.warning("Looking for due backups failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def check(self):
+        """
+        Start the backups whose interval has elapsed since the last one.
+
+        Returns:
+            list: The names of the servers whose backup was started.
+        """
+        now = time.time()
+        due = [
+            schedule["server"] for schedule in self.store.backup_schedules()
+            if schedule["server"] not in self._running
+            and (schedule["last_at"] is None or now - schedule["last_at"] >= schedule["interval"])
+        ]
+        for server_name in due:
+            self._running.add(server_name)
+            task = asyncio.create_task(self._run(server_name))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return due
+
+    async def _run(self, server_name):
+        self.metrics["scheduled"] += 1
+        try:
+            await self.on_backup(server_name)
+        except Exception as e:
+            self.metrics["failures"] += 1
+            logger.warning("Scheduled backup of %s failed: %s", server_name, e)
+        finally:
+            # Même en échec : la prochaine tentative attend un intervalle complet
+            self.store.mark_backup(server_name, time.time())
+            self._running.discard(server_name)
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import math
+import os
+import time
+
+# Parallélisme par défaut des opérations groupées
+BATCH_PARALLELISM = 10
+# Attente maximale du retour d'un serveur créé ou redémarré avant de libérer sa place dans la fenêtre
+BATCH_READY_TIMEOUT = float(os.environ.get("MCDEPLOYER_BATCH_READY_TIMEOUT", "600"))
+
+
+def max_in_flight(total, parallelism, max_unavailable=None):
+    """
+    Compute how many servers a batch may process at once.
+
+    Args:
+        total (int): The number of servers in the batch.
+        parallelism (int): The requested parallelism.
+        max_unavailable (float): Optional percentage of the batch allowed to be down at once.
+
+    Returns:
+        int: The size of the rolling window, at least 1.
+    """
+    limit = parallelism
+    if max_unavailable is not None:
+        limit = min(limit, math.floor(total * max_unavailable / 100))
+    return max(1, limit)
+
+
+class Batch:
+    """
+    A fleet operation: one job per server, run through a rolling window.
+
+    At most `limit` servers are being processed at any time; as soon as one finishes, the
+    next one starts. With `settle(server_name)`, a server keeps its place in the window
+    after its job until settle returns: e.g. until a restarted server accepts players again,
+    so the window bounds the servers actually down. settle returns None, or the error that
+    fails the server. The batch keeps running if the client following it disconnects.
+    """
+
+    def __init__(self, kind, names, submit, limit, settle=None):
+        self.kind = kind
+        self.names = names
+        self.limit = limit
+        self._settle = settle
+        self.results = []
+        self.total = len(names)
+        self.started_at = time.time()
+        self.finished_at = None
+        self._submit = submit
+        self._changed = asyncio.Condition()
+        self._task = None
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    def start(self, failures=()):
+        """
+        Start the batch in the background.
+
+        Args:
+            failures (list): Results of servers rejected before starting (e.g. unknown names).
+
+        Returns:
+            asyncio.Task: The task running the batch.
+        """
+        self.results.extend(failures)
+        self.total = len(self.names) + len(self.results)
+        self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def _publish(self, result):
+        async with self._changed:
+            self.results.append(result)
+            self._changed.notify_all()
+
+    async def _one(self, window, name):
+        async with window:
+            job = self._submit(name)
+            await job.wait()
+            error = job.error
+            if error is None and self._settle is not None:
+                error = await self._settle(name)
+        await self._publish({
+            "server_name": name,
+            "job_id": job.id,
+            "status": job.status if error is None else "failed",
+            "result": job.result,
+            "error": error,
+        })
+
+    async def _run(self):
+        window = asyncio.Semaphore(self.limit)
+        await asyncio.gather(*(self._one(window, name) for name in self.names))
+        async with self._changed:
+            self.finished_at = time.time()
+            self._changed.notify_all()
+
+    def summary(self):
+        succeeded = sum(1 for result in self.results if result["status"] == "succeeded")
+        return {
+            "kind": self.kind,
+            "total": self.total,
+            "succeeded": succeeded,
+            "failed": len(self.results) - succeeded,
+            "max_in_flight": self.limit,
+            "elapsed_seconds": (self.finished_at or time.time()) - self.started_at,
+        }
+
+    async def stream(self):
+        """
+        Stream the per-server results as newline-delimited JSON, then a summary line.
+
+        Yields:
+            str: One JSON document per line.
+        """
+        sent = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: sent < len(self.results) or self.finished)
+            while sent < len(self.results):
+                yield json.dumps(self.results[sent]) + "\n"
+                sent += 1
+            if self.finished:
+                yield json.dumps({"summary": self.summary()}) + "\n"
+                return
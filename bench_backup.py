@@ -0,0 +1,83 @@
+"""
+Benchmark : deuxième sauvegarde d'un monde presque inchangé.
+
+Un monde de --regions fichiers de région de 1024 chunks est sauvegardé une première fois,
+puis --changed % des chunks de --touched % des régions sont modifiés (comme après une
+session de jeu) et le monde est sauvegardé de nouveau. Le benchmark compare la durée et
+les octets écrits des deux sauvegardes à une copie complète du dossier.
+
+Usage : python bench_backup.py [--regions 16] [--touched 25] [--changed 2]
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from backups import SECTOR, BackupRepository
+
+CHUNKS = 1024
+
+
+def write_region(path, payloads, timestamps):
+    header, body = bytearray(2 * SECTOR), bytearray()
+    for index, payload in enumerate(payloads):
+        record = (len(payload) + 1).to_bytes(4, "big") + b"\x02" + payload
+        sectors = -(-len(record) // SECTOR)
+        header[index * 4:index * 4 + 4] = (2 + len(body) // SECTOR).to_bytes(3, "big") + bytes([sectors])
+        header[SECTOR + index * 4:SECTOR + index * 4 + 4] = timestamps[index].to_bytes(4, "big")
+        body += record.ljust(sectors * SECTOR, b"\0")
+    with open(path, "wb") as f:
+        f.write(header + body)
+
+
+def tree_size(root):
+    return sum(os.path.getsize(os.path.join(directory, name)) for directory, _, names in os.walk(root) for name in names)
+
+
+def main(regions, touched, changed):
+    root = tempfile.mkdtemp(prefix="mcdeployer-bench-")
+    data_dir = os.path.join(root, "bench_backup")
+    region_dir = os.path.join(data_dir, "world", "region")
+    os.makedirs(region_dir)
+    rng = random.Random(0)
+    # Données de chunk déjà compressées par le serveur : incompressibles
+    worlds = {}
+    for i in range(regions):
+        payloads = [rng.randbytes(rng.randint(1500, 6000)) for _ in range(CHUNKS)]
+        timestamps = [1_700_000_000] * CHUNKS
+        worlds[f"r.{i}.0.mca"] = (payloads, timestamps)
+        write_region(os.path.join(region_dir, f"r.{i}.0.mca"), payloads, timestamps)
+    size = tree_size(data_dir)
+
+    start = time.perf_counter()
+    shutil.copytree(data_dir, os.path.join(root, "copy"))
+    copy_elapsed = time.perf_counter() - start
+
+    repository = BackupRepository(os.path.join(root, ".backups"), bandwidth=0)
+    first = repository.create("bench_backup", data_dir)
+
+    for name in rng.sample(sorted(worlds), max(1, regions * touched // 100)):
+        payloads, timestamps = worlds[name]
+        for index in rng.sample(range(CHUNKS), CHUNKS * changed // 100):
+            payloads[index] = rng.randbytes(len(payloads[index]))
+            timestamps[index] += 600
+        write_region(os.path.join(region_dir, name), payloads, timestamps)
+    second = repository.create("bench_backup", data_dir)
+    shutil.rmtree(root)
+
+    print(f"monde : {regions} régions, {size / 1024 ** 2:.1f} Mio")
+    print(f"copie complète     {copy_elapsed:6.2f} s  {size / 1024 ** 2:8.2f} Mio écrits")
+    for label, snapshot in (("1re sauvegarde", first), ("2e sauvegarde", second)):
+        print(f"{label:<18} {snapshot['duration']:6.2f} s  {snapshot['bytes_written'] / 1024 ** 2:8.2f} Mio écrits"
+              f"  ({snapshot['files_read']} fichiers lus, {snapshot['pieces_written']} morceaux écrits)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--regions", type=int, default=16)
+    parser.add_argument("--touched", type=int, default=25)
+    parser.add_argument("--changed", type=int, default=2)
+    args = parser.parse_args()
+    main(args.regions, args.touched, args.changed)
@@ -0,0 +1,65 @@
+"""
+Benchmark : redémarrage de 100 serveurs, appels séquentiels contre /servers/batch/restart.
+
+Le démon Docker est simulé (voir fake_docker.py) : chaque redémarrage dure --op-delay
+secondes. L'approche séquentielle enchaîne /restart-server/{name} et attend chaque tâche ;
+l'opération groupée traite les serveurs dans une fenêtre glissante limitée par
+--parallelism et --max-unavailable (pourcentage de la flotte arrêtée en même temps).
+
+Usage : python bench_batch.py [--servers 100] [--op-delay 0.2] [--parallelism 20] [--max-unavailable 10]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from fake_docker import load_api, wait_for_job
+
+
+async def sequential(http, names):
+    start = time.perf_counter()
+    for name in names:
+        response = await http.post(f"/restart-server/{name}")
+        await wait_for_job(http, response.json()["job_id"])
+    return time.perf_counter() - start
+
+
+async def batched(http, names, parallelism, max_unavailable):
+    start = time.perf_counter()
+    summary = None
+    body = {"names": names, "parallelism": parallelism, "max_unavailable": max_unavailable}
+    async with http.stream("POST", "/servers/batch/restart", json=body) as response:
+        async for line in response.aiter_lines():
+            if line:
+                summary = json.loads(line).get("summary", summary)
+    return time.perf_counter() - start, summary
+
+
+async def main(servers, op_delay, parallelism, max_unavailable):
+    api, fake = load_api(op_delay)
+    names = [f"bench_fleet_{i}" for i in range(servers)]
+    for i, name in enumerate(names):
+        fake.containers.add(name, 30000 + i)
+
+    transport = httpx.ASGITransport(app=api.app)
+    async with api.lifespan(api.app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600.0) as http:
+        sequential_seconds = await sequential(http, names)
+        batch_seconds, summary = await batched(http, names, parallelism, max_unavailable)
+
+    print(f"{servers} redémarrages ({op_delay:.2f} s chacun)")
+    print(f"séquentiel                  {sequential_seconds:7.2f} s")
+    print(f"groupé (fenêtre de {summary['max_in_flight']:>3})    {batch_seconds:7.2f} s  "
+          f"x{sequential_seconds / batch_seconds:.1f}, {summary['failed']} échec(s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", type=int, default=100)
+    parser.add_argument("--op-delay", type=float, default=0.2)
+    parser.add_argument("--parallelism", type=int, default=20)
+    parser.add_argument("--max-unavailable", type=float, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.servers, args.op_delay, args.parallelism, args.max_unavailable))
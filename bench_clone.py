@@ -0,0 +1,62 @@
+"""
+Benchmark : dossiers de --clones serveurs créés depuis un modèle.
+
+Le modèle contient un monde de --regions fichiers de région de --region-size Mio et
+--jars Mio de jars et bibliothèques. Le benchmark compare une copie complète par serveur
+(shutil.copytree) à clone_tree, qui clone les fichiers du monde par reflink quand le
+système de fichiers le permet (btrfs, XFS) et lie les jars ; il affiche la durée et les
+octets réellement écrits. Lancer le benchmark sur le système de fichiers de ServerData
+(--dir) : sur ext4, le monde est copié et seuls les jars sont partagés.
+
+Usage : python bench_clone.py [--clones 10] [--regions 32] [--region-size 4] [--jars 64] [--dir /tmp]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from templates import clone_tree
+
+
+def main(clones, regions, region_size, jars, directory):
+    root = tempfile.mkdtemp(prefix="mcdeployer-bench-", dir=directory)
+    template = os.path.join(root, "template")
+    os.makedirs(os.path.join(template, "world", "region"))
+    os.makedirs(os.path.join(template, "libraries"))
+    for i in range(regions):
+        with open(os.path.join(template, "world", "region", f"r.{i}.0.mca"), "wb") as f:
+            f.write(os.urandom(region_size * 1024 ** 2))
+    for i in range(jars):
+        with open(os.path.join(template, "libraries", f"lib-{i}.jar"), "wb") as f:
+            f.write(os.urandom(1024 ** 2))
+    size = (regions * region_size + jars) * 1024 ** 2
+
+    start = time.perf_counter()
+    for i in range(clones):
+        shutil.copytree(template, os.path.join(root, f"copy-{i}"))
+    copy_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    totals = {"reflinked": 0, "linked": 0, "copied": 0, "bytes_copied": 0}
+    for i in range(clones):
+        for key, value in clone_tree(template, os.path.join(root, f"clone-{i}")).items():
+            totals[key] += value
+    clone_elapsed = time.perf_counter() - start
+    shutil.rmtree(root)
+
+    print(f"modèle : {regions} régions, {jars} jars, {size / 1024 ** 2:.0f} Mio ; {clones} serveurs")
+    print(f"copytree     {copy_elapsed:6.2f} s  {clones * size / 1024 ** 2:9.1f} Mio écrits")
+    print(f"clone_tree   {clone_elapsed:6.2f} s  {totals['bytes_copied'] / 1024 ** 2:9.1f} Mio écrits"
+          f"  ({totals['reflinked']} reflinks, {totals['linked']} liens, {totals['copied']} copies)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clones", type=int, default=10)
+    parser.add_argument("--regions", type=int, default=32)
+    parser.add_argument("--region-size", type=int, default=4)
+    parser.add_argument("--jars", type=int, default=64)
+    parser.add_argument("--dir", default=None)
+    args = parser.parse_args()
+    main(args.clones, args.regions, args.region_size, args.jars, args.dir)
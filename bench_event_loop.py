@@ -0,0 +1,78 @@
+"""
+Benchmark : latence de /list-servers/ pendant 20 arrêts/créations simultanés.
+
+Le démon Docker est remplacé par un client factice dont stop() et run() dorment
+comme le ferait un vrai démon (arrêt de la JVM, pull d'image). On mesure la latence
+de /list-servers/ au repos puis pendant la rafale : avec les appels Docker hors de la
+boucle asyncio, les deux séries doivent rester du même ordre de grandeur.
+
+Usage : python bench_event_loop.py [--ops 20] [--op-delay 1.0]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from fake_docker import load_api, wait_for_job
+
+
+async def measure_list(http, done):
+    latencies = []
+    while not done.is_set():
+        start = time.perf_counter()
+        response = await http.get("/list-servers/")
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.01)
+    return latencies
+
+
+def summarize(label, latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{label:<28} n={len(latencies):<5} p50={statistics.median(latencies):7.2f} ms  "
+          f"p99={p99:7.2f} ms  max={latencies[-1]:7.2f} ms")
+
+
+async def main(ops, op_delay):
+    api, fake = load_api(op_delay)
+    for i in range(ops):
+        fake.containers.add(f"bench_stop_{i}", 30000 + i)
+
+    transport = httpx.ASGITransport(app=api.app)
+    async with api.lifespan(api.app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60.0) as http:
+        idle_done = asyncio.Event()
+        asyncio.get_running_loop().call_later(1.0, idle_done.set)
+        idle = await measure_list(http, idle_done)
+
+        half = ops // 2
+        burst = [http.post(f"/stop-server/bench_stop_{i}") for i in range(half)]
+        burst += [
+            http.post("/create-server/", json={"server_name": f"bench_create_{i}", "port": 31000 + i})
+            for i in range(ops - half)
+        ]
+        start = time.perf_counter()
+        responses = await asyncio.gather(*burst)
+        burst_done = asyncio.Event()
+        measuring = asyncio.create_task(measure_list(http, burst_done))
+        jobs = [await wait_for_job(http, r.json()["job_id"]) for r in responses]
+        elapsed = time.perf_counter() - start
+        burst_done.set()
+        loaded = await measuring
+
+    failed = [job for job in jobs if job["status"] != "succeeded"]
+    print(f"{ops} opérations concurrentes ({op_delay:.1f} s chacune) terminées en {elapsed:.2f} s, "
+          f"{len(failed)} échec(s)")
+    summarize("list-servers au repos", idle)
+    summarize("list-servers sous charge", loaded)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=20)
+    parser.add_argument("--op-delay", type=float, default=1.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.ops, args.op_delay))
@@ -0,0 +1,68 @@
+"""
+Benchmark : sondage Server List Ping de 500 serveurs.
+
+Chaque serveur est simulé par un écouteur TCP local qui répond au statut et au ping
+après --delay secondes, comme un serveur Minecraft chargé. Le sondeur les interroge
+tous depuis la boucle asyncio, --concurrency à la fois, sans thread par serveur.
+
+Usage : python bench_probe.py [--servers 500] [--delay 0.05] [--concurrency 256]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from inventory import ServerInventory
+from probe import GameProber, _packet, _read_packet, _string
+
+
+def status_handler(delay):
+    async def handle(reader, writer):
+        try:
+            await _read_packet(reader)  # handshake
+            await _read_packet(reader)  # demande de statut
+            await asyncio.sleep(delay)
+            status = {"version": {"name": "1.20.4", "protocol": 765}, "players": {"online": 3, "max": 20}}
+            writer.write(_packet(0x00, _string(json.dumps(status))))
+            _, payload = await _read_packet(reader)
+            writer.write(_packet(0x01, payload))
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+    return handle
+
+
+async def main(servers, delay, concurrency):
+    inventory = ServerInventory()
+    listeners = []
+    for i in range(servers):
+        listener = await asyncio.start_server(status_handler(delay), "127.0.0.1", 0)
+        listeners.append(listener)
+        port = listener.sockets[0].getsockname()[1]
+        inventory.upsert(f"bench_probe_{i}", id=str(i), status="running", port=port)
+
+    prober = GameProber(inventory, lambda name: None, concurrency=concurrency)
+    try:
+        start = time.perf_counter()
+        probed = await prober.probe_all()
+        elapsed = time.perf_counter() - start
+    finally:
+        for listener in listeners:
+            listener.close()
+
+    servers_list = inventory.list()
+    ready = sum(1 for server in servers_list if server["ready"])
+    latencies = sorted(server["latency_ms"] for server in servers_list if server["latency_ms"] is not None)
+    print(f"{probed} serveurs sondés en {elapsed:.2f} s (réponse en {delay * 1000:.0f} ms, {concurrency} à la fois)")
+    print(f"{ready} prêts, latence p50={latencies[len(latencies) // 2]:.2f} ms max={latencies[-1]:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", type=int, default=500)
+    parser.add_argument("--delay", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=256)
+    args = parser.parse_args()
+    asyncio.run(main(args.servers, args.delay, args.concurrency))
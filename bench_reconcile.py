@@ -0,0 +1,61 @@
+"""
+Benchmark : retour de 300 serveurs après un redémarrage de l'hôte.
+
+Tous les conteneurs sont arrêtés et leur état voulu est "running". Le réconciliateur les
+redémarre par vagues de --batch séparées de --wave-delay secondes ; chaque démarrage
+simulé dure --start secondes. Le benchmark affiche le nombre de démarrages simultanés au
+pic et le temps total, à comparer avec --batch 300 (tout en même temps).
+
+Usage : python bench_reconcile.py [--servers 300] [--batch 10] [--wave-delay 0.1] [--start 0.05]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from fake_docker import FakeDockerClient
+from inventory import ServerInventory
+from nodes import Node, NodeRegistry
+from reconciler import Reconciler
+from store import StateStore
+
+
+async def main(servers, batch, wave_delay, start):
+    store = StateStore()
+    store.open(os.path.join(tempfile.mkdtemp(prefix="mcdeployer-bench-"), ".mcdeployer.db"))
+    inventory = ServerInventory()
+    for i in range(servers):
+        name = f"bench_reconcile_{i}"
+        store.put_server(name, {"server_name": name}, desired_status="running")
+        inventory.upsert(name, id=str(i), node="local", status="exited")
+    node = Node("local", FakeDockerClient(0), inventory)
+    node.events.connected = True
+    starting, peak = set(), [0]
+
+    async def apply(action, server_name):
+        starting.add(server_name)
+        peak[0] = max(peak[0], len(starting))
+        await asyncio.sleep(start)
+        inventory.upsert(server_name, status="running")
+        starting.discard(server_name)
+
+    reconciler = Reconciler(store, inventory, NodeRegistry({"local": node}, inventory), apply,
+                            batch=batch, wave_delay=wave_delay)
+    begin = time.perf_counter()
+    applied = await reconciler.reconcile()
+    elapsed = time.perf_counter() - begin
+    store.close()
+
+    print(f"{applied} serveurs redémarrés en {elapsed:.2f} s, {reconciler.metrics['waves']} vagues de {batch}")
+    print(f"démarrages simultanés au pic : {peak[0]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", type=int, default=300)
+    parser.add_argument("--batch", type=int, default=10)
+    parser.add_argument("--wave-delay", type=float, default=0.1)
+    parser.add_argument("--start", type=float, default=0.05)
+    args = parser.parse_args()
+    asyncio.run(main(args.servers, args.batch, args.wave_delay, args.start))
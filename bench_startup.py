@@ -0,0 +1,70 @@
+"""
+Benchmark : démarrage à froid de l'API.
+
+Chaque essai lance un nouvel interpréteur qui importe api.py, exécute le démarrage du
+lifespan puis sert une première requête GET /healthz, et mesure chaque étape. Le démon
+Docker visé (--docker-host) peut être injoignable : l'import ne le contacte pas, et le
+démarrage ne fait que journaliser l'échec de connexion. C'est ce que paie chaque worker
+uvicorn supplémentaire.
+
+Usage : python bench_startup.py [--runs 5] [--docker-host tcp://127.0.0.1:1]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Exécuté dans un dossier temporaire : ServerData et la base d'état n'y laissent pas de trace
+TRIAL = """
+import asyncio, json, time
+begin = time.perf_counter()
+import api
+imported = time.perf_counter()
+client_at_import = api.client.initialized
+import httpx
+
+async def main():
+    async with api.lifespan(api.app):
+        started = time.perf_counter()
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+            health = (await http.get("/healthz")).json()
+        served = time.perf_counter()
+    return started, served, health
+
+started, served, health = asyncio.run(main())
+print(json.dumps({
+    "import": imported - begin, "lifespan": started - imported, "healthz": served - started,
+    "client_at_import": client_at_import, "status": health["status"],
+}))
+"""
+
+
+def trial(docker_host):
+    with tempfile.TemporaryDirectory(prefix="mcdeployer-bench-") as directory:
+        env = dict(os.environ, DOCKER_HOST=docker_host, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)),
+                   MCDEPLOYER_RECONCILE_INTERVAL="0")
+        output = subprocess.run(
+            [sys.executable, "-c", TRIAL], cwd=directory, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(runs, docker_host):
+    results = [trial(docker_host) for _ in range(runs)]
+    print(f"{runs} démarrages, DOCKER_HOST={docker_host}, statut : {results[-1]['status']}, "
+          f"client Docker créé à l'import : {any(result['client_at_import'] for result in results)}")
+    for step, label in (("import", "import de api.py"), ("lifespan", "démarrage du lifespan"), ("healthz", "1re requête /healthz")):
+        values = [result[step] * 1000 for result in results]
+        print(f"{label:<24} médiane {statistics.median(values):8.1f} ms  max {max(values):8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--docker-host", default="tcp://127.0.0.1:1")
+    args = parser.parse_args()
+    main(args.runs, args.docker_host)
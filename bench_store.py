@@ -0,0 +1,58 @@
+"""
+Benchmark : lectures et écritures du store d'état SQLite avec 1000 serveurs.
+
+Le store est créé dans un dossier temporaire, rempli de --servers définitions complètes
+(configuration, ports, nœud) et de --events événements d'historique par serveur, puis
+chaque opération faite par les routes est chronométrée sur la boucle, une à la fois.
+
+Usage : python bench_store.py [--servers 1000] [--events 20] [--reads 10000]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from store import StateStore
+
+
+def summarize(label, latencies):
+    latencies = sorted(latency * 1000 for latency in latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{label:<24} n={len(latencies):<6} p50={statistics.median(latencies):6.3f} ms  "
+          f"p99={p99:6.3f} ms  max={latencies[-1]:6.3f} ms")
+
+
+def timed(operation, *args):
+    start = time.perf_counter()
+    operation(*args)
+    return time.perf_counter() - start
+
+
+def main(servers, events, reads):
+    store = StateStore()
+    store.open(os.path.join(tempfile.mkdtemp(prefix="mcdeployer-bench-"), ".mcdeployer.db"))
+    names = [f"bench_store_{i}" for i in range(servers)]
+    spec = {"version": "latest", "type": "PAPER", "memory": "2G", "eula": "true", "labels": {"tier": "lobby"}}
+    writes = []
+    for i, name in enumerate(names):
+        ports = {"port": 25565 + i, "rcon_port": 35565 + i, "query_port": 36565 + i}
+        writes.append(timed(store.put_server, name, dict(spec, server_name=name), ports, f"node{i % 4}", f"{i:064x}"))
+    records = [timed(store.record, name, "status", "running") for _ in range(events) for name in names]
+
+    summarize("put_server", writes)
+    summarize("record", records)
+    summarize("get_server", [timed(store.get_server, random.choice(names)) for _ in range(reads)])
+    summarize("history (100)", [timed(store.history, random.choice(names)) for _ in range(reads // 10)])
+    summarize("list_servers (noeud)", [timed(store.list_servers, "node1") for _ in range(100)])
+    store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--reads", type=int, default=10000)
+    args = parser.parse_args()
+    main(args.servers, args.events, args.reads)
@@ -0,0 +1,21 @@
+import os
+
+import pytest
+
+from store import StateStore
+
+
+def write(path, data=b"data"):
+    """ Fichier de test, avec ses dossiers parents """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+@pytest.fixture
+def store(tmp_path):
+    """ Store d'état ouvert dans un dossier temporaire, qui garde cinq événements par serveur """
+    store = StateStore(history=5)
+    store.open(os.path.join(tmp_path, ".mcdeployer.db"))
+    yield store
+    store.close()
@@ -0,0 +1,222 @@
+import asyncio
+import codecs
+import hmac
+import logging
+import os
+import ssl
+from collections import deque
+
+from logs import LogSubscription
+
+logger = logging.getLogger(__name__)
+
+# Sortie console gardée par serveur pour les clients qui arrivent en cours de route
+CONSOLE_REPLAY = int(os.environ.get("MCDEPLOYER_CONSOLE_REPLAY", str(64 * 1024)))
+# Morceaux de sortie en attente par client ; au-delà, les plus anciens sont abandonnés
+CONSOLE_BUFFER = int(os.environ.get("MCDEPLOYER_CONSOLE_BUFFER", "1000"))
+# Jeton donnant le droit d'écrire sur la console ; sans jeton, la console est en lecture seule
+CONSOLE_TOKEN = os.environ.get("MCDEPLOYER_CONSOLE_TOKEN", "")
+
+READ_SIZE = 4096
+
+
+def can_write(token, expected=CONSOLE_TOKEN):
+    """
+    Check whether a console client may send input.
+
+    Args:
+        token (str): The token given by the client, if any.
+        expected (str): The configured token; writing is disabled when it is empty.
+
+    Returns:
+        bool: True if the token matches the configured one.
+    """
+    return bool(expected) and bool(token) and hmac.compare_digest(token, expected)
+
+
+class _ConsoleSession:
+    """
+    One attachment to the stdin/stdout of a container, shared by all its viewers.
+    """
+
+    def __init__(self, server_name, container_id, sock, replay, buffer):
+        self.server_name = server_name
+        self.container_id = container_id
+        # Socket brut sous le wrapper de docker-py
+        self.sock = getattr(sock, "_sock", sock)
+        self.viewers = set()
+        self.replay = deque()
+        self.replay_size = 0
+        self.replay_limit = replay
+        self.buffer = buffer
+        self.closed = False
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._write_lock = asyncio.Lock()
+        self._task = None
+
+    def start(self, on_closed):
+        self._task = asyncio.create_task(self._pump(on_closed))
+
+    async def _recv(self):
+        loop = asyncio.get_running_loop()
+        if isinstance(self.sock, ssl.SSLSocket):
+            # Démon distant en TLS : la lecture non bloquante n'est pas possible sur ce socket
+            return await asyncio.to_thread(self.sock.recv, READ_SIZE)
+        return await loop.sock_recv(self.sock, READ_SIZE)
+
+    async def _pump(self, on_closed):
+        if not isinstance(self.sock, ssl.SSLSocket):
+            self.sock.setblocking(False)
+        try:
+            while True:
+                data = await self._recv()
+                if not data:
+                    break
+                self._publish(self._decoder.decode(data))
+        except OSError as e:
+            if not self.closed:
+                logger.info("Console of %s detached: %s", self.server_name, e)
+        finally:
+            self.close()
+            on_closed(self)
+
+    def _publish(self, text):
+        if not text:
+            return
+        self.replay.append(text)
+        self.replay_size += len(text)
+        while self.replay_size > self.replay_limit and len(self.replay) > 1:
+            self.replay_size -= len(self.replay.popleft())
+        for viewer in list(self.viewers):
+            viewer.push(text)
+
+    def subscribe(self):
+        subscription = LogSubscription(self.buffer)
+        for text in self.replay:
+            subscription.push(text)
+        self.viewers.add(subscription)
+        return subscription
+
+    async def write(self, data):
+        # Une seule écriture à la fois : les saisies de plusieurs administrateurs ne s'entremêlent pas
+        async with self._write_lock:
+            if self.closed:
+                raise ConnectionError(f"Console of {self.server_name} is detached")
+            if isinstance(self.sock, ssl.SSLSocket):
+                await asyncio.to_thread(self.sock.sendall, data.encode("utf-8"))
+            else:
+                await asyncio.get_running_loop().sock_sendall(self.sock, data.encode("utf-8"))
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        for viewer in list(self.viewers):
+            viewer.close()
+
+
+class ConsoleHub:
+    """
+    Multiplexer of container consoles for WebSocket viewers.
+
+    A server has at most one attached Docker socket, opened for its first viewer and closed
+    when its last viewer leaves or the container stops. Output is read on the asyncio loop
+    and fanned out to a bounded queue per viewer, after the replay buffer of the most recent
+    output; input from authorized writers goes through a lock so lines are never interleaved.
+    """
+
+    def __init__(self, client, docker_exec, replay=CONSOLE_REPLAY, buffer=CONSOLE_BUFFER):
+        self.client = client
+        self.docker_exec = docker_exec
+        self.replay = replay
+        self.buffer = buffer
+        self._sessions = {}
+        self._opening = {}
+
+    def _attach_socket(self, client, container_id):
+        return client.api.attach_socket(
+            container_id, params={"stdin": 1, "stdout": 1, "stderr": 1, "stream": 1}
+        )
+
+    async def _open(self, server_name, container_id, node):
+        # Le socket est ouvert avec le client et les créneaux "read" du nœud du serveur
+        client = node.client if node is not None else self.client
+        docker_exec = node.docker_exec if node is not None else self.docker_exec
+        sock = await docker_exec.run("read", self._attach_socket, client, container_id)
+        session = _ConsoleSession(server_name, container_id, sock, self.replay, self.buffer)
+        session.start(self._closed)
+        self._sessions[server_name] = session
+        return session
+
+    def _closed(self, session):
+        if self._sessions.get(session.server_name) is session:
+            del self._sessions[session.server_name]
+
+    async def attach(self, server_name, container_id, node=None):
+        """
+        Add a viewer to the console of a server, attaching to the container if needed.
+
+        Args:
+            server_name (str): The name of the server.
+            container_id (str): The id of its container.
+            node (Node): The node of the server; the default client and executor if not set.
+
+        Returns:
+            LogSubscription: The queue of output chunks of the viewer, starting with the
+                replay buffer; None marks the end of the console.
+        """
+        session = self._sessions.get(server_name)
+        if session is not None and (session.closed or session.container_id != container_id):
+            session.close()
+            session = None
+        if session is None:
+            # Un seul attachement même si plusieurs clients arrivent en même temps
+            opening = self._opening.get(server_name)
+            if opening is None:
+                opening = self._opening[server_name] = asyncio.ensure_future(self._open(server_name, container_id, node))
+                opening.add_done_callback(lambda _: self._opening.pop(server_name, None))
+            session = await asyncio.shield(opening)
+        return session.subscribe()
+
+    def detach(self, server_name, subscription):
+        session = self._sessions.get(server_name)
+        if session is None:
+            return
+        session.viewers.discard(subscription)
+        if not session.viewers:
+            session.close()
+            self._closed(session)
+
+    async def write(self, server_name, data):
+        """
+        Send input to the console of a server.
+
+        Args:
+            server_name (str): The name of the server.
+            data (str): The input, e.g. "say hello\\n".
+
+        Raises:
+            ConnectionError: If the console is not attached.
+        """
+        session = self._sessions.get(server_name)
+        if session is None:
+            raise ConnectionError(f"Console of {server_name} is detached")
+        await session.write(data)
+
+    def close(self, server_name):
+        session = self._sessions.pop(server_name, None)
+        if session is not None:
+            session.close()
+
+    def stop(self):
+        for server_name in list(self._sessions):
+            self.close(server_name)
+
+    def status(self):
+        return {name: {"viewers": len(session.viewers)} for name, session in self._sessions.items()}
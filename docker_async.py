@@ -0,0 +1,99 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# Nombre maximal d'appels Docker simultanés par type d'opération.
+# Chaque limite peut être surchargée via MCDEPLOYER_DOCKER_LIMIT_<OPERATION>.
+DEFAULT_OPERATION_LIMITS = {
+    "read": 16,
+    "create": 4,
+    "stop": 8,
+    "restart": 8,
+    "delete": 4,
+    "pull": 2,
+    # Lecture de l'historique des logs
+    "logs": 8,
+    # Attente qu'un serveur préchauffé devienne joignable : longue, surtout passive
+    "joinable": 16,
+    # Mesure du temps avant qu'un serveur créé soit joignable : jamais aux dépens du préchauffage
+    "measure": 32,
+    # Entrées/sorties disque lourdes (hachage, liens des artefacts partagés)
+    "io": 2,
+    # Relevés périodiques des statistiques des conteneurs
+    "stats": 4,
+    # Sauvegardes et restaurations des mondes, longues et bornées en débit
+    "backup": 1,
+    # Nettoyage de la corbeille, long et borné en débit : ne prend jamais les créneaux "io"
+    "trash": 1,
+}
+
+
+def load_operation_limits():
+    """
+    Build the per-operation concurrency limits from the defaults and the environment.
+
+    Returns:
+        dict: The maximum number of concurrent calls allowed for each operation.
+    """
+    limits = {}
+    for operation, default in DEFAULT_OPERATION_LIMITS.items():
+        value = os.environ.get(f"MCDEPLOYER_DOCKER_LIMIT_{operation.upper()}")
+        limits[operation] = max(1, int(value)) if value else default
+    return limits
+
+
+class DockerExecutor:
+    """
+    Run blocking docker-py calls on a bounded thread pool so the asyncio loop stays responsive.
+
+    Every call is tagged with an operation name ("read", "create", "stop", ...). Each operation
+    has its own semaphore, and the pool is sized to the sum of the limits, so a burst of slow
+    stops or creates can never take the threads needed to answer reads.
+    """
+
+    def __init__(self, limits=None):
+        self.limits = dict(load_operation_limits(), **(limits or {}))
+        self._executor = ThreadPoolExecutor(
+            max_workers=sum(self.limits.values()),
+            thread_name_prefix="docker",
+        )
+        self._semaphores = {}
+
+    def _semaphore(self, operation):
+        if operation not in self.limits:
+            raise ValueError(f"Unknown Docker operation: {operation}")
+        semaphore = self._semaphores.get(operation)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.limits[operation])
+            self._semaphores[operation] = semaphore
+        return semaphore
+
+    async def run(self, operation, func, *args, **kwargs):
+        """
+        Run a blocking Docker call in the thread pool.
+
+        Args:
+            operation (str): The operation class used to pick the concurrency limit.
+            func (callable): The blocking docker-py callable.
+            *args: Positional arguments passed to func.
+            **kwargs: Keyword arguments passed to func.
+
+        Returns:
+            Any: Whatever func returns.
+
+        Raises:
+            Exception: Any exception raised by func is re-raised in the caller.
+        """
+        async with self._semaphore(operation):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    def shutdown(self, wait=True):
+        """
+        Stop the thread pool.
+
+        Args:
+            wait (bool): Whether to wait for the running calls to finish.
+        """
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
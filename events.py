@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+
+from inventory import MANAGED_FILTER
+
+logger = logging.getLogger(__name__)
+
+# Délais de reconnexion au flux d'événements (backoff exponentiel avec jitter)
+EVENTS_BACKOFF_INITIAL = float(os.environ.get("MCDEPLOYER_EVENTS_BACKOFF_INITIAL", "1"))
+EVENTS_BACKOFF_MAX = float(os.environ.get("MCDEPLOYER_EVENTS_BACKOFF_MAX", "30"))
+
+
+class EventWatcher:
+    """
+    Background subsystem keeping the server inventory in sync with the Docker daemon.
+
+    A dedicated thread lists the managed containers, then follows the Docker events stream
+    filtered on the MCDeployer label. When the stream drops, it waits with exponential backoff,
+    lists the containers again (events may have been missed) and resubscribes.
+    Every update is handed to the asyncio loop, which owns the inventory. With several nodes,
+    each one has its own watcher and only replaces its own entries. After each full listing
+    (the first one, then each one following a reconnection), `on_sync(node)` is called on
+    the loop, once the inventory holds every container of the node.
+    """
+
+    def __init__(self, client, inventory, node=None, backoff_initial=EVENTS_BACKOFF_INITIAL,
+                 backoff_max=EVENTS_BACKOFF_MAX):
+        self.client = client
+        self.inventory = inventory
+        self.node = node
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.connected = False
+        self.reconnects = 0
+        self._loop = None
+        self._stream = None
+        self._stopped = threading.Event()
+        self._thread = None
+        self._first_sync = None
+        self.on_sync = None
+
+    async def start(self, timeout=10.0):
+        """
+        Start the watcher thread and wait for the first inventory sync.
+
+        If the daemon cannot be reached within the timeout, the API starts anyway with an
+        empty inventory and the watcher keeps retrying in the background.
+
+        Args:
+            timeout (float): How long to wait for the first sync, in seconds.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._first_sync = asyncio.Event()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name=f"docker-events-{self.node}" if self.node else "docker-events", daemon=True)
+        self._thread.start()
+        try:
+            await asyncio.wait_for(self._first_sync.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Docker daemon unreachable, starting with an empty inventory")
+
+    async def stop(self):
+        """
+        Stop following events and wait for the watcher thread to exit.
+        """
+        self._stopped.set()
+        stream = self._stream
+        if stream is not None:
+            stream.close()
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join, 5)
+            self._thread = None
+
+    def _sync(self):
+        summaries = self.client.api.containers(all=True, filters=MANAGED_FILTER)
+        self._loop.call_soon_threadsafe(self.inventory.replace, summaries, self.node)
+        self._loop.call_soon_threadsafe(self._synced)
+
+    def _synced(self):
+        self._first_sync.set()
+        if self.on_sync is not None:
+            try:
+                self.on_sync(self.node)
+            except Exception as e:
+                logger.warning("Handling the sync of node %s failed: %s", self.node, e)
+
+    def _run(self):
+        delay = self.backoff_initial
+        while not self._stopped.is_set():
+            try:
+                # Abonnement avant la resynchronisation : aucun événement n'est perdu entre les deux
+                self._stream = self.client.events(decode=True, filters=dict(MANAGED_FILTER, type="container"))
+                self._sync()
+                self.connected = True
+                delay = self.backoff_initial
+                for event in self._stream:
+                    self._loop.call_soon_threadsafe(self.inventory.apply_event, event, self.node)
+                if not self._stopped.is_set():
+                    logger.warning("Docker events stream closed by the daemon")
+            except Exception as e:
+                if self._stopped.is_set():
+                    break
+                logger.warning("Docker events stream failed: %s", e)
+            finally:
+                self.connected = False
+                if self._stream is not None:
+                    self._stream.close()
+                    self._stream = None
+            if self._stopped.wait(delay * random.uniform(0.5, 1.0)):
+                break
+            self.reconnects += 1
+            delay = min(delay * 2, self.backoff_max)
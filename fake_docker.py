@@ -0,0 +1,172 @@
+"""
+Client Docker factice utilisé par les benchmarks.
+
+Les opérations lentes (run, stop, restart) dorment `op_delay` secondes, comme le ferait
+un vrai démon, ce qui permet de mesurer le comportement de l'API sans Docker.
+"""
+import asyncio
+import tempfile
+import threading
+import time
+import uuid
+
+import docker
+
+
+class FakeContainer:
+    def __init__(self, name, port, op_delay, labels=None):
+        self.id = uuid.uuid4().hex
+        self.short_id = self.id[:12]
+        self.name = name
+        self.status = "running"
+        self.labels = dict(labels or {"mcdeployer.managed": "true", "mcdeployer.server": name})
+        self.labels.setdefault("mcdeployer.port", str(port))
+        self.attrs = {"HostConfig": {"PortBindings": {"25565/tcp": [{"HostPort": str(port)}]}}, "Config": {"Env": []}}
+        self._op_delay = op_delay
+        self._on_remove = lambda container: None
+
+    def stop(self):
+        time.sleep(self._op_delay)
+        self.status = "exited"
+
+    def restart(self):
+        time.sleep(self._op_delay)
+        self.status = "running"
+
+    def start(self):
+        self.restart()
+
+    def remove(self, v=False, force=False):
+        self._on_remove(self)
+
+    def update(self, **kwargs):
+        self.attrs["HostConfig"].update(kwargs)
+
+    def logs(self, **kwargs):
+        raise docker.errors.APIError("logs are not simulated")
+
+
+class FakeContainers:
+    def __init__(self, op_delay):
+        self._op_delay = op_delay
+        self._containers = {}
+
+    def add(self, name, port, labels=None):
+        container = FakeContainer(name, port, self._op_delay, labels)
+        container._on_remove = lambda removed: self._containers.pop(removed.name, None)
+        self._containers[name] = container
+        return container
+
+    def run(self, image, name, ports, labels=None, **kwargs):
+        time.sleep(self._op_delay)
+        return self.add(name, ports["25565/tcp"], labels)
+
+    def create(self, image, name, ports, labels=None, **kwargs):
+        if name in self._containers:
+            raise docker.errors.APIError(f"Conflict: the container name {name} is already in use")
+        container = self.add(name, ports["25565/tcp"], labels)
+        container.status = "created"
+        return container
+
+    def get(self, name):
+        try:
+            return self._containers[name]
+        except KeyError:
+            raise docker.errors.NotFound(name)
+
+    def list(self, all=False, filters=None):
+        if filters:
+            return []
+        return list(self._containers.values())
+
+
+class FakeEvents:
+    def __init__(self):
+        self._closed = threading.Event()
+
+    def __iter__(self):
+        self._closed.wait()
+        return iter(())
+
+    def close(self):
+        self._closed.set()
+
+
+class FakeAPI:
+    def __init__(self, containers):
+        self._containers = containers
+
+    def containers(self, all=False, filters=None):
+        return [
+            {
+                "Id": c.id,
+                "Names": [f"/{c.name}"],
+                "State": c.status,
+                "Labels": c.labels,
+                "Ports": [],
+            }
+            for c in self._containers.list(all=all)
+        ]
+
+    def inspect_container(self, container_id):
+        return {"Id": container_id, "Config": {"Env": ["MEMORY=1G"]}}
+
+    def stats(self, container_id, stream=True, one_shot=None):
+        return {
+            "cpu_stats": {"cpu_usage": {"total_usage": int(time.time() * 1e8)}, "system_cpu_usage": int(time.time() * 1e9), "online_cpus": 4},
+            "memory_stats": {"usage": 512 * 1024 * 1024, "limit": 8 * 1024 ** 3},
+            "networks": {"eth0": {"rx_bytes": 0, "tx_bytes": 0}},
+        }
+
+
+class FakeImage:
+    tags = ["itzg/minecraft-server:latest"]
+    attrs = {"Size": 0}
+
+
+class FakeImages:
+    def list(self, name=None):
+        return [FakeImage()]
+
+
+class FakeDockerClient:
+    def __init__(self, op_delay, memory=1024 ** 4):
+        self.containers = FakeContainers(op_delay)
+        self.api = FakeAPI(self.containers)
+        self.images = FakeImages()
+        self.memory = memory
+
+    def info(self):
+        return {"MemTotal": self.memory, "NCPU": 64}
+
+    def events(self, **kwargs):
+        return FakeEvents()
+
+    def close(self):
+        pass
+
+
+def load_api(op_delay):
+    """
+    Import api.py against a fake Docker client, with a temporary ServerData directory.
+
+    Args:
+        op_delay (float): How long the slow Docker operations take, in seconds.
+
+    Returns:
+        tuple: The api module and the fake client.
+    """
+    fake = FakeDockerClient(op_delay)
+    docker.from_env = lambda **kwargs: fake
+    import api
+
+    api.SERVER_DATA_DIR = tempfile.mkdtemp(prefix="mcdeployer-bench-")
+    return api, fake
+
+
+async def wait_for_job(http, job_id):
+    while True:
+        job = (await http.get(f"/jobs/{job_id}")).json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        await asyncio.sleep(0.05)
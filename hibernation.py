@@ -0,0 +1,328 @@
+import asyncio
+import json
+import logging
+import os
+import struct
+import time
+
+from inventory import MANAGED_LABEL, SERVER_LABEL
+from probe import ProbeError, _packet, _read_packet, _string, decode_varint
+
+logger = logging.getLogger(__name__)
+
+# Durée sans joueur (en secondes) avant qu'un serveur soit mis en veille ; 0 la désactive.
+# Chaque serveur peut la surcharger avec hibernate_after à la création.
+HIBERNATE_AFTER = int(os.environ.get("MCDEPLOYER_HIBERNATE_AFTER", "0"))
+# Intervalle entre deux recherches de serveurs inactifs
+HIBERNATE_INTERVAL = float(os.environ.get("MCDEPLOYER_HIBERNATE_INTERVAL", "30"))
+# Adresse de l'hôte sur laquelle les serveurs en veille écoutent
+HIBERNATE_BIND = os.environ.get("MCDEPLOYER_HIBERNATE_BIND", "0.0.0.0")
+HIBERNATE_MOTD = os.environ.get("MCDEPLOYER_HIBERNATE_MOTD", "Sleeping - join to start the server")
+STARTING_MOTD = os.environ.get("MCDEPLOYER_STARTING_MOTD", "Starting, reconnect in a few seconds")
+
+HIBERNATE_LABEL = "mcdeployer.hibernate_after"
+MARKER_FILE = ".mcdeployer-hibernated"
+# Délai maximal d'un échange avec un client sur un serveur en veille
+CLIENT_TIMEOUT = 5.0
+
+
+def parse_handshake(data):
+    """
+    Decode the payload of a handshake packet.
+
+    Args:
+        data (bytes): The payload, after the packet id.
+
+    Returns:
+        tuple: The protocol version of the client and the next state (1 status, 2 login).
+    """
+    protocol, offset = decode_varint(data)
+    length, offset = decode_varint(data, offset)
+    offset += length + 2  # adresse et port demandés par le client
+    next_state, _ = decode_varint(data, offset)
+    return protocol, next_state
+
+
+class _SleepingServer:
+    """
+    The lightweight listener standing in for a hibernated server on its game port.
+    """
+
+    def __init__(self, hibernator, server_name, port):
+        self.hibernator = hibernator
+        self.server_name = server_name
+        self.port = port
+        self.since = time.time()
+        self.waking = False
+        self.server = None
+
+    async def start(self, host):
+        self.server = await asyncio.start_server(self._handle, host, self.port)
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    def _status(self, protocol):
+        return {
+            # Même version que le client pour que la liste des serveurs ne l'affiche pas incompatible
+            "version": {"name": "Hibernating", "protocol": protocol},
+            "players": {"online": 0, "max": 0},
+            "description": {"text": STARTING_MOTD if self.waking else HIBERNATE_MOTD},
+        }
+
+    async def _exchange(self, reader, writer):
+        packet_id, data = await _read_packet(reader)
+        if packet_id != 0x00:
+            return
+        protocol, next_state = parse_handshake(data)
+        if next_state == 1:
+            await _read_packet(reader)  # demande de statut
+            writer.write(_packet(0x00, _string(json.dumps(self._status(protocol)))))
+            await writer.drain()
+            packet_id, payload = await _read_packet(reader)
+            if packet_id == 0x01:
+                writer.write(_packet(0x01, payload))
+                await writer.drain()
+        else:
+            # Tentative de connexion d'un joueur : le serveur est réveillé, le client reconnectera
+            self.hibernator.wake(self.server_name)
+            writer.write(_packet(0x00, _string(json.dumps({"text": STARTING_MOTD}))))
+            await writer.drain()
+
+    async def _handle(self, reader, writer):
+        try:
+            await asyncio.wait_for(self._exchange(reader, writer), CLIENT_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ProbeError,
+                IndexError, struct.error):
+            pass
+        finally:
+            writer.close()
+
+
+class Hibernator:
+    """
+    Hibernation of idle servers and wake-on-connect.
+
+    A server whose players_online (written by the prober) stays at zero for its
+    `hibernate_after` seconds is stopped, which frees all its memory, and a small asyncio
+    listener takes over its game port. The listener answers server list pings with a
+    "sleeping" MOTD without starting anything; the first login attempt disconnects the
+    player with a "starting" message and starts the container again. Stopping and starting
+    go through `on_sleep` and `on_wake`, coroutines supplied by the API that run the
+    corresponding jobs. A marker file in the data directory keeps hibernated servers
+    listening across API restarts. The listener runs in the API process, so only the
+    servers of `node`, the node sharing the host of the API, are hibernated.
+    """
+
+    def __init__(self, inventory, docker_exec, data_root, on_sleep=None, on_wake=None,
+                 default_after=HIBERNATE_AFTER, interval=HIBERNATE_INTERVAL, host=HIBERNATE_BIND, node=None):
+        self.inventory = inventory
+        self.node = node
+        self.docker_exec = docker_exec
+        self.data_root = data_root
+        self.on_sleep = on_sleep
+        self.on_wake = on_wake
+        self.default_after = default_after
+        self.interval = interval
+        self.host = host
+        self.metrics = {"hibernations": 0, "wakes": 0, "failures": 0}
+        self._policies = {}
+        self._idle_since = {}
+        self._sleeping = {}
+        self._pending = set()
+        self._tasks = set()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        # Les marqueurs restent : les serveurs en veille écouteront de nouveau au prochain démarrage
+        for sleeping in list(self._sleeping.values()):
+            await sleeping.close()
+        self._sleeping.clear()
+
+    def configure(self, server_name, after):
+        """
+        Set the idle time after which a server hibernates.
+
+        Args:
+            server_name (str): The name of the server.
+            after (int): Seconds without players; None for the default, 0 to never hibernate.
+        """
+        if after is None:
+            self._policies.pop(server_name, None)
+        else:
+            self._policies[server_name] = after
+
+    def after(self, server_name):
+        return self._policies.get(server_name, self.default_after)
+
+    def forget(self, server_name):
+        self._policies.pop(server_name, None)
+        self._idle_since.pop(server_name, None)
+
+    def _marker(self, server_name):
+        return os.path.join(self.data_root, server_name, MARKER_FILE)
+
+    def _mark(self, server_name, hibernated):
+        path = self._marker(server_name)
+        if hibernated:
+            with open(path, "w") as f:
+                f.write(str(time.time()))
+        elif os.path.exists(path):
+            os.remove(path)
+
+    async def rebuild(self, summaries):
+        """
+        Reload the policies from the container labels and listen again for hibernated servers.
+
+        Args:
+            summaries (list): The container summaries returned by the low-level list endpoint.
+        """
+        for summary in summaries:
+            labels = summary.get("Labels") or {}
+            if labels.get(MANAGED_LABEL) != "true":
+                continue
+            server_name = labels.get(SERVER_LABEL) or summary["Names"][0].lstrip("/")
+            if labels.get(HIBERNATE_LABEL):
+                self._policies[server_name] = int(labels[HIBERNATE_LABEL])
+            if summary["State"] != "running" and os.path.exists(self._marker(server_name)):
+                server = self.inventory.get(server_name)
+                if server and server["port"]:
+                    try:
+                        await self.sleep(server_name, server["port"])
+                    except OSError as e:
+                        logger.warning("Could not listen for hibernated server %s: %s", server_name, e)
+
+    def is_hibernated(self, server_name):
+        return server_name in self._sleeping
+
+    def port(self, server_name):
+        sleeping = self._sleeping.get(server_name)
+        return sleeping.port if sleeping else None
+
+    async def sleep(self, server_name, port):
+        """
+        Listen on the game port of a stopped server, waking it up on the first login.
+
+        Args:
+            server_name (str): The name of the server.
+            port (int): Its game port on the host.
+
+        Raises:
+            OSError: If the port cannot be bound.
+        """
+        if server_name in self._sleeping:
+            return
+        sleeping = _SleepingServer(self, server_name, port)
+        await sleeping.start(self.host)
+        self._sleeping[server_name] = sleeping
+        self._idle_since.pop(server_name, None)
+        await self.docker_exec.run("io", self._mark, server_name, True)
+        self.metrics["hibernations"] += 1
+
+    async def release(self, server_name):
+        """
+        Stop listening for a hibernated server so its container can bind the port again.
+
+        Args:
+            server_name (str): The name of the server.
+
+        Returns:
+            bool: Whether the server was hibernated.
+        """
+        sleeping = self._sleeping.pop(server_name, None)
+        if sleeping is None:
+            return False
+        await sleeping.close()
+        await self.docker_exec.run("io", self._mark, server_name, False)
+        return True
+
+    def wake(self, server_name):
+        """
+        Start a hibernated server again, in the background.
+
+        Args:
+            server_name (str): The name of the server.
+        """
+        sleeping = self._sleeping.get(server_name)
+        if sleeping is None or sleeping.waking or self.on_wake is None:
+            return
+        sleeping.waking = True
+        self.metrics["wakes"] += 1
+        self._spawn(server_name, self.on_wake)
+
+    def _spawn(self, server_name, action):
+        async def run():
+            try:
+                await action(server_name)
+            except Exception as e:
+                self.metrics["failures"] += 1
+                logger.warning("Hibernation of %s failed: %s", server_name, e)
+                sleeping = self._sleeping.get(server_name)
+                if sleeping is not None:
+                    sleeping.waking = False
+            finally:
+                self._pending.discard(server_name)
+
+        self._pending.add(server_name)
+        task = asyncio.create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _loop(self):
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                logger.warning("Looking for idle servers failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def check(self):
+        """
+        Hibernate the running servers that have had no players for long enough.
+
+        Returns:
+            list: The names of the servers put to sleep.
+        """
+        now = time.monotonic()
+        idle = []
+        for server in self.inventory.list():
+            server_name = server["name"]
+            after = self.after(server_name)
+            # Un serveur qui démarre (ready faux) ou dont le nombre de joueurs est inconnu n'est pas inactif
+            if (not after or server["node"] not in (None, self.node) or server["status"] != "running"
+                    or not server["ready"] or server["players_online"] != 0 or server_name in self._pending):
+                self._idle_since.pop(server_name, None)
+                continue
+            since = self._idle_since.setdefault(server_name, now)
+            if now - since >= after:
+                idle.append(server_name)
+        if self.on_sleep is not None:
+            for server_name in idle:
+                self._idle_since.pop(server_name, None)
+                self._spawn(server_name, self.on_sleep)
+        return idle
+
+    def status(self):
+        return {
+            "default_after_seconds": self.default_after,
+            "interval_seconds": self.interval,
+            "metrics": dict(self.metrics),
+            "hibernated": {
+                name: {"port": sleeping.port, "since": sleeping.since, "waking": sleeping.waking}
+                for name, sleeping in self._sleeping.items()
+            },
+            "idle": {name: time.monotonic() - since for name, since in self._idle_since.items()},
+        }
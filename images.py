@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import os
+import time
+
+import docker
+
+logger = logging.getLogger(__name__)
+
+IMAGE_REPOSITORY = "itzg/minecraft-server"
+# Tags téléchargés au démarrage de l'API, séparés par des virgules (ex: "latest,java17")
+PREPULL_TAGS = [tag.strip() for tag in os.environ.get("MCDEPLOYER_PREPULL_TAGS", "").split(",") if tag.strip()]
+# Espace disque maximal occupé par les images du dépôt (0 = illimité)
+IMAGE_CACHE_BYTES = int(os.environ.get("MCDEPLOYER_IMAGE_CACHE_BYTES", "0"))
+
+
+class ImagePull:
+    """
+    Progress of one image pull, aggregated over its layers.
+    """
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.status = "pulling"
+        self.started_at = time.time()
+        self.finished_at = None
+        self.error = None
+        self.waiters = 0
+        self._layers = {}
+
+    def update(self, chunk):
+        detail = chunk.get("progressDetail") or {}
+        if chunk.get("id") and detail.get("total"):
+            self._layers[chunk["id"]] = (detail.get("current", 0), detail["total"])
+
+    @property
+    def current(self):
+        return sum(current for current, _ in self._layers.values())
+
+    @property
+    def total(self):
+        return sum(total for _, total in self._layers.values())
+
+    def to_dict(self):
+        return {
+            "tag": self.tag,
+            "status": self.status,
+            "current_bytes": self.current,
+            "total_bytes": self.total,
+            "waiters": self.waiters,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+class ImageManager:
+    """
+    Warm cache of itzg/minecraft-server images.
+
+    Images known to be present are tracked in memory, so a create on a cached tag does not
+    call the daemon. Concurrent requests for a missing tag share one pull. When the images
+    exceed the disk budget, the least recently used tags that no container uses are removed;
+    pre-pulled tags are never evicted.
+    """
+
+    def __init__(self, client, docker_exec, repository=IMAGE_REPOSITORY, prepull_tags=None,
+                 budget_bytes=IMAGE_CACHE_BYTES):
+        self.client = client
+        self.docker_exec = docker_exec
+        self.repository = repository
+        self.prepull_tags = list(PREPULL_TAGS if prepull_tags is None else prepull_tags)
+        self.budget_bytes = budget_bytes
+        # tag -> {"size": octets, "last_used": horodatage}
+        self._cached = {}
+        self._pulls = {}
+        self._tasks = {}
+        self._background = set()
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "deduplicated": 0,
+            "pulls": 0,
+            "pull_failures": 0,
+            "evictions": 0,
+            "evicted_bytes": 0,
+        }
+
+    def reference(self, tag):
+        return f"{self.repository}:{tag}"
+
+    def cached(self, tag):
+        return tag in self._cached
+
+    def _load(self):
+        cached = {}
+        for image in self.client.images.list(name=self.repository):
+            for reference in image.tags:
+                repository, _, tag = reference.rpartition(":")
+                if repository == self.repository:
+                    cached[tag] = {"size": image.attrs.get("Size", 0), "last_used": 0.0}
+        return cached
+
+    async def start(self):
+        """
+        Load the images already present and pre-pull the configured tags in the background.
+        """
+        try:
+            self._cached = await self.docker_exec.run("read", self._load)
+        except Exception as e:
+            # Démon injoignable au démarrage : le cache se remplit au fil des pulls
+            logger.warning("Could not list %s images: %s", self.repository, e)
+        self.prefetch(self.prepull_tags)
+
+    async def stop(self):
+        for task in self._background:
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+
+    def prefetch(self, tags, refresh=False):
+        """
+        Pull tags in the background.
+
+        Args:
+            tags (list): The tags to pull.
+            refresh (bool): Pull again even if the tag is already cached, to pick up a moved tag.
+
+        Returns:
+            dict: The state of each tag: "cached", "pulling" or "queued".
+        """
+        states = {}
+        for tag in tags:
+            if tag in self._pulls:
+                states[tag] = "pulling"
+            elif tag in self._cached and not refresh:
+                states[tag] = "cached"
+            else:
+                states[tag] = "queued"
+                task = asyncio.create_task(self.ensure(tag, refresh=refresh))
+                self._background.add(task)
+                task.add_done_callback(self._prefetch_done)
+        return states
+
+    def _prefetch_done(self, task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Image prefetch failed: %s", task.exception())
+
+    async def ensure(self, tag, refresh=False, on_progress=None):
+        """
+        Make sure an image tag is present, pulling it at most once at a time.
+
+        Args:
+            tag (str): The tag of the image.
+            refresh (bool): Pull again even if the tag is already cached.
+            on_progress (callable): Optional coroutine function receiving progress messages.
+
+        Returns:
+            str: The full image reference.
+
+        Raises:
+            docker.errors.ImageNotFound: If the tag does not exist in the registry.
+            docker.errors.APIError: If the pull fails.
+        """
+        if tag in self._cached and not refresh:
+            self.metrics["hits"] += 1
+            self._cached[tag]["last_used"] = time.time()
+            return self.reference(tag)
+        task = self._tasks.get(tag)
+        if task is None:
+            self.metrics["misses"] += 1
+            pull = self._pulls[tag] = ImagePull(tag)
+            task = self._tasks[tag] = asyncio.create_task(self._pull(pull))
+            task.add_done_callback(lambda _: self._tasks.pop(tag, None))
+        else:
+            self.metrics["deduplicated"] += 1
+            pull = self._pulls[tag]
+        pull.waiters += 1
+        if on_progress is not None:
+            await on_progress(f"Pulling image {self.reference(tag)}")
+        # asyncio.wait n'annule pas le pull partagé si l'appelant est annulé
+        while not task.done():
+            await asyncio.wait({task}, timeout=2.0)
+            if not task.done() and on_progress is not None and pull.total:
+                await on_progress(f"Pulling image {self.reference(tag)}: {pull.current * 100 // pull.total}%")
+        task.result()
+        if tag in self._cached:
+            self._cached[tag]["last_used"] = time.time()
+        return self.reference(tag)
+
+    def _pull_blocking(self, pull):
+        try:
+            stream = self.client.api.pull(self.repository, tag=pull.tag, stream=True, decode=True)
+        except docker.errors.NotFound as e:
+            raise docker.errors.ImageNotFound(str(e))
+        for chunk in stream:
+            if "error" in chunk:
+                message = chunk["error"]
+                if "not found" in message or "manifest unknown" in message:
+                    raise docker.errors.ImageNotFound(message)
+                raise docker.errors.APIError(message)
+            pull.update(chunk)
+        image = self.client.images.get(self.reference(pull.tag))
+        return image.attrs.get("Size", 0)
+
+    async def _pull(self, pull):
+        tag = pull.tag
+        self.metrics["pulls"] += 1
+        try:
+            size = await self.docker_exec.run("pull", self._pull_blocking, pull)
+            pull.status = "done"
+        except Exception as e:
+            pull.status = "failed"
+            pull.error = str(e)
+            self.metrics["pull_failures"] += 1
+            raise
+        finally:
+            pull.finished_at = time.time()
+            self._pulls.pop(tag, None)
+        self._cached[tag] = {"size": size, "last_used": time.time()}
+        await self._enforce_budget(keep=tag)
+
+    def _in_use(self, tag):
+        return bool(self.client.api.containers(all=True, filters={"ancestor": self.reference(tag)}))
+
+    def _remove(self, tag):
+        self.client.images.remove(self.reference(tag))
+
+    async def _enforce_budget(self, keep):
+        if not self.budget_bytes:
+            return
+        used = sum(entry["size"] for entry in self._cached.values())
+        candidates = sorted(
+            (tag for tag in self._cached if tag != keep and tag not in self.prepull_tags and tag not in self._tasks),
+            key=lambda tag: self._cached[tag]["last_used"],
+        )
+        for tag in candidates:
+            if used <= self.budget_bytes:
+                break
+            try:
+                if await self.docker_exec.run("read", self._in_use, tag):
+                    continue
+                await self.docker_exec.run("delete", self._remove, tag)
+            except docker.errors.APIError as e:
+                logger.info("Could not evict %s: %s", self.reference(tag), e)
+                continue
+            entry = self._cached.pop(tag)
+            used -= entry["size"]
+            self.metrics["evictions"] += 1
+            self.metrics["evicted_bytes"] += entry["size"]
+
+    def status(self):
+        """
+        Describe the cache, the running pulls and the metrics.
+
+        Returns:
+            dict: The cached tags, the pulls in progress and the hit/miss counters.
+        """
+        return {
+            "repository": self.repository,
+            "budget_bytes": self.budget_bytes,
+            "used_bytes": sum(entry["size"] for entry in self._cached.values()),
+            "images": [
+                {"tag": tag, "size": entry["size"], "last_used": entry["last_used"] or None,
+                 "pinned": tag in self.prepull_tags}
+                for tag, entry in sorted(self._cached.items())
+            ],
+            "pulls": [pull.to_dict() for pull in self._pulls.values()],
+            "metrics": dict(self.metrics),
+        }
@@ -0,0 +1,259 @@
+import time
+from collections import deque
+
+# Labels posés par MCDeployer sur les conteneurs qu'il gère
+MANAGED_LABEL = "mcdeployer.managed"
+SERVER_LABEL = "mcdeployer.server"
+PORT_LABEL = "mcdeployer.port"
+MANAGED_FILTER = {"label": f"{MANAGED_LABEL}=true"}
+
+# État du jeu tenu par le sondeur (voir probe.GameProber), remis à zéro quand le conteneur s'arrête
+PROBE_FIELDS = {"ready": False, "players_online": None, "max_players": None, "latency_ms": None, "probed_at": None}
+
+# Statut d'un conteneur après chaque action du flux d'événements Docker
+EVENT_STATUS = {
+    "create": "created",
+    "start": "running",
+    "restart": "running",
+    "unpause": "running",
+    "pause": "paused",
+    "die": "exited",
+    "stop": "exited",
+    "kill": "exited",
+}
+
+
+def server_labels(server_name, port, labels=None):
+    """
+    Build the labels identifying a container managed by MCDeployer.
+
+    Args:
+        server_name (str): The name of the server.
+        port (int): The host port bound to the Minecraft port.
+        labels (dict): Optional user labels, used by batch selectors.
+
+    Returns:
+        dict: The container labels.
+    """
+    return dict(user_labels(labels), **{MANAGED_LABEL: "true", SERVER_LABEL: server_name, PORT_LABEL: str(port)})
+
+
+def user_labels(labels):
+    """
+    Keep the labels set by the user, without the MCDeployer ones.
+
+    Args:
+        labels (dict): Container labels.
+
+    Returns:
+        dict: The labels whose key does not start with "mcdeployer.".
+    """
+    return {key: value for key, value in (labels or {}).items() if not key.startswith("mcdeployer.")}
+
+
+def match_selector(labels, selector):
+    """
+    Check labels against a selector such as "tier=lobby,region=eu" or "canary".
+
+    Args:
+        labels (dict): The labels of a server.
+        selector (str): Comma separated "key=value" or "key" (presence) requirements.
+
+    Returns:
+        bool: True if every requirement is met.
+    """
+    for requirement in selector.split(","):
+        key, has_value, value = requirement.strip().partition("=")
+        if not key:
+            continue
+        if key not in labels or (has_value and labels[key] != value):
+            return False
+    return True
+
+
+def _summary_port(summary):
+    labels = summary.get("Labels") or {}
+    if labels.get(PORT_LABEL):
+        return int(labels[PORT_LABEL])
+    for binding in summary.get("Ports") or []:
+        if binding.get("PrivatePort") == 25565 and binding.get("PublicPort"):
+            return int(binding["PublicPort"])
+    return None
+
+
+def _summary_health(summary):
+    status = summary.get("Status") or ""
+    for health in ("healthy", "unhealthy", "health: starting"):
+        if f"({health})" in status:
+            return health.replace("health: ", "")
+    return None
+
+
+def _event_time(event):
+    if event.get("timeNano"):
+        return event["timeNano"] / 1e9
+    return float(event.get("time") or time.time())
+
+
+class ServerInventory:
+    """
+    In-memory state table of the Minecraft servers managed by MCDeployer.
+
+    Each entry holds the container status, its health, the last exit code, the number of
+    restarts observed, the time of the last status change and the game-level readiness and
+    player counts written by the prober. It is filled from a
+    label-filtered container listing, then updated incrementally from the Docker events
+    stream (see EventWatcher) and by the jobs themselves, so reads never hit the daemon.
+    All mutations happen on the asyncio loop; `on_transition` is called with the server
+    name, its new status and the time of every status change.
+    """
+
+    def __init__(self, on_transition=None):
+        self.on_transition = on_transition
+        self._servers = {}
+        # Identifiants des conteneurs supprimés, pour ignorer leurs événements tardifs
+        self._removed_ids = deque(maxlen=256)
+
+    def replace(self, summaries, node=None):
+        """
+        Replace the entries of a node with a fresh listing of its managed containers.
+
+        Restart counts and exit codes already known for a container are kept, and the
+        entries of the other nodes are left untouched.
+
+        Args:
+            summaries (list): The container summaries returned by the low-level list endpoint
+                with the MCDeployer label filter.
+            node (str): The name of the node the listing comes from.
+        """
+        servers = {name: server for name, server in self._servers.items() if server["node"] != node}
+        now = time.time()
+        for summary in summaries:
+            name = summary["Names"][0].lstrip("/")
+            previous = self._servers.get(name)
+            if previous and previous["id"] != summary["Id"]:
+                previous = None
+            status = summary["State"]
+            servers[name] = {
+                "name": name,
+                "id": summary["Id"],
+                "node": node,
+                "status": status,
+                "port": _summary_port(summary),
+                "labels": user_labels(summary.get("Labels")),
+                "health": _summary_health(summary),
+                "exit_code": previous["exit_code"] if previous else None,
+                "restart_count": previous["restart_count"] if previous else 0,
+                "last_transition": previous["last_transition"]
+                if previous and previous["status"] == status else summary.get("Created", now),
+            }
+            servers[name].update(
+                {field: previous[field] for field in PROBE_FIELDS}
+                if previous and status == "running" else PROBE_FIELDS
+            )
+        self._servers = servers
+
+    def get(self, server_name):
+        server = self._servers.get(server_name)
+        return dict(server) if server else None
+
+    def list(self):
+        return [dict(server) for server in self._servers.values()]
+
+    def select(self, selector):
+        """
+        List the names of the servers whose labels match a selector.
+
+        Args:
+            selector (str): See match_selector.
+
+        Returns:
+            list: The matching server names.
+        """
+        return [name for name, server in self._servers.items() if match_selector(server["labels"], selector)]
+
+    def upsert(self, server_name, **fields):
+        """
+        Create or update the entry of a server.
+
+        A change of status also updates last_transition.
+
+        Args:
+            server_name (str): The name of the server.
+            **fields: The fields to set (id, status, port, health, exit_code, ...).
+        """
+        server = self._servers.get(server_name)
+        if server is None:
+            server = self._servers[server_name] = {
+                "name": server_name,
+                "id": None,
+                "node": None,
+                "status": None,
+                "port": None,
+                "labels": {},
+                "health": None,
+                "exit_code": None,
+                "restart_count": 0,
+                "last_transition": None,
+                **PROBE_FIELDS,
+            }
+        if "status" in fields and fields["status"] != server["status"]:
+            server["last_transition"] = fields.pop("at", None) or time.time()
+            if self.on_transition is not None:
+                self.on_transition(server_name, fields["status"], server["last_transition"])
+        fields.pop("at", None)
+        server.update(fields)
+
+    def remove(self, server_name):
+        server = self._servers.pop(server_name, None)
+        if server and server["id"]:
+            self._removed_ids.append(server["id"])
+
+    def apply_event(self, event, node=None):
+        """
+        Update the table from one Docker container event.
+
+        Args:
+            event (dict): A decoded event from the Docker events stream.
+            node (str): The name of the node the event comes from.
+        """
+        action = event.get("Action") or event.get("status") or ""
+        attributes = event.get("Actor", {}).get("Attributes", {})
+        server_name = attributes.get("name")
+        if not server_name or event.get("id") in self._removed_ids:
+            return
+        at = _event_time(event)
+        if action == "destroy":
+            server = self._servers.get(server_name)
+            if server and server["id"] in (None, event.get("id")):
+                self.remove(server_name)
+            return
+        if action == "rename":
+            old_name = attributes.get("oldName", "").lstrip("/")
+            server = self._servers.pop(old_name, None)
+            if server:
+                server["name"] = server_name
+                self._servers[server_name] = server
+            return
+        if action.startswith("health_status"):
+            self.upsert(server_name, health=action.split(":", 1)[1].strip())
+            return
+        status = EVENT_STATUS.get(action)
+        if status is None:
+            return
+        server = self._servers.get(server_name)
+        fields = {"id": event.get("id"), "node": node, "status": status, "at": at}
+        if attributes.get(PORT_LABEL):
+            fields["port"] = int(attributes[PORT_LABEL])
+        if action == "create":
+            # Les attributs d'un événement mêlent les labels du conteneur et name/image
+            fields["labels"] = user_labels({k: v for k, v in attributes.items() if k not in ("name", "image")})
+        if action == "die":
+            fields["health"] = None
+            fields.update(PROBE_FIELDS)
+            if attributes.get("exitCode") is not None:
+                fields["exit_code"] = int(attributes["exitCode"])
+        if action == "start" and server and server["status"] == "exited" and server["id"] == event.get("id"):
+            # Redémarrage du même conteneur après un arrêt (politique de redémarrage ou API)
+            fields["restart_count"] = server["restart_count"] + 1
+        self.upsert(server_name, **fields)
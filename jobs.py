@@ -0,0 +1,239 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from fastapi import HTTPException
+
+# Les workers ne font qu'attendre : la concurrence réelle est bornée par DockerExecutor
+JOB_WORKERS = int(os.environ.get("MCDEPLOYER_JOB_WORKERS", "32"))
+# Nombre de tâches terminées conservées pour GET /jobs/{id}
+JOB_HISTORY = int(os.environ.get("MCDEPLOYER_JOB_HISTORY", "1000"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED_STATES = (SUCCEEDED, FAILED)
+
+
+class Job:
+    """
+    A server operation (create, stop, restart, delete, hibernate, wake, backup, restore,
+    template, clone) executed in the background.
+
+    The operation reports its progress through `progress()`; every state change is appended
+    to `events` and wakes up the clients following the job.
+    """
+
+    def __init__(self, kind, server_name, operation):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.server_name = server_name
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.events = []
+        self._operation = operation
+        self._changed = asyncio.Condition()
+        self._record(QUEUED, f"Server {server_name} {kind} queued")
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def _record(self, status, message):
+        self.events.append({"time": time.time(), "status": status, "message": message})
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def progress(self, message):
+        """
+        Publish a progress message for this job.
+
+        Args:
+            message (str): A human readable description of the current step.
+        """
+        self._record(self.status, message)
+        await self._notify()
+
+    async def _run(self):
+        self.status = RUNNING
+        self.started_at = time.time()
+        self._record(RUNNING, f"Server {self.server_name} {self.kind} started")
+        await self._notify()
+        try:
+            self.result = await self._operation(self)
+            self.status = SUCCEEDED
+            self._record(SUCCEEDED, f"Server {self.server_name} {self.kind} succeeded")
+        except HTTPException as e:
+            self.status = FAILED
+            self.error = {"status_code": e.status_code, "detail": e.detail}
+            self._record(FAILED, str(e.detail))
+        except Exception as e:
+            self.status = FAILED
+            self.error = {"status_code": 500, "detail": str(e)}
+            self._record(FAILED, str(e))
+        finally:
+            self.finished_at = time.time()
+            self._operation = None
+            await self._notify()
+
+    async def follow(self):
+        """
+        Iterate over the job events, replaying past ones, until the job is finished.
+
+        Yields:
+            dict: The job events in order.
+        """
+        sent = 0
+        while True:
+            async with self._changed:
+                if sent == len(self.events) and not self.finished:
+                    await self._changed.wait()
+            while sent < len(self.events):
+                yield self.events[sent]
+                sent += 1
+            if self.finished:
+                return
+
+    async def wait(self):
+        """
+        Wait until the job is finished.
+        """
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.finished)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "server_name": self.server_name,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+            "events": list(self.events),
+        }
+
+
+class JobManager:
+    """
+    Queue of server operations consumed by a bounded pool of asyncio workers.
+
+    Jobs targeting the same server run one after the other, in submission order. Workers
+    are dispatched per server: a worker takes the next job of a server with no job running,
+    so jobs waiting behind a busy server never hold a worker and never delay other servers.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, history=JOB_HISTORY):
+        self.workers = workers
+        self.history = history
+        self._jobs = OrderedDict()
+        self._queue = None
+        self._tasks = []
+        # serveur -> tâches en file, dans l'ordre de soumission
+        self._pending = {}
+        # serveur -> nombre de tâches en file ou en cours
+        self._unfinished = {}
+
+    def _ensure_started(self):
+        if self._tasks:
+            return
+        # Serveurs ayant des tâches en file et aucune en cours : chacun y figure au plus une fois
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def _worker(self):
+        while True:
+            server_name = await self._queue.get()
+            job = self._pending[server_name].popleft()
+            try:
+                await job._run()
+            finally:
+                self._unfinished[server_name] -= 1
+                if self._unfinished[server_name] == 0:
+                    del self._unfinished[server_name]
+                if self._pending[server_name]:
+                    # Remis en fin de file : les autres serveurs passent avant sa tâche suivante
+                    self._queue.put_nowait(server_name)
+                else:
+                    del self._pending[server_name]
+                self._queue.task_done()
+
+    def _evict(self):
+        if len(self._jobs) <= self.history:
+            return
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job_id]
+
+    def submit(self, kind, server_name, operation):
+        """
+        Queue an operation and return immediately.
+
+        Args:
+            kind (str): The operation name ("create", "stop", "restart", "delete", "hibernate",
+                "wake", "backup", "restore", "template" or "clone").
+            server_name (str): The server targeted by the operation.
+            operation (callable): An async callable taking the Job and returning its result.
+
+        Returns:
+            Job: The queued job.
+        """
+        self._ensure_started()
+        job = Job(kind, server_name, operation)
+        self._jobs[job.id] = job
+        self._unfinished[server_name] = self._unfinished.get(server_name, 0) + 1
+        self._evict()
+        if server_name in self._pending:
+            # Une tâche du serveur est déjà en file ou en cours : celle-ci sera prise après
+            self._pending[server_name].append(job)
+        else:
+            self._pending[server_name] = deque([job])
+            self._queue.put_nowait(server_name)
+        return job
+
+    def busy(self, server_name):
+        """
+        Tell whether an operation on a server is queued or running.
+
+        Args:
+            server_name (str): The name of the server.
+
+        Returns:
+            bool: Whether a job targeting the server is not finished yet.
+        """
+        return server_name in self._unfinished
+
+    def get(self, job_id):
+        """
+        Look up a job by id.
+
+        Args:
+            job_id (str): The job id returned by submit.
+
+        Returns:
+            Job: The job, or None if it is unknown or was evicted.
+        """
+        return self._jobs.get(job_id)
+
+    def list(self):
+        return list(self._jobs.values())
+
+    async def stop(self):
+        """
+        Cancel the workers. Jobs still queued are dropped.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Nombre maximal de serveurs dont les logs sont suivis en même temps (un thread chacun)
+LOG_FOLLOWERS = int(os.environ.get("MCDEPLOYER_LOG_FOLLOWERS", "64"))
+# Lignes en attente par client ; au-delà, les plus anciennes sont abandonnées
+LOG_BUFFER = int(os.environ.get("MCDEPLOYER_LOG_BUFFER", "1000"))
+
+# "[12:34:56] [Server thread/INFO]: ..." ou "[12:34:56 WARN]: ..." (Paper)
+LEVEL_PATTERN = re.compile(r"^(?:\[[^\]]*\] )?\[[^\]]*?(?:/| )(TRACE|DEBUG|INFO|WARN|WARNING|ERROR|FATAL)\]")
+LEVELS = {"TRACE": 0, "DEBUG": 1, "INFO": 2, "WARN": 3, "WARNING": 3, "ERROR": 4, "FATAL": 5}
+
+
+class FollowersExhausted(Exception):
+    """
+    Too many servers already have their logs followed.
+    """
+
+
+def parse_timestamp(value):
+    """
+    Parse the RFC 3339 timestamp Docker puts in front of each log line.
+
+    Args:
+        value (str): The timestamp, with nanoseconds.
+
+    Returns:
+        float: The POSIX time.
+    """
+    date, _, fraction = value.rstrip("Z").partition(".")
+    moment = datetime.strptime(date, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+    return moment + float(f"0.{fraction}") if fraction else moment
+
+
+def split_line(raw):
+    """
+    Split a timestamped log line.
+
+    Args:
+        raw (str): "<timestamp> <line>" as returned with timestamps=True.
+
+    Returns:
+        tuple: The raw timestamp and the line.
+    """
+    timestamp, _, line = raw.partition(" ")
+    return timestamp, line.rstrip("\r")
+
+
+def line_level(line):
+    match = LEVEL_PATTERN.match(line)
+    return match.group(1) if match else None
+
+
+class LogFilter:
+    """
+    Server-side filter of one viewer: regular expression and minimum level.
+
+    Lines without a level (stack traces, multi-line messages) follow the decision taken for
+    the last line that had one.
+    """
+
+    def __init__(self, grep=None, level=None):
+        self.pattern = re.compile(grep) if grep else None
+        if level is not None and level.upper() not in LEVELS:
+            raise ValueError(f"Unknown log level {level}")
+        self.level = LEVELS[level.upper()] if level else None
+        self._keep_continuation = True
+
+    def __call__(self, line):
+        if self.level is not None:
+            level = line_level(line)
+            if level is not None:
+                self._keep_continuation = LEVELS[level] >= self.level
+            if not self._keep_continuation:
+                return False
+        return self.pattern is None or self.pattern.search(line) is not None
+
+
+class LogSubscription:
+    """
+    The bounded queue of lines of one viewer.
+
+    When the viewer reads slower than the server logs, the oldest lines are dropped and
+    counted, so a slow client never pins memory nor slows down the other viewers.
+    """
+
+    def __init__(self, size=LOG_BUFFER):
+        self.queue = asyncio.Queue(maxsize=size)
+        self.dropped = 0
+        self.closed = False
+
+    def push(self, item):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(item)
+
+    def close(self):
+        self.closed = True
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class _Follower:
+    """
+    One thread following the log stream of one container and fanning it out to viewers.
+    """
+
+    def __init__(self, hub, server_name, container):
+        self.hub = hub
+        self.server_name = server_name
+        self.container = container
+        self.subscriptions = set()
+        self.stream = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"logs-{server_name}", daemon=True)
+
+    def _publish(self, lines):
+        for subscription in list(self.subscriptions):
+            for line in lines:
+                subscription.push(line)
+
+    def _finish(self):
+        for subscription in list(self.subscriptions):
+            subscription.close()
+        self.hub._remove(self)
+
+    def _run(self):
+        loop = self.hub.loop
+        pending = b""
+        try:
+            self.stream = self.container.logs(stream=True, follow=True, timestamps=True, since=int(time.time()))
+            if self.stopped.is_set():
+                return
+            for chunk in self.stream:
+                pending += chunk
+                *complete, pending = pending.split(b"\n")
+                if complete:
+                    lines = [split_line(line.decode(errors="replace")) for line in complete]
+                    loop.call_soon_threadsafe(self._publish, lines)
+        except Exception as e:
+            if not self.stopped.is_set():
+                logger.info("Log stream of %s ended: %s", self.server_name, e)
+        finally:
+            if self.stream is not None:
+                self.stream.close()
+            if not self.stopped.is_set():
+                loop.call_soon_threadsafe(self._finish)
+
+    def stop(self):
+        self.stopped.set()
+        if self.stream is not None:
+            self.stream.close()
+
+
+class LogHub:
+    """
+    Fan-out of container log streams to any number of viewers.
+
+    A server is followed by a single thread, started for its first viewer and stopped
+    when its last viewer leaves; every viewer gets its own bounded queue and filter on the
+    asyncio loop. The number of threads is bounded by the number of servers being watched,
+    never by the number of viewers.
+    """
+
+    def __init__(self, max_followers=LOG_FOLLOWERS, buffer=LOG_BUFFER):
+        self.max_followers = max_followers
+        self.buffer = buffer
+        self.loop = None
+        self._followers = {}
+
+    def subscribe(self, server_name, container):
+        """
+        Attach a viewer to the live logs of a server.
+
+        Args:
+            server_name (str): The name of the server.
+            container (Container): The docker-py container of the server.
+
+        Returns:
+            LogSubscription: The queue of (timestamp, line) tuples of the viewer; None marks
+                the end of the stream.
+
+        Raises:
+            FollowersExhausted: If too many servers are already followed.
+        """
+        self.loop = asyncio.get_running_loop()
+        follower = self._followers.get(server_name)
+        if follower is not None and follower.container.id != container.id:
+            # Conteneur recréé sous le même nom
+            follower.stop()
+            self._remove(follower)
+            follower = None
+        if follower is None:
+            if len(self._followers) >= self.max_followers:
+                raise FollowersExhausted(f"Logs of {self.max_followers} servers are already followed")
+            follower = self._followers[server_name] = _Follower(self, server_name, container)
+            follower.thread.start()
+        subscription = LogSubscription(self.buffer)
+        follower.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, server_name, subscription):
+        follower = self._followers.get(server_name)
+        if follower is None:
+            return
+        follower.subscriptions.discard(subscription)
+        if not follower.subscriptions:
+            follower.stop()
+            self._remove(follower)
+
+    def _remove(self, follower):
+        if self._followers.get(follower.server_name) is follower:
+            del self._followers[follower.server_name]
+
+    def close(self, server_name):
+        """
+        End the streams of a server, e.g. when it is deleted.
+
+        Args:
+            server_name (str): The name of the server.
+        """
+        follower = self._followers.get(server_name)
+        if follower is not None:
+            follower.stop()
+            follower._finish()
+
+    def stop(self):
+        for follower in list(self._followers.values()):
+            follower.stop()
+            follower._finish()
+
+    def status(self):
+        return {
+            "followed": {name: len(follower.subscriptions) for name, follower in self._followers.items()},
+            "max_followers": self.max_followers,
+        }
+
+
+def read_history(container, tail=None, since=None, until=None):
+    """
+    Read past log lines of a container. Blocking: run it through the "logs" operation.
+
+    Args:
+        container (Container): The docker-py container.
+        tail (int): Only the last lines.
+        since (float): Only lines after this POSIX time.
+        until (float): Only lines before this POSIX time.
+
+    Returns:
+        list: (timestamp, line) tuples.
+    """
+    kwargs = {"timestamps": True, "tail": tail if tail is not None else "all"}
+    if since is not None:
+        kwargs["since"] = since
+    if until is not None:
+        kwargs["until"] = until
+    output = container.logs(**kwargs).decode(errors="replace")
+    return [split_line(line) for line in output.splitlines() if line]
@@ -0,0 +1,516 @@
+import asyncio
+import logging
+import os
+import threading
+from functools import partial
+from urllib.parse import urlparse
+
+import docker
+
+from docker_async import DockerExecutor
+from events import EventWatcher
+from images import ImageManager
+from inventory import MANAGED_LABEL, SERVER_LABEL
+from stats import parse_memory
+
+logger = logging.getLogger(__name__)
+
+# Démons Docker gérés, "nom=url" séparés par des virgules
+# (ex: "a=unix:///var/run/docker.sock,b=tcp://10.0.0.2:2376").
+# Vide : un seul nœud "local", configuré par l'environnement Docker habituel (DOCKER_HOST, ...)
+NODES = os.environ.get("MCDEPLOYER_NODES", "")
+# Connexions HTTP gardées ouvertes vers chaque démon
+NODE_POOL_SIZE = int(os.environ.get("MCDEPLOYER_NODE_POOL_SIZE", "32"))
+# Délai maximal (en secondes) d'un appel à un démon
+DOCKER_TIMEOUT = float(os.environ.get("MCDEPLOYER_DOCKER_TIMEOUT", "60"))
+# Version de l'API Docker ; "auto" la demande au démon à la création du client
+DOCKER_API_VERSION = os.environ.get("MCDEPLOYER_DOCKER_API_VERSION", "auto")
+# Mémoire réservable sur un nœud, en multiple de sa mémoire physique (au-delà de 1 : surengagement)
+NODE_OVERCOMMIT = float(os.environ.get("MCDEPLOYER_NODE_OVERCOMMIT", "1.0"))
+# CPU réservables sur un nœud, en multiple de ses cœurs
+CPU_OVERCOMMIT = float(os.environ.get("MCDEPLOYER_CPU_OVERCOMMIT", "2.0"))
+# Mémoire hors tas de la JVM (metaspace, piles, code compilé, tampons réseau) ajoutée à la limite
+# du conteneur : une fraction du tas, avec un minimum
+JVM_OVERHEAD = float(os.environ.get("MCDEPLOYER_JVM_OVERHEAD", "0.25"))
+JVM_OVERHEAD_MIN = os.environ.get("MCDEPLOYER_JVM_OVERHEAD_MIN", "256M")
+# CPU d'un serveur qui n'en précise pas ; 0 : pas de limite
+DEFAULT_CPUS = float(os.environ.get("MCDEPLOYER_DEFAULT_CPUS", "0"))
+# Nombre maximal de processus et threads par conteneur
+PIDS_LIMIT = int(os.environ.get("MCDEPLOYER_PIDS_LIMIT", "1024"))
+# Attente maximale (en secondes) de capacité libre avant de refuser une création ; 0 : refus immédiat
+CAPACITY_WAIT = float(os.environ.get("MCDEPLOYER_CAPACITY_WAIT", "0"))
+
+DEFAULT_NODE = "local"
+NODE_LABEL = "mcdeployer.node"
+MEMORY_LABEL = "mcdeployer.memory"
+CPUS_LABEL = "mcdeployer.cpus"
+# Mémoire d'un serveur qui ne précise ni memory ni max_memory (défaut de l'image itzg)
+DEFAULT_SERVER_MEMORY = "1G"
+
+
+class NoCapacity(Exception):
+    """
+    No node has enough free memory for the server.
+    """
+
+
+class UnknownNode(Exception):
+    """
+    The requested node is not registered.
+    """
+
+
+def parse_nodes(value):
+    """
+    Parse the MCDEPLOYER_NODES setting.
+
+    Args:
+        value (str): Comma separated "name=url" entries.
+
+    Returns:
+        dict: The Docker endpoint URL of each node, in the configured order.
+
+    Raises:
+        ValueError: If an entry has no name or no URL.
+    """
+    nodes = {}
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        name, _, url = entry.strip().partition("=")
+        if not name or not url:
+            raise ValueError(f"Invalid node entry: {entry}")
+        nodes[name] = url
+    return nodes
+
+
+def node_host(url):
+    """
+    Find the address the published ports of a node are reachable on.
+
+    Args:
+        url (str): The Docker endpoint of the node; None for the local environment.
+
+    Returns:
+        str: The host name of a TCP or SSH endpoint, 127.0.0.1 for a local socket.
+    """
+    parsed = urlparse(url or "")
+    if parsed.scheme in ("tcp", "http", "https", "ssh") and parsed.hostname:
+        return parsed.hostname
+    return "127.0.0.1"
+
+
+def server_memory(config_memory, config_max_memory=None):
+    return parse_memory(config_max_memory or config_memory or DEFAULT_SERVER_MEMORY)
+
+
+def container_memory(heap, overhead=JVM_OVERHEAD, overhead_min=JVM_OVERHEAD_MIN):
+    """
+    Size the memory limit of a container from the heap of its JVM.
+
+    Args:
+        heap (int): The maximum heap, in bytes.
+        overhead (float): The off-heap memory, as a fraction of the heap.
+        overhead_min (str): The minimum off-heap memory, e.g. "256M".
+
+    Returns:
+        int: The memory limit of the container, in bytes.
+    """
+    return heap + max(int(heap * overhead), parse_memory(overhead_min) or 0)
+
+
+def resource_limits(memory, cpus=None, pids_limit=PIDS_LIMIT):
+    """
+    Build the cgroup limits of a server container.
+
+    Args:
+        memory (int): The memory limit, in bytes; swap is not allowed beyond it.
+        cpus (float): The CPUs the container may use; None or 0 for no limit.
+        pids_limit (int): The maximum number of processes and threads.
+
+    Returns:
+        dict: The keyword arguments for containers.run.
+    """
+    limits = {"mem_limit": memory, "memswap_limit": memory, "pids_limit": pids_limit}
+    if cpus:
+        limits["nano_cpus"] = int(cpus * 1e9)
+    return limits
+
+
+def _on_event_loop():
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+class LazyDockerClient:
+    """
+    A pooled docker-py client created on first use.
+
+    Building a docker.DockerClient asks the daemon for its API version, so creating one at
+    import time needs a reachable daemon and a round trip before the app serves anything.
+    The proxy builds the client and its connection pool the first time one of its
+    attributes is used (normally from an executor thread during the lifespan startup, see
+    Node.start), retries on the next use if the daemon was unreachable, and close()
+    releases the connections. Until the client exists, its attributes can only be used off
+    the event loop: resolving one there would connect to the daemon and block the loop, so
+    it raises RuntimeError instead.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def initialized(self):
+        return self._client is not None
+
+    def get(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def __getattr__(self, name):
+        if self._client is None and _on_event_loop():
+            raise RuntimeError(f"Docker client not created yet: {name} must be used from the executor")
+        return getattr(self.get(), name)
+
+    def close(self):
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+
+class Node:
+    """
+    One Docker daemon, with its own connection pool, executor, image cache and events watcher.
+    """
+
+    def __init__(self, name, client, inventory, url=None):
+        self.name = name
+        self.url = url
+        self.host = node_host(url)
+        self.client = client
+        self.docker_exec = DockerExecutor()
+        self.images = ImageManager(client, self.docker_exec)
+        self.events = EventWatcher(client, inventory, node=name)
+        self.memory_total = None
+        self.cpus_total = None
+        # serveur -> mémoire réservée, en octets
+        self.reserved = {}
+        # serveur -> CPU réservés
+        self.reserved_cpus = {}
+
+    @property
+    def connected(self):
+        return self.events.connected
+
+    def free_memory(self, overcommit):
+        if self.memory_total is None:
+            return None
+        return int(self.memory_total * overcommit) - sum(self.reserved.values())
+
+    def free_cpus(self, overcommit):
+        if self.cpus_total is None:
+            return None
+        return self.cpus_total * overcommit - sum(self.reserved_cpus.values())
+
+    async def start(self):
+        sync_timeout = 10.0
+        if isinstance(self.client, LazyDockerClient):
+            try:
+                # Création du client hors de la boucle : elle interroge le démon
+                await self.docker_exec.run("read", self.client.get)
+            except Exception as e:
+                logger.warning("Could not connect to node %s: %s", self.name, e)
+                # Inutile d'attendre la première synchronisation : l'observateur réessaie en arrière-plan
+                sync_timeout = 0
+        await self.events.start(timeout=sync_timeout)
+        try:
+            info = await self.docker_exec.run("read", lambda: self.client.info())
+            self.memory_total = info.get("MemTotal")
+            self.cpus_total = info.get("NCPU")
+        except Exception as e:
+            logger.warning("Could not read the capacity of node %s: %s", self.name, e)
+        await self.images.start()
+
+    async def stop(self):
+        await self.images.stop()
+        await self.events.stop()
+
+
+class NodeRegistry:
+    """
+    The Docker daemons managed by MCDeployer and the placement of servers on them.
+
+    Each node has its own pooled docker-py client, DockerExecutor (so the concurrency limits
+    protect each daemon separately), image cache and events watcher feeding the shared
+    inventory, whose entries record the node of every server. A new server goes to the
+    connected node with enough free memory for its container memory limit (and free CPUs
+    for its CPU limit), preferring a node that already has its image, then the one with
+    the most free memory. The memory is reserved as soon as the node is picked, so
+    concurrent creates never oversubscribe it; a create that does not fit can wait for a
+    delete to free capacity (see acquire).
+    """
+
+    def __init__(self, nodes, inventory, overcommit=NODE_OVERCOMMIT, cpu_overcommit=CPU_OVERCOMMIT):
+        self.nodes = nodes
+        self.inventory = inventory
+        self.overcommit = overcommit
+        self.cpu_overcommit = cpu_overcommit
+        self.default = next(iter(nodes.values()))
+        self.metrics = {"placements": 0, "rejections": 0, "waits": 0}
+        # Débloqué à chaque libération de capacité, pour les créations en attente
+        self._freed = None
+
+    @classmethod
+    def from_env(cls, inventory, value=NODES, pool_size=NODE_POOL_SIZE, timeout=DOCKER_TIMEOUT,
+                 version=DOCKER_API_VERSION):
+        """
+        Build the registry from the MCDEPLOYER_NODES setting, without contacting the daemons.
+
+        Args:
+            inventory (ServerInventory): The inventory fed by the events watchers.
+            value (str): See parse_nodes; empty for the single local node.
+            pool_size (int): The connections kept open to each daemon.
+            timeout (float): The timeout of the calls to the daemons, in seconds.
+            version (str): The Docker API version, or "auto" to ask each daemon.
+
+        Returns:
+            NodeRegistry: The registry.
+        """
+        options = {"max_pool_size": pool_size, "timeout": timeout, "version": version}
+        endpoints = parse_nodes(value)
+        if not endpoints:
+            client = LazyDockerClient(lambda: docker.from_env(**options))
+            return cls({DEFAULT_NODE: Node(DEFAULT_NODE, client, inventory)}, inventory)
+        nodes = {
+            name: Node(name, LazyDockerClient(partial(docker.DockerClient, base_url=url, **options)), inventory, url)
+            for name, url in endpoints.items()
+        }
+        return cls(nodes, inventory)
+
+    async def start(self):
+        await asyncio.gather(*(node.start() for node in self.nodes.values()))
+
+    async def stop(self):
+        await asyncio.gather(*(node.stop() for node in self.nodes.values()))
+
+    def shutdown(self):
+        for node in self.nodes.values():
+            node.docker_exec.shutdown(wait=False)
+            if isinstance(node.client, LazyDockerClient):
+                node.client.close()
+
+    async def containers(self):
+        """
+        List all the containers of every reachable node.
+
+        Returns:
+            dict: The container summaries of each node, by node name.
+        """
+        async def one(node):
+            try:
+                return await node.docker_exec.run("read", lambda: node.client.api.containers(all=True))
+            except Exception as e:
+                logger.warning("Could not list the containers of node %s: %s", node.name, e)
+                return []
+
+        listings = await asyncio.gather(*(one(node) for node in self.nodes.values()))
+        return dict(zip(self.nodes, listings))
+
+    def rebuild(self, node_name, summaries):
+        """
+        Rebuild the memory reservations of a node from its containers.
+
+        Args:
+            node_name (str): The name of the node.
+            summaries (list): Its container summaries.
+        """
+        reserved, reserved_cpus = {}, {}
+        for summary in summaries:
+            labels = summary.get("Labels") or {}
+            if labels.get(MANAGED_LABEL) != "true":
+                continue
+            server_name = labels.get(SERVER_LABEL) or summary["Names"][0].lstrip("/")
+            memory = labels.get(MEMORY_LABEL)
+            reserved[server_name] = int(memory) if memory else container_memory(server_memory(None))
+            if labels.get(CPUS_LABEL):
+                reserved_cpus[server_name] = float(labels[CPUS_LABEL])
+        self.nodes[node_name].reserved = reserved
+        self.nodes[node_name].reserved_cpus = reserved_cpus
+
+    def get(self, node_name):
+        node = self.nodes.get(node_name)
+        if node is None:
+            raise UnknownNode(f"Node {node_name} not found")
+        return node
+
+    def node_of(self, server_name):
+        """
+        Find the node a server lives on.
+
+        Args:
+            server_name (str): The name of the server.
+
+        Returns:
+            Node: Its node; the default node for a server the inventory does not know.
+        """
+        server = self.inventory.get(server_name)
+        if server is not None and server["node"] in self.nodes:
+            return self.nodes[server["node"]]
+        return self.default
+
+    def place(self, server_name, memory, tag=None, node_name=None, cpus=0):
+        """
+        Pick the node of a new server and reserve its memory and CPUs there.
+
+        Args:
+            server_name (str): The name of the server.
+            memory (int): The memory limit of its container, in bytes.
+            tag (str): The image tag, to prefer nodes that already have it.
+            node_name (str): Pin the server to this node.
+            cpus (float): Its CPU limit; 0 if it has none.
+
+        Returns:
+            Node: The chosen node.
+
+        Raises:
+            UnknownNode: If the pinned node does not exist.
+            NoCapacity: If no node has enough free memory and CPUs.
+        """
+        candidates = [self.get(node_name)] if node_name else [node for node in self.nodes.values() if node.connected]
+        scored = []
+        for node in candidates:
+            free = node.free_memory(self.overcommit)
+            if free is not None and free < memory:
+                continue
+            free_cpus = node.free_cpus(self.cpu_overcommit)
+            if cpus and free_cpus is not None and free_cpus < cpus:
+                continue
+            # Nœud dont la mémoire est inconnue : accepté seulement s'il est le seul possible
+            scored.append(((free is not None, tag is not None and node.images.cached(tag), free or 0), node))
+        if not scored:
+            raise NoCapacity(
+                f"No node has {memory} bytes of free memory" + (f" and {cpus} free CPUs" if cpus else "")
+                + f" for server {server_name}"
+            )
+        node = max(scored, key=lambda entry: entry[0])[1]
+        node.reserved[server_name] = memory
+        if cpus:
+            node.reserved_cpus[server_name] = cpus
+        self.metrics["placements"] += 1
+        return node
+
+    async def acquire(self, server_name, memory, tag=None, node_name=None, cpus=0, timeout=CAPACITY_WAIT,
+                      on_wait=None):
+        """
+        Place a server, waiting up to `timeout` seconds for capacity to be released.
+
+        Args:
+            server_name, memory, tag, node_name, cpus: See place.
+            timeout (float): How long to wait for a delete to free capacity; 0 to fail at once.
+            on_wait (callable): Async callable receiving a message when the create starts waiting.
+
+        Returns:
+            Node: The chosen node.
+
+        Raises:
+            UnknownNode: If the pinned node does not exist.
+            NoCapacity: If there is still not enough capacity after the timeout.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        waiting = False
+        while True:
+            try:
+                return self.place(server_name, memory, tag, node_name, cpus)
+            except NoCapacity as e:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self.metrics["rejections"] += 1
+                    raise
+                if not waiting:
+                    waiting = True
+                    self.metrics["waits"] += 1
+                    if on_wait is not None:
+                        await on_wait(f"{e}, waiting up to {remaining:.0f} s for capacity")
+            if self._freed is None:
+                self._freed = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._freed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self, server_name):
+        for node in self.nodes.values():
+            node.reserved.pop(server_name, None)
+            node.reserved_cpus.pop(server_name, None)
+        if self._freed is not None:
+            self._freed.set()
+            self._freed = None
+
+    def ledger(self):
+        """
+        Describe the capacity reserved on every node.
+
+        Returns:
+            dict: The overcommit ratios and, per node, its allocatable, reserved and free
+                memory and CPUs and the reservation of each server.
+        """
+        return {
+            "overcommit": self.overcommit,
+            "cpu_overcommit": self.cpu_overcommit,
+            "metrics": dict(self.metrics),
+            "nodes": {
+                node.name: {
+                    "memory_total": node.memory_total,
+                    "memory_allocatable": int(node.memory_total * self.overcommit) if node.memory_total else None,
+                    "memory_reserved": sum(node.reserved.values()),
+                    "memory_free": node.free_memory(self.overcommit),
+                    "cpus_total": node.cpus_total,
+                    "cpus_allocatable": node.cpus_total * self.cpu_overcommit if node.cpus_total else None,
+                    "cpus_reserved": sum(node.reserved_cpus.values()),
+                    "cpus_free": node.free_cpus(self.cpu_overcommit),
+                    "servers": {
+                        server_name: {"memory": memory, "cpus": node.reserved_cpus.get(server_name)}
+                        for server_name, memory in sorted(node.reserved.items())
+                    },
+                }
+                for node in self.nodes.values()
+            },
+        }
+
+    def status(self):
+        servers = {}
+        for server in self.inventory.list():
+            servers[server["node"]] = servers.get(server["node"], 0) + 1
+        return {
+            "overcommit": self.overcommit,
+            "cpu_overcommit": self.cpu_overcommit,
+            "default": self.default.name,
+            "metrics": dict(self.metrics),
+            "nodes": [
+                {
+                    "name": node.name,
+                    "url": node.url,
+                    "host": node.host,
+                    "connected": node.connected,
+                    "memory_total": node.memory_total,
+                    "memory_reserved": sum(node.reserved.values()),
+                    "memory_free": node.free_memory(self.overcommit),
+                    "cpus_total": node.cpus_total,
+                    "cpus_reserved": sum(node.reserved_cpus.values()),
+                    "cpus_free": node.free_cpus(self.cpu_overcommit),
+                    "servers": servers.get(node.name, 0),
+                    "images": [image["tag"] for image in node.images.status()["images"]],
+                }
+                for node in self.nodes.values()
+            ],
+        }
@@ -0,0 +1,230 @@
+import os
+from collections import deque
+
+from inventory import MANAGED_LABEL, PORT_LABEL, SERVER_LABEL
+
+# Plage de ports de l'hôte attribués aux serveurs comme port de jeu
+PORT_RANGE = os.environ.get("MCDEPLOYER_PORT_RANGE", "25565-25764")
+# Plage des ports RCON et query, séparée pour que les ports de jeu restent contigus
+AUX_PORT_RANGE = os.environ.get("MCDEPLOYER_AUX_PORT_RANGE", "35565-35964")
+# Adresse de l'hôte sur laquelle le port RCON est publié
+RCON_BIND = os.environ.get("MCDEPLOYER_RCON_BIND", "127.0.0.1")
+
+RCON_PORT_LABEL = "mcdeployer.rcon_port"
+QUERY_PORT_LABEL = "mcdeployer.query_port"
+# Ports attribués à chaque serveur et port du conteneur correspondant
+PORT_KINDS = ("port", "rcon_port", "query_port")
+CONTAINER_PORTS = {"port": "25565/tcp", "rcon_port": "25575/tcp", "query_port": "25565/udp"}
+PORT_LABELS = {"port": PORT_LABEL, "rcon_port": RCON_PORT_LABEL, "query_port": QUERY_PORT_LABEL}
+
+
+class PortConflict(Exception):
+    """
+    A requested port is already used, or the server already holds ports.
+    """
+
+
+class PortsExhausted(Exception):
+    """
+    The port range has not enough free ports left.
+    """
+
+
+def parse_range(value):
+    start, _, end = value.partition("-")
+    start, end = int(start), int(end or start)
+    if not 0 < start <= end < 65536:
+        raise ValueError(f"Invalid port range: {value}")
+    return start, end
+
+
+def port_bindings(ports, rcon_bind=RCON_BIND):
+    """
+    Build the `ports` argument of containers.run for allocated ports.
+
+    Args:
+        ports (dict): The host ports of the server, by kind (see PORT_KINDS).
+        rcon_bind (str): The host address the RCON port is published on.
+
+    Returns:
+        dict: The container port to host binding mapping.
+    """
+    bindings = {CONTAINER_PORTS["port"]: ports["port"], CONTAINER_PORTS["query_port"]: ports["query_port"]}
+    bindings[CONTAINER_PORTS["rcon_port"]] = (rcon_bind, ports["rcon_port"]) if rcon_bind else ports["rcon_port"]
+    return bindings
+
+
+def port_labels(ports):
+    return {PORT_LABELS[kind]: str(port) for kind, port in ports.items()}
+
+
+class _FreeList:
+    """
+    FIFO free-list of the ports of a range; ports marked used elsewhere are skipped lazily.
+    """
+
+    def __init__(self, port_range):
+        self.start, self.end = parse_range(port_range)
+        self._free = deque(range(self.start, self.end + 1))
+        self._queued = set(self._free)
+
+    def __contains__(self, port):
+        return self.start <= port <= self.end
+
+    def __len__(self):
+        return self.end - self.start + 1
+
+    def pop(self, used):
+        while self._free:
+            port = self._free.popleft()
+            self._queued.discard(port)
+            if port not in used:
+                return port
+        return None
+
+    def push(self, port):
+        if port in self and port not in self._queued:
+            self._free.append(port)
+            self._queued.add(port)
+
+    def __str__(self):
+        return f"{self.start}-{self.end}"
+
+
+class PortAllocator:
+    """
+    Owner of the host ports handed to the servers.
+
+    Game ports come from one range and RCON/query ports from another. Free ports of each
+    range are kept in a FIFO free-list, so allocating and releasing are O(1) and a freed
+    port is reused as late as possible. Ports requested explicitly are marked used and
+    skipped lazily when they come out of a free-list. Ports outside the ranges (explicit
+    requests, containers not managed by MCDeployer) are tracked too, so they are never
+    handed out twice.
+
+    The index is rebuilt from the state store, the container labels and the port bindings
+    at startup, then updated by create and delete. All calls happen on the asyncio loop, so
+    the three ports of a server are taken in one step and concurrent creates never race.
+    """
+
+    def __init__(self, port_range=PORT_RANGE, aux_port_range=AUX_PORT_RANGE):
+        self.port_range = port_range
+        self.aux_port_range = aux_port_range
+        self._reset()
+
+    def _reset(self):
+        game, aux = _FreeList(self.port_range), _FreeList(self.aux_port_range)
+        if game.start <= aux.end and aux.start <= game.end:
+            raise ValueError(f"Port ranges {game} and {aux} overlap")
+        self._pools = {"port": game, "rcon_port": aux, "query_port": aux}
+        # port -> nom du serveur, ou None pour un port utilisé hors MCDeployer
+        self._owners = {}
+        self._servers = {}
+
+    def _push_free(self, port):
+        for pool in (self._pools["port"], self._pools["rcon_port"]):
+            pool.push(port)
+
+    def rebuild(self, summaries, records=()):
+        """
+        Rebuild the index from the state store and a listing of all the containers of the host.
+
+        Args:
+            summaries (list): The container summaries returned by the low-level list
+                endpoint, without filter.
+            records (list): The servers of the state store. Their ports are taken first, so
+                the servers of a node that could not be listed keep them; the labels of a
+                listed container win over its record.
+        """
+        self._reset()
+        for record in records:
+            if record.get("ports"):
+                self._take(record["name"], {kind: int(port) for kind, port in record["ports"].items() if port})
+        for summary in summaries:
+            labels = summary.get("Labels") or {}
+            if labels.get(MANAGED_LABEL) == "true" and labels.get(PORT_LABEL):
+                server_name = labels.get(SERVER_LABEL) or summary["Names"][0].lstrip("/")
+                self._take(server_name, {kind: int(labels[label]) for kind, label in PORT_LABELS.items() if labels.get(label)})
+                continue
+            for binding in summary.get("Ports") or []:
+                if binding.get("PublicPort"):
+                    self._owners.setdefault(int(binding["PublicPort"]), None)
+
+    def _take(self, server_name, ports):
+        for port in self._servers.pop(server_name, {}).values():
+            if self._owners.get(port) == server_name:
+                del self._owners[port]
+        self._servers[server_name] = ports
+        for port in ports.values():
+            self._owners[port] = server_name
+
+    def allocate(self, server_name, requested=None):
+        """
+        Take the game, RCON and query ports of a new server, all or none.
+
+        Args:
+            server_name (str): The name of the server.
+            requested (dict): Optional explicit host ports, by kind. Missing kinds are taken
+                from the free-lists.
+
+        Returns:
+            dict: The host ports of the server, by kind.
+
+        Raises:
+            PortConflict: If the server already holds ports or a requested port is used.
+            PortsExhausted: If a range has not enough free ports left.
+        """
+        if server_name in self._servers:
+            raise PortConflict(f"Server {server_name} already exists")
+        requested = {kind: port for kind, port in (requested or {}).items() if port is not None}
+        if len(set(requested.values())) < len(requested):
+            raise PortConflict("The same port is requested twice")
+        for port in requested.values():
+            if port in self._owners:
+                raise PortConflict(f"Port {port} is already used")
+        ports = dict(requested)
+        for port in ports.values():
+            self._owners[port] = server_name
+        for kind in PORT_KINDS:
+            if kind in ports:
+                continue
+            port = self._pools[kind].pop(self._owners)
+            if port is None:
+                for taken in ports.values():
+                    del self._owners[taken]
+                    self._push_free(taken)
+                raise PortsExhausted(f"No free port left in {self._pools[kind]}")
+            ports[kind] = port
+            self._owners[port] = server_name
+        self._servers[server_name] = ports
+        return dict(ports)
+
+    def release(self, server_name):
+        """
+        Give the ports of a deleted server back to the free-lists.
+
+        Args:
+            server_name (str): The name of the server.
+        """
+        for port in self._servers.pop(server_name, {}).values():
+            if self._owners.get(port) == server_name:
+                del self._owners[port]
+                self._push_free(port)
+
+    def get(self, server_name):
+        ports = self._servers.get(server_name)
+        return dict(ports) if ports else None
+
+    def status(self):
+        """
+        Describe the ranges and how many of their ports are used.
+
+        Returns:
+            dict: For the game and the RCON/query range, its bounds and used and free counts,
+                plus the number of servers holding ports.
+        """
+        result = {"servers": len(self._servers)}
+        for name, pool in (("game", self._pools["port"]), ("aux", self._pools["rcon_port"])):
+            used = sum(1 for port in self._owners if port in pool)
+            result[name] = {"range": str(pool), "size": len(pool), "used": used, "free": len(pool) - used}
+        return result
@@ -0,0 +1,247 @@
+import asyncio
+import os
+import re
+import time
+
+from rcon import RconError
+
+# CPU laissés à un serveur pendant sa prégénération, s'il n'a pas déjà sa propre limite ; 0 : pas de limite
+PREGEN_CPUS = float(os.environ.get("MCDEPLOYER_PREGEN_CPUS", "2"))
+# Prégénérations simultanées, toutes très gourmandes en CPU et en disque
+PREGEN_CONCURRENCY = int(os.environ.get("MCDEPLOYER_PREGEN_CONCURRENCY", "2"))
+# Intervalle entre deux relevés de l'avancement
+PREGEN_POLL = float(os.environ.get("MCDEPLOYER_PREGEN_POLL", "10"))
+# Attente maximale de la console du serveur (téléchargement du jar, génération du spawn)
+PREGEN_START_TIMEOUT = float(os.environ.get("MCDEPLOYER_PREGEN_START_TIMEOUT", "600"))
+
+# Chunky, installé depuis Modrinth, génère les chunks sur le serveur lui-même
+CHUNKY_PROJECT = "chunky"
+# Types de serveurs pouvant charger Chunky (plugin ou mod)
+PREGEN_TYPES = ("PAPER", "PURPUR", "PUFFERFISH", "SPIGOT", "BUKKIT", "FABRIC", "QUILT", "FORGE", "NEOFORGE")
+# Relevés consécutifs en échec tolérés avant d'abandonner
+MAX_POLL_FAILURES = 3
+
+PROGRESS_PATTERN = re.compile(r"Processed: (\d+) chunks \(([\d.]+)%\)(?:, ETA: ([\d:]+))?(?:, Rate: ([\d.]+) cps)?")
+# Réponses de la console à une commande inconnue (vanilla, Paper, Forge)
+UNKNOWN_COMMAND = ("unknown or incomplete command", "unknown command")
+
+
+class PregenUnavailable(Exception):
+    """
+    The server has no chunk pre-generator, or it did not accept the task.
+    """
+
+
+def _unknown_command(response):
+    return any(message in response.lower() for message in UNKNOWN_COMMAND)
+
+
+def parse_progress(response):
+    """
+    Parse the answer of `chunky progress`.
+
+    Args:
+        response (str): The RCON response.
+
+    Returns:
+        dict: The chunks processed, percent, ETA and rate; None if no task is running.
+    """
+    match = PROGRESS_PATTERN.search(response)
+    if match is None:
+        return None
+    chunks, percent, eta, rate = match.groups()
+    return {"chunks": int(chunks), "percent": float(percent), "eta": eta, "rate": float(rate) if rate else None}
+
+
+def pregen_commands(radius, world="world", max_world_size=None):
+    """
+    Build the console commands starting the pre-generation of a world.
+
+    Args:
+        radius (int): The radius to generate around 0, 0, in blocks.
+        world (str): The name of the world.
+        max_world_size (int): The world border radius; the radius is capped to it.
+
+    Returns:
+        list: The commands, in order.
+    """
+    commands = []
+    if max_world_size:
+        radius = min(radius, max_world_size)
+        commands += ["worldborder center 0 0", f"worldborder set {2 * max_world_size}"]
+    return commands + [f"chunky world {world}", "chunky center 0 0", f"chunky radius {radius}", "chunky start"]
+
+
+class Pregenerator:
+    """
+    Chunk pre-generation of the worlds, so players do not generate chunks while exploring.
+
+    Generating chunks on demand is the main cause of TPS drops in the first hours of a
+    server. The pre-generator drives Chunky through `command(server_name, command)` (RCON):
+    it waits for the console, sets the world border and the radius, starts the task, and
+    polls its progress every `poll` seconds until it completes. A generation takes hours,
+    so it runs as a background task of its own, outside the job queue (see submit), and
+    can be cancelled. At most `concurrency` worlds are generated at once. The servers being
+    generated are listed in `running`, so they can be kept "not ready" meanwhile, and the
+    outcome of the last generation of each server is kept in `results`.
+    """
+
+    def __init__(self, command, concurrency=PREGEN_CONCURRENCY, poll=PREGEN_POLL, start_timeout=PREGEN_START_TIMEOUT):
+        self.command = command
+        self.poll = poll
+        self.start_timeout = start_timeout
+        self.metrics = {"started": 0, "completed": 0, "failed": 0, "cancelled": 0}
+        # serveur -> avancement de la tâche en cours ou en attente
+        self.running = {}
+        # serveur -> issue de sa dernière prégénération
+        self.results = {}
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tasks = {}
+
+    def submit(self, server_name, radius, operation):
+        """
+        Run a pre-generation in the background once a slot is free.
+
+        The server is held not ready at once. The slot is taken before the operation starts,
+        so queued generations hold nothing else (CPU cap, RCON session) while they wait.
+
+        Args:
+            server_name (str): The name of the server.
+            radius (int): The radius to generate, in blocks.
+            operation (callable): An async callable doing the generation, e.g. capping the
+                CPU of the server around run(). It returns the result of run().
+
+        Returns:
+            asyncio.Task: The background task.
+        """
+        self.running[server_name] = {"radius": radius, "state": "queued", "percent": 0.0}
+        self.results.pop(server_name, None)
+        task = asyncio.create_task(self._run_task(server_name, operation))
+        self._tasks[server_name] = task
+        return task
+
+    async def _run_task(self, server_name, operation):
+        try:
+            async with self._slots:
+                result = await operation()
+            self.results[server_name] = dict(result, status="completed", finished_at=time.time())
+            return result
+        except asyncio.CancelledError:
+            self.results[server_name] = {"status": "cancelled", "finished_at": time.time()}
+            raise
+        except Exception as e:
+            self.results[server_name] = {"status": "failed", "error": str(e), "finished_at": time.time()}
+        finally:
+            self.running.pop(server_name, None)
+            if self._tasks.get(server_name) is asyncio.current_task():
+                del self._tasks[server_name]
+
+    async def cancel(self, server_name):
+        """
+        Cancel the pre-generation of a server, queued or running, and wait for its cleanup.
+
+        Args:
+            server_name (str): The name of the server.
+
+        Returns:
+            bool: Whether a pre-generation was cancelled.
+        """
+        task = self._tasks.get(server_name)
+        if task is None:
+            return False
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return True
+
+    def forget(self, server_name):
+        self.results.pop(server_name, None)
+
+    async def stop(self):
+        for server_name in list(self._tasks):
+            await self.cancel(server_name)
+
+    async def _start(self, server_name, commands):
+        deadline = time.monotonic() + self.start_timeout
+        while True:
+            try:
+                response = await self.command(server_name, "chunky progress")
+                break
+            except RconError:
+                if time.monotonic() >= deadline:
+                    raise
+                await asyncio.sleep(self.poll)
+        if _unknown_command(response):
+            raise PregenUnavailable(f"Chunky is not installed on server {server_name}")
+        for command in commands:
+            response = await self.command(server_name, command)
+            if _unknown_command(response):
+                raise PregenUnavailable(f"Server {server_name} refused {command!r}: {response.strip()}")
+        if "confirm" in response.lower():
+            # Une tâche existait déjà pour ce monde
+            await self.command(server_name, "chunky confirm")
+
+    async def run(self, server_name, radius, world="world", max_world_size=None, on_progress=None):
+        """
+        Pre-generate the world of a server and wait for the end of the task.
+
+        Args:
+            server_name (str): The name of the server.
+            radius (int): The radius to generate around 0, 0, in blocks.
+            world (str): The name of the world.
+            max_world_size (int): The world border radius, also capping the radius.
+            on_progress (callable): An async callable receiving progress messages.
+
+        Returns:
+            dict: The radius generated, the last progress and the duration.
+
+        Raises:
+            PregenUnavailable: If Chunky is missing or refuses the task.
+            RconError: If the console cannot be reached.
+        """
+        on_progress = on_progress or (lambda message: asyncio.sleep(0))
+        if max_world_size:
+            radius = min(radius, max_world_size)
+        self.running.setdefault(server_name, {"radius": radius, "state": "queued", "percent": 0.0})
+        try:
+            started_at = time.time()
+            self.running[server_name]["state"] = "starting"
+            await on_progress(f"Waiting for the console to pre-generate a radius of {radius} blocks")
+            await self._start(server_name, pregen_commands(radius, world, max_world_size))
+            self.metrics["started"] += 1
+            self.running[server_name]["state"] = "generating"
+            progress, failures = None, 0
+            while True:
+                await asyncio.sleep(self.poll)
+                try:
+                    response = await self.command(server_name, "chunky progress")
+                    failures = 0
+                except RconError:
+                    failures += 1
+                    if failures >= MAX_POLL_FAILURES:
+                        raise
+                    continue
+                current = parse_progress(response)
+                if current is None or current["percent"] >= 100:
+                    # Plus de tâche en cours : la génération est terminée
+                    progress = dict(progress or {}, percent=100.0)
+                    break
+                progress = current
+                self.running[server_name].update(progress)
+                await on_progress(f"Pre-generated {progress['chunks']} chunks ({progress['percent']:.1f}%), ETA {progress['eta']}")
+            self.metrics["completed"] += 1
+            return {"radius": radius, "progress": progress, "duration": time.time() - started_at}
+        except asyncio.CancelledError:
+            self.metrics["cancelled"] += 1
+            raise
+        except Exception:
+            self.metrics["failed"] += 1
+            raise
+        finally:
+            self.running.pop(server_name, None)
+
+    def status(self):
+        return {
+            "metrics": dict(self.metrics),
+            "running": {name: dict(task) for name, task in self.running.items()},
+            "results": {name: dict(result) for name, result in self.results.items()},
+        }
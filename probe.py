@@ -0,0 +1,337 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+# Durée de validité d'un sondage : un serveur n'est pas sondé plus souvent
+PROBE_TTL = float(os.environ.get("MCDEPLOYER_PROBE_TTL", "5"))
+# Nombre maximal de sondages simultanés
+PROBE_CONCURRENCY = int(os.environ.get("MCDEPLOYER_PROBE_CONCURRENCY", "256"))
+# Délai maximal d'un sondage
+PROBE_TIMEOUT = float(os.environ.get("MCDEPLOYER_PROBE_TIMEOUT", "2"))
+# Adresse de l'hôte sur laquelle les ports des serveurs sont joignables
+PROBE_HOST = os.environ.get("MCDEPLOYER_PROBE_HOST", "127.0.0.1")
+
+# Version de protocole envoyée dans le handshake : -1 demande le statut sans imposer de version
+STATUS_PROTOCOL_VERSION = -1
+QUERY_MAGIC = b"\xfe\xfd"
+
+
+class ProbeError(Exception):
+    """
+    The server did not answer the status request.
+    """
+
+
+def encode_varint(value):
+    value &= 0xFFFFFFFF
+    data = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            data.append(byte | 0x80)
+        else:
+            data.append(byte)
+            return bytes(data)
+
+
+def decode_varint(data, offset=0):
+    value = 0
+    for position in range(5):
+        byte = data[offset + position]
+        value |= (byte & 0x7F) << (7 * position)
+        if not byte & 0x80:
+            return value, offset + position + 1
+    raise ProbeError("VarInt too long")
+
+
+async def read_varint(reader):
+    value = 0
+    for position in range(5):
+        byte = (await reader.readexactly(1))[0]
+        value |= (byte & 0x7F) << (7 * position)
+        if not byte & 0x80:
+            return value - (1 << 32) if value & (1 << 31) else value
+    raise ProbeError("VarInt too long")
+
+
+def _packet(packet_id, payload=b""):
+    data = encode_varint(packet_id) + payload
+    return encode_varint(len(data)) + data
+
+
+def _string(value):
+    data = value.encode("utf-8")
+    return encode_varint(len(data)) + data
+
+
+async def _read_packet(reader):
+    length = await read_varint(reader)
+    if not 0 < length <= 1024 * 1024:
+        raise ProbeError(f"Invalid packet length {length}")
+    data = await reader.readexactly(length)
+    packet_id, offset = decode_varint(data)
+    return packet_id, data[offset:]
+
+
+async def server_list_ping(host, port, timeout=PROBE_TIMEOUT):
+    """
+    Ask a Minecraft server for its status with the Server List Ping protocol.
+
+    Args:
+        host (str): The host the game port is reachable on.
+        port (int): The game port.
+        timeout (float): How long to wait for the whole exchange, in seconds.
+
+    Returns:
+        dict: The player counts and the round-trip time of the ping, in milliseconds.
+
+    Raises:
+        ConnectionError: If the port does not accept connections (server not started).
+        ProbeError: If the connection is accepted but no valid status comes back.
+    """
+    async def exchange():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            handshake = encode_varint(STATUS_PROTOCOL_VERSION) + _string(host) + struct.pack(">H", port) + encode_varint(1)
+            writer.write(_packet(0x00, handshake) + _packet(0x00))
+            await writer.drain()
+            try:
+                packet_id, data = await _read_packet(reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                raise ProbeError("Connection closed before the status response")
+            if packet_id != 0x00:
+                raise ProbeError(f"Unexpected packet {packet_id:#x}")
+            length, offset = decode_varint(data)
+            status = json.loads(data[offset:offset + length].decode("utf-8"))
+            payload = random.getrandbits(63)
+            sent_at = time.perf_counter()
+            writer.write(_packet(0x01, struct.pack(">q", payload)))
+            await writer.drain()
+            try:
+                packet_id, data = await _read_packet(reader)
+                latency = (time.perf_counter() - sent_at) * 1000.0
+            except (asyncio.IncompleteReadError, ConnectionError):
+                # Certains serveurs ferment la connexion sans répondre au ping
+                latency = None
+            players = status.get("players") or {}
+            return {
+                "players_online": players.get("online"),
+                "max_players": players.get("max"),
+                "latency_ms": latency,
+            }
+        finally:
+            writer.close()
+
+    try:
+        return await asyncio.wait_for(exchange(), timeout)
+    except asyncio.TimeoutError:
+        raise ProbeError(f"No status response within {timeout} s")
+    except (ValueError, UnicodeDecodeError, IndexError) as e:
+        raise ProbeError(f"Invalid status response: {e}")
+
+
+class _QueryProtocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.responses = asyncio.Queue()
+
+    def datagram_received(self, data, addr):
+        self.responses.put_nowait(data)
+
+    def error_received(self, exc):
+        self.responses.put_nowait(exc)
+
+
+async def query_basic_stat(host, port, timeout=PROBE_TIMEOUT):
+    """
+    Ask a Minecraft server for its player counts with the UDP Query protocol.
+
+    Only answers when the server runs with enable_query.
+
+    Args:
+        host (str): The host the query port is reachable on.
+        port (int): The query port.
+        timeout (float): How long to wait for the whole exchange, in seconds.
+
+    Returns:
+        dict: The player counts and the round-trip time of the stat request, in milliseconds.
+
+    Raises:
+        ProbeError: If the server does not answer.
+    """
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(_QueryProtocol, remote_addr=(host, port))
+
+    async def request(packet):
+        transport.sendto(packet)
+        response = await protocol.responses.get()
+        if isinstance(response, Exception):
+            raise ProbeError(f"Query failed: {response}")
+        return response
+
+    try:
+        session = random.getrandbits(32) & 0x0F0F0F0F
+        response = await asyncio.wait_for(request(QUERY_MAGIC + b"\x09" + struct.pack(">i", session)), timeout)
+        challenge = int(response[5:].split(b"\x00", 1)[0])
+        sent_at = time.perf_counter()
+        response = await asyncio.wait_for(
+            request(QUERY_MAGIC + b"\x00" + struct.pack(">ii", session, challenge)), timeout
+        )
+        latency = (time.perf_counter() - sent_at) * 1000.0
+        # MOTD, type de jeu, monde, joueurs connectés, joueurs maximum
+        fields = response[5:].split(b"\x00")
+        return {"players_online": int(fields[3]), "max_players": int(fields[4]), "latency_ms": latency}
+    except asyncio.TimeoutError:
+        raise ProbeError(f"No query response within {timeout} s")
+    except (ValueError, IndexError) as e:
+        raise ProbeError(f"Invalid query response: {e}")
+    finally:
+        transport.close()
+
+
+class GameProber:
+    """
+    Game-level readiness of the servers, probed with Server List Ping.
+
+    A running container is not a joinable server: the JVM may still be downloading the jar
+    or generating the world. The prober asks every running server for its status, a few
+    hundred at a time on the asyncio loop (no thread per server), and writes ready,
+    players_online, max_players and latency_ms into the inventory. A result is kept for
+    `ttl` seconds before the server is probed again. When a server accepts the connection
+    but hides its status (enable_status=false), the UDP Query protocol is tried on its query
+    port. Servers of other nodes are probed on the address of their node, from `hosts`.
+    Servers for which `is_held(server_name)` is true (e.g. while their world is being
+    pre-generated) are never reported ready. `on_ready(server_name)` is called each time a
+    server becomes ready, including the first probe after the API starts.
+    """
+
+    def __init__(self, inventory, query_port, host=PROBE_HOST, ttl=PROBE_TTL,
+                 concurrency=PROBE_CONCURRENCY, timeout=PROBE_TIMEOUT, hosts=None, is_held=None, on_ready=None):
+        self.inventory = inventory
+        self.query_port = query_port
+        self.host = host
+        self.hosts = hosts or {}
+        self.is_held = is_held or (lambda server_name: False)
+        self.on_ready = on_ready
+        self.ttl = ttl
+        self.timeout = timeout
+        self.metrics = {"cycles": 0, "probes": 0, "ready": 0, "last_cycle_seconds": None}
+        self._concurrency = asyncio.Semaphore(concurrency)
+        self._probed_at = {}
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.probe_all()
+            except Exception as e:
+                logger.warning("Probing the servers failed: %s", e)
+            await asyncio.sleep(max(0.5, self.ttl / 5))
+
+    async def _probe(self, server):
+        host = self.hosts.get(server.get("node"), self.host)
+        async with self._concurrency:
+            result = {"ready": False, "players_online": None, "max_players": None, "latency_ms": None}
+            try:
+                result.update(await server_list_ping(host, server["port"], self.timeout), ready=True)
+            except (OSError, ProbeError) as e:
+                query_port = self.query_port(server["name"])
+                if isinstance(e, ProbeError) and query_port:
+                    try:
+                        result.update(await query_basic_stat(host, query_port, self.timeout), ready=True)
+                    except (OSError, ProbeError):
+                        pass
+        answered = result["ready"]
+        if self.is_held(server["name"]):
+            result["ready"] = False
+        self._probed_at[server["name"]] = time.monotonic()
+        self.metrics["probes"] += 1
+        current = self.inventory.get(server["name"])
+        if current is not None:
+            self.inventory.upsert(server["name"], probed_at=time.time(), **result)
+            if result["ready"] and not current.get("ready") and self.on_ready is not None:
+                self.on_ready(server["name"])
+        return answered
+
+    async def probe_all(self, max_age=None):
+        """
+        Probe the running servers whose last result is older than `max_age`.
+
+        Args:
+            max_age (float): The age after which a result is refreshed; defaults to the TTL.
+
+        Returns:
+            int: The number of servers probed.
+        """
+        started = time.monotonic()
+        max_age = self.ttl if max_age is None else max_age
+        servers = [
+            server for server in self.inventory.list()
+            if server["status"] == "running" and server["port"]
+            and started - self._probed_at.get(server["name"], float("-inf")) >= max_age
+        ]
+        results = await asyncio.gather(*(self._probe(server) for server in servers))
+        known = {server["name"] for server in self.inventory.list()}
+        for name in list(self._probed_at):
+            if name not in known:
+                del self._probed_at[name]
+        self.metrics["cycles"] += 1
+        self.metrics["ready"] = sum(1 for server in self.inventory.list() if server.get("ready"))
+        if servers:
+            self.metrics["last_cycle_seconds"] = time.monotonic() - started
+        return len(results)
+
+    async def probe(self, server_name):
+        """
+        Probe one server now, ignoring the TTL.
+
+        Args:
+            server_name (str): The name of the server.
+
+        Returns:
+            bool: Whether the server accepts players.
+        """
+        server = self.inventory.get(server_name)
+        if server is None or server["status"] != "running" or not server["port"]:
+            return False
+        return await self._probe(server) and not self.is_held(server_name)
+
+    async def wait_up(self, server_name, timeout, interval=1.0):
+        """
+        Probe one server until it answers, or until the timeout.
+
+        Unlike probe(), a held server counts once it answers: its world being pre-generated
+        keeps it not ready for hours, but it is up.
+
+        Args:
+            server_name (str): The name of the server.
+            timeout (float): How long to wait, in seconds.
+            interval (float): The delay between two probes, in seconds.
+
+        Returns:
+            bool: Whether the server answered in time.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            server = self.inventory.get(server_name)
+            if server is not None and server["status"] == "running" and server["port"] and await self._probe(server):
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(interval, remaining))
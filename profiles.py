@@ -0,0 +1,122 @@
+import math
+import os
+
+from stats import parse_memory
+
+# Tas à partir duquel ZGC remplace G1 : ses pauses ne grandissent pas avec le tas
+ZGC_HEAP = os.environ.get("MCDEPLOYER_ZGC_HEAP", "12G")
+# Options de la JVM avec ZGC (les flags d'Aikar sont réglés pour G1)
+ZGC_FLAGS = "-XX:+UseZGC -XX:+AlwaysPreTouch -XX:+DisableExplicitGC -XX:+PerfDisableSharedMem"
+
+# Types de serveurs chargeant des mods, plus gourmands en mémoire par joueur
+MODDED_TYPES = ("FORGE", "NEOFORGE", "FABRIC", "QUILT", "AUTO_CURSEFORGE", "CURSEFORGE", "MODRINTH", "FTBA")
+# Profils : tas de base, tas par joueur au-delà de `players`, et réglages du serveur.
+# Plus il y a de joueurs, plus les distances baissent : le coût des chunks chargés croît avec eux
+PROFILES = {
+    "small": {
+        "heap": "2G", "heap_per_player": "128M", "players": 10,
+        "view_distance": 10, "simulation_distance": 8, "network_compression_threshold": 256,
+    },
+    "medium": {
+        "heap": "4G", "heap_per_player": "128M", "players": 30,
+        "view_distance": 8, "simulation_distance": 6, "network_compression_threshold": 256,
+    },
+    "large": {
+        "heap": "8G", "heap_per_player": "128M", "players": 60,
+        "view_distance": 6, "simulation_distance": 4, "network_compression_threshold": 512,
+    },
+    "modded": {
+        "heap": "6G", "heap_per_player": "256M", "players": 20,
+        "view_distance": 8, "simulation_distance": 5, "network_compression_threshold": 256,
+    },
+}
+AUTO = "auto"
+# Champs de MinecraftServerConfig qu'un profil renseigne quand l'utilisateur ne les donne pas
+TUNED_FIELDS = (
+    "memory", "use_aikar_flags", "jvm_xx_opts", "view_distance", "simulation_distance",
+    "network_compression_threshold", "sync_chunk_writes",
+)
+# Granularité du tas calculé
+HEAP_STEP = 512 * 1024 ** 2
+
+
+class UnknownProfile(Exception):
+    """
+    The requested performance profile does not exist.
+    """
+
+
+def format_memory(size):
+    """
+    Format a size in bytes as a JVM memory size, e.g. 4294967296 -> "4G".
+    """
+    for unit, factor in (("G", 1024 ** 3), ("M", 1024 ** 2)):
+        if size % factor == 0:
+            return f"{size // factor}{unit}"
+    return str(size)
+
+
+def choose_profile(settings):
+    """
+    Pick the profile matching the size and type of a server, for the "auto" profile.
+
+    Args:
+        settings (dict): The configuration of the server.
+
+    Returns:
+        str: The name of the profile.
+    """
+    if (settings.get("type") or "").upper() in MODDED_TYPES:
+        return "modded"
+    heap = parse_memory(settings.get("max_memory") or settings.get("memory"))
+    if heap is not None:
+        return "small" if heap < 3 * 1024 ** 3 else "medium" if heap < 6 * 1024 ** 3 else "large"
+    players = settings.get("max_players")
+    if players is not None:
+        return "small" if players <= 10 else "medium" if players <= 30 else "large"
+    return "small"
+
+
+def resolve_profile(settings, zgc_heap=ZGC_HEAP):
+    """
+    Derive the JVM and server settings of a performance profile.
+
+    The heap is the one requested (`max_memory` or `memory`), or the base heap of the profile
+    grown with `max_players`; Xms equals Xmx so the heap is never resized. G1 with Aikar's
+    flags is used below `zgc_heap`, ZGC above. Values given explicitly always win.
+
+    Args:
+        settings (dict): The configuration of the server, with its `performance_profile`.
+        zgc_heap (str): The heap from which ZGC is used.
+
+    Returns:
+        dict: The profile name, the effective value of each tuned field and the fields the
+            configuration overrides.
+
+    Raises:
+        UnknownProfile: If the profile does not exist.
+    """
+    name = settings["performance_profile"].lower()
+    if name == AUTO:
+        name = choose_profile(settings)
+    if name not in PROFILES:
+        raise UnknownProfile(f"Unknown performance profile {settings['performance_profile']}, expected one of {', '.join((AUTO, *PROFILES))}")
+    profile = PROFILES[name]
+    values = {field: profile[field] for field in ("view_distance", "simulation_distance", "network_compression_threshold")}
+    # Écritures de chunks asynchrones : le tick n'attend plus le disque
+    values["sync_chunk_writes"] = False
+    heap = parse_memory(settings.get("max_memory") or settings.get("memory"))
+    if heap is None:
+        players = settings.get("max_players") or profile["players"]
+        extra = max(players - profile["players"], 0) * parse_memory(profile["heap_per_player"])
+        heap = math.ceil((parse_memory(profile["heap"]) + extra) / HEAP_STEP) * HEAP_STEP
+        values["memory"] = format_memory(heap)
+    # Le ramasse-miettes n'est choisi que si l'utilisateur n'a réglé ni l'un ni l'autre
+    if settings.get("use_aikar_flags") is None and settings.get("jvm_xx_opts") is None:
+        if heap >= parse_memory(zgc_heap):
+            values.update(use_aikar_flags=False, jvm_xx_opts=ZGC_FLAGS)
+        else:
+            values["use_aikar_flags"] = True
+    overridden = sorted(field for field in TUNED_FIELDS if settings.get(field) is not None)
+    values.update({field: settings[field] for field in overridden})
+    return {"profile": name, "values": values, "overridden": overridden}
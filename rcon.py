@@ -0,0 +1,363 @@
+import asyncio
+import itertools
+import logging
+import os
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+# Connexions RCON ouvertes au plus par serveur
+RCON_POOL_SIZE = int(os.environ.get("MCDEPLOYER_RCON_POOL_SIZE", "2"))
+# Durée d'inactivité après laquelle une connexion est fermée
+RCON_IDLE_TIMEOUT = float(os.environ.get("MCDEPLOYER_RCON_IDLE_TIMEOUT", "60"))
+# Délai maximal de connexion et de réponse à une commande
+RCON_TIMEOUT = float(os.environ.get("MCDEPLOYER_RCON_TIMEOUT", "10"))
+
+# Types de paquets du protocole RCON (Source RCON, repris par Minecraft)
+SERVERDATA_RESPONSE_VALUE = 0
+SERVERDATA_EXECCOMMAND = 2
+SERVERDATA_AUTH = 3
+# Type inconnu du serveur : sa réponse "Unknown request" marque la fin d'une réponse fragmentée
+END_MARKER_TYPE = 200
+
+MAX_COMMAND_LENGTH = 1446
+# Minecraft fragmente ses réponses à 4096 octets ; certains serveurs modifiés envoient plus
+MAX_PACKET_LENGTH = 1024 * 1024
+
+
+class RconError(Exception):
+    """
+    The RCON session failed: connection refused or lost, or protocol error.
+    """
+
+
+class RconAuthError(RconError):
+    """
+    The server rejected the RCON password.
+    """
+
+
+class RconSessionClosed(RconError):
+    """
+    The session was closed before the command reached the server, which therefore did not
+    run it: the command can safely be sent again on another session.
+    """
+
+
+def encode_packet(request_id, type, body):
+    payload = struct.pack("<ii", request_id, type) + body.encode("utf-8") + b"\x00\x00"
+    return struct.pack("<i", len(payload)) + payload
+
+
+async def read_packet(reader):
+    """
+    Read one RCON packet.
+
+    Args:
+        reader (asyncio.StreamReader): The stream of the connection.
+
+    Returns:
+        tuple: The request id, the type and the body of the packet.
+    """
+    (length,) = struct.unpack("<i", await reader.readexactly(4))
+    if not 10 <= length <= MAX_PACKET_LENGTH:
+        raise RconError(f"Invalid RCON packet length {length}")
+    payload = await reader.readexactly(length)
+    request_id, type = struct.unpack("<ii", payload[:8])
+    return request_id, type, payload[8:-2].decode("utf-8", errors="replace")
+
+
+class RconConnection:
+    """
+    One authenticated RCON session, with pipelined commands.
+
+    Minecraft handles the packets of a connection in order, so several commands can be
+    written without waiting for the previous responses. Each command is followed by a
+    packet of an unknown type: the server answers it after the last fragment of the
+    command response, which tells where a response longer than one packet ends. A reader
+    task dispatches the responses to the waiting commands by request id.
+    """
+
+    def __init__(self, host, port, password, timeout=RCON_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self.in_flight = 0
+        self.last_used = time.monotonic()
+        self.closed = False
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._ids = itertools.count(1)
+        # identifiant de la commande -> (future, fragments reçus)
+        self._pending = {}
+        self._markers = {}
+
+    async def connect(self):
+        """
+        Open the TCP connection and authenticate.
+
+        Raises:
+            RconAuthError: If the password is rejected.
+            RconError: If the server cannot be reached.
+        """
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.timeout
+            )
+            request_id = next(self._ids)
+            self._writer.write(encode_packet(request_id, SERVERDATA_AUTH, self.password))
+            await self._writer.drain()
+            while True:
+                response_id, type, _ = await asyncio.wait_for(read_packet(self._reader), self.timeout)
+                # Certains serveurs envoient un paquet vide avant la réponse d'authentification
+                if type == SERVERDATA_EXECCOMMAND or response_id == -1:
+                    break
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+            self.close()
+            raise RconError(f"Could not open an RCON session on {self.host}:{self.port}: {e}") from e
+        if response_id == -1:
+            self.close()
+            raise RconAuthError(f"RCON password rejected by {self.host}:{self.port}")
+        self._reader_task = asyncio.create_task(self._read_loop())
+
+    async def _read_loop(self):
+        error = RconError("RCON connection closed")
+        try:
+            while True:
+                response_id, _, body = await read_packet(self._reader)
+                if response_id in self._pending:
+                    self._pending[response_id][1].append(body)
+                elif response_id in self._markers:
+                    command_id = self._markers.pop(response_id)
+                    future, fragments = self._pending.pop(command_id)
+                    if not future.done():
+                        future.set_result("".join(fragments))
+        except (OSError, asyncio.IncompleteReadError, RconError) as e:
+            error = e if isinstance(e, RconError) else RconError(f"RCON connection lost: {e}")
+        finally:
+            self._fail_pending(error)
+            self.close()
+
+    def _fail_pending(self, error):
+        for future, _ in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+        self._markers.clear()
+
+    async def command(self, command):
+        """
+        Run a command and return its full response.
+
+        Args:
+            command (str): The command, without leading slash.
+
+        Returns:
+            str: The response of the server.
+
+        Raises:
+            RconError: If the connection fails or the response does not come in time.
+        """
+        if self.closed:
+            raise RconSessionClosed("RCON connection closed")
+        if len(command.encode("utf-8")) > MAX_COMMAND_LENGTH:
+            raise ValueError(f"RCON commands are limited to {MAX_COMMAND_LENGTH} bytes")
+        command_id, marker_id = next(self._ids), next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[command_id] = (future, [])
+        self._markers[marker_id] = command_id
+        self.in_flight += 1
+        try:
+            try:
+                self._writer.write(
+                    encode_packet(command_id, SERVERDATA_EXECCOMMAND, command)
+                    + encode_packet(marker_id, END_MARKER_TYPE, "")
+                )
+                await self._writer.drain()
+            except OSError as e:
+                self.close()
+                raise RconSessionClosed(f"RCON connection lost: {e}") from e
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            # La connexion n'est plus synchronisée : elle est abandonnée. La commande a pu
+            # s'exécuter (stop, save-all flush lents) : elle n'est jamais renvoyée.
+            self.close()
+            raise RconError(f"RCON command timed out after {self.timeout} s")
+        finally:
+            self.in_flight -= 1
+            self.last_used = time.monotonic()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self._reader_task is not None and self._reader_task is not asyncio.current_task():
+            self._reader_task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+        self._fail_pending(RconError("RCON connection closed"))
+
+
+class RconPool:
+    """
+    The RCON sessions of one server.
+
+    A command goes to the least busy open session; a new session is opened only when all
+    of them already have commands in flight and the pool is not full.
+    """
+
+    def __init__(self, host, port, password, size=RCON_POOL_SIZE, timeout=RCON_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.size = size
+        self.timeout = timeout
+        self.connections = []
+        self._opening = 0
+        self._lock = asyncio.Lock()
+
+    async def _acquire(self):
+        self.connections = [connection for connection in self.connections if not connection.closed]
+        idle = [connection for connection in self.connections if connection.in_flight == 0]
+        if idle:
+            return idle[0]
+        if len(self.connections) + self._opening >= self.size and self.connections:
+            return min(self.connections, key=lambda connection: connection.in_flight)
+        async with self._lock:
+            # Une seule ouverture à la fois : les commandes suivantes se partagent la session ouverte
+            self.connections = [connection for connection in self.connections if not connection.closed]
+            if len(self.connections) >= self.size:
+                return min(self.connections, key=lambda connection: connection.in_flight)
+            connection = RconConnection(self.host, self.port, self.password, self.timeout)
+            self._opening += 1
+            try:
+                await connection.connect()
+            finally:
+                self._opening -= 1
+            self.connections.append(connection)
+            return connection
+
+    async def command(self, command):
+        """
+        Run a command on one of the sessions, retrying once on a fresh session if a pooled
+        one turns out to be dead before the command was sent. A command that may have reached
+        the server (timeout, connection lost while waiting for the response) is never sent
+        again: stop or save-all flush must not run twice.
+
+        Args:
+            command (str): The command.
+
+        Returns:
+            str: The response of the server.
+        """
+        for attempt in (1, 2):
+            connection = await self._acquire()
+            try:
+                return await connection.command(command)
+            except RconSessionClosed:
+                if attempt == 2:
+                    raise
+                # Session fermée par le serveur (redémarrage) avant l'envoi : nouvelle tentative
+                logger.info("RCON session to %s:%s lost, reconnecting", self.host, self.port)
+
+    def evict_idle(self, idle_timeout):
+        now = time.monotonic()
+        for connection in self.connections:
+            if connection.in_flight == 0 and now - connection.last_used > idle_timeout:
+                connection.close()
+        self.connections = [connection for connection in self.connections if not connection.closed]
+
+    def close(self):
+        for connection in self.connections:
+            connection.close()
+        self.connections = []
+
+
+class RconManager:
+    """
+    RCON connection pools of all the servers, with idle eviction.
+
+    The address and password of a server are looked up through `resolve`, an async callable
+    taking the server name and returning (host, port, password); the result is kept with
+    the pool until the pool is closed (server stopped, deleted, or password rejected).
+    """
+
+    def __init__(self, resolve, pool_size=RCON_POOL_SIZE, idle_timeout=RCON_IDLE_TIMEOUT, timeout=RCON_TIMEOUT):
+        self.resolve = resolve
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.metrics = {"commands": 0, "errors": 0}
+        self._pools = {}
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._evict_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for pool in self._pools.values():
+            pool.close()
+        self._pools.clear()
+
+    async def _evict_loop(self):
+        while True:
+            await asyncio.sleep(max(1.0, self.idle_timeout / 4))
+            for pool in self._pools.values():
+                pool.evict_idle(self.idle_timeout)
+
+    async def command(self, server_name, command):
+        """
+        Run a command on a server.
+
+        Args:
+            server_name (str): The name of the server.
+            command (str): The command, without leading slash.
+
+        Returns:
+            str: The response of the server.
+
+        Raises:
+            RconAuthError: If the password is rejected.
+            RconError: If the server cannot be reached or does not answer in time.
+        """
+        pool = self._pools.get(server_name)
+        if pool is None:
+            host, port, password = await self.resolve(server_name)
+            pool = self._pools.setdefault(
+                server_name, RconPool(host, port, password, self.pool_size, self.timeout)
+            )
+        self.metrics["commands"] += 1
+        try:
+            return await pool.command(command)
+        except RconError as e:
+            self.metrics["errors"] += 1
+            if isinstance(e, RconAuthError):
+                self.close(server_name)
+            raise
+
+    def close(self, server_name):
+        """
+        Close the sessions of a server, e.g. when it is stopped or deleted.
+
+        Args:
+            server_name (str): The name of the server.
+        """
+        pool = self._pools.pop(server_name, None)
+        if pool is not None:
+            pool.close()
+
+    def status(self):
+        return {
+            "servers": {
+                name: {"connections": len(pool.connections), "in_flight": sum(c.in_flight for c in pool.connections)}
+                for name, pool in self._pools.items()
+            },
+            "metrics": dict(self.metrics),
+        }
@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import os
+import random
+import time
+
+from store import spec_hash
+
+logger = logging.getLogger(__name__)
+
+# Intervalle entre deux comparaisons de l'état voulu et de l'état Docker ; 0 désactive le réconciliateur
+RECONCILE_INTERVAL = float(os.environ.get("MCDEPLOYER_RECONCILE_INTERVAL", "30"))
+# Actions lancées ensemble dans une vague
+RECONCILE_BATCH = int(os.environ.get("MCDEPLOYER_RECONCILE_BATCH", "10"))
+# Pause entre deux vagues, pour que disques et CPU absorbent les démarrages
+RECONCILE_WAVE_DELAY = float(os.environ.get("MCDEPLOYER_RECONCILE_WAVE_DELAY", "10"))
+# Délai avant de retoucher un serveur (backoff exponentiel avec jitter)
+RECONCILE_BACKOFF_INITIAL = float(os.environ.get("MCDEPLOYER_RECONCILE_BACKOFF_INITIAL", "5"))
+RECONCILE_BACKOFF_MAX = float(os.environ.get("MCDEPLOYER_RECONCILE_BACKOFF_MAX", "300"))
+
+RUNNING = "running"
+STOPPED = "stopped"
+DESIRED_STATUSES = (RUNNING, STOPPED)
+# Ordre des actions dans une passe : libérer la mémoire avant d'en consommer
+ACTIONS = ("stop", "start", "create", "recreate")
+
+
+def plan(record, server, hibernated=False):
+    """
+    Find the action bringing a server to its desired state.
+
+    Args:
+        record (dict): The definition of the server in the state store.
+        server (dict): Its inventory entry; None if it has no container.
+        hibernated (bool): Whether it is hibernated (stopped, but woken up by players).
+
+    Returns:
+        str: "stop", "start", "create" or "recreate"; None if the server has converged,
+            is not managed or is in a transient state (restarting, paused, ...).
+    """
+    desired = record["desired_status"]
+    if desired == STOPPED:
+        if server is not None and (server["status"] == "running" or hibernated):
+            return "stop"
+        return None
+    if desired != RUNNING or hibernated:
+        return None
+    if server is None:
+        return "create" if record["spec"] is not None else None
+    if record["spec"] is not None and (
+            server["status"] == "dead" or record["applied"] not in (None, spec_hash(record["spec"]))):
+        return "recreate"
+    if server["status"] in ("created", "exited"):
+        return "start"
+    return None
+
+
+class Reconciler:
+    """
+    Background loop converging the Docker state to the desired state of the servers.
+
+    The API records in the state store whether each server should run and the spec its
+    container should be created from. Every `interval` seconds, or as soon as `wake()` is
+    called, the reconciler compares each definition with the inventory and applies the
+    minimal action through `apply(action, server_name)`: start an exited container, stop a
+    running one, create a missing one or recreate one whose spec changed. Actions run in
+    waves of `batch` separated by `wave_delay`, so the 300 servers of a rebooted host come
+    back a few at a time instead of all at once. A server that was just acted upon is left
+    alone for an exponentially growing, jittered delay, which also slows down crash loops.
+    Servers with a job in progress, hibernated ones and those of a disconnected node are
+    skipped.
+    """
+
+    def __init__(self, store, inventory, nodes, apply, is_hibernated=None, is_busy=None,
+                 interval=RECONCILE_INTERVAL, batch=RECONCILE_BATCH, wave_delay=RECONCILE_WAVE_DELAY,
+                 backoff_initial=RECONCILE_BACKOFF_INITIAL, backoff_max=RECONCILE_BACKOFF_MAX):
+        self.store = store
+        self.inventory = inventory
+        self.nodes = nodes
+        self.apply = apply
+        self.is_hibernated = is_hibernated or (lambda server_name: False)
+        self.is_busy = is_busy or (lambda server_name: False)
+        self.interval = interval
+        self.batch = batch
+        self.wave_delay = wave_delay
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.metrics = {"passes": 0, "waves": 0, "failures": 0, **{action: 0 for action in ACTIONS}}
+        self.last_pass = None
+        # serveur -> (actions consécutives, dernière action, prochaine action permise), en temps monotone
+        self._backoff = {}
+        self._wakeup = None
+        self._task = None
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    def start(self):
+        if not self.enabled:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def wake(self, server_name=None):
+        """
+        Run a pass now instead of waiting for the next interval.
+
+        Args:
+            server_name (str): A server whose desired state just changed; its backoff is reset.
+        """
+        if server_name is not None:
+            self._backoff.pop(server_name, None)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.warning("Reconciliation failed: %s", e)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def diff(self):
+        """
+        Compare the desired state of every server with the inventory.
+
+        Returns:
+            list: The (action, server name) pairs to apply now, stops first.
+        """
+        now = time.monotonic()
+        actions = []
+        for record in self.store.list_servers():
+            server_name = record["name"]
+            if record["desired_status"] is None or self.is_busy(server_name):
+                continue
+            node = self.nodes.nodes.get(record["node"])
+            if node is not None and not node.connected:
+                # L'inventaire de ce nœud n'est plus à jour
+                continue
+            action = plan(record, self.inventory.get(server_name), self.is_hibernated(server_name))
+            backoff = self._backoff.get(server_name)
+            if action is None:
+                # Stable depuis assez longtemps : le backoff repart de zéro
+                if backoff is not None and now - backoff[1] >= self.backoff_max:
+                    del self._backoff[server_name]
+                continue
+            if backoff is not None and backoff[2] > now:
+                continue
+            actions.append((action, server_name))
+        actions.sort(key=lambda entry: (ACTIONS.index(entry[0]), entry[1]))
+        return actions
+
+    async def _apply(self, action, server_name):
+        attempts = self._backoff.get(server_name, (0,))[0] + 1
+        delay = min(self.backoff_initial * 2 ** (attempts - 1), self.backoff_max)
+        now = time.monotonic()
+        self._backoff[server_name] = (attempts, now, now + delay * random.uniform(0.5, 1.0))
+        self.metrics[action] += 1
+        try:
+            await self.apply(action, server_name)
+        except Exception as e:
+            self.metrics["failures"] += 1
+            logger.warning("Could not %s server %s: %s", action, server_name, e)
+
+    async def reconcile(self):
+        """
+        Apply the pending actions in waves until every server has converged or is backing off.
+
+        Returns:
+            int: The number of actions applied.
+        """
+        started_at = time.time()
+        applied = 0
+        while True:
+            actions = self.diff()
+            if not actions:
+                break
+            if applied:
+                # Les actions restantes sont recalculées après la pause : l'état a pu changer
+                await asyncio.sleep(self.wave_delay * random.uniform(0.5, 1.0))
+                actions = self.diff()
+                if not actions:
+                    break
+            wave = actions[:self.batch]
+            await asyncio.gather(*(self._apply(action, server_name) for action, server_name in wave))
+            applied += len(wave)
+            self.metrics["waves"] += 1
+        self.metrics["passes"] += 1
+        self.last_pass = {"at": started_at, "duration": time.time() - started_at, "actions": applied}
+        return applied
+
+    def status(self):
+        now = time.monotonic()
+        return {
+            "enabled": self.enabled,
+            "interval_seconds": self.interval,
+            "batch": self.batch,
+            "wave_delay_seconds": self.wave_delay,
+            "metrics": dict(self.metrics),
+            "last_pass": self.last_pass,
+            "backing_off": {
+                server_name: {"attempts": attempts, "retry_in": round(retry_at - now, 1)}
+                for server_name, (attempts, _, retry_at) in self._backoff.items()
+                if retry_at > now
+            },
+        }
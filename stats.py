@@ -0,0 +1,284 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Intervalle entre deux relevés des statistiques de tous les serveurs
+STATS_INTERVAL = float(os.environ.get("MCDEPLOYER_STATS_INTERVAL", "10"))
+# Nombre de relevés conservés par serveur
+STATS_SAMPLES = int(os.environ.get("MCDEPLOYER_STATS_SAMPLES", "60"))
+
+MEMORY_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_memory(value):
+    """
+    Parse a JVM memory size such as "2G" or "1024m".
+
+    Args:
+        value (str): The size, with an optional K, M, G or T suffix.
+
+    Returns:
+        int: The size in bytes, or None if the value cannot be parsed.
+    """
+    if not value:
+        return None
+    value = value.strip().upper()
+    try:
+        if value[-1] in MEMORY_UNITS:
+            return int(float(value[:-1]) * MEMORY_UNITS[value[-1]])
+        return int(value)
+    except ValueError:
+        return None
+
+
+def _container_env(attrs):
+    env = {}
+    for entry in (attrs.get("Config") or {}).get("Env") or []:
+        key, _, value = entry.partition("=")
+        env[key] = value
+    return env
+
+
+def _memory_usage(memory_stats):
+    usage = memory_stats.get("usage")
+    if usage is None:
+        return None
+    details = memory_stats.get("stats") or {}
+    # Même calcul que `docker stats` : le cache de pages inactif n'est pas compté (cgroup v1 et v2)
+    inactive = details.get("inactive_file", details.get("total_inactive_file", 0))
+    return max(0, usage - inactive)
+
+
+def _block_io(blkio_stats):
+    read = write = 0
+    for entry in (blkio_stats or {}).get("io_service_bytes_recursive") or []:
+        op = entry.get("op", "").lower()
+        if op == "read":
+            read += entry.get("value", 0)
+        elif op == "write":
+            write += entry.get("value", 0)
+    return read, write
+
+
+def parse_sample(raw, previous=None, memory_max=None):
+    """
+    Turn one raw stats document into a sample.
+
+    The CPU usage is computed against the previous sample of the same container, so the
+    stats can be read in one shot instead of waiting a second for Docker's own pre-read.
+
+    Args:
+        raw (dict): The document returned by the stats endpoint.
+        previous (dict): The previous sample of the container, if any.
+        memory_max (int): The JVM maximum memory of the server, in bytes, if known.
+
+    Returns:
+        dict: The sample.
+    """
+    cpu_stats = raw.get("cpu_stats") or {}
+    cpu_total = (cpu_stats.get("cpu_usage") or {}).get("total_usage", 0)
+    system_total = cpu_stats.get("system_cpu_usage", 0)
+    online_cpus = cpu_stats.get("online_cpus") or len((cpu_stats.get("cpu_usage") or {}).get("percpu_usage") or []) or 1
+    cpu_percent = None
+    if previous is not None:
+        cpu_delta = cpu_total - previous["_cpu_total"]
+        system_delta = system_total - previous["_system_total"]
+        if cpu_delta >= 0 and system_delta > 0:
+            cpu_percent = cpu_delta / system_delta * online_cpus * 100.0
+    memory_stats = raw.get("memory_stats") or {}
+    memory = _memory_usage(memory_stats)
+    networks = raw.get("networks") or {}
+    block_read, block_write = _block_io(raw.get("blkio_stats"))
+    return {
+        "timestamp": time.time(),
+        "cpu_percent": cpu_percent,
+        "online_cpus": online_cpus,
+        "memory_bytes": memory,
+        "memory_limit_bytes": memory_stats.get("limit"),
+        "memory_max_bytes": memory_max,
+        "memory_percent_of_max": memory / memory_max * 100.0 if memory is not None and memory_max else None,
+        "network_rx_bytes": sum(network.get("rx_bytes", 0) for network in networks.values()),
+        "network_tx_bytes": sum(network.get("tx_bytes", 0) for network in networks.values()),
+        "block_read_bytes": block_read,
+        "block_write_bytes": block_write,
+        "pids": (raw.get("pids_stats") or {}).get("current"),
+        "_cpu_total": cpu_total,
+        "_system_total": system_total,
+    }
+
+
+def public_sample(sample):
+    return {key: value for key, value in sample.items() if not key.startswith("_")}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def prometheus_metric(name, help, type, values):
+    """
+    Render one metric family in the Prometheus text exposition format.
+
+    Args:
+        name (str): The metric name.
+        help (str): The help text.
+        type (str): "gauge" or "counter".
+        values (list): (labels dict, value) pairs; None values are skipped.
+
+    Returns:
+        list: The lines of the family, empty if there is no value.
+    """
+    lines = []
+    for labels, value in values:
+        if value is None:
+            continue
+        rendered = ",".join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+        lines.append(f"{name}{{{rendered}}} {value}" if rendered else f"{name} {value}")
+    if not lines:
+        return []
+    return [f"# HELP {name} {help}", f"# TYPE {name} {type}"] + lines
+
+
+# Séries exposées sur /metrics : (nom, aide, type, clé du relevé)
+SERVER_METRICS = (
+    ("mcdeployer_server_cpu_percent", "CPU usage of the server container, in percent of one core.", "gauge", "cpu_percent"),
+    ("mcdeployer_server_memory_bytes", "Memory used by the server container, without inactive page cache.", "gauge", "memory_bytes"),
+    ("mcdeployer_server_memory_limit_bytes", "Memory limit of the server container.", "gauge", "memory_limit_bytes"),
+    ("mcdeployer_server_memory_max_bytes", "JVM maximum memory configured for the server.", "gauge", "memory_max_bytes"),
+    ("mcdeployer_server_network_receive_bytes_total", "Bytes received by the server container.", "counter", "network_rx_bytes"),
+    ("mcdeployer_server_network_transmit_bytes_total", "Bytes sent by the server container.", "counter", "network_tx_bytes"),
+    ("mcdeployer_server_block_read_bytes_total", "Bytes read from block devices by the server container.", "counter", "block_read_bytes"),
+    ("mcdeployer_server_block_write_bytes_total", "Bytes written to block devices by the server container.", "counter", "block_write_bytes"),
+    ("mcdeployer_server_pids", "Number of processes and threads in the server container.", "gauge", "pids"),
+)
+
+
+class StatsCollector:
+    """
+    Background sampler of the resource usage of every running server.
+
+    Every `interval` seconds, one one-shot stats call per running container is made through
+    the DockerExecutor "stats" operation, and the samples are appended to a fixed-size ring
+    buffer per server. Requests are served from these buffers and never call the daemon.
+    Servers of other nodes are sampled with the client and the executor of their node, from
+    the node registry `nodes`.
+    """
+
+    def __init__(self, client, docker_exec, inventory, interval=STATS_INTERVAL, samples=STATS_SAMPLES, nodes=None):
+        self.client = client
+        self.nodes = nodes
+        self.docker_exec = docker_exec
+        self.inventory = inventory
+        self.interval = interval
+        self.size = samples
+        self.metrics = {"cycles": 0, "samples": 0, "errors": 0, "last_cycle_seconds": None}
+        self._series = {}
+        # identifiant du conteneur -> mémoire maximale de la JVM, lue une seule fois
+        self._memory_max = {}
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            started = time.monotonic()
+            try:
+                await self.collect()
+            except Exception as e:
+                logger.warning("Stats collection failed: %s", e)
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def _read(self, client, container_id):
+        return client.api.stats(container_id, stream=False, one_shot=True)
+
+    def _read_memory_max(self, client, container_id):
+        env = _container_env(client.api.inspect_container(container_id))
+        return parse_memory(env.get("MAX_MEMORY") or env.get("MEMORY"))
+
+    async def _sample(self, server):
+        container_id = server["id"]
+        node = self.nodes.nodes.get(server.get("node")) if self.nodes is not None else None
+        # Chaque nœud a son propre client et ses propres créneaux "stats"
+        client = node.client if node is not None else self.client
+        docker_exec = node.docker_exec if node is not None else self.docker_exec
+        if container_id not in self._memory_max:
+            self._memory_max[container_id] = await docker_exec.run("stats", self._read_memory_max, client, container_id)
+        raw = await docker_exec.run("stats", self._read, client, container_id)
+        series = self._series.get(server["name"])
+        if series is None or series["id"] != container_id:
+            series = self._series[server["name"]] = {"id": container_id, "samples": deque(maxlen=self.size)}
+        previous = series["samples"][-1] if series["samples"] else None
+        series["samples"].append(parse_sample(raw, previous, self._memory_max[container_id]))
+        self.metrics["samples"] += 1
+
+    async def collect(self):
+        """
+        Take one sample of every running server, in parallel.
+        """
+        started = time.monotonic()
+        servers = [server for server in self.inventory.list() if server["status"] == "running" and server["id"]]
+        results = await asyncio.gather(*(self._sample(server) for server in servers), return_exceptions=True)
+        for server, result in zip(servers, results):
+            if isinstance(result, Exception):
+                self.metrics["errors"] += 1
+                logger.debug("Could not sample the stats of %s: %s", server["name"], result)
+        # Séries des serveurs supprimés
+        known = {server["name"] for server in self.inventory.list()}
+        for name in list(self._series):
+            if name not in known:
+                del self._series[name]
+        live_ids = {series["id"] for series in self._series.values()}
+        for container_id in list(self._memory_max):
+            if container_id not in live_ids:
+                del self._memory_max[container_id]
+        self.metrics["cycles"] += 1
+        self.metrics["last_cycle_seconds"] = time.monotonic() - started
+
+    def series(self, server_name):
+        """
+        Get the samples kept for a server.
+
+        Args:
+            server_name (str): The name of the server.
+
+        Returns:
+            list: The samples, oldest first; empty if none was taken yet.
+        """
+        series = self._series.get(server_name)
+        return [public_sample(sample) for sample in series["samples"]] if series else []
+
+    def latest(self, server_name):
+        samples = self.series(server_name)
+        return samples[-1] if samples else None
+
+    def prometheus(self):
+        """
+        Render the latest sample of every server in the Prometheus text exposition format.
+
+        Returns:
+            list: The lines of the server and collector metric families.
+        """
+        latest = {name: series["samples"][-1] for name, series in self._series.items() if series["samples"]}
+        lines = []
+        for name, help, type, key in SERVER_METRICS:
+            lines += prometheus_metric(name, help, type, [({"server": server}, sample[key]) for server, sample in latest.items()])
+        lines += prometheus_metric(
+            "mcdeployer_stats_cycle_seconds", "Duration of the last stats collection cycle.", "gauge",
+            [({}, self.metrics["last_cycle_seconds"])],
+        )
+        lines += prometheus_metric(
+            "mcdeployer_stats_errors_total", "Stats samples that could not be taken.", "counter",
+            [({}, self.metrics["errors"])],
+        )
+        return lines
@@ -0,0 +1,327 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+# Fichier SQLite de l'état ; par défaut ServerData/.mcdeployer.db
+STATE_DB = os.environ.get("MCDEPLOYER_STATE_DB", "")
+# Événements de cycle de vie conservés par serveur
+STATE_HISTORY = int(os.environ.get("MCDEPLOYER_STATE_HISTORY", "1000"))
+
+# Une entrée par version du schéma, appliquée une seule fois (PRAGMA user_version)
+MIGRATIONS = [
+    """
+    CREATE TABLE servers (
+        name TEXT PRIMARY KEY,
+        node TEXT,
+        container_id TEXT,
+        spec TEXT,
+        ports TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX servers_node ON servers (node);
+    CREATE INDEX servers_container ON servers (container_id);
+    CREATE TABLE history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        server TEXT NOT NULL,
+        at REAL NOT NULL,
+        event TEXT NOT NULL,
+        detail TEXT
+    );
+    CREATE INDEX history_server ON history (server, id);
+    """,
+    # État voulu (running, stopped ou NULL : non géré) et empreinte de la spec du conteneur actuel
+    """
+    ALTER TABLE servers ADD COLUMN desired_status TEXT;
+    ALTER TABLE servers ADD COLUMN applied TEXT;
+    """,
+    """
+    CREATE TABLE backup_schedules (
+        server TEXT PRIMARY KEY,
+        interval REAL NOT NULL,
+        keep INTEGER,
+        last_at REAL
+    );
+    """,
+    # Modèles de serveurs : configuration partagée (leurs données sont dans ServerData/.templates)
+    """
+    CREATE TABLE templates (
+        name TEXT PRIMARY KEY,
+        config TEXT NOT NULL,
+        source TEXT,
+        created_at REAL NOT NULL
+    );
+    """,
+]
+
+
+def spec_hash(spec):
+    """
+    Fingerprint a server spec, to tell whether its container was created from it.
+
+    Args:
+        spec (dict): The configuration of the server.
+
+    Returns:
+        str: A short hash of the spec, independent of the key order.
+    """
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _row(row):
+    server = dict(row)
+    server["spec"] = json.loads(server["spec"]) if server["spec"] else None
+    server["ports"] = json.loads(server["ports"]) if server["ports"] else None
+    return server
+
+
+class StateStore:
+    """
+    Embedded SQLite store of the server definitions.
+
+    It keeps, for every server, the configuration it was created with, its ports, its
+    node and container, and a bounded history of its lifecycle, so a server can be
+    recreated or upgraded from its spec. The database runs in WAL mode with
+    synchronous=NORMAL: readers never wait for the writer and a commit does not fsync, so
+    reads and the small write transactions run directly on the asyncio loop in well
+    under a millisecond. All access happens on the loop thread.
+    """
+
+    def __init__(self, history=STATE_HISTORY):
+        self.history_size = history
+        self.path = None
+        self._db = None
+
+    def open(self, path):
+        """
+        Open (and create or migrate) the database.
+
+        Args:
+            path (str): The SQLite file.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+            with self._db:
+                self._db.execute("BEGIN")
+                for statement in script.split(";"):
+                    if statement.strip():
+                        self._db.execute(statement)
+                self._db.execute(f"PRAGMA user_version={number}")
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def put_server(self, name, spec=None, ports=None, node=None, container_id=None, desired_status=None):
+        """
+        Record the definition of a server, replacing the previous one.
+
+        Args:
+            name (str): The name of the server.
+            spec (dict): The configuration its container was created with.
+            ports (dict): Its host ports, by kind.
+            node (str): The node it was placed on.
+            container_id (str): The id of its container.
+            desired_status (str): "running" or "stopped" to let the reconciler keep it in
+                that state; None to leave it unmanaged.
+        """
+        now = time.time()
+        with self._db:
+            self._db.execute(
+                "INSERT INTO servers (name, node, container_id, spec, ports, created_at, updated_at, desired_status, applied)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (name) DO UPDATE SET node = excluded.node, container_id = excluded.container_id,"
+                " spec = excluded.spec, ports = excluded.ports, updated_at = excluded.updated_at,"
+                " desired_status = excluded.desired_status, applied = excluded.applied",
+                (name, node, container_id, json.dumps(spec) if spec is not None else None,
+                 json.dumps(ports) if ports is not None else None, now, now, desired_status,
+                 spec_hash(spec) if spec is not None else None),
+            )
+
+    def update_server(self, name, **fields):
+        """
+        Change some columns of a recorded server.
+
+        Args:
+            name (str): The name of the server.
+            **fields: node, container_id, spec, ports or desired_status. Changing the spec
+                does not change the fingerprint of the applied one.
+        """
+        for key in ("spec", "ports"):
+            if key in fields and fields[key] is not None:
+                fields[key] = json.dumps(fields[key])
+        columns = ", ".join(f"{key} = ?" for key in fields)
+        with self._db:
+            self._db.execute(
+                f"UPDATE servers SET {columns}, updated_at = ? WHERE name = ?",
+                (*fields.values(), time.time(), name),
+            )
+
+    def delete_server(self, name):
+        with self._db:
+            self._db.execute("DELETE FROM servers WHERE name = ?", (name,))
+
+    def get_server(self, name):
+        """
+        Read the definition of a server.
+
+        Args:
+            name (str): The name of the server.
+
+        Returns:
+            dict: Its spec, ports, node, container id and timestamps; None if unknown.
+        """
+        row = self._db.execute("SELECT * FROM servers WHERE name = ?", (name,)).fetchone()
+        return _row(row) if row else None
+
+    def list_servers(self, node=None):
+        if node is None:
+            rows = self._db.execute("SELECT * FROM servers ORDER BY name").fetchall()
+        else:
+            rows = self._db.execute("SELECT * FROM servers WHERE node = ? ORDER BY name", (node,)).fetchall()
+        return [_row(row) for row in rows]
+
+    def record(self, server, event, detail=None, at=None):
+        """
+        Append a lifecycle event to the history of a server, dropping the oldest beyond the limit.
+
+        Args:
+            server (str): The name of the server.
+            event (str): What happened, e.g. "created", "status", "deleted".
+            detail (str): Optional detail, e.g. the new status.
+            at (float): The POSIX time of the event; now if not set.
+        """
+        with self._db:
+            self._db.execute(
+                "INSERT INTO history (server, at, event, detail) VALUES (?, ?, ?, ?)",
+                (server, at or time.time(), event, detail),
+            )
+            self._db.execute(
+                "DELETE FROM history WHERE server = ? AND id < "
+                "(SELECT id FROM history WHERE server = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (server, server, self.history_size - 1),
+            )
+
+    def history(self, server, limit=100):
+        """
+        Read the most recent lifecycle events of a server.
+
+        Args:
+            server (str): The name of the server.
+            limit (int): How many events to return.
+
+        Returns:
+            list: The events, oldest first.
+        """
+        rows = self._db.execute(
+            "SELECT at, event, detail FROM history WHERE server = ? ORDER BY id DESC LIMIT ?", (server, limit)
+        ).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    def set_backup_schedule(self, server, interval, keep=None):
+        """
+        Back up a server every `interval` seconds, keeping its last `keep` snapshots.
+
+        Args:
+            server (str): The name of the server.
+            interval (float): Seconds between two backups.
+            keep (int): How many snapshots to keep; None to keep them all.
+        """
+        with self._db:
+            self._db.execute(
+                "INSERT INTO backup_schedules (server, interval, keep) VALUES (?, ?, ?)"
+                " ON CONFLICT (server) DO UPDATE SET interval = excluded.interval, keep = excluded.keep",
+                (server, interval, keep),
+            )
+
+    def delete_backup_schedule(self, server):
+        with self._db:
+            self._db.execute("DELETE FROM backup_schedules WHERE server = ?", (server,))
+
+    def get_backup_schedule(self, server):
+        row = self._db.execute("SELECT * FROM backup_schedules WHERE server = ?", (server,)).fetchone()
+        return dict(row) if row else None
+
+    def backup_schedules(self):
+        return [dict(row) for row in self._db.execute("SELECT * FROM backup_schedules ORDER BY server")]
+
+    def mark_backup(self, server, at):
+        with self._db:
+            self._db.execute("UPDATE backup_schedules SET last_at = ? WHERE server = ?", (at, server))
+
+    def put_template(self, name, config, source=None):
+        """
+        Record a server template, replacing any previous one with the same name.
+
+        Args:
+            name (str): The name of the template.
+            config (dict): The configuration of the servers created from it, without instance fields.
+            source (str): The server its data was captured from, if any.
+        """
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO templates (name, config, source, created_at) VALUES (?, ?, ?, ?)",
+                (name, json.dumps(config), source, time.time()),
+            )
+
+    def get_template(self, name):
+        row = self._db.execute("SELECT * FROM templates WHERE name = ?", (name,)).fetchone()
+        return dict(row, config=json.loads(row["config"])) if row else None
+
+    def list_templates(self):
+        return [dict(row, config=json.loads(row["config"])) for row in self._db.execute("SELECT * FROM templates ORDER BY name")]
+
+    def delete_template(self, name):
+        with self._db:
+            return self._db.execute("DELETE FROM templates WHERE name = ?", (name,)).rowcount > 0
+
+    def reconcile(self, servers, nodes=None):
+        """
+        Compare the recorded servers with the managed containers found on the Docker nodes.
+
+        Containers unknown to the store are adopted without a spec; recorded servers whose
+        container is gone are kept (their spec allows recreating them) and reported missing.
+        Only the nodes actually listed are compared: the servers recorded on a node that
+        could not be reached are left as they are.
+
+        Args:
+            servers (list): The inventory entries (name, id, node) of the managed containers.
+            nodes (set): The nodes whose containers are all in servers; None for every node.
+
+        Returns:
+            dict: The names of the adopted, missing and updated servers.
+        """
+        recorded = {server["name"]: server for server in self.list_servers()}
+        result = {"adopted": [], "missing": [], "updated": []}
+        if nodes is not None:
+            servers = [server for server in servers if server["node"] in nodes]
+        for server in servers:
+            known = recorded.pop(server["name"], None)
+            if known is None:
+                self.put_server(server["name"], node=server["node"], container_id=server["id"])
+                self.record(server["name"], "adopted", server["id"])
+                result["adopted"].append(server["name"])
+            elif (known["container_id"], known["node"]) != (server["id"], server["node"]):
+                self.update_server(server["name"], container_id=server["id"], node=server["node"])
+                self.record(server["name"], "container", server["id"])
+                result["updated"].append(server["name"])
+        for name, known in recorded.items():
+            if nodes is not None and known["node"] not in nodes:
+                continue
+            if known["container_id"] is not None:
+                self.update_server(name, container_id=None)
+                self.record(name, "missing", known["container_id"])
+            result["missing"].append(name)
+        return result
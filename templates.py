@@ -0,0 +1,183 @@
+import errno
+import fcntl
+import fnmatch
+import logging
+import os
+import re
+import shutil
+import uuid
+
+from artifacts import is_shared
+
+logger = logging.getLogger(__name__)
+
+# ioctl Linux de clonage d'un fichier par partage de ses extents (btrfs, XFS, bcachefs, ZFS 2.2)
+FICLONE = 0x40049409
+# Fichiers propres à une instance, jamais copiés dans un modèle ou un clone
+CLONE_EXCLUDED_PATTERNS = ("logs/*", "crash-reports/*", ".mcdeployer-*", "session.lock", "*/session.lock")
+# Champs de configuration propres à un serveur, jamais hérités d'un modèle ou d'un serveur cloné
+INSTANCE_FIELDS = ("server_name", "port", "rcon_port", "query_port", "rcon_password", "template", "pregenerate_radius")
+TEMPLATE_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+STAGING_DIR = ".staging"
+
+
+def _matches(relative_path, patterns):
+    return any(fnmatch.fnmatch(relative_path, pattern) for pattern in patterns)
+
+
+def reflink(source, target):
+    """
+    Clone a file by sharing its extents: instant, and blocks are copied only when written.
+
+    Args:
+        source (str): The file to clone.
+        target (str): The new file.
+
+    Raises:
+        OSError: If the filesystem cannot clone files (EOPNOTSUPP, EXDEV, EINVAL, ...).
+    """
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copystat(source, target)
+
+
+def clone_tree(source, target, use_reflink=True):
+    """
+    Copy a server directory with copy-on-write where the filesystem allows it. Blocking.
+
+    World files are reflinked, or copied when reflinks are not supported: Minecraft rewrites
+    region files in place, so they can never be shared. Jars, libraries, mods and plugins
+    are immutable and hard-linked, like the artifact store does. Logs, crash reports,
+    session locks and MCDeployer markers are skipped.
+
+    Args:
+        source (str): The directory to copy.
+        target (str): The new directory, which must not exist.
+        use_reflink (bool): Whether to try reflinks before copying.
+
+    Returns:
+        dict: The number of files reflinked, hard-linked and copied, and the bytes copied.
+    """
+    result = {"reflinked": 0, "linked": 0, "copied": 0, "bytes_copied": 0}
+    os.makedirs(target)
+    for directory, subdirectories, files in os.walk(source):
+        relative_directory = os.path.relpath(directory, source)
+        subdirectories[:] = [
+            name for name in subdirectories
+            if not _matches(os.path.normpath(os.path.join(relative_directory, name)) + "/", CLONE_EXCLUDED_PATTERNS)
+        ]
+        for name in subdirectories:
+            relative_path = os.path.normpath(os.path.join(relative_directory, name))
+            if not os.path.islink(os.path.join(directory, name)):
+                os.makedirs(os.path.join(target, relative_path), exist_ok=True)
+        for name in files + [name for name in subdirectories if os.path.islink(os.path.join(directory, name))]:
+            relative_path = os.path.normpath(os.path.join(relative_directory, name))
+            if _matches(relative_path, CLONE_EXCLUDED_PATTERNS):
+                continue
+            path, copy = os.path.join(directory, name), os.path.join(target, relative_path)
+            if os.path.islink(path):
+                os.symlink(os.readlink(path), copy)
+                continue
+            if is_shared(relative_path):
+                try:
+                    os.link(path, copy)
+                    result["linked"] += 1
+                    continue
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        raise
+            if use_reflink:
+                try:
+                    reflink(path, copy)
+                    result["reflinked"] += 1
+                    continue
+                except OSError as e:
+                    # Inutile de réessayer fichier par fichier sur le même système de fichiers
+                    logger.info("Reflinks not supported from %s, copying: %s", source, e)
+                    use_reflink = False
+            shutil.copy2(path, copy)
+            result["copied"] += 1
+            result["bytes_copied"] += os.path.getsize(copy)
+    return result
+
+
+class TemplateRepository:
+    """
+    Baseline data directories (world, mods, plugins, configuration) of the server templates.
+
+    The data of a template lives under ServerData/.templates/<name>, on the same filesystem
+    as the servers so its files can be reflinked or hard-linked into them. Snapshots of
+    running servers being cloned are staged under ServerData/.templates/.staging.
+    """
+
+    def __init__(self, data_root):
+        self.root = os.path.join(data_root, ".templates")
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def has_data(self, name):
+        return os.path.isdir(self.path(name))
+
+    def capture(self, name, data_dir):
+        """
+        Make the data directory of a server the baseline of a template. Blocking.
+
+        The snapshot is built next to the template and swapped in once complete, so servers
+        seeded meanwhile see either the previous baseline or the new one.
+
+        Args:
+            name (str): The name of the template.
+            data_dir (str): The data directory of the server.
+
+        Returns:
+            dict: The copy statistics (see clone_tree).
+        """
+        temporary = os.path.join(self.root, STAGING_DIR, f"{name}-{uuid.uuid4().hex[:8]}")
+        os.makedirs(os.path.dirname(temporary), exist_ok=True)
+        result = clone_tree(data_dir, temporary)
+        previous = None
+        if os.path.exists(self.path(name)):
+            previous = f"{temporary}-previous"
+            os.rename(self.path(name), previous)
+        os.rename(temporary, self.path(name))
+        if previous:
+            shutil.rmtree(previous, ignore_errors=True)
+        return result
+
+    def stage(self, data_dir):
+        """
+        Snapshot the data directory of a server to seed its clones from. Blocking.
+
+        Args:
+            data_dir (str): The data directory of the server.
+
+        Returns:
+            tuple: The path of the snapshot and the copy statistics.
+        """
+        path = os.path.join(self.root, STAGING_DIR, uuid.uuid4().hex)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            return path, clone_tree(data_dir, path)
+        except BaseException:
+            self.discard(path)
+            raise
+
+    def seed(self, source, data_dir):
+        """
+        Create the data directory of a new server from a template or a staged snapshot. Blocking.
+
+        Args:
+            source (str): The template data or staged snapshot.
+            data_dir (str): The data directory of the new server, which must not exist.
+
+        Returns:
+            dict: The copy statistics (see clone_tree).
+        """
+        return clone_tree(source, data_dir)
+
+    def delete(self, name):
+        shutil.rmtree(self.path(name), ignore_errors=True)
+
+    def discard(self, path):
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,175 @@
+import json
+import os
+import shutil
+import time
+
+import docker
+import pytest
+import requests
+from fastapi import WebSocketDisconnect
+from fastapi.testclient import TestClient
+
+import probe
+import templates
+from artifacts import ArtifactStore
+from fake_docker import load_api
+
+
+@pytest.fixture(scope="module")
+def loaded_api():
+    """ Module api et démon Docker simulé, sans Docker ni serveur sur :8000 """
+    api, fake = load_api(0)
+    api.artifacts = ArtifactStore(api.SERVER_DATA_DIR)
+    yield api, fake
+    shutil.rmtree(api.SERVER_DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="module")
+def api_client(loaded_api):
+    api, _ = loaded_api
+    with TestClient(api.app) as client:
+        yield client
+
+
+def wait_for_job(client, job_id):
+    for _ in range(100):
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_backups_reject_paths_outside_server_data(api_client):
+    """ Vérifie qu'un nom de serveur ne peut pas désigner un dossier hors de ServerData """
+    assert api_client.post("/servers/%2E%2E/backups").status_code == 422
+    assert api_client.post("/servers/%2E%2E/backups/1-abcdef/restore").status_code == 422
+    assert api_client.post("/create-server/", json={"server_name": ".."}).status_code == 422
+    assert api_client.post("/servers/ghost/backups").status_code == 404
+    assert api_client.post("/servers/ghost/backups/1-abcdef/restore").status_code == 404
+
+
+def test_failed_create_removes_new_data_dir(api_client, loaded_api, monkeypatch):
+    """ Vérifie qu'une création refusée par Docker ne laisse ni dossier de données ni conteneur orphelin """
+    api, fake = loaded_api
+    create = fake.containers.create
+    for error in (docker.errors.ImageNotFound("missing"), docker.errors.APIError("refused")):
+        def refuse(*args, **kwargs):
+            raise error
+        monkeypatch.setattr(fake.containers, "create", refuse)
+        response = api_client.post("/create-server/", json={"server_name": "lobby", "eula": "true"})
+        job = wait_for_job(api_client, response.json()["job_id"])
+        assert job["status"] == "failed"
+        assert not os.path.exists(os.path.join(api.SERVER_DATA_DIR, "lobby"))
+
+    # Conteneur créé, puis démarrage refusé (port déjà pris)
+    def create_unstartable(*args, **kwargs):
+        container = create(*args, **kwargs)
+        container.start = refuse
+        return container
+    monkeypatch.setattr(fake.containers, "create", create_unstartable)
+    response = api_client.post("/create-server/", json={"server_name": "lobby", "eula": "true"})
+    assert wait_for_job(api_client, response.json()["job_id"])["status"] == "failed"
+    assert "lobby" not in fake.containers._containers
+    assert not os.path.exists(os.path.join(api.SERVER_DATA_DIR, "lobby"))
+
+    # Conteneur démarré, puis échec de l'enregistrement dans le store
+    monkeypatch.setattr(fake.containers, "create", create)
+    monkeypatch.setattr(api.store, "record", refuse)
+    response = api_client.post("/create-server/", json={"server_name": "lobby", "eula": "true"})
+    assert wait_for_job(api_client, response.json()["job_id"])["status"] == "failed"
+    assert "lobby" not in fake.containers._containers
+    assert api.store.get_server("lobby") is None and api.inventory.get("lobby") is None
+    monkeypatch.undo()
+
+    # Le nom est libre : un nouvel essai réussit
+    response = api_client.post("/create-server/", json={"server_name": "lobby", "eula": "true"})
+    assert wait_for_job(api_client, response.json()["job_id"])["status"] == "succeeded"
+
+
+def test_clone_discards_staging_on_error(api_client, loaded_api, monkeypatch, tmp_path):
+    """ Vérifie que des surcharges invalides sont refusées avant l'instantané et qu'un instantané raté est supprimé """
+    api, _ = loaded_api
+    monkeypatch.setattr(api.templates, "root", str(tmp_path))
+    response = api_client.post("/create-server/", json={"server_name": "source", "eula": "true"})
+    assert wait_for_job(api_client, response.json()["job_id"])["status"] == "succeeded"
+
+    response = api_client.post("/servers/source/clone", json={"count": 2, "config": {"memory_limit": {"bad": 1}}})
+    assert response.status_code == 422 and "memory_limit" in response.json()["detail"]
+    assert not os.path.exists(os.path.join(tmp_path, ".staging"))
+
+    def clone_tree(source, destination):
+        os.makedirs(destination)
+        raise OSError("disk full")
+    monkeypatch.setattr(templates, "clone_tree", clone_tree)
+    response = api_client.post("/servers/source/clone", json={"count": 2})
+    assert response.status_code == 500 and response.json()["detail"] == "disk full"
+    assert os.listdir(os.path.join(tmp_path, ".staging")) == []
+
+
+def test_healthz_without_daemon(api_client):
+    """ Vérifie que le contrôle de santé répond sans démon Docker réel, contre le client simulé """
+    response = api_client.get("/healthz")
+    assert response.status_code == 200
+    health = response.json()
+    assert health["status"] == "ok" and health["uptime_seconds"] >= 0
+    assert all(node["client"] for node in health["nodes"].values())
+
+
+def test_batch_restart_waits_for_servers_to_answer(api_client, loaded_api, monkeypatch):
+    """ Vérifie qu'un serveur lent à répondre après son redémarrage retient la vague suivante """
+    api, _ = loaded_api
+    for name in ("wave-a", "wave-b"):
+        response = api_client.post("/create-server/", json={"server_name": name, "eula": "true"})
+        assert wait_for_job(api_client, response.json()["job_id"])["status"] == "succeeded"
+    slow_port = api.inventory.get("wave-a")["port"]
+
+    async def server_list_ping(host, port, timeout):
+        if port == slow_port:
+            raise ConnectionRefusedError(port)
+        return {"players_online": 0, "max_players": 20, "latency_ms": 1.0}
+    monkeypatch.setattr(probe, "server_list_ping", server_list_ping)
+
+    response = api_client.post("/servers/batch/restart", json={"names": ["wave-a", "wave-b"], "parallelism": 1, "ready_timeout": 0.3})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    results = {line["server_name"]: line for line in lines[:-1]}
+    assert results["wave-a"]["status"] == "failed" and results["wave-a"]["error"]["status_code"] == 504
+    assert results["wave-b"]["status"] == "succeeded"
+    assert lines[-1]["summary"]["failed"] == 1
+    slow = api_client.get(f"/jobs/{results['wave-a']['job_id']}").json()
+    following = api_client.get(f"/jobs/{results['wave-b']['job_id']}").json()
+    assert following["created_at"] >= slow["finished_at"] + 0.3
+
+
+def test_artifacts_are_ingested_once_ready(api_client, loaded_api, monkeypatch):
+    """ Vérifie que les jars d'un serveur sont partagés dès qu'il répond, sans attendre la mesure du pool """
+    api, _ = loaded_api
+    response = api_client.post("/create-server/", json={"server_name": "ingested", "eula": "true"})
+    assert wait_for_job(api_client, response.json()["job_id"])["status"] == "succeeded"
+    data_dir = os.path.join(api.SERVER_DATA_DIR, "ingested")
+    with open(os.path.join(data_dir, "server.jar"), "wb") as f:
+        f.write(b"jar")
+
+    async def server_list_ping(host, port, timeout):
+        return {"players_online": 0, "max_players": 20, "latency_ms": 1.0}
+    monkeypatch.setattr(probe, "server_list_ping", server_list_ping)
+    for _ in range(100):
+        if os.path.exists(os.path.join(data_dir, ".mcdeployer-artifacts")):
+            break
+        time.sleep(0.05)
+    assert os.stat(os.path.join(data_dir, "server.jar")).st_nlink == 2
+
+
+def test_console_closes_when_the_daemon_is_unreachable(api_client, loaded_api, monkeypatch):
+    """ Vérifie qu'un démon injoignable ferme la console avec le code 1011 et sa raison """
+    api, _ = loaded_api
+    response = api_client.post("/create-server/", json={"server_name": "console", "eula": "true"})
+    assert wait_for_job(api_client, response.json()["job_id"])["status"] == "succeeded"
+
+    def unreachable(client, container_id):
+        raise requests.exceptions.ConnectionError("Connection refused")
+    monkeypatch.setattr(api.consoles, "_attach_socket", unreachable)
+    with api_client.websocket_connect("/servers/console/console") as websocket:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_text()
+    assert closed.value.code == 1011 and "Connection refused" in closed.value.reason
@@ -0,0 +1,48 @@
+import hashlib
+import os
+
+from artifacts import ArtifactStore, is_shared
+from conftest import write
+
+
+def test_only_immutable_files_are_shared():
+    """ Vérifie que seuls les jars sont partagés, sans que "*" traverse les sous-dossiers """
+    assert is_shared("paper.jar")
+    assert is_shared("mods/sodium.jar")
+    assert is_shared("libraries/com/google/guava/guava/32.1.2/guava-32.1.2.jar")
+    assert is_shared("versions/1.20.4/paper-1.20.4.jar")
+    assert not is_shared("mods/config/sodium.json")
+    assert not is_shared("mods/sub/extra.jar")
+    assert not is_shared("plugins/Essentials/config.yml")
+    assert not is_shared("cache/mojang_1.20.4.json")
+    assert not is_shared("world/paper.jar")
+
+
+def test_ingest_unshares_files_no_longer_shared(tmp_path):
+    """ Vérifie qu'un fichier lié au store par des motifs plus larges redevient propre au serveur """
+    store = ArtifactStore(str(tmp_path))
+    data_dir = os.path.join(tmp_path, "lobby")
+    write(os.path.join(data_dir, "mods", "sodium.jar"), b"jar")
+    write(os.path.join(data_dir, "mods", "config", "sodium.json"), b"{}")
+    # Lien créé par une version qui partageait tout mods/
+    stored = store._object_path(hashlib.sha256(b"{}").hexdigest())
+    os.makedirs(os.path.dirname(stored))
+    os.link(os.path.join(data_dir, "mods", "config", "sodium.json"), stored)
+    os.chmod(stored, 0o444)
+
+    result = store.ingest(data_dir, "key")
+    assert result["ingested"] == 1 and result["unshared"] == 1
+    config = os.path.join(data_dir, "mods", "config", "sodium.json")
+    assert os.stat(config).st_nlink == 1 and os.stat(config).st_mode & 0o200
+    assert os.stat(os.path.join(data_dir, "mods", "sodium.jar")).st_nlink == 2
+
+
+def test_ingest_is_recorded_per_key(tmp_path):
+    """ Vérifie qu'un dossier ingéré n'est plus à ingérer pour la même clé, mais l'est pour une autre """
+    store = ArtifactStore(str(tmp_path))
+    data_dir = os.path.join(tmp_path, "lobby")
+    write(os.path.join(data_dir, "paper.jar"), b"jar")
+    assert not store.ingested(data_dir, "key")
+    store.ingest(data_dir, "key")
+    assert store.ingested(data_dir, "key")
+    assert not store.ingested(data_dir, "other")
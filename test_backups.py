@@ -0,0 +1,103 @@
+import os
+import zlib
+
+import pytest
+
+from backups import EXCLUDED_PATTERNS, SECTOR, BackupRepository, SnapshotNotFound, region_pieces
+
+
+def write_region(path, chunks):
+    """ Fichier de région Anvil : un chunk compressé par entrée de (index, données) """
+    header, body = bytearray(2 * SECTOR), bytearray()
+    for index, data in chunks:
+        payload = zlib.compress(data)
+        record = (len(payload) + 1).to_bytes(4, "big") + b"\x02" + payload
+        sectors = -(-len(record) // SECTOR)
+        sector = 2 + len(body) // SECTOR
+        header[index * 4:index * 4 + 4] = sector.to_bytes(3, "big") + bytes([sectors])
+        body += record.ljust(sectors * SECTOR, b"\0")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(header + body)
+
+
+def chunk(index, version=0):
+    return f"chunk {index} v{version} ".encode() * 200
+
+
+@pytest.fixture
+def world(tmp_path):
+    """ Dossier de serveur avec une région de 64 chunks, un fichier de configuration et un mod """
+    data_dir = os.path.join(tmp_path, "lobby")
+    write_region(os.path.join(data_dir, "world", "region", "r.0.0.mca"), [(i, chunk(i)) for i in range(64)])
+    with open(os.path.join(data_dir, "server.properties"), "w") as f:
+        f.write("motd=lobby\n")
+    os.makedirs(os.path.join(data_dir, "mods"))
+    with open(os.path.join(data_dir, "mods", "hand-installed.jar"), "wb") as f:
+        f.write(b"mod")
+    os.makedirs(os.path.join(data_dir, "logs"))
+    with open(os.path.join(data_dir, "logs", "latest.log"), "w") as f:
+        f.write("started\n")
+    return data_dir
+
+
+def read_tree(root):
+    return {
+        os.path.relpath(os.path.join(directory, name), root): open(os.path.join(directory, name), "rb").read()
+        for directory, _, names in os.walk(root) for name in names
+    }
+
+
+def test_region_pieces(world):
+    """ Vérifie le découpage d'un fichier de région en en-tête plus un morceau par chunk """
+    with open(os.path.join(world, "world", "region", "r.0.0.mca"), "rb") as f:
+        pieces = region_pieces(f.read())
+    assert pieces[0] == (0, 2 * SECTOR) and len(pieces) == 65
+    assert region_pieces(b"not a region file" * 1000) is None
+
+
+def test_second_backup_only_writes_changed_chunks(tmp_path, world):
+    """ Vérifie qu'une sauvegarde après la modification d'un chunk n'écrit que ce chunk """
+    repository = BackupRepository(os.path.join(tmp_path, ".backups"), bandwidth=0)
+    first = repository.create("lobby", world)
+    assert first["files"] == 3 and first["pieces_written"] == 67
+    write_region(os.path.join(world, "world", "region", "r.0.0.mca"),
+                 [(i, chunk(i, 1 if i == 5 else 0)) for i in range(64)])
+    second = repository.create("lobby", world)
+    assert second["files_read"] == 1
+    assert second["pieces_written"] == 1
+    assert second["bytes_written"] < first["bytes_written"] / 10
+    assert [snapshot["id"] for snapshot in repository.list("lobby")] == [first["id"], second["id"]]
+
+
+def test_restore_snapshot(tmp_path, world):
+    """ Vérifie qu'une restauration remet les fichiers sauvegardés et retire les nouveaux """
+    repository = BackupRepository(os.path.join(tmp_path, ".backups"), bandwidth=0)
+    expected = {path: data for path, data in read_tree(world).items() if not path.startswith("logs")}
+    snapshot = repository.create("lobby", world)
+    write_region(os.path.join(world, "world", "region", "r.0.0.mca"), [(0, b"griefed")])
+    write_region(os.path.join(world, "world", "region", "r.1.0.mca"), [(0, b"new")])
+    os.remove(os.path.join(world, "mods", "hand-installed.jar"))
+    result = repository.restore("lobby", snapshot["id"], world)
+    assert result == {"files_written": 2, "files_removed": 1}
+    restored = read_tree(world)
+    assert restored.pop(os.path.join("logs", "latest.log")) == b"started\n"
+    assert restored == expected
+    assert "logs/*" in EXCLUDED_PATTERNS
+    assert repository.has_snapshot("lobby", snapshot["id"])
+    # Un identifiant ne désigne jamais un fichier hors du dossier des instantanés du serveur
+    assert not repository.has_snapshot("lobby", f"../lobby/{snapshot['id']}")
+    with pytest.raises(SnapshotNotFound):
+        repository.restore("lobby", f"../lobby/{snapshot['id']}", world)
+
+
+def test_prune_collects_unused_objects(tmp_path, world):
+    """ Vérifie que la rétention supprime les vieux instantanés et leurs objets inutilisés """
+    repository = BackupRepository(os.path.join(tmp_path, ".backups"), bandwidth=0)
+    repository.create("lobby", world)
+    write_region(os.path.join(world, "world", "region", "r.0.0.mca"), [(i, chunk(i, 1)) for i in range(64)])
+    repository.create("lobby", world)
+    objects = repository.status()["objects"]
+    assert repository.prune("lobby", keep=1) == 1
+    assert repository.status()["objects"] == objects - 64
+    assert len(repository.list("lobby")) == 1
@@ -1,3 +1,4 @@
+import json
 import os
 import shutil
 import time
@@ -10,8 +11,27 @@ from api import app, SERVER_DATA_DIR  # Importez SERVER_DATA_DIR depuis api.py
 # Configuration du client HTTP
 client = httpx.Client(base_url="http://localhost:8000", timeout=90.0)  # Augmentez le timeout
 
-# Client Docker
-docker_client = docker.from_env()
+
+def wait_for_job(response, timeout=90.0):
+    """ Attend la fin de la tâche renvoyée par l'API et vérifie qu'elle a réussi """
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] == "failed":
+            raise AssertionError(f"La tâche {job_id} a échoué : {job['error']}")
+        if job["status"] == "succeeded":
+            return job
+        time.sleep(0.5)
+    raise AssertionError(f"La tâche {job_id} n'est pas terminée après {timeout} s")
+
+@pytest.fixture(scope="module")
+def docker_client():
+    """ Client Docker, créé à la première utilisation : la collecte des tests n'exige pas de démon """
+    daemon = docker.from_env()
+    yield daemon
+    daemon.close()
 
 
 
@@ -29,12 +49,12 @@ def test_server():
             "eula": "true"
         }
     )
-    assert response.status_code == 200
+    wait_for_job(response)
     yield server_name  # Exécute le test avec ce serveur
 
     # Supprimer le serveur après le test
     try:
-        client.post(f"/delete-server/{server_name}")
+        wait_for_job(client.post(f"/delete-server/{server_name}"))
         time.sleep(1)  # Délai pour permettre à Docker de terminer l'opération
     except Exception as e:
         print(f"Failed to delete server {server_name}: {e}")
@@ -59,12 +79,12 @@ def test_create_server_with_mods():
             "whitelist": "player1,player2"
         }
     )
-    assert response.status_code == 200
-    assert "container_id" in response.json()
+    job = wait_for_job(response)
+    assert "container_id" in job["result"]
 
     # Supprimer le serveur après le test
     try:
-        client.post("/delete-server/test_server_mods")
+        wait_for_job(client.post("/delete-server/test_server_mods"))
         time.sleep(1)  # Délai pour permettre à Docker de terminer l'opération
     except Exception as e:
         print(f"Failed to delete server test_server_mods: {e}")
@@ -77,11 +97,39 @@ def test_list_servers(test_server):
     assert isinstance(servers, list)
     assert any(server["name"] == test_server for server in servers)
 
+def test_list_servers_ignores_unmanaged_containers(test_server, docker_client):
+    """ Vérifie que les conteneurs qui ne sont pas gérés par MCDeployer ne sont pas listés """
+    container = docker_client.containers.create("itzg/minecraft-server:latest", name="test_unmanaged_container")
+    try:
+        response = client.get("/list-servers/")
+        names = [server["name"] for server in response.json()["servers"]]
+        assert test_server in names
+        assert "test_unmanaged_container" not in names
+    finally:
+        container.remove()
+
+def test_get_server_state(test_server, docker_client):
+    """ Vérifie que l'état d'un serveur est tenu à jour à partir des événements Docker """
+    docker_client.containers.get(test_server).stop()
+    time.sleep(1)  # Délai pour laisser arriver les événements
+    server = client.get(f"/servers/{test_server}").json()
+    assert server["status"] == "exited"
+    assert server["exit_code"] is not None
+    assert server["last_transition"] is not None
+    assert server["ready"] is False
+    assert server["players_online"] is None
+
+def test_get_nonexistent_server():
+    """ Vérifie qu'un serveur inconnu renvoie une 404 """
+    response = client.get("/servers/nonexistent_server")
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Server nonexistent_server not found"}
+
 def test_restart_server(test_server):
     """ Test du redémarrage d'un serveur """
     response = client.post(f"/restart-server/{test_server}")
-    assert response.status_code == 200
-    assert response.json() == {"message": f"Server {test_server} restarted successfully"}
+    job = wait_for_job(response)
+    assert job["result"] == {"message": f"Server {test_server} restarted successfully"}
 
 def test_restart_nonexistent_server():
     """ Test de tentative de redémarrage d'un serveur inexistant """
@@ -101,11 +149,11 @@ def test_delete_server():
             "eula": "true"
         }
     )
-    assert create_response.status_code == 200
+    wait_for_job(create_response)
 
     delete_response = client.post(f"/delete-server/{server_name}")
-    assert delete_response.status_code == 200
-    assert delete_response.json() == {"message": f"Server {server_name} deleted successfully"}
+    job = wait_for_job(delete_response)
+    assert job["result"] == {"message": f"Server {server_name} deleted successfully"}
 
     list_response = client.get("/list-servers/")
     assert server_name not in [server["name"] for server in list_response.json()["servers"]]
@@ -138,8 +186,8 @@ def test_create_server_creates_data_directory():
             "eula": "true"
         }
     )
-    assert response.status_code == 200
-    assert "container_id" in response.json()
+    job = wait_for_job(response)
+    assert "container_id" in job["result"]
 
     # Vérifier que le dossier local a été créé dans ServerData
     data_dir = os.path.join(SERVER_DATA_DIR, server_name)
@@ -147,7 +195,7 @@ def test_create_server_creates_data_directory():
 
     # Nettoyer après le test
     try:
-        client.post(f"/delete-server/{server_name}")
+        wait_for_job(client.post(f"/delete-server/{server_name}"))
         time.sleep(1)  # Délai pour permettre à Docker de terminer l'opération
         shutil.rmtree(data_dir)
     except Exception as e:
@@ -165,7 +213,7 @@ def test_delete_server_removes_data_directory():
             "eula": "true"
         }
     )
-    assert create_response.status_code == 200
+    wait_for_job(create_response)
 
     # Vérifier que le dossier local a été créé dans ServerData
     data_dir = os.path.join(SERVER_DATA_DIR, server_name)
@@ -173,13 +221,13 @@ def test_delete_server_removes_data_directory():
 
     # Supprimer le serveur
     delete_response = client.post(f"/delete-server/{server_name}")
-    assert delete_response.status_code == 200
-    assert delete_response.json() == {"message": f"Server {server_name} deleted successfully"}
+    job = wait_for_job(delete_response)
+    assert job["result"] == {"message": f"Server {server_name} deleted successfully"}
 
     # Vérifier que le dossier local a été supprimé
     assert not os.path.exists(data_dir), f"Le dossier {data_dir} n'a pas été supprimé."
 
-def test_delete_server_removes_volumes():
+def test_delete_server_removes_volumes(docker_client):
     """ Vérifie que les volumes sont supprimés lors de la suppression d'un serveur """
     server_name = "test_server_to_delete_volumes"
     create_response = client.post(
@@ -191,10 +239,10 @@ def test_delete_server_removes_volumes():
             "eula": "true"
         }
     )
-    assert create_response.status_code == 200
+    create_job = wait_for_job(create_response)
 
     # Récupérer le conteneur avec le client Docker
-    container_id = create_response.json()["container_id"]
+    container_id = create_job["result"]["container_id"]
     container = docker_client.containers.get(container_id)
 
     # Vérifier que le conteneur a des volumes (montages de dossiers locaux)
@@ -207,8 +255,225 @@ def test_delete_server_removes_volumes():
 
     # Supprimer le serveur via l'API
     delete_response = client.post(f"/delete-server/{server_name}")
-    assert delete_response.status_code == 200
-    assert delete_response.json() == {"message": f"Server {server_name} deleted successfully"}
+    job = wait_for_job(delete_response)
+    assert job["result"] == {"message": f"Server {server_name} deleted successfully"}
 
     # Vérifier que le dossier local a été supprimé
-    assert not os.path.exists(data_dir), f"Le dossier {data_dir} n'a pas été supprimé."
\ No newline at end of file
+    assert not os.path.exists(data_dir), f"Le dossier {data_dir} n'a pas été supprimé."
+
+def test_prefetch_images(docker_client):
+    """ Vérifie que le pré-téléchargement d'une image la place dans le cache """
+    response = client.post("/images/prefetch", json={"tags": ["latest"]})
+    assert response.status_code == 202
+    assert response.json()["tags"]["latest"] in ("cached", "pulling", "queued")
+
+    deadline = time.time() + 300
+    while time.time() < deadline:
+        cache = client.get("/images/").json()
+        if any(image["tag"] == "latest" for image in cache["images"]):
+            break
+        time.sleep(1)
+    else:
+        raise AssertionError("L'image latest n'a pas été téléchargée.")
+    assert docker_client.images.get("itzg/minecraft-server:latest")
+
+def test_configure_warm_pool_profile():
+    """ Vérifie la configuration d'un profil du pool de serveurs préchauffés """
+    response = client.post(
+        "/warm-pool/profiles",
+        json={"version": "latest", "type": "PAPER", "memory": "1G", "target": 0}
+    )
+    assert response.status_code == 200
+    assert response.json()["profile"] == "latest:PAPER:1G"
+    profile = client.get("/warm-pool/").json()["profiles"]["latest:PAPER:1G"]
+    assert profile["target"] == 0
+    assert profile["ready"] == 0
+
+def test_get_artifact_store():
+    """ Vérifie que l'état du magasin d'artefacts partagés est exposé """
+    response = client.get("/artifacts/")
+    assert response.status_code == 200
+    stats = response.json()
+    assert set(stats) == {"objects", "stored_bytes", "links", "bytes_saved"}
+    assert stats["links"] >= 0
+
+def test_batch_restart_servers(test_server):
+    """ Vérifie qu'une opération groupée renvoie une ligne par serveur puis un résumé """
+    response = client.post(
+        "/servers/batch/restart",
+        json={"names": [test_server, "nonexistent_server"], "parallelism": 2, "max_unavailable": 50}
+    )
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines() if line]
+    results = {line["server_name"]: line for line in lines if "server_name" in line}
+    assert results[test_server]["status"] == "succeeded"
+    assert results["nonexistent_server"]["error"]["status_code"] == 404
+    assert lines[-1]["summary"]["total"] == 2
+    assert lines[-1]["summary"]["succeeded"] == 1
+
+def test_batch_unknown_operation():
+    """ Vérifie qu'une opération groupée inconnue renvoie une 404 """
+    response = client.post("/servers/batch/upgrade", json={"names": ["test_server_temp"]})
+    assert response.status_code == 404
+
+def test_list_trash():
+    """ Vérifie que la corbeille des dossiers supprimés est exposée """
+    response = client.get("/trash/")
+    assert response.status_code == 200
+    trash = response.json()
+    assert trash["mode"] in ("delete", "archive")
+    assert isinstance(trash["entries"], list)
+
+def test_restore_nonexistent_trash_entry():
+    """ Vérifie que la restauration d'une entrée inconnue de la corbeille échoue avec une 404 """
+    response = client.post("/trash/nonexistent_server-00000000/restore")
+    with pytest.raises(AssertionError, match="404"):
+        wait_for_job(response)
+
+def test_create_server_allocates_ports(docker_client):
+    """ Vérifie que les ports de jeu, RCON et query sont attribués automatiquement """
+    server_name = "test_server_auto_ports"
+    try:
+        job = wait_for_job(client.post("/create-server/", json={"server_name": server_name, "eula": "true"}))
+        ports = job["result"]["ports"]
+        assert len(set(ports.values())) == 3
+        assert client.get(f"/servers/{server_name}").json()["ports"] == ports
+        bindings = docker_client.containers.get(server_name).attrs["HostConfig"]["PortBindings"]
+        assert bindings["25565/tcp"][0]["HostPort"] == str(ports["port"])
+        assert bindings["25575/tcp"][0]["HostPort"] == str(ports["rcon_port"])
+    finally:
+        wait_for_job(client.post(f"/delete-server/{server_name}"))
+
+def test_create_server_port_conflict(test_server):
+    """ Vérifie qu'un port déjà attribué est refusé avant l'appel à Docker """
+    port = client.get(f"/servers/{test_server}").json()["port"]
+    response = client.post("/create-server/", json={"server_name": "test_server_conflict", "port": port, "eula": "true"})
+    with pytest.raises(AssertionError, match="409"):
+        wait_for_job(response)
+
+def test_get_server_metrics(test_server):
+    """ Vérifie que les relevés de ressources d'un serveur sont exposés """
+    response = client.get(f"/servers/{test_server}/metrics")
+    assert response.status_code == 200
+    metrics = response.json()
+    assert metrics["server_name"] == test_server
+    assert isinstance(metrics["samples"], list)
+
+def test_prometheus_metrics(test_server):
+    """ Vérifie l'exposition des métriques au format Prometheus """
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert f'mcdeployer_server_up{{server="{test_server}"}} 1' in response.text
+
+def test_command_nonexistent_server():
+    """ Vérifie qu'une commande sur un serveur inconnu renvoie une 404 """
+    response = client.post("/servers/nonexistent_server/command", json={"command": "list"})
+    assert response.status_code == 404
+
+def test_batch_command_requires_targets():
+    """ Vérifie qu'une commande groupée sans noms ni sélecteur est refusée """
+    response = client.post("/servers/batch/command", json={"command": "list"})
+    assert response.status_code == 422
+
+def test_get_server_logs(test_server):
+    """ Vérifie la lecture des logs d'un serveur sans suivi """
+    response = client.get(f"/servers/{test_server}/logs", params={"follow": "false", "tail": 10})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.rstrip().endswith("event: end\ndata: {}")
+
+def test_get_server_logs_invalid_filter(test_server):
+    """ Vérifie qu'une expression régulière invalide est refusée """
+    response = client.get(f"/servers/{test_server}/logs", params={"grep": "["})
+    assert response.status_code == 422
+
+def test_hibernate_and_wake_server(test_server, docker_client):
+    """ Vérifie qu'un serveur mis en veille libère son conteneur puis redémarre au réveil """
+    wait_for_job(client.post(f"/servers/{test_server}/hibernate"))
+    server = client.get(f"/servers/{test_server}").json()
+    assert server["hibernated"] is True
+    assert docker_client.containers.get(test_server).status == "exited"
+    assert test_server in client.get("/hibernation/").json()["hibernated"]
+    wait_for_job(client.post(f"/servers/{test_server}/wake"))
+    assert client.get(f"/servers/{test_server}").json()["hibernated"] is False
+    assert docker_client.containers.get(test_server).status == "running"
+
+def test_wake_server_not_hibernated(test_server):
+    """ Vérifie qu'un serveur qui n'est pas en veille ne peut pas être réveillé """
+    response = client.post(f"/servers/{test_server}/wake")
+    assert response.status_code == 409
+
+def test_healthz():
+    """ Vérifie que le contrôle de santé répond une fois l'API démarrée """
+    response = client.get("/healthz")
+    assert response.status_code == 200
+    health = response.json()
+    assert health["status"] == "ok"
+    assert all(node["client"] for node in health["nodes"].values())
+
+
+def test_list_nodes(test_server):
+    """ Vérifie que le nœud du serveur de test est listé avec sa mémoire """
+    response = client.get("/nodes/")
+    assert response.status_code == 200
+    server = client.get(f"/servers/{test_server}").json()
+    node = next(node for node in response.json()["nodes"] if node["name"] == server["node"])
+    assert node["servers"] >= 1
+    assert node["memory_reserved"] > 0
+
+def test_create_server_unknown_node():
+    """ Vérifie qu'un nœud inconnu est refusé """
+    response = client.post("/create-server/", json={"server_name": "test_server_node", "node": "nonexistent_node", "eula": "true"})
+    with pytest.raises(AssertionError, match="404"):
+        wait_for_job(response)
+
+def test_get_server_spec_and_history(test_server):
+    """ Vérifie que la configuration et l'historique d'un serveur sont enregistrés """
+    spec = client.get(f"/servers/{test_server}/spec").json()
+    assert spec["spec"]["port"] == 25565
+    assert spec["ports"]["port"] == 25565
+    events = client.get(f"/servers/{test_server}/history").json()["events"]
+    assert "created" in [event["event"] for event in events]
+
+def test_set_desired_state_unknown_server():
+    """ Vérifie qu'on ne peut pas déclarer l'état voulu d'un serveur inconnu """
+    response = client.put("/servers/unknown_server/desired", json={"status": "stopped"})
+    assert response.status_code == 404
+
+def test_backup_and_restore_server(test_server):
+    """ Vérifie la sauvegarde d'un serveur puis la restauration refusée tant qu'il tourne """
+    snapshot = wait_for_job(client.post(f"/servers/{test_server}/backups"))["result"]
+    snapshots = client.get(f"/servers/{test_server}/backups").json()["snapshots"]
+    assert snapshot["id"] in [entry["id"] for entry in snapshots]
+    with pytest.raises(AssertionError, match="409"):
+        wait_for_job(client.post(f"/servers/{test_server}/backups/{snapshot['id']}/restore"))
+
+def test_create_server_applies_resource_limits(test_server, docker_client):
+    """ Vérifie les limites cgroup du conteneur et leur réservation dans le registre de capacité """
+    host_config = docker_client.containers.get(test_server).attrs["HostConfig"]
+    assert host_config["Memory"] > 0
+    assert host_config["MemorySwap"] == host_config["Memory"]
+    assert host_config["PidsLimit"] > 0
+    nodes = client.get("/capacity/").json()["nodes"]
+    assert any(test_server in node["servers"] for node in nodes.values())
+
+def test_pregenerate_requires_chunky_server_type():
+    """ Vérifie qu'un serveur vanilla ne peut pas être créé avec une prégénération """
+    response = client.post("/create-server/", json={"server_name": "test_server_pregen", "pregenerate_radius": 500, "eula": "true"})
+    with pytest.raises(AssertionError, match="400"):
+        wait_for_job(response)
+
+def test_pregenerate_nonexistent_server():
+    """ Vérifie la prégénération d'un serveur inconnu """
+    response = client.post("/servers/unknown_server/pregenerate", json={"radius": 500})
+    assert response.status_code == 404
+
+def test_create_template_from_nonexistent_server():
+    """ Vérifie qu'un modèle ne peut pas capturer un serveur inconnu """
+    response = client.post("/templates/", json={"name": "test_template", "server_name": "unknown_server"})
+    assert response.status_code == 404
+
+def test_clone_nonexistent_server():
+    """ Vérifie le clonage d'un serveur inconnu """
+    response = client.post("/servers/unknown_server/clone", json={"count": 2})
+    assert response.status_code == 404
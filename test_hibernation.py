@@ -0,0 +1,110 @@
+import asyncio
+import json
+import struct
+
+from hibernation import HIBERNATE_MOTD, STARTING_MOTD, _SleepingServer, parse_handshake
+from probe import _packet, _read_packet, _string, decode_varint, encode_varint, server_list_ping
+
+PROTOCOL = 765
+
+
+class FakeHibernator:
+    """ Hibernator réduit à wake, qui note les réveils demandés """
+
+    def __init__(self):
+        self.sleeping = None
+        self.woken = []
+
+    def wake(self, server_name):
+        self.woken.append(server_name)
+        self.sleeping.waking = True
+
+
+def handshake(next_state, protocol=PROTOCOL, host="mc.example.org", port=25565):
+    return encode_varint(protocol) + _string(host) + struct.pack(">H", port) + encode_varint(next_state)
+
+
+async def sleeping_server():
+    hibernator = FakeHibernator()
+    sleeping = hibernator.sleeping = _SleepingServer(hibernator, "lobby", 0)
+    await sleeping.start("127.0.0.1")
+    return hibernator, sleeping, sleeping.server.sockets[0].getsockname()[1]
+
+
+async def read_status(port):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(_packet(0x00, handshake(1)) + _packet(0x00))
+        _, data = await _read_packet(reader)
+        length, offset = decode_varint(data)
+        return json.loads(data[offset:offset + length])
+    finally:
+        writer.close()
+
+
+async def login(port):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(_packet(0x00, handshake(2)) + _packet(0x00, _string("Steve")))
+        packet_id, data = await _read_packet(reader)
+        length, offset = decode_varint(data)
+        return packet_id, json.loads(data[offset:offset + length])
+    finally:
+        writer.close()
+
+
+def test_parse_handshake():
+    """ Vérifie la lecture de la version du client et de l'état demandé """
+    assert parse_handshake(handshake(1)) == (PROTOCOL, 1)
+    assert parse_handshake(handshake(2, protocol=47, host="")) == (47, 2)
+
+
+def test_sleeping_server_answers_pings_without_waking():
+    """ Vérifie que le statut annonce la veille, dans la version du client, sans réveiller le serveur """
+    async def main():
+        hibernator, sleeping, port = await sleeping_server()
+        try:
+            return await read_status(port), await server_list_ping("127.0.0.1", port, 2), hibernator.woken
+        finally:
+            await sleeping.close()
+
+    status, ping, woken = asyncio.run(main())
+    assert status["version"]["protocol"] == PROTOCOL
+    assert status["description"]["text"] == HIBERNATE_MOTD
+    assert ping["players_online"] == 0 and ping["latency_ms"] is not None
+    assert woken == []
+
+
+def test_login_wakes_the_server():
+    """ Vérifie qu'une connexion de joueur réveille le serveur et le déconnecte avec le message de démarrage """
+    async def main():
+        hibernator, sleeping, port = await sleeping_server()
+        try:
+            disconnect = await login(port)
+            return disconnect, await read_status(port), hibernator.woken
+        finally:
+            await sleeping.close()
+
+    (packet_id, reason), status, woken = asyncio.run(main())
+    assert packet_id == 0x00 and reason == {"text": STARTING_MOTD}
+    assert woken == ["lobby"]
+    assert status["description"]["text"] == STARTING_MOTD
+
+
+def test_garbage_is_ignored():
+    """ Vérifie qu'un client envoyant n'importe quoi est déconnecté sans réveiller le serveur """
+    async def main():
+        hibernator, sleeping, port = await sleeping_server()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"\xff" * 8)
+            await writer.drain()
+            closed = await asyncio.wait_for(reader.read(), 2)
+            writer.close()
+            return closed, await read_status(port), hibernator.woken
+        finally:
+            await sleeping.close()
+
+    closed, status, woken = asyncio.run(main())
+    assert closed == b"" and woken == []
+    assert status["description"]["text"] == HIBERNATE_MOTD
@@ -0,0 +1,31 @@
+import asyncio
+
+from jobs import JobManager
+
+
+def test_busy_server_does_not_hold_workers():
+    """ Vérifie que les tâches en attente d'un serveur occupé ne bloquent pas les autres serveurs """
+    order = []
+
+    async def main():
+        jobs = JobManager(workers=2)
+        release = asyncio.Event()
+
+        async def slow(job):
+            await release.wait()
+            order.append(job.server_name)
+
+        async def fast(job):
+            order.append(job.server_name)
+
+        queued = [jobs.submit("backup", "lobby", slow) for _ in range(3)]
+        other = jobs.submit("stop", "survival", fast)
+        await asyncio.wait_for(other.wait(), 1)
+        assert jobs.busy("lobby") and not jobs.busy("survival")
+        release.set()
+        for job in queued:
+            await job.wait()
+        await jobs.stop()
+
+    asyncio.run(main())
+    assert order == ["survival", "lobby", "lobby", "lobby"]
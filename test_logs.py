@@ -0,0 +1,124 @@
+import asyncio
+import threading
+
+import pytest
+
+from logs import FollowersExhausted, LogFilter, LogHub, LogSubscription, line_level, parse_timestamp, read_history
+
+LINES = [
+    "[12:00:00] [Server thread/INFO]: Starting minecraft server version 1.20.4",
+    "[12:00:01] [Server thread/WARN]: Can't keep up!",
+    "\tat net.minecraft.server.MinecraftServer.tick",
+    "[12:00:02] [Server thread/INFO]: Steve joined the game",
+    "[12:00:03 ERROR]: Could not pass event PlayerJoinEvent",
+    "\tat org.bukkit.plugin.SimplePluginManager.callEvent",
+]
+
+
+class FakeLogStream:
+    """ Flux suivi : rend ses morceaux puis bloque jusqu'à sa fermeture, comme le flux annulable de Docker """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        yield from self.chunks
+        self.closed.wait(5)
+
+    def close(self):
+        self.closed.set()
+
+
+class FakeLogContainer:
+    """ Conteneur dont les logs sont découpés en morceaux arbitraires """
+
+    def __init__(self, container_id="c1", chunks=()):
+        self.id = container_id
+        self.chunks = list(chunks)
+        self.calls = []
+        self.streams = []
+
+    def logs(self, stream=False, **kwargs):
+        self.calls.append(kwargs)
+        if not stream:
+            return b"".join(self.chunks)
+        self.streams.append(FakeLogStream(self.chunks))
+        return self.streams[-1]
+
+
+def timestamped(lines):
+    return "".join(f"2024-05-01T12:00:0{i}.500000000Z {line}\n" for i, line in enumerate(lines)).encode()
+
+
+def test_line_level():
+    """ Vérifie la lecture du niveau dans les formats Vanilla et Paper """
+    assert [line_level(line) for line in LINES] == ["INFO", "WARN", None, "INFO", "ERROR", None]
+
+
+def test_filter_by_level_keeps_continuations():
+    """ Vérifie que les lignes sans niveau suivent la décision prise pour la dernière ligne qui en avait un """
+    keep = LogFilter(level="warn")
+    assert [line for line in LINES if keep(line)] == [LINES[1], LINES[2], LINES[4], LINES[5]]
+    with pytest.raises(ValueError):
+        LogFilter(level="verbose")
+
+
+def test_filter_by_pattern_and_level():
+    """ Vérifie que le motif et le niveau se combinent """
+    assert [line for line in LINES if LogFilter(grep="(?i)join")(line)] == [LINES[3], LINES[4]]
+    keep = LogFilter(grep="Join", level="ERROR")
+    assert [line for line in LINES if keep(line)] == [LINES[4]]
+
+
+def test_parse_timestamp():
+    """ Vérifie la lecture des horodatages RFC 3339 de Docker, avec nanosecondes """
+    assert parse_timestamp("2024-05-01T12:00:00Z") == 1714564800.0
+    assert parse_timestamp("2024-05-01T12:00:00.250000000Z") == pytest.approx(1714564800.25)
+
+
+def test_subscription_drops_oldest_lines():
+    """ Vérifie qu'un client lent perd les lignes les plus anciennes et reçoit toujours la fin du flux """
+    async def main():
+        subscription = LogSubscription(size=3)
+        for i in range(5):
+            subscription.push(i)
+        subscription.close()
+        return [subscription.queue.get_nowait() for _ in range(3)], subscription.dropped
+
+    # La fin du flux prend la place de la plus ancienne ligne restante, sans être comptée
+    assert asyncio.run(main()) == ([3, 4, None], 2)
+
+
+def test_read_history():
+    """ Vérifie le découpage de l'historique en (horodatage, ligne) """
+    container = FakeLogContainer(chunks=[timestamped(LINES[:2])])
+    assert read_history(container, tail=10) == [
+        ("2024-05-01T12:00:00.500000000Z", LINES[0]),
+        ("2024-05-01T12:00:01.500000000Z", LINES[1]),
+    ]
+    assert container.calls == [{"timestamps": True, "tail": 10}]
+
+
+def test_hub_fans_out_one_stream():
+    """ Vérifie qu'un seul flux par serveur est lu, recollé ligne par ligne et distribué à chaque client """
+    async def main():
+        data = timestamped(LINES[:3])
+        container = FakeLogContainer(chunks=[data[:10], data[10:70], data[70:]])
+        hub = LogHub(max_followers=1, buffer=10)
+        first, second = hub.subscribe("lobby", container), hub.subscribe("lobby", container)
+        with pytest.raises(FollowersExhausted):
+            hub.subscribe("survival", FakeLogContainer("c2"))
+        lines = []
+        for subscription in (first, second):
+            lines.append([(await asyncio.wait_for(subscription.queue.get(), 5))[1] for _ in range(3)])
+        followed = hub.status()["followed"]
+        hub.unsubscribe("lobby", first)
+        hub.unsubscribe("lobby", second)
+        return lines, followed, hub.status()["followed"], container.streams
+
+    lines, followed, left, streams = asyncio.run(main())
+    assert lines == [LINES[:3], LINES[:3]]
+    assert followed == {"lobby": 2} and left == {}
+    # Un seul flux pour les deux clients, fermé au départ du dernier
+    assert len(streams) == 1 and streams[0].closed.is_set()
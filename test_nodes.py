@@ -0,0 +1,201 @@
+import asyncio
+import threading
+
+import pytest
+
+from fake_docker import FakeDockerClient
+from inventory import ServerInventory
+from nodes import (
+    LazyDockerClient, NoCapacity, Node, NodeRegistry, UnknownNode, container_memory, parse_nodes, resource_limits,
+)
+from stats import StatsCollector
+
+GIB = 1024 ** 3
+
+
+def registry(*specs):
+    """ Registre de nœuds factices : (nom, mémoire en Gio, tags en cache) """
+    inventory = ServerInventory()
+    nodes = {}
+    for name, memory, tags in specs:
+        node = Node(name, FakeDockerClient(0, memory * GIB), inventory, f"tcp://{name}:2375")
+        node.memory_total = memory * GIB
+        node.events.connected = True
+        node.images._cached = {tag: {"size": 0, "last_used": 0.0} for tag in tags}
+        nodes[name] = node
+    return NodeRegistry(nodes, inventory)
+
+
+def test_parse_nodes():
+    """ Vérifie la lecture de MCDEPLOYER_NODES """
+    assert parse_nodes("a=unix:///var/run/docker.sock, b=tcp://10.0.0.2:2376") == {
+        "a": "unix:///var/run/docker.sock",
+        "b": "tcp://10.0.0.2:2376",
+    }
+    with pytest.raises(ValueError):
+        parse_nodes("a")
+
+
+def test_place_on_node_with_most_free_memory():
+    """ Vérifie que les serveurs sont répartis sur le nœud le plus libre """
+    nodes = registry(("a", 8, []), ("b", 16, []))
+    placed = [nodes.place(f"s{i}", 4 * GIB).name for i in range(6)]
+    assert placed.count("a") == 2 and placed.count("b") == 4
+    with pytest.raises(NoCapacity):
+        nodes.place("s6", 4 * GIB)
+
+
+def test_place_prefers_cached_image():
+    """ Vérifie qu'un nœud ayant déjà l'image est préféré à un nœud plus libre """
+    nodes = registry(("a", 8, ["java17"]), ("b", 16, []))
+    assert nodes.place("cached", 2 * GIB, "java17").name == "a"
+    assert nodes.place("missing", 2 * GIB, "java21").name == "b"
+
+
+def test_place_skips_disconnected_and_unknown_nodes():
+    """ Vérifie qu'un nœud injoignable n'est jamais choisi et qu'un nœud épinglé doit exister """
+    nodes = registry(("a", 8, []), ("b", 16, []))
+    nodes.nodes["b"].events.connected = False
+    assert nodes.place("s", GIB).name == "a"
+    assert nodes.place("pinned", GIB, node_name="b").name == "b"
+    with pytest.raises(UnknownNode):
+        nodes.place("other", GIB, node_name="c")
+
+
+def test_release_frees_memory():
+    """ Vérifie que la mémoire d'un serveur supprimé redevient disponible """
+    nodes = registry(("a", 4, []))
+    nodes.place("s1", 4 * GIB)
+    with pytest.raises(NoCapacity):
+        nodes.place("s2", GIB)
+    nodes.release("s1")
+    assert nodes.place("s2", GIB).name == "a"
+
+
+def test_inventory_replace_keeps_other_nodes():
+    """ Vérifie que la resynchronisation d'un nœud ne retire pas les serveurs des autres """
+    nodes = registry(("a", 8, []), ("b", 8, []))
+    summary = {"Id": "1", "Names": ["/lobby"], "State": "running", "Labels": {}, "Ports": []}
+    nodes.inventory.replace([summary], "a")
+    nodes.inventory.replace([dict(summary, Id="2", Names=["/survival"])], "b")
+    nodes.inventory.replace([], "b")
+    assert [server["name"] for server in nodes.inventory.list()] == ["lobby"]
+    assert nodes.node_of("lobby").name == "a"
+    assert nodes.node_of("unknown") is nodes.default
+
+
+def test_container_limits_include_jvm_overhead():
+    """ Vérifie la marge hors tas de la JVM et les limites cgroup du conteneur """
+    assert container_memory(4 * GIB, 0.25, "256M") == 5 * GIB
+    assert container_memory(GIB // 2, 0.25, "256M") == GIB // 2 + 256 * 1024 ** 2
+    assert resource_limits(5 * GIB, 1.5, 512) == {
+        "mem_limit": 5 * GIB, "memswap_limit": 5 * GIB, "pids_limit": 512, "nano_cpus": 1_500_000_000,
+    }
+    assert "nano_cpus" not in resource_limits(GIB, None)
+
+
+def test_place_respects_cpu_overcommit():
+    """ Vérifie que les CPU réservés ne dépassent pas les cœurs du nœud multipliés par le surengagement """
+    nodes = registry(("a", 64, []))
+    nodes.nodes["a"].cpus_total = 4
+    nodes.cpu_overcommit = 1.5
+    nodes.place("s1", GIB, cpus=4)
+    with pytest.raises(NoCapacity):
+        nodes.place("s2", GIB, cpus=4)
+    assert nodes.place("s3", GIB, cpus=2).name == "a"
+    assert nodes.ledger()["nodes"]["a"]["cpus_free"] == 0
+
+
+def test_acquire_waits_for_released_capacity():
+    """ Vérifie qu'une création en attente est placée dès qu'une suppression libère la mémoire """
+    nodes = registry(("a", 4, []))
+    nodes.place("s1", 4 * GIB)
+
+    async def scenario():
+        messages = []
+
+        async def on_wait(message):
+            messages.append(message)
+
+        waiting = asyncio.create_task(nodes.acquire("s2", 2 * GIB, timeout=5, on_wait=on_wait))
+        await asyncio.sleep(0.01)
+        assert not waiting.done() and len(messages) == 1
+        nodes.release("s1")
+        assert (await waiting).name == "a"
+        with pytest.raises(NoCapacity):
+            await nodes.acquire("s3", 4 * GIB, timeout=0.01)
+
+    asyncio.run(scenario())
+    assert nodes.metrics["waits"] == 2 and nodes.metrics["rejections"] == 1
+
+
+def test_lazy_client_is_created_off_the_event_loop():
+    """ Vérifie que le client paresseux n'est jamais créé depuis la boucle, qui serait bloquée """
+    created = []
+
+    def factory():
+        created.append(threading.current_thread())
+        return FakeDockerClient(0, 8 * GIB)
+
+    async def main():
+        client = LazyDockerClient(factory)
+        with pytest.raises(RuntimeError):
+            client.containers
+        node = Node("a", client, ServerInventory())
+        await node.start()
+        await node.stop()
+        return client, node
+
+    client, node = asyncio.run(main())
+    assert client.initialized and node.memory_total == 8 * GIB
+    assert created and threading.main_thread() not in created
+
+
+def test_sync_callback_runs_once_the_inventory_is_filled():
+    """ Vérifie que on_sync est appelé avec le nom du nœud, après le remplissage de l'inventaire """
+    async def main():
+        client = FakeDockerClient(0, 8 * GIB)
+        client.containers.add("lobby", 25565, {"mcdeployer.managed": "true", "mcdeployer.server": "lobby"})
+        inventory = ServerInventory()
+        node = Node("a", client, inventory)
+        synced = []
+        node.events.on_sync = lambda name: synced.append((name, [server["name"] for server in inventory.list()]))
+        await node.start()
+        await node.stop()
+        return synced
+
+    assert asyncio.run(main()) == [("a", ["lobby"])]
+
+
+def test_stats_are_sampled_on_the_node_of_the_server():
+    """ Vérifie que les relevés d'un serveur passent par le client et l'exécuteur de son nœud """
+    async def main():
+        inventory = ServerInventory()
+        nodes = {}
+        for name in ("a", "b"):
+            client = FakeDockerClient(0, 8 * GIB)
+            nodes[name] = Node(name, client, inventory)
+        nodes["b"].client.containers.add("lobby", 25565, {"mcdeployer.managed": "true", "mcdeployer.server": "lobby"})
+        registry = NodeRegistry(nodes, inventory)
+        calls = []
+
+        def recorded(node):
+            run = node.docker_exec.run
+
+            def wrapper(op, fn, *args):
+                calls.append((node.name, op))
+                return run(op, fn, *args)
+            return wrapper
+
+        for node in nodes.values():
+            node.docker_exec.run = recorded(node)
+        await registry.start()
+        calls.clear()
+        collector = StatsCollector(nodes["a"].client, nodes["a"].docker_exec, inventory, nodes=registry)
+        await collector.collect()
+        await registry.stop()
+        return calls, collector.metrics
+
+    calls, metrics = asyncio.run(main())
+    assert metrics["samples"] == 1 and metrics["errors"] == 0
+    assert calls and all(call == ("b", "stats") for call in calls)
@@ -0,0 +1,103 @@
+import pytest
+
+from inventory import MANAGED_LABEL, PORT_LABEL, SERVER_LABEL
+from ports import QUERY_PORT_LABEL, RCON_PORT_LABEL, PortAllocator, PortConflict, PortsExhausted
+
+
+def allocator(aux_port_range="35565-35574"):
+    """ Petites plages : quatre ports de jeu et, par défaut, dix ports RCON/query """
+    return PortAllocator("25565-25568", aux_port_range)
+
+
+def summary(name, labels=None, public_ports=()):
+    return {
+        "Names": [f"/{name}"],
+        "Labels": labels or {},
+        "Ports": [{"PrivatePort": 25565, "PublicPort": port, "Type": "tcp"} for port in public_ports],
+    }
+
+
+def managed(name, port, rcon_port, query_port):
+    return summary(name, {
+        MANAGED_LABEL: "true", SERVER_LABEL: name, PORT_LABEL: str(port),
+        RCON_PORT_LABEL: str(rcon_port), QUERY_PORT_LABEL: str(query_port),
+    })
+
+
+def test_allocate_takes_three_ports():
+    """ Vérifie que le port de jeu vient de sa plage et les ports RCON et query de l'autre """
+    ports = allocator("35565-35568")
+    assert ports.allocate("lobby") == {"port": 25565, "rcon_port": 35565, "query_port": 35566}
+    assert ports.allocate("survival") == {"port": 25566, "rcon_port": 35567, "query_port": 35568}
+    with pytest.raises(PortConflict):
+        ports.allocate("lobby")
+    assert ports.status()["aux"]["free"] == 0
+
+
+def test_release_reuses_ports_last():
+    """ Vérifie qu'un port libéré retourne en fin de liste et n'est repris qu'en dernier """
+    ports = allocator()
+    ports.allocate("lobby")
+    ports.release("lobby")
+    assert ports.get("lobby") is None
+    assert ports.allocate("survival")["port"] == 25566
+    assert ports.allocate("creative")["port"] == 25567
+    assert ports.allocate("minigames")["port"] == 25568
+    assert ports.allocate("lobby")["port"] == 25565
+
+
+def test_requested_ports_are_checked():
+    """ Vérifie qu'un port demandé déjà pris ou demandé deux fois est refusé """
+    ports = allocator()
+    assert ports.allocate("lobby", {"port": 30000})["port"] == 30000
+    with pytest.raises(PortConflict):
+        ports.allocate("survival", {"port": 30000})
+    with pytest.raises(PortConflict):
+        ports.allocate("survival", {"rcon_port": 31000, "query_port": 31000})
+    # Un port de la plage pris explicitement est sauté par la liste libre
+    assert ports.allocate("creative", {"port": 25565})["port"] == 25565
+    assert ports.allocate("survival")["port"] == 25566
+
+
+def test_allocation_is_all_or_nothing():
+    """ Vérifie qu'un manque de port rend ceux déjà pris pour le serveur """
+    ports = allocator("35565-35566")
+    ports.allocate("lobby")
+    with pytest.raises(PortsExhausted):
+        ports.allocate("survival")
+    assert ports.get("survival") is None
+    assert ports.status()["game"]["used"] == 1
+    ports = allocator()
+    for name in ("lobby", "survival", "creative", "minigames"):
+        ports.allocate(name)
+    with pytest.raises(PortsExhausted):
+        ports.allocate("skyblock", {"rcon_port": 31000})
+    # Le port RCON demandé est de nouveau libre
+    assert ports.allocate("skyblock", {"port": 30000, "rcon_port": 31000})["query_port"] == 35573
+
+
+def test_rebuild_from_labels_and_bindings():
+    """ Vérifie la reconstruction depuis les labels des serveurs et les ports publiés des autres conteneurs """
+    ports = allocator()
+    ports.rebuild([managed("lobby", 25565, 35565, 35566), summary("proxy", public_ports=[25566])])
+    assert ports.get("lobby") == {"port": 25565, "rcon_port": 35565, "query_port": 35566}
+    assert ports.get("proxy") is None
+    assert ports.allocate("survival")["port"] == 25567
+
+
+def test_rebuild_keeps_ports_of_unlisted_servers():
+    """ Vérifie que les ports enregistrés d'un serveur dont le nœud n'a pas été listé sont conservés """
+    ports = allocator()
+    records = [
+        {"name": "lobby", "ports": {"port": 25565, "rcon_port": 35565, "query_port": 35566}},
+        {"name": "remote", "ports": {"port": 25566, "rcon_port": 35567, "query_port": 35568}},
+        {"name": "adopted", "ports": None},
+    ]
+    # Le conteneur listé l'emporte sur son enregistrement
+    ports.rebuild([managed("lobby", 25567, 35565, 35566)], records)
+    assert ports.get("lobby")["port"] == 25567
+    assert ports.get("remote") == {"port": 25566, "rcon_port": 35567, "query_port": 35568}
+    assert ports.allocate("survival")["port"] == 25565
+    assert ports.allocate("creative")["port"] == 25568
+    with pytest.raises(PortsExhausted):
+        ports.allocate("minigames")
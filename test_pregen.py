@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from pregen import PregenUnavailable, Pregenerator, parse_progress, pregen_commands
+from rcon import RconError
+
+PROGRESS = "[Chunky] Task running for world. Processed: {chunks} chunks ({percent}%), ETA: 0:01:40, Rate: 250.0 cps, Current: 12, -3"
+
+
+class FakeConsole:
+    """ Console simulant Chunky : chaque relevé avance la tâche, après quelques refus de connexion """
+
+    def __init__(self, steps=(25, 50, 75), refusals=2, installed=True):
+        self.steps = list(steps)
+        self.refusals = refusals
+        self.installed = installed
+        self.commands = []
+        self.started = False
+
+    async def command(self, server_name, command):
+        if self.refusals:
+            self.refusals -= 1
+            raise RconError("Connection refused")
+        self.commands.append(command)
+        if not self.installed and command.startswith("chunky"):
+            return "Unknown or incomplete command, see below for error"
+        if command == "chunky start":
+            self.started = True
+            return "[Chunky] Task started for world at 0, 0 with radius 1000."
+        if command == "chunky progress":
+            if self.started and self.steps:
+                percent = self.steps.pop(0)
+                return PROGRESS.format(chunks=percent * 10, percent=f"{percent:.2f}")
+            return "[Chunky] No tasks running."
+        return ""
+
+
+def test_parse_progress_and_commands():
+    """ Vérifie la lecture de l'avancement de Chunky et la bordure tirée de max_world_size """
+    assert parse_progress(PROGRESS.format(chunks=1234, percent="5.67")) == {
+        "chunks": 1234, "percent": 5.67, "eta": "0:01:40", "rate": 250.0,
+    }
+    assert parse_progress("[Chunky] No tasks running.") is None
+    assert pregen_commands(5000, max_world_size=2000) == [
+        "worldborder center 0 0", "worldborder set 4000",
+        "chunky world world", "chunky center 0 0", "chunky radius 2000", "chunky start",
+    ]
+
+
+def test_pregenerate_until_done():
+    """ Vérifie l'attente de la console, le suivi de l'avancement et la fin de la tâche """
+    console, messages = FakeConsole(), []
+
+    async def on_progress(message):
+        messages.append(message)
+
+    async def main():
+        pregenerator = Pregenerator(console.command, poll=0)
+        result = await pregenerator.run("lobby", 1000, on_progress=on_progress)
+        return pregenerator, result
+
+    pregenerator, result = asyncio.run(main())
+    assert console.commands[-5:-1] == ["chunky start", "chunky progress", "chunky progress", "chunky progress"]
+    assert result["progress"]["percent"] == 100.0
+    assert any("75.0%" in message for message in messages)
+    assert pregenerator.running == {}
+    assert pregenerator.metrics["completed"] == 1
+
+
+def test_pregenerate_without_chunky():
+    """ Vérifie l'échec d'une prégénération sur un serveur sans Chunky """
+    pregenerator = Pregenerator(FakeConsole(refusals=0, installed=False).command, poll=0)
+    with pytest.raises(PregenUnavailable):
+        asyncio.run(pregenerator.run("lobby", 1000))
+    assert pregenerator.metrics["failed"] == 1
+
+
+def test_cancel_releases_slot_and_server():
+    """ Vérifie qu'une prégénération annulée libère son créneau et ne retient plus le serveur """
+    async def main():
+        pregenerator = Pregenerator(FakeConsole(steps=[10] * 1000, refusals=0).command, concurrency=1, poll=0.01)
+        started = []
+
+        def operation(server_name):
+            async def run():
+                started.append(server_name)
+                return await pregenerator.run(server_name, 1000)
+            return run
+
+        pregenerator.submit("lobby", 1000, operation("lobby"))
+        pregenerator.submit("survival", 1000, operation("survival"))
+        await asyncio.sleep(0.05)
+        # Un seul créneau : la seconde génération attend sans avoir démarré
+        assert started == ["lobby"] and pregenerator.running["survival"]["state"] == "queued"
+        assert await pregenerator.cancel("lobby")
+        await asyncio.sleep(0.05)
+        assert started == ["lobby", "survival"]
+        await pregenerator.stop()
+        return pregenerator
+
+    pregenerator = asyncio.run(main())
+    assert pregenerator.running == {} and pregenerator._tasks == {}
+    assert pregenerator.results["lobby"]["status"] == "cancelled"
+    assert pregenerator.metrics["cancelled"] == 2
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import struct
+
+import pytest
+
+from inventory import ServerInventory
+from probe import GameProber, ProbeError, _packet, decode_varint, encode_varint, read_varint, server_list_ping
+
+
+class FakeStatusServer:
+    """ Serveur local qui répond au Server List Ping comme Minecraft """
+
+    def __init__(self, online=3, max_players=20, pong=True, status=None):
+        self.status = status if status is not None else json.dumps(
+            {"version": {"name": "1.20.4", "protocol": 765}, "players": {"online": online, "max": max_players}}
+        ).encode()
+        self.pong = pong
+        self.handshakes = []
+        self.server = None
+        self.port = None
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _read_packet(self, reader):
+        length = await read_varint(reader)
+        data = await reader.readexactly(length)
+        packet_id, offset = decode_varint(data)
+        return packet_id, data[offset:]
+
+    async def _handle(self, reader, writer):
+        try:
+            packet_id, handshake = await self._read_packet(reader)
+            protocol, offset = decode_varint(handshake)
+            length, offset = decode_varint(handshake, offset)
+            host = handshake[offset:offset + length].decode()
+            port, next_state = struct.unpack(">H", handshake[offset + length:offset + length + 2])[0], handshake[-1]
+            self.handshakes.append((packet_id, protocol, host, port, next_state))
+            await self._read_packet(reader)
+            writer.write(_packet(0x00, encode_varint(len(self.status)) + self.status))
+            packet_id, payload = await self._read_packet(reader)
+            if self.pong:
+                writer.write(_packet(0x01, payload))
+            await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+
+def test_varint_round_trip():
+    """ Vérifie l'encodage des VarInt, y compris les valeurs négatives sur cinq octets """
+    assert encode_varint(0) == b"\x00"
+    assert encode_varint(300) == b"\xac\x02"
+    assert encode_varint(-1) == b"\xff\xff\xff\xff\x0f"
+    for value in (0, 1, 127, 128, 25565, 2 ** 31 - 1):
+        assert decode_varint(b"\x01" + encode_varint(value), 1) == (value, 1 + len(encode_varint(value)))
+    with pytest.raises(ProbeError):
+        decode_varint(b"\xff" * 5)
+
+
+def test_read_varint_is_signed():
+    """ Vérifie que les VarInt lus sur le flux gardent leur signe """
+    async def main():
+        reader = asyncio.StreamReader()
+        reader.feed_data(encode_varint(-1) + encode_varint(765))
+        return await read_varint(reader), await read_varint(reader)
+
+    assert asyncio.run(main()) == (-1, 765)
+
+
+def test_packet_is_length_prefixed():
+    """ Vérifie qu'un paquet est préfixé par sa longueur, identifiant compris """
+    assert _packet(0x00) == b"\x01\x00"
+    assert _packet(0x01, b"\x00" * 8) == b"\x09\x01" + b"\x00" * 8
+
+
+def test_server_list_ping():
+    """ Vérifie le handshake envoyé et la lecture du nombre de joueurs et de la latence """
+    async def main():
+        async with FakeStatusServer(online=3, max_players=20) as server:
+            return await server_list_ping("127.0.0.1", server.port, 2), server.handshakes
+
+    status, handshakes = asyncio.run(main())
+    assert status["players_online"] == 3 and status["max_players"] == 20
+    assert status["latency_ms"] is not None and status["latency_ms"] >= 0
+    # Version de protocole -1, lue non signée par decode_varint ; état suivant 1 (statut)
+    assert handshakes[0][0] == 0x00 and handshakes[0][1] == 2 ** 32 - 1 and handshakes[0][4] == 1
+    assert handshakes[0][2] == "127.0.0.1"
+
+
+def test_server_list_ping_without_pong():
+    """ Vérifie qu'un serveur qui ferme la connexion sans répondre au ping reste joignable """
+    async def main():
+        async with FakeStatusServer(pong=False) as server:
+            return await server_list_ping("127.0.0.1", server.port, 2)
+
+    assert asyncio.run(main())["latency_ms"] is None
+
+
+def test_server_list_ping_errors():
+    """ Vérifie qu'un statut invalide ou un port fermé lèvent les bonnes erreurs """
+    async def invalid():
+        async with FakeStatusServer(status=b"not json") as server:
+            return await server_list_ping("127.0.0.1", server.port, 2)
+
+    async def closed():
+        async with FakeStatusServer() as server:
+            port = server.port
+        return await server_list_ping("127.0.0.1", port, 2)
+
+    with pytest.raises(ProbeError):
+        asyncio.run(invalid())
+    with pytest.raises(ConnectionError):
+        asyncio.run(closed())
+
+
+def test_prober_reports_ready_once():
+    """ Vérifie que l'inventaire est mis à jour, qu'un serveur retenu n'est pas prêt et que on_ready n'est appelé qu'une fois """
+    async def main():
+        async with FakeStatusServer(online=5) as server:
+            inventory = ServerInventory()
+            for name in ("lobby", "pregen"):
+                inventory.upsert(name, status="running", port=server.port)
+            ready = []
+            prober = GameProber(
+                inventory, lambda server_name: None, host="127.0.0.1", ttl=0,
+                is_held=lambda server_name: server_name == "pregen", on_ready=ready.append,
+            )
+            await prober.probe_all()
+            await prober.probe_all()
+            up = await prober.wait_up("pregen", 2, interval=0.05)
+            return inventory, ready, up, await prober.probe("pregen")
+
+    inventory, ready, up, pregen_ready = asyncio.run(main())
+    assert ready == ["lobby"]
+    assert inventory.get("lobby")["ready"] and inventory.get("lobby")["players_online"] == 5
+    assert not inventory.get("pregen")["ready"]
+    assert up and not pregen_ready
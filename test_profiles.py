@@ -0,0 +1,35 @@
+import pytest
+
+from profiles import ZGC_FLAGS, UnknownProfile, resolve_profile
+
+
+def test_profile_sizes_heap_from_players():
+    """ Vérifie le tas dérivé du profil et de max_players, avec G1 sous le seuil de ZGC """
+    tuning = resolve_profile({"performance_profile": "small"})
+    assert tuning["values"]["memory"] == "2G"
+    assert tuning["values"]["use_aikar_flags"] is True
+    assert tuning["values"]["sync_chunk_writes"] is False
+    # 30 joueurs : 20 de plus que prévu par le profil, à 128M chacun
+    assert resolve_profile({"performance_profile": "small", "max_players": 30})["values"]["memory"] == "4608M"
+    large = resolve_profile({"performance_profile": "large", "max_players": 100})["values"]
+    assert large["memory"] == "13G"
+    assert (large["use_aikar_flags"], large["jvm_xx_opts"]) == (False, ZGC_FLAGS)
+
+
+def test_explicit_values_override_profile():
+    """ Vérifie que les valeurs données explicitement l'emportent sur le profil """
+    tuning = resolve_profile({"performance_profile": "medium", "max_memory": "16G", "view_distance": 12, "use_aikar_flags": True})
+    assert "memory" not in tuning["values"]
+    assert tuning["values"]["view_distance"] == 12
+    assert tuning["values"]["use_aikar_flags"] is True
+    assert "jvm_xx_opts" not in tuning["values"]
+    assert tuning["overridden"] == ["use_aikar_flags", "view_distance"]
+
+
+def test_auto_profile():
+    """ Vérifie le choix du profil selon le type, la mémoire et le nombre de joueurs """
+    assert resolve_profile({"performance_profile": "auto", "type": "FORGE", "memory": "2G"})["profile"] == "modded"
+    assert resolve_profile({"performance_profile": "auto", "memory": "8G"})["profile"] == "large"
+    assert resolve_profile({"performance_profile": "auto", "max_players": 20})["profile"] == "medium"
+    with pytest.raises(UnknownProfile):
+        resolve_profile({"performance_profile": "huge"})
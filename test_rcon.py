@@ -0,0 +1,191 @@
+import asyncio
+import struct
+
+import pytest
+
+from rcon import RconAuthError, RconError, RconManager, RconPool, encode_packet
+
+PASSWORD = "secret"
+
+
+class FakeRconServer:
+    """ Serveur RCON local qui reproduit le comportement de Minecraft """
+
+    def __init__(self, password=PASSWORD, delay=0.0):
+        self.password = password
+        self.delay = delay
+        self.connections = 0
+        self.commands = []
+        self.writers = []
+        self.server = None
+        self.port = None
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        for writer in self.writers:
+            writer.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+    def _respond(self, writer, request_id, body):
+        # Réponse fragmentée en paquets de 4096 octets, comme Minecraft
+        data = body.encode()
+        for start in range(0, max(len(data), 1), 4096):
+            payload = struct.pack("<ii", request_id, 0) + data[start:start + 4096] + b"\x00\x00"
+            writer.write(struct.pack("<i", len(payload)) + payload)
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self.writers.append(writer)
+        authenticated = False
+        try:
+            while True:
+                (length,) = struct.unpack("<i", await reader.readexactly(4))
+                payload = await reader.readexactly(length)
+                request_id, type = struct.unpack("<ii", payload[:8])
+                body = payload[8:-2].decode()
+                if type == 3:
+                    authenticated = body == self.password
+                    writer.write(encode_packet(request_id if authenticated else -1, 2, ""))
+                elif not authenticated:
+                    break
+                elif type == 2:
+                    self.commands.append(body)
+                    await asyncio.sleep(self.delay)
+                    if body.startswith("echo "):
+                        self._respond(writer, request_id, body[5:])
+                    elif body.startswith("repeat "):
+                        self._respond(writer, request_id, "x" * int(body[7:]))
+                    else:
+                        self._respond(writer, request_id, f"Unknown command: {body}")
+                else:
+                    self._respond(writer, request_id, f"Unknown request {type:x}")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_command_returns_response():
+    """ Vérifie qu'une commande renvoie la réponse du serveur """
+    async def scenario():
+        async with FakeRconServer() as server:
+            pool = RconPool("127.0.0.1", server.port, PASSWORD)
+            try:
+                return await pool.command("echo hello")
+            finally:
+                pool.close()
+
+    assert run(scenario()) == "hello"
+
+
+def test_wrong_password_is_rejected():
+    """ Vérifie qu'un mauvais mot de passe lève une RconAuthError """
+    async def scenario():
+        async with FakeRconServer() as server:
+            pool = RconPool("127.0.0.1", server.port, "wrong")
+            try:
+                await pool.command("echo hello")
+            finally:
+                pool.close()
+
+    with pytest.raises(RconAuthError):
+        run(scenario())
+
+
+def test_fragmented_response_is_reassembled():
+    """ Vérifie qu'une réponse de plusieurs paquets est reconstituée """
+    async def scenario():
+        async with FakeRconServer() as server:
+            pool = RconPool("127.0.0.1", server.port, PASSWORD)
+            try:
+                return await pool.command("repeat 10000")
+            finally:
+                pool.close()
+
+    assert run(scenario()) == "x" * 10000
+
+
+def test_pipelined_commands_share_a_session():
+    """ Vérifie que des commandes simultanées sont pipelinées sur une seule session """
+    async def scenario():
+        async with FakeRconServer(delay=0.01) as server:
+            pool = RconPool("127.0.0.1", server.port, PASSWORD, size=1)
+            try:
+                responses = await asyncio.gather(*(pool.command(f"echo {i}") for i in range(50)))
+            finally:
+                pool.close()
+            return responses, server.connections
+
+    responses, connections = run(scenario())
+    assert responses == [str(i) for i in range(50)]
+    assert connections == 1
+
+
+def test_idle_sessions_are_evicted():
+    """ Vérifie que les sessions inactives sont fermées puis rouvertes à la demande """
+    async def scenario():
+        async with FakeRconServer() as server:
+            pool = RconPool("127.0.0.1", server.port, PASSWORD)
+            try:
+                await pool.command("echo a")
+                pool.evict_idle(0)
+                assert pool.connections == []
+                await pool.command("echo b")
+            finally:
+                pool.close()
+            return server.connections
+
+    assert run(scenario()) == 2
+
+
+def test_lost_session_is_reopened():
+    """ Vérifie qu'une session coupée par le serveur est rouverte de façon transparente """
+    async def scenario():
+        async with FakeRconServer() as server:
+            resolved = []
+
+            async def resolve(name):
+                resolved.append(name)
+                return "127.0.0.1", server.port, PASSWORD
+
+            manager = RconManager(resolve)
+            try:
+                await manager.command("lobby", "echo a")
+                for writer in server.writers:
+                    writer.close()
+                await asyncio.sleep(0.05)
+                response = await manager.command("lobby", "echo b")
+            finally:
+                await manager.stop()
+            return response, resolved, server.connections
+
+    response, resolved, connections = run(scenario())
+    assert response == "b"
+    assert resolved == ["lobby"]
+    assert connections == 2
+
+
+def test_timed_out_command_is_not_sent_again():
+    """ Vérifie qu'une commande expirée n'est pas renvoyée sur une nouvelle session """
+    async def scenario():
+        async with FakeRconServer(delay=0.3) as server:
+            pool = RconPool("127.0.0.1", server.port, PASSWORD, timeout=0.1)
+            try:
+                with pytest.raises(RconError, match="timed out"):
+                    await pool.command("save-all flush")
+            finally:
+                pool.close()
+            await asyncio.sleep(0.4)
+            return server.commands
+
+    assert run(scenario()) == ["save-all flush"]
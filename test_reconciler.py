@@ -0,0 +1,89 @@
+import asyncio
+
+from fake_docker import FakeDockerClient
+from inventory import ServerInventory
+from nodes import Node, NodeRegistry
+from reconciler import Reconciler, plan
+from store import spec_hash
+
+SPEC = {"server_name": "lobby", "version": "1.20.4"}
+
+
+def record(desired, spec=SPEC, applied=SPEC):
+    return {"desired_status": desired, "spec": spec, "applied": spec_hash(applied) if applied else None}
+
+
+def reconciler(store, inventory, apply, **kwargs):
+    """ Réconciliateur sur un nœud factice connecté """
+    node = Node("local", FakeDockerClient(0), inventory)
+    node.events.connected = True
+    return Reconciler(store, inventory, NodeRegistry({"local": node}, inventory), apply, **kwargs)
+
+
+def test_plan():
+    """ Vérifie l'action choisie pour chaque écart entre état voulu et état Docker """
+    running, exited = {"status": "running"}, {"status": "exited"}
+    assert plan(record("running"), running) is None
+    assert plan(record("running"), exited) == "start"
+    assert plan(record("running"), None) == "create"
+    assert plan(record("running"), running | {"status": "restarting"}) is None
+    assert plan(record("running", applied={"server_name": "lobby"}), running) == "recreate"
+    assert plan(record("running"), exited, hibernated=True) is None
+    assert plan(record("stopped"), running) == "stop"
+    assert plan(record("stopped"), None) is None
+    assert plan(record(None), exited) is None
+    # Serveur adopté sans spec : démarré ou arrêté, jamais recréé
+    assert plan(record("running", spec=None, applied=None), None) is None
+
+
+def test_desired_status_is_stored(store):
+    """ Vérifie l'enregistrement de l'état voulu et de l'empreinte de la spec appliquée """
+    store.put_server("lobby", SPEC, desired_status="running")
+    server = store.get_server("lobby")
+    assert (server["desired_status"], server["applied"]) == ("running", spec_hash(SPEC))
+    store.update_server("lobby", spec=dict(SPEC, version="1.21"), desired_status="stopped")
+    server = store.get_server("lobby")
+    assert server["desired_status"] == "stopped"
+    assert server["applied"] == spec_hash(SPEC) != spec_hash(server["spec"])
+
+
+def test_reconcile_in_waves(store):
+    """ Vérifie que les serveurs redémarrent par vagues bornées après un redémarrage de l'hôte """
+    inventory = ServerInventory()
+    for i in range(25):
+        store.put_server(f"s{i:02}", dict(SPEC, server_name=f"s{i:02}"), desired_status="running")
+        inventory.upsert(f"s{i:02}", status="exited", node="local")
+    in_flight, peak = set(), []
+
+    async def apply(action, server_name):
+        assert action == "start"
+        in_flight.add(server_name)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        inventory.upsert(server_name, status="running")
+        in_flight.discard(server_name)
+
+    reconciling = reconciler(store, inventory, apply, batch=10, wave_delay=0.01)
+    assert asyncio.run(reconciling.reconcile()) == 25
+    assert max(peak) == 10
+    assert reconciling.metrics["waves"] == 3
+    assert all(server["status"] == "running" for server in inventory.list())
+
+
+def test_failed_action_backs_off(store):
+    """ Vérifie qu'un serveur en échec n'est pas retouché avant son délai de backoff """
+    inventory = ServerInventory()
+    store.put_server("lobby", SPEC, desired_status="running")
+    inventory.upsert("lobby", status="exited", node="local")
+    calls = []
+
+    async def apply(action, server_name):
+        calls.append(server_name)
+        raise RuntimeError("port already allocated")
+
+    reconciling = reconciler(store, inventory, apply, backoff_initial=60)
+    asyncio.run(reconciling.reconcile())
+    asyncio.run(reconciling.reconcile())
+    assert calls == ["lobby"]
+    assert reconciling.metrics["failures"] == 1
+    assert 30 <= reconciling.status()["backing_off"]["lobby"]["retry_in"] <= 60
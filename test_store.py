@@ -0,0 +1,59 @@
+import sqlite3
+
+from store import MIGRATIONS
+
+
+def test_database_uses_wal(store):
+    """ Vérifie le mode WAL et l'application du schéma """
+    db = sqlite3.connect(store.path)
+    assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert db.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+
+
+def test_put_and_get_server(store):
+    """ Vérifie l'enregistrement et la relecture d'une définition """
+    spec = {"server_name": "lobby", "version": "1.20.4", "memory": "2G"}
+    store.put_server("lobby", spec, {"port": 25565}, "a", "abc")
+    server = store.get_server("lobby")
+    assert server["spec"] == spec
+    assert server["ports"] == {"port": 25565}
+    assert (server["node"], server["container_id"]) == ("a", "abc")
+    assert [server["name"] for server in store.list_servers("a")] == ["lobby"]
+    assert store.list_servers("b") == []
+    store.delete_server("lobby")
+    assert store.get_server("lobby") is None
+
+
+def test_history_is_bounded(store):
+    """ Vérifie que seuls les derniers événements de chaque serveur sont gardés """
+    for i in range(8):
+        store.record("lobby", "status", str(i))
+        store.record("survival", "status", str(i))
+    assert [event["detail"] for event in store.history("lobby")] == ["3", "4", "5", "6", "7"]
+    assert len(store.history("survival")) == 5
+
+
+def test_reconcile_with_docker(store):
+    """ Vérifie l'adoption des conteneurs inconnus et le signalement des conteneurs disparus """
+    store.put_server("gone", {"server_name": "gone"}, node="a", container_id="1")
+    store.put_server("moved", {"server_name": "moved"}, node="a", container_id="2")
+    changes = store.reconcile([
+        {"name": "moved", "id": "3", "node": "a"},
+        {"name": "adopted", "id": "4", "node": "b"},
+    ])
+    assert changes == {"adopted": ["adopted"], "missing": ["gone"], "updated": ["moved"]}
+    assert store.get_server("gone")["spec"] == {"server_name": "gone"}
+    assert store.get_server("gone")["container_id"] is None
+    assert store.get_server("adopted")["spec"] is None
+    assert store.history("gone")[-1]["event"] == "missing"
+
+
+def test_reconcile_leaves_unreachable_nodes_alone(store):
+    """ Vérifie que les serveurs d'un nœud non listé ne sont pas signalés disparus """
+    store.put_server("far", {"server_name": "far"}, node="b", container_id="1")
+    store.put_server("near", {"server_name": "near"}, node="a", container_id="2")
+    changes = store.reconcile([{"name": "far", "id": "1", "node": "b"}], nodes={"a"})
+    assert changes == {"adopted": [], "missing": ["near"], "updated": []}
+    assert store.get_server("far")["container_id"] == "1"
+    assert store.history("far") == []
+    assert store.reconcile([{"name": "far", "id": "1", "node": "b"}], nodes={"b"}) == {"adopted": [], "missing": [], "updated": []}
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from conftest import write
+from store import StateStore
+from templates import TemplateRepository, clone_tree
+
+
+@pytest.fixture
+def server_dir(tmp_path):
+    """ Dossier de serveur avec un monde, un jar, un plugin, des logs et un verrou de session """
+    data_dir = os.path.join(tmp_path, "lobby")
+    write(os.path.join(data_dir, "world", "region", "r.0.0.mca"), os.urandom(8192))
+    write(os.path.join(data_dir, "world", "session.lock"))
+    write(os.path.join(data_dir, "paper.jar"))
+    write(os.path.join(data_dir, "plugins", "Chunky.jar"))
+    write(os.path.join(data_dir, "server.properties"), b"motd=lobby\n")
+    write(os.path.join(data_dir, "logs", "latest.log"))
+    return data_dir
+
+
+def test_clone_tree(server_dir, tmp_path):
+    """ Vérifie que les jars sont liés, le monde copié et les fichiers d'instance ignorés """
+    clone = os.path.join(tmp_path, "lobby-1")
+    result = clone_tree(server_dir, clone, use_reflink=False)
+    assert result == {"reflinked": 0, "linked": 2, "copied": 2, "bytes_copied": 8192 + 11}
+    assert os.path.samefile(os.path.join(server_dir, "paper.jar"), os.path.join(clone, "paper.jar"))
+    assert not os.path.exists(os.path.join(clone, "logs"))
+    assert not os.path.exists(os.path.join(clone, "world", "session.lock"))
+    # Le monde d'un clone est indépendant : Minecraft réécrit les régions sur place
+    region = os.path.join(clone, "world", "region", "r.0.0.mca")
+    with open(region, "r+b") as f:
+        f.write(b"\0" * 16)
+    with open(os.path.join(server_dir, "world", "region", "r.0.0.mca"), "rb") as f:
+        assert f.read(16) != b"\0" * 16
+
+
+def test_capture_replaces_template_data(server_dir, tmp_path):
+    """ Vérifie qu'une nouvelle capture remplace les données du modèle """
+    repository = TemplateRepository(str(tmp_path))
+    repository.capture("lobby", server_dir)
+    os.remove(os.path.join(server_dir, "server.properties"))
+    repository.capture("lobby", server_dir)
+    assert not os.path.exists(os.path.join(repository.path("lobby"), "server.properties"))
+    assert os.listdir(os.path.join(repository.root, ".staging")) == []
+    repository.seed(repository.path("lobby"), os.path.join(tmp_path, "lobby-2"))
+    assert os.path.exists(os.path.join(tmp_path, "lobby-2", "world", "region", "r.0.0.mca"))
+
+
+def test_templates_are_stored(tmp_path):
+    """ Vérifie l'enregistrement, le remplacement et la suppression des modèles """
+    store = StateStore()
+    store.open(os.path.join(tmp_path, ".mcdeployer.db"))
+    store.put_template("lobby", {"type": "PAPER"}, source="lobby-main")
+    store.put_template("lobby", {"type": "PAPER", "max_players": 50}, source="lobby-main")
+    assert store.get_template("lobby")["config"] == {"type": "PAPER", "max_players": 50}
+    assert [template["name"] for template in store.list_templates()] == ["lobby"]
+    assert store.delete_template("lobby") and not store.delete_template("lobby")
+    store.close()
@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+
+import pytest
+
+from trash import METADATA_FILE, Throttle, Trash
+
+
+@pytest.fixture
+def server_dir(tmp_path):
+    """ Dossier de serveur avec un monde et un fichier de configuration """
+    data_dir = tmp_path / "lobby"
+    (data_dir / "world").mkdir(parents=True)
+    (data_dir / "world" / "level.dat").write_bytes(b"level" * 1000)
+    (data_dir / "server.properties").write_text("motd=lobby\n")
+    return str(data_dir)
+
+
+def test_throttle_limits_the_rate():
+    """ Vérifie que la rafale passe sans attendre puis que le débit moyen est respecté """
+    throttle = Throttle(100, burst=10)
+    started = time.monotonic()
+    throttle.consume(10)
+    assert time.monotonic() - started < 0.05
+    throttle.consume(20)
+    assert time.monotonic() - started >= 0.18
+    unlimited = Throttle(0)
+    started = time.monotonic()
+    unlimited.consume(10 ** 9)
+    assert time.monotonic() - started < 0.05
+
+
+def test_restore_trashed_directory(tmp_path, server_dir):
+    """ Vérifie qu'un dossier mis à la corbeille est restauré à l'identique, sans ses métadonnées """
+    trash = Trash(str(tmp_path), mode="delete", retention=3600, iops=0)
+    entry_id = trash.put(server_dir, "lobby")
+    assert not os.path.exists(server_dir)
+    assert [(entry["entry_id"], entry["state"]) for entry in trash.entries()] == [(entry_id, "trashed")]
+    assert trash.restore(entry_id, server_dir) == "trashed"
+    assert sorted(os.listdir(server_dir)) == ["server.properties", "world"]
+    assert trash.entries() == []
+    with pytest.raises(FileNotFoundError):
+        trash.restore(entry_id, str(tmp_path / "other"))
+
+
+def test_reaper_removes_file_by_file(tmp_path, server_dir):
+    """ Vérifie que le nettoyage en mode delete supprime chaque fichier et l'entrée """
+    trash = Trash(str(tmp_path), mode="delete", retention=0, iops=0)
+    entry_id = trash.put(server_dir, "lobby")
+    trash._reap({"entry_id": entry_id})
+    assert trash.entries() == []
+    # level.dat, server.properties et le fichier de métadonnées
+    assert trash.metrics["files_removed"] == 3 and trash.metrics["removed"] == 1
+
+
+def test_restore_from_archive(tmp_path, server_dir):
+    """ Vérifie qu'un dossier archivé puis supprimé est restauré depuis son archive """
+    trash = Trash(str(tmp_path), mode="archive", iops=0, bandwidth=0)
+    entry_id = trash.put(server_dir, "lobby")
+    trash._reap({"entry_id": entry_id})
+    assert [entry["state"] for entry in trash.entries()] == ["archived"]
+    assert trash.restore(entry_id, server_dir) == "archived"
+    with open(os.path.join(server_dir, "world", "level.dat"), "rb") as f:
+        assert f.read() == b"level" * 1000
+    assert not os.path.exists(os.path.join(server_dir, METADATA_FILE))
+
+
+def test_restore_is_refused_while_the_entry_is_archived(tmp_path, server_dir):
+    """ Vérifie qu'une restauration pendant l'archivage de l'entrée est refusée, puis possible une fois l'archive écrite """
+    trash = Trash(str(tmp_path), mode="archive", iops=0, bandwidth=0)
+    entry_id = trash.put(server_dir, "lobby")
+    archiving, release = threading.Event(), threading.Event()
+    archive = trash._archive
+
+    def slow_archive(path, entry_id):
+        archiving.set()
+        release.wait(5)
+        archive(path, entry_id)
+    trash._archive = slow_archive
+    reaper = threading.Thread(target=trash._reap, args=({"entry_id": entry_id},))
+    reaper.start()
+    assert archiving.wait(5)
+    with pytest.raises(BlockingIOError):
+        trash.restore(entry_id, server_dir)
+    assert trash.status()["current"] == entry_id
+    release.set()
+    reaper.join(5)
+    assert trash.status()["current"] is None
+    assert trash.restore(entry_id, server_dir) == "archived"
+
+
+def test_reaper_skips_an_entry_restored_meanwhile(tmp_path, server_dir):
+    """ Vérifie que le nettoyage ne touche pas une entrée restaurée entre sa planification et son tour """
+    trash = Trash(str(tmp_path), mode="delete", retention=0, iops=0)
+    entry_id = trash.put(server_dir, "lobby")
+    trash.restore(entry_id, server_dir)
+    trash._reap({"entry_id": entry_id})
+    assert os.path.exists(os.path.join(server_dir, "server.properties"))
+    assert trash.metrics["removed"] == 0
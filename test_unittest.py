@@ -11,6 +11,21 @@ from api import app, SERVER_DATA_DIR  # Importez SERVER_DATA_DIR depuis api.py
 client = httpx.Client(base_url="http://localhost:8000", timeout=60.0)  # Augmentez le délai d'attente à 30 secondes
 
 
+def wait_for_job(response, timeout=90.0):
+    """ Attend la fin de la tâche renvoyée par l'API et vérifie qu'elle a réussi """
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] == "failed":
+            raise AssertionError(f"La tâche {job_id} a échoué : {job['error']}")
+        if job["status"] == "succeeded":
+            return job
+        time.sleep(0.5)
+    raise AssertionError(f"La tâche {job_id} n'est pas terminée après {timeout} s")
+
+
 def test_create_server_basic():
     """ Test de création d'un serveur avec les paramètres de base """
     response = client.post(
@@ -22,8 +37,8 @@ def test_create_server_basic():
             "eula": "true"
         }
     )
-    assert response.status_code == 200
-    assert "container_id" in response.json()
+    job = wait_for_job(response)
+    assert "container_id" in job["result"]
 
 def test_create_server_with_mods():
     """ Test de création d'un serveur avec des mods et une whitelist """
@@ -38,8 +53,8 @@ def test_create_server_with_mods():
             "whitelist": "player1,player2"
         }
     )
-    assert response.status_code == 200
-    assert "container_id" in response.json()
+    job = wait_for_job(response)
+    assert "container_id" in job["result"]
 
 def test_list_servers():
     """ Vérifie que la liste des serveurs est bien retournée """
@@ -52,8 +67,8 @@ def test_list_servers():
 def test_restart_server():
     """ Test du redémarrage d'un serveur """
     response = client.post("/restart-server/test_server_basic")
-    assert response.status_code == 200
-    assert response.json() == {"message": "Server test_server_basic restarted successfully"}
+    job = wait_for_job(response)
+    assert job["result"] == {"message": "Server test_server_basic restarted successfully"}
 
 def test_restart_nonexistent_server():
     """ Test de tentative de redémarrage d'un serveur inexistant """
@@ -72,15 +87,32 @@ def test_delete_server():
             "eula": "true"
         }
     )
-    assert create_response.status_code == 200
+    wait_for_job(create_response)
 
     delete_response = client.post("/delete-server/test_server_to_delete")
-    assert delete_response.status_code == 200
-    assert delete_response.json() == {"message": "Server test_server_to_delete deleted successfully"}
+    job = wait_for_job(delete_response)
+    assert job["result"] == {"message": "Server test_server_to_delete deleted successfully"}
 
     list_response = client.get("/list-servers/")
     assert "test_server_to_delete" not in [server["name"] for server in list_response.json()["servers"]]
 
+def test_get_nonexistent_job():
+    """ Vérifie qu'une tâche inconnue renvoie une 404 """
+    response = client.get("/jobs/nonexistent_job")
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Job nonexistent_job not found"}
+
+def test_follow_job_events():
+    """ Vérifie que le flux d'événements d'une tâche se termine par son état final """
+    response = client.post("/restart-server/test_server_basic")
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    with client.stream("GET", f"/jobs/{job_id}/events") as stream:
+        events = [line for line in stream.iter_lines() if line.startswith("event: ")]
+    assert events[0] == "event: queued"
+    assert events[-2] == "event: succeeded"
+    assert events[-1] == "event: end"
+
 def test_delete_nonexistent_server():
     """ Vérifie la suppression d'un serveur qui n'existe pas """
     response = client.post("/delete-server/nonexistent_server")
@@ -111,8 +143,8 @@ def test_create_server_creates_data_directory():
             "eula": "true"
         }
     )
-    assert response.status_code == 200
-    assert "container_id" in response.json()
+    job = wait_for_job(response)
+    assert "container_id" in job["result"]
 
     # Vérifier que le dossier local a été créé dans ServerData
     data_dir = os.path.join(SERVER_DATA_DIR, server_name)
@@ -133,7 +165,7 @@ def test_delete_server_removes_data_directory():
             "eula": "true"
         }
     )
-    assert create_response.status_code == 200
+    wait_for_job(create_response)
 
     # Vérifier que le dossier local a été créé dans ServerData
     data_dir = os.path.join(SERVER_DATA_DIR, server_name)
@@ -141,8 +173,8 @@ def test_delete_server_removes_data_directory():
 
     # Supprimer le serveur
     delete_response = client.post(f"/delete-server/{server_name}")
-    assert delete_response.status_code == 200
-    assert delete_response.json() == {"message": f"Server {server_name} deleted successfully"}
+    job = wait_for_job(delete_response)
+    assert job["result"] == {"message": f"Server {server_name} deleted successfully"}
 
     # Vérifier que le dossier local a été supprimé
     assert not os.path.exists(data_dir), f"Le dossier {data_dir} n'a pas été supprimé."
@@ -159,11 +191,11 @@ def test_delete_server_removes_volumes():
             "eula": "true"
         }
     )
-    assert create_response.status_code == 200
+    create_job = wait_for_job(create_response)
 
     # Récupérer le conteneur avec le client Docker
     docker_client = docker.from_env()
-    container_id = create_response.json()["container_id"]
+    container_id = create_job["result"]["container_id"]
     container = docker_client.containers.get(container_id)
 
     # Vérifier que le conteneur a des volumes (montages de dossiers locaux)
@@ -176,8 +208,8 @@ def test_delete_server_removes_volumes():
 
     # Supprimer le serveur via l'API
     delete_response = client.post(f"/delete-server/{server_name}")
-    assert delete_response.status_code == 200
-    assert delete_response.json() == {"message": f"Server {server_name} deleted successfully"}
+    job = wait_for_job(delete_response)
+    assert job["result"] == {"message": f"Server {server_name} deleted successfully"}
 
     # Vérifier que le dossier local a été supprimé
     assert not os.path.exists(data_dir), f"Le dossier {data_dir} n'a pas été supprimé."
@@ -188,7 +220,7 @@ def cleanup():
     yield  # Exécute les tests normalement
     response = client.get("/list-servers/")
     for server in response.json().get("servers", []):
-        client.post(f"/delete-server/{server['name']}")
+        wait_for_job(client.post(f"/delete-server/{server['name']}"))
         time.sleep(1)
         # Supprimer le dossier local s'il existe
         data_dir = os.path.join(SERVER_DATA_DIR, server['name'])
@@ -0,0 +1,307 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tarfile
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# "delete" : suppression du dossier ; "archive" : archive .tar.gz du dossier puis suppression
+TRASH_MODE = os.environ.get("MCDEPLOYER_TRASH_MODE", "delete")
+# Mode delete : délai avant suppression du dossier ; mode archive : durée de conservation de l'archive
+TRASH_RETENTION = float(os.environ.get(
+    "MCDEPLOYER_TRASH_RETENTION", "604800" if TRASH_MODE == "archive" else "0"
+))
+# Débit maximal du nettoyage : fichiers supprimés par seconde et octets archivés par seconde
+TRASH_IOPS = float(os.environ.get("MCDEPLOYER_TRASH_IOPS", "500"))
+TRASH_BANDWIDTH = float(os.environ.get("MCDEPLOYER_TRASH_BANDWIDTH", str(50 * 1024 * 1024)))
+
+METADATA_FILE = ".mcdeployer-trash.json"
+READ_CHUNK = 1024 * 1024
+
+
+class Throttle:
+    """
+    Blocking token bucket: consume() sleeps so the average rate stays under `rate` per second.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount=1):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class _ThrottledReader:
+    def __init__(self, f, throttle):
+        self._f = f
+        self._throttle = throttle
+
+    def read(self, size=-1):
+        data = self._f.read(READ_CHUNK if size is None or size < 0 else min(size, READ_CHUNK))
+        self._throttle.consume(len(data))
+        return data
+
+
+class Trash:
+    """
+    Deferred, rate-limited removal of server data directories.
+
+    delete_server only renames the data directory into ServerData/.trash, which is atomic
+    and instant. A background reaper then removes it file by file under an IOPS cap, or, in
+    archive mode, first streams it into ServerData/.archives/<entry>.tar.gz under a bandwidth
+    cap. Until the reaper gets to it (retention in delete mode) or until the archive expires
+    (archive mode), a deleted server can be restored.
+    """
+
+    def __init__(self, data_root, mode=TRASH_MODE, retention=TRASH_RETENTION, iops=TRASH_IOPS,
+                 bandwidth=TRASH_BANDWIDTH, on_removed=None):
+        if mode not in ("delete", "archive"):
+            raise ValueError(f"Unknown trash mode: {mode}")
+        self.data_root = data_root
+        self.trash_dir = os.path.join(data_root, ".trash")
+        self.archive_dir = os.path.join(data_root, ".archives")
+        self.mode = mode
+        self.retention = retention
+        self.iops = Throttle(iops)
+        self.bandwidth = Throttle(bandwidth, burst=READ_CHUNK * 4)
+        self.on_removed = on_removed
+        self.current = None
+        self.metrics = {"trashed": 0, "removed": 0, "archived": 0, "restored": 0, "expired": 0,
+                        "files_removed": 0, "bytes_archived": 0}
+        self._wakeup = asyncio.Event()
+        self._task = None
+        # Protège l'entrée en cours de nettoyage contre une restauration simultanée
+        self._lock = threading.Lock()
+
+    def put(self, data_dir, server_name):
+        """
+        Move a data directory into the trash. Blocking but instant (a rename).
+
+        Args:
+            data_dir (str): The data directory of the deleted server.
+            server_name (str): The name of the deleted server.
+
+        Returns:
+            str: The id of the trash entry.
+        """
+        os.makedirs(self.trash_dir, exist_ok=True)
+        entry_id = f"{server_name}-{uuid.uuid4().hex[:8]}"
+        path = os.path.join(self.trash_dir, entry_id)
+        os.rename(data_dir, path)
+        with open(os.path.join(path, METADATA_FILE), "w") as f:
+            json.dump({"server_name": server_name, "deleted_at": time.time()}, f)
+        self.metrics["trashed"] += 1
+        return entry_id
+
+    def wake(self):
+        """
+        Wake the reaper up after put(). Must be called from the asyncio loop.
+        """
+        self._wakeup.set()
+
+    def _read_metadata(self, path):
+        try:
+            with open(os.path.join(path, METADATA_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"server_name": os.path.basename(path).rsplit("-", 1)[0], "deleted_at": os.path.getmtime(path)}
+
+    def entries(self):
+        """
+        List the trashed directories and the archives. Blocking.
+
+        Returns:
+            list: One dict per entry with its id, server name, deletion time and state
+                ("trashed" or "archived").
+        """
+        entries = []
+        if os.path.isdir(self.trash_dir):
+            for entry_id in os.listdir(self.trash_dir):
+                metadata = self._read_metadata(os.path.join(self.trash_dir, entry_id))
+                entries.append(dict(metadata, entry_id=entry_id, state="trashed"))
+        if os.path.isdir(self.archive_dir):
+            for name in os.listdir(self.archive_dir):
+                if not name.endswith(".tar.gz"):
+                    continue
+                path = os.path.join(self.archive_dir, name)
+                entry_id = name[:-len(".tar.gz")]
+                entries.append({
+                    "entry_id": entry_id,
+                    "server_name": entry_id.rsplit("-", 1)[0],
+                    "deleted_at": os.path.getmtime(path),
+                    "state": "archived",
+                    "size": os.path.getsize(path),
+                })
+        return sorted(entries, key=lambda entry: entry["deleted_at"])
+
+    def _remove_tree(self, path):
+        for directory, subdirectories, files in os.walk(path, topdown=False):
+            for name in files:
+                os.unlink(os.path.join(directory, name))
+                self.iops.consume()
+                self.metrics["files_removed"] += 1
+            for name in subdirectories:
+                subdirectory = os.path.join(directory, name)
+                if os.path.islink(subdirectory):
+                    os.unlink(subdirectory)
+                else:
+                    os.rmdir(subdirectory)
+                self.iops.consume()
+        os.rmdir(path)
+
+    def _archive(self, path, entry_id):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        archive = os.path.join(self.archive_dir, f"{entry_id}.tar.gz")
+        partial = f"{archive}.part"
+        with tarfile.open(partial, "w:gz", compresslevel=6) as tar:
+            for directory, subdirectories, files in os.walk(path):
+                subdirectories.sort()
+                for name in sorted(files):
+                    if name == METADATA_FILE:
+                        continue
+                    full_path = os.path.join(directory, name)
+                    info = tar.gettarinfo(full_path, arcname=os.path.relpath(full_path, path))
+                    if info.isreg():
+                        with open(full_path, "rb") as f:
+                            tar.addfile(info, _ThrottledReader(f, self.bandwidth))
+                        self.metrics["bytes_archived"] += info.size
+                    else:
+                        tar.addfile(info)
+        os.replace(partial, archive)
+        self.metrics["archived"] += 1
+
+    def _reap(self, entry):
+        path = os.path.join(self.trash_dir, entry["entry_id"])
+        with self._lock:
+            if not os.path.isdir(path):
+                # Restaurée entre-temps
+                return
+            self.current = entry["entry_id"]
+        try:
+            if self.mode == "archive":
+                self._archive(path, entry["entry_id"])
+            self._remove_tree(path)
+            self.metrics["removed"] += 1
+        finally:
+            self.current = None
+
+    def _next_due(self):
+        due = []
+        now = time.time()
+        for entry in self.entries():
+            if entry["state"] == "trashed":
+                delay = 0 if self.mode == "archive" else self.retention
+            else:
+                delay = self.retention
+            due.append((entry["deleted_at"] + delay, entry))
+        return sorted(due, key=lambda item: item[0]), now
+
+    async def _reaper(self, docker_exec):
+        while True:
+            self._wakeup.clear()
+            due, now = await docker_exec.run("trash", self._next_due)
+            next_wakeup = None
+            for at, entry in due:
+                if at > now:
+                    next_wakeup = at - now
+                    break
+                try:
+                    if entry["state"] == "trashed":
+                        await docker_exec.run("trash", self._reap, entry)
+                    else:
+                        await docker_exec.run("trash", os.unlink, os.path.join(self.archive_dir, f"{entry['entry_id']}.tar.gz"))
+                        self.metrics["expired"] += 1
+                except Exception as e:
+                    logger.warning("Could not clean up trash entry %s: %s", entry["entry_id"], e)
+                    continue
+                if self.on_removed is not None:
+                    await self.on_removed()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=next_wakeup or 60.0)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, docker_exec):
+        """
+        Start the background reaper.
+
+        Args:
+            docker_exec (DockerExecutor): The executor running the blocking disk operations, on
+                its own "trash" operation so a throttled removal never holds an "io" slot.
+        """
+        self._task = asyncio.create_task(self._reaper(docker_exec))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def restore(self, entry_id, data_dir):
+        """
+        Put a trashed or archived data directory back in place. Blocking.
+
+        Args:
+            entry_id (str): The id of the trash entry.
+            data_dir (str): The data directory to restore to, which must not exist.
+
+        Returns:
+            str: The state the entry was restored from ("trashed" or "archived").
+
+        Raises:
+            FileNotFoundError: If the entry does not exist anymore.
+            FileExistsError: If the data directory already exists.
+            BlockingIOError: If the reaper is archiving or removing the entry right now.
+        """
+        if os.path.exists(data_dir):
+            raise FileExistsError(data_dir)
+        path = os.path.join(self.trash_dir, entry_id)
+        with self._lock:
+            if self.current == entry_id:
+                raise BlockingIOError(entry_id)
+            if os.path.isdir(path):
+                os.rename(path, data_dir)
+                os.remove(os.path.join(data_dir, METADATA_FILE))
+                self.metrics["restored"] += 1
+                return "trashed"
+        archive = os.path.join(self.archive_dir, f"{entry_id}.tar.gz")
+        if not os.path.exists(archive):
+            raise FileNotFoundError(entry_id)
+        partial = f"{data_dir}.restoring"
+        shutil.rmtree(partial, ignore_errors=True)
+        with tarfile.open(archive, "r:gz") as tar:
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(partial, filter="data")
+            else:
+                tar.extractall(partial)
+        os.rename(partial, data_dir)
+        self.metrics["restored"] += 1
+        return "archived"
+
+    def status(self):
+        return {
+            "mode": self.mode,
+            "retention_seconds": self.retention,
+            "iops": self.iops.rate,
+            "bandwidth_bytes": self.bandwidth.rate,
+            "current": self.current,
+            "metrics": dict(self.metrics),
+        }
@@ -0,0 +1,401 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import statistics
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from functools import partial
+
+
+logger = logging.getLogger(__name__)
+
+# Profils du pool, séparés par des virgules : "version:type:mémoire=taille" (ex: "latest:PAPER:2G=2")
+WARM_POOL = os.environ.get("MCDEPLOYER_WARM_POOL", "")
+# Nombre maximal de serveurs en cours de préchauffage en même temps
+WARM_POOL_CONCURRENCY = int(os.environ.get("MCDEPLOYER_WARM_POOL_CONCURRENCY", "1"))
+# Délai maximal pour qu'un serveur devienne joignable
+JOINABLE_TIMEOUT = float(os.environ.get("MCDEPLOYER_JOINABLE_TIMEOUT", "900"))
+
+POOL_LABEL = "mcdeployer.pool"
+MARKER_FILE = ".mcdeployer-warm"
+# Ligne de log écrite par le serveur Minecraft quand il accepte les joueurs
+READY_LOG_LINE = "Done ("
+# Paramètres qui changent le monde généré : un serveur qui les fixe ne peut pas réutiliser un monde préchauffé
+WORLD_SETTINGS = ("world", "level", "level_seed", "level_type", "generator_settings")
+
+
+def profile_key(version, type, memory):
+    return f"{version or 'latest'}:{type or ''}:{memory or ''}"
+
+
+def parse_profiles(value):
+    """
+    Parse the MCDEPLOYER_WARM_POOL setting.
+
+    Args:
+        value (str): Comma separated "version:type:memory=size" entries.
+
+    Returns:
+        dict: The target size of each profile key.
+    """
+    profiles = {}
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        key, _, size = entry.strip().rpartition("=")
+        version, _, rest = key.partition(":")
+        type, _, memory = rest.partition(":")
+        profiles[profile_key(version, type, memory)] = int(size)
+    return profiles
+
+
+def _parse_timestamp(value):
+    date, _, fraction = value.rstrip("Z").partition(".")
+    moment = datetime.strptime(date, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+    return moment + float(f"0.{fraction}") if fraction else moment
+
+
+def _close_stream(stream):
+    try:
+        stream.close()
+    except Exception as e:
+        logger.debug("Could not close a log stream: %s", e)
+
+
+def wait_until_joinable(container, timeout=JOINABLE_TIMEOUT, streams=None):
+    """
+    Follow the logs of a container until the Minecraft server accepts players.
+
+    Blocking: run it through the DockerExecutor "joinable" operation. The timeout holds even
+    when the container writes nothing: a timer closes the log stream, which ends the wait.
+
+    Args:
+        container (Container): The docker-py container.
+        timeout (float): How long to wait, in seconds.
+        streams (set): Optional set the open log stream is registered in while waiting, so
+            it can be closed to interrupt the wait.
+
+    Returns:
+        float: The time the server became joinable, taken from the log timestamp, or None if
+            the container stopped, the timeout expired or the stream was closed first.
+    """
+    stream = container.logs(stream=True, follow=True, timestamps=True)
+    timer = threading.Timer(timeout, _close_stream, (stream,))
+    timer.daemon = True
+    timer.start()
+    if streams is not None:
+        streams.add(stream)
+    try:
+        for line in stream:
+            text = line.decode(errors="replace")
+            if READY_LOG_LINE in text:
+                return _parse_timestamp(text.split(" ", 1)[0])
+    finally:
+        timer.cancel()
+        if streams is not None:
+            streams.discard(stream)
+        _close_stream(stream)
+    return None
+
+
+class ProvisioningStats:
+    """
+    Time-to-joinable samples of cold and warm provisioning.
+    """
+
+    def __init__(self, size=100):
+        self.samples = {"cold": deque(maxlen=size), "warm": deque(maxlen=size)}
+
+    def record(self, mode, seconds):
+        self.samples[mode].append(seconds)
+
+    def to_dict(self):
+        summary = {}
+        for mode, samples in self.samples.items():
+            values = sorted(samples)
+            summary[mode] = {
+                "count": len(values),
+                "mean_seconds": statistics.fmean(values) if values else None,
+                "p50_seconds": statistics.median(values) if values else None,
+                "max_seconds": values[-1] if values else None,
+            }
+        return summary
+
+
+class WarmPool:
+    """
+    Pool of pre-warmed server data directories, per (version, type, memory) profile.
+
+    Warming runs a throwaway container until the server prints "Done (", so the jar is
+    downloaded and the world generated, then stops it gracefully and removes it. Docker
+    cannot change the ports or mounts of an existing container, so what is pooled is the
+    warmed /data directory: create_server moves it into ServerData/<server_name> and starts
+    its container on it, which skips the jar download and world generation.
+    """
+
+    def __init__(self, client, docker_exec, images, data_root, profiles=None,
+                 concurrency=WARM_POOL_CONCURRENCY):
+        self.client = client
+        self.docker_exec = docker_exec
+        self.images = images
+        self.root = os.path.join(data_root, ".warm")
+        # profil -> {"target": taille visée, "refill_delay": délai avant de recompléter après une réservation}
+        self.profiles = {
+            key: {"target": size, "refill_delay": 0.0}
+            for key, size in parse_profiles(WARM_POOL if profiles is None else profiles).items()
+        }
+        self.stats = ProvisioningStats()
+        self.metrics = {"claims": 0, "misses": 0, "warmups": 0, "warmup_failures": 0}
+        self._ready = {}
+        self._warming = {}
+        self._not_before = {}
+        self._concurrency = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._background = set()
+        # Flux de logs suivis par les threads en attente d'un serveur préchauffé joignable
+        self._streams = set()
+        # serveur -> tâche et flux de logs de la mesure de son temps avant d'être joignable
+        self._measures = {}
+
+    def _recover(self):
+        # Conteneurs de préchauffage laissés par un arrêt brutal de l'API
+        try:
+            for container in self.client.containers.list(all=True, filters={"label": POOL_LABEL}):
+                container.remove(force=True)
+        except Exception as e:
+            logger.warning("Could not remove leftover warm-up containers: %s", e)
+        ready = {}
+        if not os.path.isdir(self.root):
+            return ready
+        for entry in os.listdir(self.root):
+            path = os.path.join(self.root, entry)
+            try:
+                with open(os.path.join(path, MARKER_FILE)) as marker:
+                    key = json.load(marker)["profile"]
+            except (OSError, ValueError, KeyError):
+                # Préchauffage interrompu : le dossier est inutilisable
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            ready.setdefault(key, []).append(path)
+        return ready
+
+    async def start(self):
+        """
+        Pick up the data directories warmed by a previous run and start refilling the pool.
+        """
+        self._ready = await self.docker_exec.run("delete", self._recover)
+        self._task = asyncio.create_task(self._refill_loop())
+
+    async def stop(self):
+        # Débloque les threads qui attendent un serveur joignable
+        for stream in list(self._streams):
+            _close_stream(stream)
+        tasks = list(self._background) + [task for task, _ in self._measures.values()]
+        for server_name in list(self._measures):
+            self.cancel_measure(server_name)
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def set_profile(self, version, type, memory, target, refill_delay=0.0):
+        """
+        Set the target size and refill policy of a profile.
+
+        Args:
+            version (str): The server version.
+            type (str): The server type (PAPER, FORGE, ...), or None for vanilla.
+            memory (str): The server memory, or None for the image default.
+            target (int): The number of warmed servers to keep ready.
+            refill_delay (float): Seconds to wait after a claim before warming a replacement,
+                so the claimed server boots without competing for CPU.
+
+        Returns:
+            str: The profile key.
+        """
+        key = profile_key(version, type, memory)
+        self.profiles[key] = {"target": target, "refill_delay": refill_delay}
+        self._wakeup.set()
+        return key
+
+    def claim(self, config):
+        """
+        Take a warmed data directory matching a server configuration.
+
+        Args:
+            config (MinecraftServerConfig): The configuration of the server being created.
+
+        Returns:
+            str: The path of the warmed data directory, or None if none matches.
+        """
+        if any(getattr(config, setting) for setting in WORLD_SETTINGS):
+            return None
+        key = profile_key(config.version, config.type, config.memory)
+        if key not in self.profiles:
+            return None
+        ready = self._ready.get(key)
+        if not ready:
+            self.metrics["misses"] += 1
+            return None
+        self.metrics["claims"] += 1
+        self._not_before[key] = time.time() + self.profiles[key]["refill_delay"]
+        self._wakeup.set()
+        return ready.pop()
+
+    def adopt(self, path, data_dir):
+        """
+        Move a claimed warm directory to the data directory of a server. Blocking.
+
+        Args:
+            path (str): The path returned by claim.
+            data_dir (str): The data directory of the new server, which must not exist.
+        """
+        os.rename(path, data_dir)
+        os.remove(os.path.join(data_dir, MARKER_FILE))
+
+    async def _refill_loop(self):
+        while True:
+            now = time.time()
+            for key, profile in self.profiles.items():
+                ready = self._ready.setdefault(key, [])
+                missing = profile["target"] - len(ready) - self._warming.get(key, 0)
+                if missing > 0 and self._not_before.get(key, 0) <= now:
+                    for _ in range(missing):
+                        self._warming[key] = self._warming.get(key, 0) + 1
+                        self._spawn(self._warm(key))
+                # Taille visée réduite : les dossiers en trop sont supprimés
+                while len(ready) > profile["target"]:
+                    self._spawn(self.docker_exec.run("delete", shutil.rmtree, ready.pop(), True))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=5.0)
+            except asyncio.TimeoutError:
+                pass
+
+    def _warm_blocking(self, key, image, path):
+        version, type, memory = key.split(":")
+        environment = {"EULA": "TRUE", "VERSION": version}
+        if type:
+            environment["TYPE"] = type
+        if memory:
+            environment["MEMORY"] = memory
+        os.makedirs(path)
+        container = self.client.containers.run(
+            image=image,
+            name=f"mcdeployer-warm-{os.path.basename(path)}",
+            environment=environment,
+            volumes={path: {'bind': '/data', 'mode': 'rw'}},
+            labels={POOL_LABEL: key},
+            detach=True,
+        )
+        try:
+            if wait_until_joinable(container, streams=self._streams) is None:
+                raise RuntimeError(f"Warm server for profile {key} never became joinable")
+            # Arrêt propre : le monde est sauvegardé avant la réutilisation du dossier
+            container.stop(timeout=60)
+        finally:
+            container.remove(force=True)
+        with open(os.path.join(path, MARKER_FILE), "w") as marker:
+            json.dump({"profile": key, "warmed_at": time.time()}, marker)
+
+    async def _warm(self, key):
+        path = os.path.join(self.root, uuid.uuid4().hex[:12])
+        try:
+            async with self._concurrency:
+                image = await self.images.ensure(key.split(":")[0])
+                await self.docker_exec.run("joinable", self._warm_blocking, key, image, path)
+            self._ready.setdefault(key, []).append(path)
+            self.metrics["warmups"] += 1
+        except Exception as e:
+            logger.warning("Warming a server for profile %s failed: %s", key, e)
+            self.metrics["warmup_failures"] += 1
+            await self.docker_exec.run("delete", shutil.rmtree, path, True)
+            # Pas de nouvelle tentative immédiate pour ce profil
+            self._not_before[key] = time.time() + 60
+        finally:
+            self._warming[key] -= 1
+
+    def measure(self, container, started_at, warm, docker_exec=None):
+        """
+        Measure in the background the time-to-joinable of a freshly created server.
+
+        The wait runs on the "measure" operation of the executor of the server's node, so a
+        burst of creates never holds the "joinable" slots refilling the pool.
+
+        Args:
+            container (Container): The container of the server.
+            started_at (float): When the create operation started.
+            warm (bool): Whether the server was provisioned from the pool.
+            docker_exec (DockerExecutor): The executor of the node of the server; the pool's
+                own if not set.
+        """
+        self.cancel_measure(container.name)
+        streams = set()
+        task = asyncio.create_task(
+            self._measure(container, started_at, warm, docker_exec or self.docker_exec, streams)
+        )
+        self._measures[container.name] = (task, streams)
+        task.add_done_callback(partial(self._measured, container.name))
+
+    def _measured(self, server_name, task):
+        if self._measures.get(server_name, (None,))[0] is task:
+            del self._measures[server_name]
+
+    def cancel_measure(self, server_name):
+        """
+        Stop measuring a server, e.g. because it is being deleted, and free its slot.
+
+        Args:
+            server_name (str): The name of the server.
+        """
+        task, streams = self._measures.pop(server_name, (None, ()))
+        # Le thread en attente ne se termine qu'à la fermeture de son flux de logs
+        for stream in list(streams):
+            _close_stream(stream)
+        if task is not None:
+            task.cancel()
+
+    async def _measure(self, container, started_at, warm, docker_exec, streams):
+        try:
+            ready_at = await docker_exec.run("measure", wait_until_joinable, container, streams=streams)
+        except Exception as e:
+            logger.info("Could not measure the time-to-joinable of %s: %s", container.name, e)
+            return
+        if ready_at is None:
+            return
+        self.stats.record("warm" if warm else "cold", max(0.0, ready_at - started_at))
+
+    def status(self):
+        """
+        Describe the pool and the provisioning metrics.
+
+        Returns:
+            dict: For each profile its target, ready and warming counts, the claim counters
+                and the cold vs. warm time-to-joinable.
+        """
+        return {
+            "profiles": {
+                key: {
+                    "target": profile["target"],
+                    "refill_delay": profile["refill_delay"],
+                    "ready": len(self._ready.get(key, [])),
+                    "warming": self._warming.get(key, 0),
+                }
+                for key, profile in self.profiles.items()
+            },
+            "metrics": dict(self.metrics),
+            "time_to_joinable": self.stats.to_dict(),
+        }